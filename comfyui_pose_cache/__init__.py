@@ -0,0 +1,142 @@
+"""
+ComfyUI 自定义节点：姿态提取结果缓存
+
+PoseCacheSave: 把姿态检测节点的输出保存到缓存目录
+    - IMAGE / MASK 张量保存为 uint8 .npy，可 mmap 读取
+    - 其他输出（如 PoseAndFaceDetection 的 POSEDATA 关键点）用 pickle 保存
+PoseCacheLoad: 按缓存键读取，输出顺序与被替换的检测节点一致；.npy 按批转换为 float32，不产生整段的中间副本
+
+缓存目录结构:
+    <cache_dir>/<cache_key>/meta.json
+    <cache_dir>/<cache_key>/output_<i>.npy 或 output_<i>.pkl
+
+由 handler 侧的 pose_cache.py 在提交前注入：命中时用 PoseCacheLoad 替换检测节点，未命中时追加 PoseCacheSave。
+"""
+
+import os
+import json
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+import torch
+
+MAX_OUTPUTS = 4
+DEFAULT_CACHE_DIR = os.getenv("POSE_CACHE_DIR", "/workspace/pose_cache")
+# PoseCacheLoad 每批转换的帧数
+LOAD_BATCH_FRAMES = 16
+
+
+def to_uint8(tensor):
+    """IMAGE [N,H,W,C] / MASK [N,H,W] 取值 0-1，量化为 uint8 存储（体积为 float32 的 1/4）"""
+    return (tensor.detach().cpu().clamp(0, 1) * 255.0).round().to(torch.uint8).numpy()
+
+
+def load_uint8(path, batch_frames=LOAD_BATCH_FRAMES):
+    """mmap 读取 uint8 .npy，按批写入预先分配的 float32 张量（峰值内存为结果本身加一批）"""
+    array = np.load(path, mmap_mode="r")
+    result = torch.empty(array.shape, dtype=torch.float32)
+    for start in range(0, array.shape[0], batch_frames):
+        batch = torch.from_numpy(np.ascontiguousarray(array[start:start + batch_frames]))
+        result[start:start + batch_frames] = batch.to(torch.float32).div_(255.0)
+    return result
+
+
+class PoseCacheSave:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "cache_key": ("STRING", {"default": ""}),
+                "cache_dir": ("STRING", {"default": DEFAULT_CACHE_DIR}),
+            },
+            "optional": {f"output_{i}": ("*",) for i in range(MAX_OUTPUTS)},
+        }
+
+    RETURN_TYPES = ()
+    FUNCTION = "save"
+    OUTPUT_NODE = True
+    CATEGORY = "pose_cache"
+
+    @classmethod
+    def VALIDATE_INPUTS(cls, input_types=None, **kwargs):
+        return True
+
+    def save(self, cache_key, cache_dir, **outputs):
+        entry_dir = os.path.join(cache_dir, cache_key)
+        if not cache_key or os.path.exists(os.path.join(entry_dir, "meta.json")):
+            return {}
+
+        os.makedirs(cache_dir, exist_ok=True)
+        # 先写入临时目录，完成后整体 rename，读取方不会看到写了一半的缓存
+        tmp_dir = tempfile.mkdtemp(prefix=f".{cache_key}.", dir=cache_dir)
+        try:
+            meta = {"outputs": []}
+            for i in range(MAX_OUTPUTS):
+                value = outputs.get(f"output_{i}")
+                if value is None:
+                    break
+                if isinstance(value, torch.Tensor):
+                    array = to_uint8(value)
+                    np.save(os.path.join(tmp_dir, f"output_{i}.npy"), array)
+                    meta["outputs"].append({"format": "npy", "shape": list(array.shape), "dtype": "uint8"})
+                else:
+                    # 关键点等非张量输出，缓存目录只由本服务的 worker 写入
+                    with open(os.path.join(tmp_dir, f"output_{i}.pkl"), "wb") as f:
+                        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    meta["outputs"].append({"format": "pickle", "type": type(value).__name__})
+            if not meta["outputs"]:
+                raise ValueError("没有可缓存的输出")
+            with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+                json.dump(meta, f)
+            try:
+                os.rename(tmp_dir, entry_dir)
+            except OSError:
+                # 其他 worker 已写入同一缓存键
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        return {}
+
+
+class PoseCacheLoad:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "cache_key": ("STRING", {"default": ""}),
+                "cache_dir": ("STRING", {"default": DEFAULT_CACHE_DIR}),
+            },
+        }
+
+    RETURN_TYPES = ("*",) * MAX_OUTPUTS
+    RETURN_NAMES = tuple(f"output_{i}" for i in range(MAX_OUTPUTS))
+    FUNCTION = "load"
+    CATEGORY = "pose_cache"
+
+    def load(self, cache_key, cache_dir):
+        entry_dir = os.path.join(cache_dir, cache_key)
+        with open(os.path.join(entry_dir, "meta.json")) as f:
+            meta = json.load(f)
+        results = []
+        for i, output in enumerate(meta["outputs"]):
+            if output.get("format", "npy") == "npy":
+                results.append(load_uint8(os.path.join(entry_dir, f"output_{i}.npy")))
+            else:
+                with open(os.path.join(entry_dir, f"output_{i}.pkl"), "rb") as f:
+                    results.append(pickle.load(f))
+        results.extend([None] * (MAX_OUTPUTS - len(results)))
+        return tuple(results)
+
+
+NODE_CLASS_MAPPINGS = {
+    "PoseCacheSave": PoseCacheSave,
+    "PoseCacheLoad": PoseCacheLoad,
+}
+
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "PoseCacheSave": "Pose Cache Save",
+    "PoseCacheLoad": "Pose Cache Load",
+}
@@ -0,0 +1,20 @@
+"""
+各部署共用的 RunPod handler 核心
+
+每个部署目录下的 handler.py 只保留工作流 profile 定义（选择工作流、绑定参数、选择输出），
+输入处理、ComfyUI 通信、prompt 优化、输出重封装/上传都在这里实现一次。
+"""
+
+from .profile import (WorkflowProfile, run_job, make_handler, select_output_node, build_video_result,
+                      optimize_prompt)
+from .inputs import (COMFYUI_INPUT_DIR, to_nearest_multiple_of_16, process_input, download_file_from_url,
+                     save_base64_to_file, resolve_job_file, mask_job_input)
+from .comfy_client import (SERVER_ADDRESS, CLIENT_ID, queue_prompt, get_image, get_history, get_object_info,
+                           get_available_models, get_system_stats, wait_for_http_connection, connect_websocket,
+                           get_videos, get_queue, cancel_prompts, reap_orphaned_prompts)
+from .workflow import (load_workflow, find_node_by_class_type, find_node_by_type_and_input, set_node_value,
+                       update_model_in_prompt, ensure_model_in_checkpoints)
+from .binding import validate_params, compile_bindings, apply_bindings, job_hash
+from .template import PromptTemplate, get_template, writable_node
+from .widgets import get_input_specs, get_widget_layout, normalize_prompt_inputs
+from .prompt_fixups import fix_prompt_inputs
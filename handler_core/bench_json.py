@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+JSON 编解码基准：标准库 json 与 fastjson（orjson）在真实文档大小上的对比
+
+用法:
+    python -m handler_core.bench_json [workflow.json ...] [--object-info object_info.json] [--video-mb 8]
+
+文档:
+    工作流文件（默认为仓库中的工作流）、/object_info（未指定文件时按真实 ComfyUI + WanVideoWrapper
+    的规模生成约 3.5MB 的节点定义）、任务结果（包含 base64 视频的字典）
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+
+from . import fastjson
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_WORKFLOWS = [
+    "new_Wan22_api.json",
+    "Rapid-AIO-Mega.json",
+    "onetoall_all/Wan21_OneToAllAnimation_example_01.json",
+    "steadydancer-comfyui/wanvideo_SteadyDancer_example_01.json",
+]
+
+
+def make_object_info(node_count=1500, model_count=300):
+    """生成与真实 /object_info 规模相近的节点定义（每个加载器节点带完整的模型列表）"""
+    models = [f"WanVideo/model_{i:04d}_fp8_e4m3fn_scaled_KJ.safetensors" for i in range(model_count)]
+    object_info = {}
+    for i in range(node_count):
+        required = {
+            "model": ["WANVIDEOMODEL"],
+            "steps": ["INT", {"default": 30, "min": 1, "max": 10000, "tooltip": "采样步数"}],
+            "cfg": ["FLOAT", {"default": 6.0, "min": 0.0, "max": 30.0, "step": 0.01}],
+            "scheduler": [["unipc", "dpm++", "dpm++_sde", "euler", "lcm"], {"default": "unipc"}],
+        }
+        if i % 10 == 0:
+            required["model_name"] = [models]
+        object_info[f"Node{i}"] = {
+            "input": {"required": required, "optional": {"extra": ["STRING", {"default": "", "multiline": True}]}},
+            "input_order": {"required": list(required), "optional": ["extra"]},
+            "output": ["LATENT", "IMAGE"], "output_is_list": [False, False], "output_name": ["samples", "images"],
+            "name": f"Node{i}", "display_name": f"Node {i}", "description": "", "category": "WanVideoWrapper",
+            "output_node": False,
+        }
+    return object_info
+
+
+def best_time(func, repeat):
+    """多次运行取最短时间（秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_document(name, raw, repeat):
+    """对一个文档分别测量两种后端的解析和序列化时间，返回结果行"""
+    data = json.loads(raw)
+    stdlib_loads = best_time(lambda: json.loads(raw), repeat)
+    stdlib_dumps = best_time(lambda: json.dumps(data).encode('utf-8'), repeat)
+    fast_loads = best_time(lambda: fastjson.loads(raw), repeat)
+    fast_dumps = best_time(lambda: fastjson.dumps(data), repeat)
+    return {
+        "name": name, "size": len(raw),
+        "loads": (stdlib_loads, fast_loads), "dumps": (stdlib_dumps, fast_dumps),
+    }
+
+
+def print_results(results):
+    print(f"后端: {fastjson.BACKEND}")
+    print(f"{'文档':<42} {'大小':>9} {'loads json/fast (ms)':>22} {'dumps json/fast (ms)':>22}")
+    for row in results:
+        cells = []
+        for key in ("loads", "dumps"):
+            stdlib_time, fast_time = row[key]
+            speedup = stdlib_time / fast_time if fast_time else 0
+            cells.append(f"{stdlib_time * 1000:7.2f}/{fast_time * 1000:6.2f} x{speedup:4.1f}")
+        print(f"{row['name']:<44} {row['size'] / 1024:>7.0f}KB {cells[0]:>22} {cells[1]:>22}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON 编解码基准")
+    parser.add_argument("workflows", nargs="*", help="工作流文件（默认使用仓库中的工作流）")
+    parser.add_argument("--object-info", help="ComfyUI /object_info 的 JSON 文件（默认生成）")
+    parser.add_argument("--video-mb", type=float, default=8, help="任务结果中视频的大小 (MB)")
+    parser.add_argument("--repeat", type=int, default=20, help="每项测量的重复次数")
+    args = parser.parse_args()
+
+    documents = []
+    for path in args.workflows or [os.path.join(REPO_DIR, name) for name in DEFAULT_WORKFLOWS]:
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                documents.append((os.path.basename(path), f.read()))
+        else:
+            print(f"跳过不存在的文件: {path}", file=sys.stderr)
+
+    if args.object_info:
+        with open(args.object_info, 'rb') as f:
+            documents.append(("/object_info", f.read()))
+    else:
+        documents.append(("/object_info (生成)", json.dumps(make_object_info()).encode('utf-8')))
+
+    video = base64.b64encode(os.urandom(int(args.video_mb * 1024 * 1024))).decode('ascii')
+    documents.append((f"任务结果 ({args.video_mb:g}MB 视频)",
+                      json.dumps({"video": video, "output_node": "584", "seed": 42}).encode('utf-8')))
+
+    print_results([bench_document(name, raw, args.repeat) for name, raw in documents])
+
+
+if __name__ == "__main__":
+    main()
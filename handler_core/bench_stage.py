@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+模型预热基准：冷加载与预热后加载的对比
+
+用法:
+    python -m handler_core.bench_stage [--dir /workspace/bench] [--files 3] [--size-mb 512]
+                                       [--bandwidth-mbps 200] [--boot-seconds 10]
+
+测量:
+    页缓存:   --dir 中的文件先用 POSIX_FADV_DONTNEED 逐出页缓存，测量冷读取；再用 readahead 预热后测量读取。
+              --dir 指向网络卷时即为真实的网络卷冷加载（tmpfs 上两者没有差别）
+    限速目录: 本地目录按 --bandwidth-mbps 限速模拟网络卷。冷加载 = 第一个任务直接从网络卷读取；
+              copy 预热 = 与 --boot-seconds 的 ComfyUI 启动并行复制到本地目录，启动后第一个任务等待
+              剩余复制完成并从本地读取
+"""
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+from .stage import ModelStager, RateLimiter, _read_blocks
+
+MB = 1024 * 1024
+
+
+def make_models(directory, count, size):
+    """生成 count 个随机内容的模型文件（写入后 fsync，便于逐出页缓存）"""
+    os.makedirs(directory, exist_ok=True)
+    names = []
+    chunk = os.urandom(min(size, 8 * MB))
+    for i in range(count):
+        name = f"bench_model_{i}.safetensors"
+        with open(os.path.join(directory, name), "wb") as f:
+            for offset in range(0, size, len(chunk)):
+                f.write(chunk[:size - offset])
+            f.flush()
+            os.fsync(f.fileno())
+        names.append(name)
+    return names
+
+
+def evict(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def load_model(path, limiter=None):
+    """模拟模型加载：顺序读取整个文件，返回耗时"""
+    start = time.perf_counter()
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        _read_blocks(fd, 16 * MB, limiter or RateLimiter(), lambda block: None)
+    finally:
+        os.close(fd)
+    return time.perf_counter() - start
+
+
+def bench_page_cache(directory, names):
+    paths = [os.path.join(directory, name) for name in names]
+    for path in paths:
+        evict(path)
+    cold = sum(load_model(path) for path in paths)
+
+    for path in paths:
+        evict(path)
+    stager = ModelStager(mode="readahead", search_paths=[("diffusion_models", directory)],
+                         memory_budget=float("inf"))
+    start = time.perf_counter()
+    stager.run(names, log_interval=3600)
+    staged = time.perf_counter() - start
+    warm = sum(load_model(path) for path in paths)
+    return cold, staged, warm
+
+
+def bench_throttled(directory, names, bandwidth, boot_seconds):
+    network_dir = os.path.join(directory, "network")
+    local_dir = os.path.join(directory, "local")
+    for name in names:
+        os.makedirs(network_dir, exist_ok=True)
+        shutil.move(os.path.join(directory, name), os.path.join(network_dir, name))
+
+    volume = RateLimiter(bandwidth)
+    cold = sum(load_model(os.path.join(network_dir, name), volume) for name in names)
+
+    # 预热线程从限速的“网络卷”读取，与启动并行
+    stager = ModelStager(mode="copy", stage_dir=local_dir, search_paths=[("diffusion_models", network_dir)],
+                         reserve=0, max_mbps=bandwidth / MB)
+    start = time.perf_counter()
+    stager.run(names, log_interval=3600)
+    stage_time = time.perf_counter() - start
+    wait = max(stage_time - boot_seconds, 0)
+    local = sum(load_model(os.path.join(local_dir, "diffusion_models", name)) for name in names)
+    return cold, stage_time, wait + local
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模型预热基准")
+    parser.add_argument("--dir", help="测试文件目录（默认临时目录；指向网络卷可测量真实冷加载）")
+    parser.add_argument("--files", type=int, default=3, help="模型文件数量")
+    parser.add_argument("--size-mb", type=int, default=512, help="每个模型文件的大小 (MB)")
+    parser.add_argument("--bandwidth-mbps", type=float, default=200, help="模拟网络卷的读取带宽 (MB/s)")
+    parser.add_argument("--boot-seconds", type=float, default=10, help="模拟 ComfyUI 启动耗时（与 copy 预热并行）")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="bench_stage_", dir=args.dir)
+    try:
+        names = make_models(directory, args.files, args.size_mb * MB)
+        total_mb = args.files * args.size_mb
+        print(f"{args.files} 个模型文件, 共 {total_mb} MB, 目录 {directory}")
+
+        cold, staged, warm = bench_page_cache(directory, names)
+        print(f"页缓存:   冷加载 {cold:6.2f}s ({total_mb / cold:7.0f} MB/s) | readahead 预热 {staged:6.2f}s | "
+              f"预热后加载 {warm:6.2f}s ({total_mb / warm:7.0f} MB/s)")
+
+        cold, stage_time, first_job = bench_throttled(directory, names, args.bandwidth_mbps * MB, args.boot_seconds)
+        print(f"限速目录: 冷加载 {cold:6.2f}s | copy 预热 {stage_time:6.2f}s（与 {args.boot_seconds:.0f}s 启动并行）| "
+              f"启动后第一个任务加载 {first_job:6.2f}s")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
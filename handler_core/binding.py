@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+声明式参数绑定：任务字段 -> 节点输入
+
+每个工作流声明两部分：
+
+    PARAMS = {
+        # 参数名即任务字段名；type 做类型转换，transform 在验证后执行
+        "steps": {"type": int, "default": 4, "min": 1},
+        "width": {"type": float, "default": 480, "transform": to_nearest_multiple_of_16},
+        # fixed: 不从任务读取的常量（仍可被绑定），不参与哈希
+        "video_format": {"default": "video/h264-mp4", "fixed": True},
+    }
+    BINDINGS = (
+        # (参数名, 节点ID, 输入名, widgets_values 的索引/键)；输入名或索引为 None 时只写另一处
+        ("steps", "119", "steps", 0),
+    )
+
+compile_bindings() 按模板 prompt 把 BINDINGS 编译为平铺的 setter 列表（丢弃模板中不存在的节点、
+越界的 widgets 索引，每个工作流模板只编译一次，见 template.py），apply_bindings() 只做一次遍历，
+不再逐个判断节点/字段是否存在。
+同一份 PARAMS 用于任务参数验证（validate_params）和去重用的规范化任务哈希（job_hash）。
+"""
+
+import os
+import json
+import hashlib
+import logging
+
+from .pose_cache import hash_file
+
+logger = logging.getLogger(__name__)
+
+TYPE_NAMES = {int: "整数", float: "数字", str: "字符串", bool: "布尔值", list: "数组", dict: "对象"}
+TRUE_STRINGS = ("true", "1", "yes")
+FALSE_STRINGS = ("false", "0", "no")
+
+
+def coerce_value(value, value_type):
+    """按声明的类型转换任务字段，无法转换时抛出 ValueError"""
+    if value_type is None or value is None:
+        return value
+    if value_type is bool:
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.strip().lower() in TRUE_STRINGS + FALSE_STRINGS:
+            return value.strip().lower() in TRUE_STRINGS
+        raise ValueError
+    if value_type is int:
+        if isinstance(value, bool):
+            raise ValueError
+        if isinstance(value, float):
+            if not value.is_integer():
+                raise ValueError
+            return int(value)
+        return int(value)
+    if value_type is float:
+        if isinstance(value, bool):
+            raise ValueError
+        return float(value)
+    if value_type in (str, list, dict):
+        if not isinstance(value, value_type):
+            raise ValueError
+        return value
+    return value_type(value)
+
+
+def validate_params(params_spec, job_input):
+    """
+    按 PARAMS 读取并验证任务参数
+
+    返回 (values, errors)：values 包含所有声明的参数（未提供的取默认值），errors 为错误信息列表
+    """
+    values = {}
+    errors = []
+    for name, spec in params_spec.items():
+        if spec.get("fixed") or name not in job_input or job_input[name] is None:
+            if spec.get("required") and not spec.get("fixed"):
+                errors.append(f"缺少必需参数: {name}")
+            value = spec.get("default")
+        else:
+            value = job_input[name]
+            try:
+                value = coerce_value(value, spec.get("type"))
+            except (TypeError, ValueError):
+                errors.append(f"参数 {name} 应为{TYPE_NAMES.get(spec.get('type'), '合法值')}: {value!r}")
+                continue
+            if "min" in spec and value < spec["min"]:
+                errors.append(f"参数 {name} 不能小于 {spec['min']}: {value}")
+                continue
+            if "max" in spec and value > spec["max"]:
+                errors.append(f"参数 {name} 不能大于 {spec['max']}: {value}")
+                continue
+            if "choices" in spec and value not in spec["choices"]:
+                errors.append(f"参数 {name} 不支持 {value!r}，可选: {', '.join(map(str, spec['choices']))}")
+                continue
+        if "transform" in spec and value is not None:
+            try:
+                value = spec["transform"](value)
+            except (TypeError, ValueError) as e:
+                errors.append(f"参数 {name} 无效: {e}")
+                continue
+        values[name] = value
+    return values, errors
+
+
+def compile_bindings(bindings, prompt):
+    """
+    按模板 prompt 编译 BINDINGS，返回 [(参数名, 节点ID, 输入名, widgets 索引/键), ...]
+
+    模板中不存在的节点被丢弃；widgets_values 不存在、类型不符或索引越界时只写 inputs
+    """
+    plan = []
+    for param, node_id, input_name, widget_key in bindings:
+        node = prompt.get(node_id)
+        if node is None:
+            logger.debug(f"绑定 {param} -> 节点 {node_id} 不在工作流中，已跳过")
+            continue
+        widgets = node.get("widgets_values")
+        if widget_key is not None:
+            if isinstance(widget_key, int):
+                if not isinstance(widgets, list) or widget_key >= len(widgets):
+                    widget_key = None
+            elif not isinstance(widgets, dict):
+                widget_key = None
+        if input_name is None and widget_key is None:
+            continue
+        plan.append((param, node_id, input_name, widget_key))
+    return plan
+
+
+def apply_bindings(prompt, plan, values):
+    """把参数值写入 prompt；值为 None 的参数（如未提供的可选输入文件）不写入"""
+    for param, node_id, input_name, widget_key in plan:
+        value = values[param]
+        if value is None:
+            continue
+        node = prompt[node_id]
+        if input_name is not None:
+            node.setdefault("inputs", {})[input_name] = value
+        if widget_key is not None:
+            node["widgets_values"][widget_key] = value
+
+
+def job_hash(values, params_spec, input_files=None, workflow=None):
+    """
+    规范化任务哈希：相同工作流、相同参数（验证和转换后）、相同输入文件内容的任务得到相同的哈希
+
+    input_files: {名称: 本地路径}，按文件内容哈希参与计算，因此 path / url / base64 输入同一文件结果一致
+    """
+    payload = {
+        "workflow": workflow,
+        "params": {name: value for name, value in values.items()
+                   if name in params_spec and not params_spec[name].get("fixed")},
+        "files": {name: hash_file(path) if os.path.isfile(path) else path
+                  for name, path in (input_files or {}).items() if path},
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def join_prompt_lines(prompt_input):
+    """多提示词输入：数组按换行符连接，字符串原样使用"""
+    if isinstance(prompt_input, list):
+        return "\n".join(str(p) for p in prompt_input if p)
+    return str(prompt_input)
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+worker 启动编排：ComfyUI 启动与 handler 初始化并行，冷启动时间不再是各阶段之和
+
+用法（entrypoint.sh）:
+    python -m handler_core.boot /handler.py -- --listen --use-sage-attention --preview-method none
+
+阶段:
+- comfyui:     启动 ComfyUI 子进程，按指数退避轮询 /system_stats 直到就绪，进程退出时立即失败
+- models:      扫描模型目录（预热网络卷的目录元数据），记录模型文件数量和大小
+- handler:     导入 handler.py（runpod、handler_core 等依赖），在主线程中执行以便注册信号处理
+- workflows:   预编译 profile.workflow_files，写入编译缓存（见 workflow_compiler）
+- compile_cache: 设置 ComfyUI 的 torch.compile / Triton 本地缓存目录，从网络卷恢复编译缓存（见 compile_cache.py）
+- stage:       按首次使用顺序预热工作流引用的网络卷模型（读入页缓存或复制到本地盘，见 stage.py）
+- object_info: ComfyUI 就绪后获取并缓存 /object_info，清理上一个进程遗留的 prompt
+
+comfyui / models / compile_cache / stage 在后台线程中与 handler / workflows 并行执行，最后在同一进程中启动 runpod.serverless.start，第一个任务不再等待 ComfyUI 或 /object_info。
+只有 comfyui 和 handler 阶段失败时退出，其余阶段失败只记录警告（任务执行时会按需重做）。
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+import subprocess
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+
+from .comfy_client import wait_for_http_connection, get_object_info, reap_orphaned_prompts
+from .workflow_compiler import compile_all, DEFAULT_CACHE_DIR
+from .provision import MODEL_EXTENSIONS
+from .stage import stage_profile_models
+from .compile_cache import compile_env, get_compile_cache
+
+logger = logging.getLogger(__name__)
+
+COMFYUI_MAIN = os.getenv("COMFYUI_MAIN", "/ComfyUI/main.py")
+COMFYUI_START_TIMEOUT = float(os.getenv("COMFYUI_START_TIMEOUT", "180"))
+MODEL_DIRS = ("/ComfyUI/models", "/workspace/models", "/workspace/loras")
+
+
+class BootTimeline:
+    """记录每个启动阶段的开始 / 结束时间（相对启动时刻），可在多个线程中使用"""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.start = clock()
+        self.phases = []
+        self._lock = threading.Lock()
+
+    def run(self, name, func, *args):
+        """执行一个阶段并记录耗时，异常原样抛出"""
+        start = self.clock() - self.start
+        logger.info(f"▶️ [{start:6.1f}s] {name} 开始")
+        status = "ok"
+        try:
+            return func(*args)
+        except BaseException:
+            status = "failed"
+            raise
+        finally:
+            end = self.clock() - self.start
+            with self._lock:
+                self.phases.append({"name": name, "start": start, "end": end, "status": status})
+            icon = "✅" if status == "ok" else "❌"
+            logger.info(f"{icon} [{end:6.1f}s] {name} {'完成' if status == 'ok' else '失败'} ({end - start:.1f}s)")
+
+    def report(self):
+        """输出启动时间线：各阶段区间、总耗时与各阶段耗时之和"""
+        total = self.clock() - self.start
+        phase_sum = sum(phase["end"] - phase["start"] for phase in self.phases)
+        lines = [f"🚀 启动完成: 总耗时 {total:.1f}s（各阶段耗时之和 {phase_sum:.1f}s）"]
+        for phase in sorted(self.phases, key=lambda phase: phase["start"]):
+            lines.append(f"   {phase['name']:<12} {phase['start']:6.1f}s -> {phase['end']:6.1f}s "
+                         f"({phase['end'] - phase['start']:5.1f}s) {phase['status']}")
+        logger.info("\n".join(lines))
+        return total, phase_sum
+
+
+def start_comfyui(comfyui_args):
+    """在后台启动 ComfyUI，输出直接继承到容器日志；编译缓存目录通过环境变量传给 ComfyUI"""
+    os.environ.update(compile_env())
+    command = [sys.executable, COMFYUI_MAIN] + list(comfyui_args)
+    logger.info(f"启动 ComfyUI: {' '.join(command)}")
+    return subprocess.Popen(command)
+
+
+def scan_models(model_dirs=MODEL_DIRS):
+    """统计模型目录中的模型文件，返回 {目录: (文件数, 字节数)}；不存在的目录跳过"""
+    summary = {}
+    for model_dir in model_dirs:
+        if not os.path.isdir(model_dir):
+            continue
+        count, size = 0, 0
+        for root, _, files in os.walk(model_dir, followlinks=True):
+            for name in files:
+                if name.lower().endswith(MODEL_EXTENSIONS):
+                    try:
+                        size += os.path.getsize(os.path.join(root, name))
+                        count += 1
+                    except OSError:
+                        continue
+        summary[model_dir] = (count, size)
+        logger.info(f"📦 {model_dir}: {count} 个模型文件, {size / 1024 ** 3:.1f} GB")
+    return summary
+
+
+def import_handler(handler_path):
+    """以模块名 handler 导入 handler.py（不执行 __main__ 部分）"""
+    handler_path = os.path.abspath(handler_path)
+    sys.path.insert(0, os.path.dirname(handler_path))
+    spec = importlib.util.spec_from_file_location("handler", handler_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["handler"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def compile_profile_workflows(profile, cache_dir=DEFAULT_CACHE_DIR):
+    """预编译 profile 声明的工作流（不存在的文件跳过），返回编译结果列表"""
+    workflow_files = [path for path in getattr(profile, "workflow_files", ()) if os.path.exists(path)]
+    if not workflow_files:
+        return []
+    results = compile_all(workflow_files, os.path.dirname(cache_dir), cache_dir)
+    for result in results:
+        if result["status"] == "failed":
+            logger.warning(f"⚠️ 工作流预编译失败: {result['input']}: {'; '.join(result['errors'][:3])}")
+        else:
+            logger.info(f"🧱 {result['input']}: {result['status']} ({result['nodes']} 个节点)")
+    return results
+
+
+def prefetch_comfyui_state():
+    """获取并缓存 /object_info，清理遗留 prompt"""
+    object_info = get_object_info()
+    logger.info(f"📚 /object_info 已缓存: {len(object_info)} 个节点类型")
+    reap_orphaned_prompts()
+
+
+def restore_compile_cache():
+    """恢复网络卷上当前 torch 版本 / GPU 架构的编译缓存条目"""
+    cache = get_compile_cache()
+    return cache.restore_all() if cache is not None else 0
+
+
+def run_optional(timeline, name, func, *args):
+    """执行可选阶段，失败只记录警告"""
+    try:
+        return timeline.run(name, func, *args)
+    except Exception as e:
+        logger.warning(f"⚠️ 启动阶段 {name} 失败（不影响启动）: {e}")
+        return None
+
+
+def boot(handler_path, comfyui_args, timeout=COMFYUI_START_TIMEOUT):
+    """并行完成各启动阶段，返回 handler 模块；ComfyUI 或 handler 启动失败时抛出异常"""
+    timeline = BootTimeline()
+    process = timeline.run("spawn", start_comfyui, comfyui_args)
+    executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="boot")
+    try:
+        comfyui_ready = executor.submit(timeline.run, "comfyui", wait_for_http_connection, timeout, process)
+        executor.submit(run_optional, timeline, "models", scan_models)
+        executor.submit(run_optional, timeline, "compile_cache", restore_compile_cache)
+        module = timeline.run("handler", import_handler, handler_path)
+        profile = getattr(module, "PROFILE", None)
+        if profile is not None:
+            run_optional(timeline, "workflows", compile_profile_workflows, profile)
+            executor.submit(run_optional, timeline, "stage", stage_profile_models, profile)
+        system_stats = comfyui_ready.result()
+    except BaseException:
+        process.terminate()
+        raise
+    finally:
+        # 模型目录扫描、编译缓存恢复和模型预热未完成时不阻塞启动，在后台继续
+        executor.shutdown(wait=False)
+
+    devices = system_stats.get("devices") or [{}]
+    logger.info(f"ComfyUI {system_stats.get('system', {}).get('comfyui_version', '')} 就绪, "
+                f"GPU: {devices[0].get('name', 'unknown')}")
+    run_optional(timeline, "object_info", prefetch_comfyui_state)
+    timeline.report()
+    return module
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并行启动 ComfyUI 与 RunPod handler")
+    parser.add_argument("handler", help="handler.py 路径")
+    parser.add_argument("comfyui_args", nargs=argparse.REMAINDER, help="-- 之后的参数传给 ComfyUI main.py")
+    parser.add_argument("--timeout", type=float, default=COMFYUI_START_TIMEOUT, help="等待 ComfyUI 就绪的秒数")
+    args = parser.parse_args()
+    comfyui_args = args.comfyui_args[1:] if args.comfyui_args[:1] == ["--"] else args.comfyui_args
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        module = boot(args.handler, comfyui_args, args.timeout)
+    except Exception as e:
+        logger.error(f"❌ worker 启动失败: {e}", exc_info=True)
+        sys.exit(1)
+
+    import runpod
+    runpod.serverless.start({"handler": module.handler})
+
+
+if __name__ == "__main__":
+    main()
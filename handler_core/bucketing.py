@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+分辨率 / 帧数分桶：把任务的 (width, height, length) 对齐到一组固定形状，输出再裁剪回请求的尺寸
+
+任意 16 倍数的宽高和任意帧数都是一个新形状，WanVideoTorchCompileSettings 的编译图、ComfyUI 节点缓存和任务合并
+（singleflight）都无法复用。开启分桶（任务输入 bucketing: true，或环境变量 BUCKETING=1 默认开启）后:
+
+1. 宽高选择能覆盖请求尺寸（不需要放大）、宽高比最接近、面积最小的桶，帧数选择不小于请求的最短桶长度；
+   桶的面积或帧数超过请求的 BUCKET_MAX_OVERHEAD 倍时该维度不分桶（按请求尺寸生成）
+2. 按桶的形状生成，输出在 CPU 上等比缩放并居中裁剪到请求的宽高、截取请求的帧数（video_postprocess.fit_video）
+3. 每个 worker 统计命中率（对齐到桶的任务比例）和形状复用率（生成形状此前已执行过的任务比例），见 get_bucket_stats()，
+   任务结果的 bucket.worker 中包含当前的统计
+
+配置:
+    BUCKET_SIZES=480x832,832x480,...   BUCKET_LENGTHS=33,49,81,121   BUCKET_MAX_OVERHEAD=1.5
+"""
+
+import os
+import math
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKET_SIZES = "480x832,832x480,640x640,544x960,960x544,720x1280,1280x720"
+# Wan 的帧数为 4n+1
+DEFAULT_BUCKET_LENGTHS = "33,49,81,121"
+BUCKETING_DEFAULT = os.getenv("BUCKETING", "0").lower() in ("1", "true", "yes")
+BUCKET_MAX_OVERHEAD = float(os.getenv("BUCKET_MAX_OVERHEAD", "1.5"))
+
+
+def parse_sizes(value):
+    """"480x832,832x480" -> [(480, 832), (832, 480)]"""
+    sizes = []
+    for item in value.split(","):
+        if item.strip():
+            width, height = item.lower().split("x")
+            sizes.append((int(width), int(height)))
+    return sizes
+
+
+def parse_lengths(value):
+    return sorted(int(item) for item in value.split(",") if item.strip())
+
+
+BUCKET_SIZES = parse_sizes(os.getenv("BUCKET_SIZES", DEFAULT_BUCKET_SIZES))
+BUCKET_LENGTHS = parse_lengths(os.getenv("BUCKET_LENGTHS", DEFAULT_BUCKET_LENGTHS))
+
+
+def choose_size(width, height, sizes=BUCKET_SIZES, max_overhead=BUCKET_MAX_OVERHEAD):
+    """能覆盖请求尺寸、宽高比最接近（其次面积最小）的桶，没有合适的桶时返回 None"""
+    aspect = width / height
+    candidates = []
+    for bucket_width, bucket_height in sizes:
+        # 等比缩放到覆盖请求尺寸；需要放大的桶会降低画质
+        if max(width / bucket_width, height / bucket_height) > 1:
+            continue
+        area = bucket_width * bucket_height
+        if area > width * height * max_overhead:
+            continue
+        candidates.append((abs(math.log(bucket_width / bucket_height / aspect)), area, (bucket_width, bucket_height)))
+    return min(candidates)[2] if candidates else None
+
+
+def choose_length(length, lengths=BUCKET_LENGTHS, max_overhead=BUCKET_MAX_OVERHEAD):
+    """不小于请求帧数的最短桶长度，没有合适的桶时返回 None"""
+    bucket_length = next((value for value in lengths if value >= length), None)
+    if bucket_length is None or bucket_length > length * max_overhead:
+        return None
+    return bucket_length
+
+
+class BucketStats:
+    """每个 worker 的分桶统计"""
+
+    def __init__(self):
+        self.jobs = 0
+        self.hits = 0
+        self.warm = 0
+        self.shapes = {}
+        self._lock = threading.Lock()
+
+    def record(self, shape, hit):
+        """记录一个任务，返回该形状此前是否执行过"""
+        with self._lock:
+            warm = shape in self.shapes
+            self.jobs += 1
+            self.hits += int(hit)
+            self.warm += int(warm)
+            self.shapes[shape] = self.shapes.get(shape, 0) + 1
+        return warm
+
+    def snapshot(self):
+        with self._lock:
+            jobs = self.jobs
+            return {
+                "jobs": jobs,
+                "hits": self.hits,
+                "hit_rate": self.hits / jobs if jobs else 0.0,
+                "warm_rate": self.warm / jobs if jobs else 0.0,
+                "shapes": {"x".join(str(value) for value in shape): count for shape, count in self.shapes.items()},
+            }
+
+
+_stats = BucketStats()
+
+
+def get_bucket_stats():
+    """当前 worker 的分桶统计: 任务数、命中率、形状复用率、各形状的任务数"""
+    return _stats.snapshot()
+
+
+def apply_buckets(params, names=("width", "height", "length"), sizes=BUCKET_SIZES, lengths=BUCKET_LENGTHS,
+                  max_overhead=BUCKET_MAX_OVERHEAD, stats=_stats):
+    """
+    把 params 中的宽高 / 帧数改为桶的形状（原地修改）；names 中不包含 length 时只对齐宽高
+    返回:
+        {"requested": {参数名: 请求值}, "generated": {参数名: 生成值}, "hit": 是否对齐到桶, "warm": 形状是否执行过}
+    """
+    width_name, height_name = names[0], names[1]
+    length_name = names[2] if len(names) > 2 else None
+    requested = {name: params[name] for name in names}
+
+    size = choose_size(params[width_name], params[height_name], sizes, max_overhead)
+    bucket_length = choose_length(params[length_name], lengths, max_overhead) if length_name else None
+    if size is not None:
+        params[width_name], params[height_name] = size
+    if bucket_length is not None:
+        params[length_name] = bucket_length
+    generated = {name: params[name] for name in names}
+
+    hit = size is not None and (length_name is None or bucket_length is not None)
+    warm = stats.record(tuple(generated.values()), hit)
+    summary = stats.snapshot()
+    shape = "x".join(str(value) for value in requested.values())
+    logger.info(f"📐 分桶: {shape} -> {'x'.join(str(value) for value in generated.values())} "
+                f"({'命中' if hit else '未命中'}, {'已编译形状' if warm else '新形状'}; worker 命中率 "
+                f"{summary['hit_rate']:.0%}, 形状复用率 {summary['warm_rate']:.0%}, {summary['jobs']} 个任务)")
+    return {"requested": requested, "generated": generated, "hit": hit, "warm": warm}
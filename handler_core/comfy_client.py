@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+ComfyUI HTTP / WebSocket 客户端：提交 prompt、等待执行完成、读取输出视频
+"""
+
+import os
+import time
+import uuid
+import base64
+import logging
+import urllib.request
+import urllib.parse
+import urllib.error
+
+import websocket
+
+from . import fastjson
+from .video_postprocess import remux_mp4
+
+logger = logging.getLogger(__name__)
+
+SERVER_ADDRESS = os.getenv('SERVER_ADDRESS', '127.0.0.1')
+CLIENT_ID = str(uuid.uuid4())
+
+# 等待执行时每次 recv 的超时（秒），超时后检查任务截止时间
+RECV_TIMEOUT = 5
+
+# /object_info 缓存（节点定义在 ComfyUI 进程生命周期内不变）
+_object_info_cache = None
+# 当前任务提交的 prompt（收到终止信号时中断它）
+_active_prompt_id = None
+# 本进程是否已清理过上一个 handler 进程遗留的 prompt
+_orphans_reaped = False
+
+
+def comfy_url(path, scheme="http"):
+    return f"{scheme}://{SERVER_ADDRESS}:8188{path}"
+
+
+def queue_prompt(prompt):
+    """提交prompt到ComfyUI"""
+    payload = {"prompt": prompt, "client_id": CLIENT_ID}
+    req = urllib.request.Request(comfy_url("/prompt"), data=fastjson.dumps(payload))
+    req.add_header('Content-Type', 'application/json')
+    try:
+        with urllib.request.urlopen(req) as response:
+            return fastjson.loads(response.read())
+    except urllib.error.HTTPError as e:
+        error_body = e.read().decode('utf-8')
+        logger.error(f"HTTP Error {e.code}: {error_body}")
+        raise Exception(f"ComfyUI API错误 ({e.code}): {error_body}")
+
+
+def post_json(path, payload, timeout=10):
+    """向 ComfyUI POST JSON 请求"""
+    req = urllib.request.Request(comfy_url(path), data=fastjson.dumps(payload))
+    req.add_header('Content-Type', 'application/json')
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        return response.read()
+
+
+def get_queue():
+    """获取 /queue：{"queue_running": [...], "queue_pending": [...]}，每项为 [序号, prompt_id, prompt, extra_data, 输出节点]"""
+    with urllib.request.urlopen(comfy_url("/queue"), timeout=10) as response:
+        return fastjson.loads(response.read())
+
+
+def cancel_prompts(prompt_ids):
+    """
+    从队列中删除等待中的 prompt，并中断正在执行的 prompt
+    只中断 /queue 中确认在执行的 prompt，不影响其他任务；返回被中断的 prompt_id 列表
+    """
+    prompt_ids = set(prompt_ids)
+    queue = get_queue()
+    pending = [item[1] for item in queue.get('queue_pending', []) if item[1] in prompt_ids]
+    running = [item[1] for item in queue.get('queue_running', []) if item[1] in prompt_ids]
+    if pending:
+        post_json("/queue", {"delete": pending})
+        logger.info(f"🗑️ 已从队列移除 prompt: {pending}")
+    for prompt_id in running:
+        # 新版 ComfyUI 只在当前执行的是该 prompt 时中断，旧版忽略请求体
+        post_json("/interrupt", {"prompt_id": prompt_id})
+        logger.info(f"⏹️ 已中断正在执行的 prompt: {prompt_id}")
+    return running
+
+
+def cancel_active_prompt():
+    """中断当前任务的 prompt（收到终止信号时调用），失败只记录日志"""
+    if _active_prompt_id is None:
+        return
+    try:
+        cancel_prompts([_active_prompt_id])
+    except Exception as e:
+        logger.warning(f"⚠️ 中断 prompt {_active_prompt_id} 失败: {e}")
+
+
+def reap_orphaned_prompts():
+    """
+    清理上一个 handler 进程（崩溃或被终止）遗留在 ComfyUI 中的 prompt，每个进程只执行一次
+
+    CLIENT_ID 每个进程重新生成，队列中 client_id 不同的 prompt 都没有调用方在等待结果
+    """
+    global _orphans_reaped
+    if _orphans_reaped:
+        return []
+    queue = get_queue()
+    orphaned = [item[1] for key in ('queue_running', 'queue_pending') for item in queue.get(key, [])
+                if len(item) > 3 and (item[3] or {}).get('client_id') != CLIENT_ID]
+    if orphaned:
+        logger.warning(f"🧹 清理遗留的 {len(orphaned)} 个 prompt: {orphaned}")
+        cancel_prompts(orphaned)
+    _orphans_reaped = True
+    return orphaned
+
+
+def get_image(filename, subfolder, folder_type):
+    """从ComfyUI获取输出文件"""
+    query = urllib.parse.urlencode({"filename": filename, "subfolder": subfolder, "type": folder_type})
+    with urllib.request.urlopen(f"{comfy_url('/view')}?{query}") as response:
+        return response.read()
+
+
+def get_history(prompt_id):
+    """获取执行历史"""
+    with urllib.request.urlopen(comfy_url(f"/history/{prompt_id}")) as response:
+        return fastjson.loads(response.read())
+
+
+def get_object_info():
+    """获取 ComfyUI 的 /object_info，成功后缓存在进程内；失败时抛出异常且不缓存"""
+    global _object_info_cache
+    if _object_info_cache is None:
+        with urllib.request.urlopen(comfy_url("/object_info"), timeout=10) as response:
+            _object_info_cache = fastjson.loads(response.read())
+    return _object_info_cache
+
+
+def invalidate_object_info():
+    """模型文件变化（按需下载）后丢弃 /object_info 缓存，下次重新获取模型列表"""
+    global _object_info_cache
+    _object_info_cache = None
+
+
+def get_loader_choices(object_info, class_type, input_name):
+    """加载器节点某个下拉输入的可选值（模型文件列表）"""
+    loader_info = object_info.get(class_type, {})
+    choices = (loader_info.get(input_name) or
+               loader_info.get("input", {}).get("required", {}).get(input_name) or [])
+    if isinstance(choices, list) and choices and isinstance(choices[0], list):
+        choices = choices[0]
+    return [choice for choice in choices if isinstance(choice, str)]
+
+
+def get_available_models(object_info=None):
+    """获取可用模型列表（WanVideoModelLoader + CheckpointLoaderSimple）"""
+    try:
+        object_info = object_info if object_info is not None else get_object_info()
+    except Exception as e:
+        logger.warning(f"获取模型列表失败: {e}")
+        return []
+    models = (get_loader_choices(object_info, "WanVideoModelLoader", "model") +
+              get_loader_choices(object_info, "CheckpointLoaderSimple", "ckpt_name"))
+    return list(dict.fromkeys(models))
+
+
+def get_system_stats(timeout=5):
+    """获取 /system_stats（ComfyUI 版本、Python / PyTorch 版本、GPU 与显存）"""
+    with urllib.request.urlopen(comfy_url("/system_stats"), timeout=timeout) as response:
+        return fastjson.loads(response.read())
+
+
+def wait_for_http_connection(timeout=180, process=None, initial_delay=0.1, max_delay=2.0):
+    """
+    等待ComfyUI HTTP服务就绪，按指数退避轮询 /system_stats，返回 system_stats
+    传入 ComfyUI 子进程（boot.py）时，进程退出立即失败而不是等到超时
+    """
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            system_stats = get_system_stats()
+            logger.info(f"HTTP 连接成功 (尝试 {attempt})")
+            return system_stats
+        except Exception as e:
+            if process is not None and process.poll() is not None:
+                raise Exception(f"ComfyUI 进程已退出 (退出码 {process.returncode})")
+            if time.monotonic() + delay > deadline:
+                raise Exception("无法连接到ComfyUI服务器，请确认服务器正在运行")
+            logger.debug(f"HTTP 连接失败 (尝试 {attempt}): {e}")
+            time.sleep(delay)
+            delay = min(delay * 2, max_delay)
+
+
+def connect_websocket(max_attempts=36):
+    """连接ComfyUI WebSocket"""
+    ws = websocket.WebSocket()
+    ws_url = comfy_url(f"/ws?clientId={CLIENT_ID}", scheme="ws")
+    for attempt in range(max_attempts):
+        try:
+            ws.connect(ws_url)
+            logger.info(f"WebSocket 连接成功 (尝试 {attempt + 1})")
+            return ws
+        except Exception as e:
+            if attempt == max_attempts - 1:
+                raise Exception("WebSocket连接超时")
+            logger.warning(f"WebSocket 连接失败 (尝试 {attempt + 1}/{max_attempts}): {e}")
+            time.sleep(5)
+
+
+def is_oom_error(error_info):
+    error_str = str(error_info)
+    return 'OutOfMemoryError' in error_str or 'OOM' in error_str or 'allocation' in error_str.lower()
+
+
+def format_execution_error(data):
+    """execution_error 消息（或 /history status 中的同名消息）的错误描述"""
+    message = data.get('exception_message') or data.get('error') or 'Unknown execution error'
+    if data.get('exception_type'):
+        message = f"{data['exception_type']}: {message}"
+    return f"节点 {data.get('node_id', 'unknown')} ({data.get('node_type', '')}): {message}"
+
+
+def wait_for_prompt(ws, prompt_id, preview=None, deadline=None):
+    """
+    读取 WebSocket 消息直到 prompt 执行结束，输出从 executed 消息中收集，不需要再请求 /history
+    传入 preview（preview.PreviewStreamer）时，二进制预览帧和采样进度交给它推送
+
+    返回 {"completed", "execution_order", "outputs" {节点ID: output}, "cached" [节点ID], "error", "timed_out"}
+    WebSocket 断开时 completed 为 False，由调用方改为轮询 /history；
+    超过 deadline（time.monotonic() 时间）时 timed_out 为 True
+    """
+    run = {"completed": False, "execution_order": [], "outputs": {}, "cached": [], "error": None,
+           "timed_out": False}
+    while True:
+        recv_timeout = RECV_TIMEOUT
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                run["timed_out"] = True
+                return run
+            recv_timeout = min(recv_timeout, remaining)
+        ws.settimeout(recv_timeout)
+        try:
+            out = ws.recv()
+        except websocket.WebSocketTimeoutException:
+            continue
+        except (websocket.WebSocketException, OSError) as e:
+            logger.warning(f"⚠️ WebSocket 断开: {e}")
+            return run
+        if not isinstance(out, str):
+            if preview is not None:
+                preview.handle_frame(out, prompt_id)
+            continue
+        message = fastjson.loads(out)
+        data = message.get('data', {})
+        if message['type'] not in ('executing', 'progress') and data.get('prompt_id') != prompt_id:
+            continue
+        if message['type'] == 'executing':
+            node_id = data.get('node')
+            if node_id is None and data.get('prompt_id') == prompt_id:
+                logger.info("所有节点执行完成")
+                run["completed"] = True
+                return run
+            if node_id and node_id not in run["execution_order"]:
+                run["execution_order"].append(node_id)
+        elif message['type'] == 'executed':
+            node_output = data.get('output') or {}
+            merged = run["outputs"].setdefault(str(data.get('node')), {})
+            for key, value in node_output.items():
+                if isinstance(value, list):
+                    merged.setdefault(key, []).extend(value)
+                else:
+                    merged[key] = value
+        elif message['type'] == 'execution_cached':
+            run["cached"].extend(str(node_id) for node_id in data.get('nodes', []))
+        elif message['type'] == 'execution_error':
+            run["error"] = format_execution_error(data)
+            logger.error(f"❌ 执行错误 - {run['error'][:300]}")
+            if is_oom_error(run["error"]):
+                logger.error("建议: 减小分辨率、帧数或提示词长度")
+        elif message['type'] == 'execution_interrupted':
+            run["error"] = f"执行被中断 (节点 {data.get('node_id', 'unknown')})"
+            logger.error(f"❌ {run['error']}")
+        elif message['type'] == 'progress':
+            logger.debug(f"节点 {data.get('node')} 进度: {data.get('value', 0)}/{data.get('max', 100)}")
+            if preview is not None and data.get('prompt_id') in (None, prompt_id):
+                preview.update_progress(data)
+
+
+def wait_for_history(prompt_id, poll_interval=2, deadline=None):
+    """轮询 /history 直到 prompt 出现（ComfyUI 在执行结束时写入历史），超过 deadline 时返回 None"""
+    while True:
+        history = get_history(prompt_id)
+        if prompt_id in history:
+            return history[prompt_id]
+        if deadline is not None and time.monotonic() >= deadline:
+            return None
+        time.sleep(poll_interval)
+
+
+def get_history_error(history):
+    """/history 条目中的执行错误，没有错误时返回 None"""
+    if 'error' in history:
+        error_info = history['error']
+        return error_info.get('message', str(error_info)) if isinstance(error_info, dict) else str(error_info)
+    status = history.get('status') or {}
+    if status.get('status_str') == 'error':
+        for event, data in status.get('messages', []):
+            if event == 'execution_error':
+                return format_execution_error(data)
+        return "执行失败"
+    return None
+
+
+def get_terminal_nodes(prompt):
+    """没有被其他节点引用的节点（输出节点）"""
+    referenced = {str(value[0]) for node in prompt.values() for value in node.get("inputs", {}).values()
+                  if isinstance(value, list) and len(value) == 2}
+    return [node_id for node_id in prompt if node_id not in referenced]
+
+
+def read_output_videos(history, prompt, mp4_layout="none", deadline=None):
+    """
+    从执行历史中读取所有视频输出
+    返回 (output_videos {节点ID: [base64, ...]}, output_video_paths {节点ID: [本地路径, ...]})
+    """
+    output_videos = {}
+    output_video_paths = {}
+    for node_id, node_output in history['outputs'].items():
+        videos_output = []
+        node_class = prompt.get(node_id, {}).get("class_type", "unknown")
+        video_list = node_output.get('gifs') or node_output.get('videos')
+        if not video_list:
+            if "VHS_VideoCombine" in node_class:
+                logger.warning(f"⚠️ 节点 {node_id} (VHS_VideoCombine): 没有视频输出，输出字段: {list(node_output.keys())}")
+            output_videos[node_id] = videos_output
+            continue
+
+        logger.info(f"✅ 节点 {node_id} ({node_class}): 找到视频输出，数量: {len(video_list)}")
+        for video in video_list:
+            video_path = video.get('fullpath')
+            if video_path and os.path.exists(video_path):
+                # 重封装失败不影响返回原始视频
+                if video_path.lower().endswith('.mp4'):
+                    try:
+                        remux_mp4(video_path, mp4_layout, deadline)
+                    except Exception as e:
+                        logger.warning(f"   节点 {node_id}: 视频重封装失败，返回原始文件: {e}")
+                with open(video_path, 'rb') as f:
+                    videos_output.append(base64.b64encode(f.read()).decode('utf-8'))
+                output_video_paths.setdefault(node_id, []).append(video_path)
+            elif 'filename' in video:
+                try:
+                    video_bytes = get_image(video['filename'], video.get('subfolder', ''), video.get('type', 'output'))
+                    videos_output.append(base64.b64encode(video_bytes).decode('utf-8'))
+                except Exception as e:
+                    logger.warning(f"   节点 {node_id}: 无法读取视频文件 {video['filename']}: {e}")
+            else:
+                logger.warning(f"   节点 {node_id}: 视频文件不存在: {video_path}")
+        output_videos[node_id] = videos_output
+    return output_videos, output_video_paths
+
+
+def get_videos(ws, prompt, mp4_layout="none", preview=None, deadline=None):
+    """
+    提交 prompt 并等待执行完成，读取生成的视频
+    输出来自 WebSocket 的 executed 消息；WebSocket 断开，或输出节点命中缓存但没有收到 executed 时
+    （旧版 ComfyUI 只发送 execution_cached）才请求 /history
+
+    超过 deadline（time.monotonic() 时间）时从队列移除 / 中断 prompt 并抛出异常，GPU 不会继续执行被放弃的任务
+
+    返回 (output_videos, execution_order, output_video_paths, history)，history 只包含 outputs（回退时为完整条目）
+    """
+    global _active_prompt_id
+    if deadline is not None and time.monotonic() >= deadline:
+        raise Exception("任务超时: 提交工作流前已超过截止时间")
+    prompt_id = queue_prompt(prompt)['prompt_id']
+    _active_prompt_id = prompt_id
+    logger.info(f"开始执行工作流，prompt_id: {prompt_id}")
+    try:
+        run = wait_for_prompt(ws, prompt_id, preview, deadline)
+        history = {"outputs": run["outputs"]}
+        error_info = run["error"]
+        terminal_nodes = get_terminal_nodes(prompt)
+        cached_outputs = [node_id for node_id in run["cached"]
+                          if node_id not in run["outputs"] and node_id in terminal_nodes]
+        if not error_info and not run["timed_out"] and (not run["completed"] or cached_outputs):
+            if cached_outputs:
+                logger.info(f"输出节点命中缓存，从 /history 读取输出: {cached_outputs}")
+            history = wait_for_history(prompt_id, deadline=deadline)
+            if history is None:
+                run["timed_out"] = True
+            else:
+                error_info = get_history_error(history)
+
+        if run["timed_out"]:
+            raise Exception("任务超时: 已超过截止时间，ComfyUI 执行已中断")
+    except BaseException as e:
+        # 超时或等待过程中出错：没有调用方再等待这个 prompt，立即释放 GPU
+        logger.error(f"⏹️ 放弃 prompt {prompt_id}: {e}")
+        cancel_active_prompt()
+        raise
+    finally:
+        _active_prompt_id = None
+        if preview is not None:
+            preview.close()
+    execution_order = run["execution_order"]
+
+    if error_info:
+        if is_oom_error(error_info):
+            raise Exception(f"GPU内存不足(OOM): {error_info}. 请减小分辨率、帧数或提示词长度。")
+        raise Exception(f"ComfyUI执行错误: {error_info}")
+    if 'outputs' not in history:
+        raise Exception("执行历史中未找到输出")
+
+    logger.info(f"📊 执行历史中的输出节点: {list(history['outputs'].keys())}")
+    output_videos, output_video_paths = read_output_videos(history, prompt, mp4_layout, deadline)
+    video_output_nodes = [node_id for node_id, videos in output_videos.items() if videos]
+    logger.info(f"📹 有视频输出的节点: {video_output_nodes}")
+    return output_videos, execution_order, output_video_paths, history
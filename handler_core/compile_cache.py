@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+torch.compile / Triton 编译缓存：按 torch 版本、GPU 架构、工作流形状保存到网络卷，冷启动的 worker 直接复用
+
+工作流中的 WanVideoTorchCompileSettings 让每个新 worker 都从头编译（几十秒到几分钟）。这里:
+
+1. boot 启动 ComfyUI 前设置 TORCHINDUCTOR_CACHE_DIR / TRITON_CACHE_DIR 指向本地盘（LOCAL_COMPILE_CACHE_DIR），
+   编译过程的大量小文件不直接读写网络卷
+2. 网络卷上按 <COMPILE_CACHE_DIR>/<torch 版本>-<GPU 架构>/<工作流>-<宽x高x帧数>.tar 保存条目；
+   形状使用分桶后的生成形状（见 bucketing.py），同一个桶的任务共用一个条目
+3. 提交使用 torch.compile 的任务前恢复该形状的条目；任务完成后本地缓存中出现新文件（发生了编译）时，
+   把该形状的全部文件写入条目（临时文件 + os.replace 原子替换）
+4. 条目总大小超过 COMPILE_CACHE_BUDGET_GB 时按最近使用时间（mtime，恢复时更新）淘汰
+5. 每个任务的结果中返回 compile_cache: {"key", "hit": 没有发生编译, "restored": 是否从网络卷恢复, "new_files"}
+
+boot 的 compile_cache 阶段在后台预先恢复当前环境的所有条目（最近使用的在前）。
+"""
+
+import os
+import re
+import time
+import tarfile
+import logging
+import tempfile
+import threading
+import subprocess
+import importlib.metadata
+
+logger = logging.getLogger(__name__)
+
+COMPILE_CACHE_DIR = os.getenv("COMPILE_CACHE_DIR", "/workspace/.compile_cache")
+LOCAL_COMPILE_CACHE_DIR = os.getenv("LOCAL_COMPILE_CACHE_DIR", "/tmp/torch_compile_cache")
+COMPILE_CACHE_BUDGET = float(os.getenv("COMPILE_CACHE_BUDGET_GB", "10")) * 1024 ** 3
+COMPILE_NODE_TYPES = ("WanVideoTorchCompileSettings",)
+SHAPE_PARAMS = ("width", "height", "length")
+
+
+def compile_env(local_dir=LOCAL_COMPILE_CACHE_DIR):
+    """ComfyUI 进程的编译缓存环境变量"""
+    return {
+        "TORCHINDUCTOR_CACHE_DIR": os.path.join(local_dir, "inductor"),
+        "TRITON_CACHE_DIR": os.path.join(local_dir, "triton"),
+        "TORCHINDUCTOR_FX_GRAPH_CACHE": "1",
+    }
+
+
+def torch_version():
+    try:
+        return importlib.metadata.version("torch")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def gpu_arch():
+    """GPU 计算能力（如 sm89），通过 nvidia-smi 获取，不导入 torch"""
+    try:
+        output = subprocess.run(["nvidia-smi", "--query-gpu=compute_cap", "--format=csv,noheader"],
+                                capture_output=True, text=True, timeout=10).stdout
+        return "sm" + output.splitlines()[0].strip().replace(".", "")
+    except (OSError, IndexError, subprocess.SubprocessError):
+        return "unknown"
+
+
+def sanitize(value):
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", str(value))
+
+
+def environment_key():
+    """编译产物只在相同 torch 版本和 GPU 架构之间通用"""
+    return sanitize(f"torch{torch_version()}-{gpu_arch()}")
+
+
+def uses_torch_compile(prompt):
+    return any(node.get("class_type") in COMPILE_NODE_TYPES for node in prompt.values())
+
+
+def shape_key(workflow_file, shape):
+    """<工作流名>-<宽x高x帧数>"""
+    workflow = os.path.splitext(os.path.basename(workflow_file or "workflow"))[0]
+    return sanitize(f"{workflow}-{'x'.join(str(value) for value in shape.values())}")
+
+
+def list_files(directory):
+    """目录中所有文件的相对路径"""
+    files = set()
+    for root, _, names in os.walk(directory):
+        for name in names:
+            files.add(os.path.relpath(os.path.join(root, name), directory))
+    return files
+
+
+def is_safe_member(member):
+    name = os.path.normpath(member.name)
+    return member.isfile() and not os.path.isabs(name) and not name.startswith("..")
+
+
+class CompileCache:
+    """本地编译缓存目录与网络卷上按形状保存的条目"""
+
+    def __init__(self, root=COMPILE_CACHE_DIR, local_dir=LOCAL_COMPILE_CACHE_DIR, budget=COMPILE_CACHE_BUDGET,
+                 env_key=None):
+        self.root = root
+        self.local_dir = local_dir
+        self.budget = budget
+        self.env_key = env_key or environment_key()
+        self.entry_dir = os.path.join(root, self.env_key)
+        # 形状 -> 属于该形状的本地文件（从条目恢复的和任务中新编译的）
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def entry_path(self, key):
+        return os.path.join(self.entry_dir, f"{key}.tar")
+
+    def restore(self, key):
+        """把形状的条目解压到本地缓存目录（已存在的文件跳过），返回是否找到条目"""
+        with self._lock:
+            if key in self._files:
+                return True
+            path = self.entry_path(key)
+            try:
+                with tarfile.open(path) as tar:
+                    files = set()
+                    for member in tar.getmembers():
+                        if not is_safe_member(member):
+                            continue
+                        files.add(os.path.normpath(member.name))
+                        dest = os.path.join(self.local_dir, member.name)
+                        if os.path.exists(dest):
+                            continue
+                        os.makedirs(os.path.dirname(dest), exist_ok=True)
+                        source = tar.extractfile(member)
+                        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dest))
+                        with os.fdopen(fd, 'wb') as f:
+                            f.write(source.read())
+                        os.replace(tmp_path, dest)
+                # 更新 mtime 作为最近使用时间
+                os.utime(path)
+            except FileNotFoundError:
+                return False
+            except (OSError, tarfile.TarError) as e:
+                logger.warning(f"⚠️ 编译缓存条目损坏，忽略: {path}: {e}")
+                return False
+            self._files[key] = files
+            logger.info(f"🔥 已恢复编译缓存 {key}: {len(files)} 个文件")
+            return True
+
+    def restore_all(self):
+        """恢复当前环境的所有条目（最近使用的在前），返回恢复的条目数"""
+        try:
+            entries = [name for name in os.listdir(self.entry_dir) if name.endswith(".tar")]
+        except OSError:
+            return 0
+        entries.sort(key=lambda name: os.path.getmtime(os.path.join(self.entry_dir, name)), reverse=True)
+        return sum(1 for name in entries if self.restore(name[:-len(".tar")]))
+
+    def begin(self, key):
+        """提交任务前调用：恢复条目并记录本地缓存中已有的文件"""
+        restored = self.restore(key)
+        return {"key": key, "restored": restored, "before": list_files(self.local_dir)}
+
+    def finish(self, token):
+        """任务完成后调用：有新编译的文件时写入条目，返回本任务的缓存状态"""
+        key = token["key"]
+        new_files = list_files(self.local_dir) - token["before"]
+        if new_files:
+            with self._lock:
+                files = self._files.setdefault(key, set())
+                files |= new_files
+                files = set(files)
+            try:
+                self.save(key, files)
+                self.prune(keep={self.entry_path(key)})
+            except (OSError, tarfile.TarError) as e:
+                logger.warning(f"⚠️ 无法保存编译缓存 {key}: {e}")
+        status = {"key": f"{self.env_key}/{key}", "hit": not new_files, "restored": token["restored"],
+                  "new_files": len(new_files)}
+        logger.info(f"🔥 编译缓存{'命中' if status['hit'] else '未命中'}: {status['key']} "
+                    f"(从网络卷恢复: {status['restored']}, 新编译文件: {status['new_files']})")
+        return status
+
+    def save(self, key, files):
+        """把文件写入条目：先写同目录临时文件再原子替换"""
+        os.makedirs(self.entry_dir, exist_ok=True)
+        start = time.monotonic()
+        fd, tmp_path = tempfile.mkstemp(suffix=".tar.tmp", dir=self.entry_dir)
+        os.close(fd)
+        try:
+            with tarfile.open(tmp_path, "w") as tar:
+                for relpath in sorted(files):
+                    path = os.path.join(self.local_dir, relpath)
+                    if os.path.isfile(path):
+                        tar.add(path, arcname=relpath)
+            os.replace(tmp_path, self.entry_path(key))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        logger.info(f"💾 已保存编译缓存 {key}: {len(files)} 个文件, "
+                    f"{os.path.getsize(self.entry_path(key)) / 1024 ** 2:.1f} MB ({time.monotonic() - start:.1f}s)")
+
+    def prune(self, keep=()):
+        """所有环境的条目总大小超过预算时，按最近使用时间淘汰（keep 中的条目不淘汰）"""
+        if not self.budget:
+            return []
+        entries = []
+        for root, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith(".tar"):
+                    path = os.path.join(root, name)
+                    try:
+                        entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+                    except OSError:
+                        continue
+        total = sum(size for _, size, _ in entries)
+        evicted = []
+        for _, size, path in sorted(entries):
+            if total <= self.budget:
+                break
+            if path in keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted.append(path)
+            logger.info(f"🗑️ 淘汰编译缓存: {os.path.relpath(path, self.root)}")
+        return evicted
+
+
+_default_cache = None
+
+
+def get_compile_cache():
+    """boot 设置了本地编译缓存目录时返回 CompileCache，否则返回 None（ComfyUI 的编译产物不在已知目录中）"""
+    global _default_cache
+    if os.environ.get("TORCHINDUCTOR_CACHE_DIR") != compile_env()["TORCHINDUCTOR_CACHE_DIR"]:
+        return None
+    if _default_cache is None:
+        _default_cache = CompileCache()
+    return _default_cache
+
+
+def job_shape(params, bucket=None):
+    """任务的生成形状：分桶后的形状，否则为参数中的宽高帧数"""
+    if bucket:
+        return bucket["generated"]
+    return {name: params[name] for name in SHAPE_PARAMS if name in params}
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+handler_core 测试共用的 fixture：本地 HF 兼容镜像
+"""
+
+import os
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+MIRROR_FILES = {"org/repo/main/vae.safetensors": os.urandom(10000), "org/repo/main/lora.safetensors": os.urandom(6000)}
+
+
+class MirrorHandler(BaseHTTPRequestHandler):
+    """/org/repo/resolve/main/<path> 302 跳转到 /cdn/...（带 X-Linked-Etag），/cdn 支持 Range"""
+
+    def do_HEAD(self):
+        self.respond(body=False)
+
+    def do_GET(self):
+        self.respond(body=True)
+
+    def respond(self, body):
+        if "/resolve/" in self.path:
+            key = self.path.lstrip("/").replace("/resolve/", "/")
+            self.send_response(302)
+            self.send_header("Location", f"/cdn/{key}")
+            self.send_header("X-Linked-Etag", f'"{hashlib.sha256(self.server.files[key]).hexdigest()}"')
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        data = self.server.files[self.path[len("/cdn/"):]]
+        start, end = 0, len(data) - 1
+        if self.headers.get("Range"):
+            start, end = (int(value) for value in self.headers["Range"][len("bytes="):].split("-"))
+            self.server.ranges.append((start, end))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        else:
+            self.send_response(200)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if body:
+            self.wfile.write(data[start:end + 1])
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def mirror():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MirrorHandler)
+    server.files = dict(MIRROR_FILES)
+    server.ranges = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
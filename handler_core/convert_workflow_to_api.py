@@ -1,12 +1,17 @@
 #!/usr/bin/env python3
 """
 将 ComfyUI workflow (nodes 数组格式) 转换为 API 格式 (节点ID key格式)
+
+各部署的 handler 和 workflow_compiler 共用这一个转换器（WorkflowProfile.load_prompt），
+转换后的修正见 prompt_fixups.py。
 """
-import json
 import sys
 import os
 import logging
 
+from . import fastjson
+from .subgraph_expander import expand_subgraphs
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -18,10 +23,15 @@ def get_getnode_class_name():
 
 
 def convert_nodes_to_prompt_format(workflow_data, logic_node_values=None, getnode_class_name="GetNode|comfyui-logic"):
-    """将nodes数组格式转换为节点ID key格式"""
+    """
+    将nodes数组格式转换为节点ID key格式
+    logic_node_values: 预先计算的 comfyui-logic 节点值 {节点ID: 值}，转换时跳过这些节点并内联其值
+    """
     if logic_node_values is None:
         logic_node_values = {}
     
+    # 先把子图实例展开为普通节点（ID 为 "<实例ID>:<内部ID>"）
+    workflow_data = expand_subgraphs(workflow_data)
     prompt = {}
     all_nodes_map = {str(node["id"]): node for node in workflow_data.get("nodes", [])}
     
@@ -168,108 +178,6 @@ def convert_nodes_to_prompt_format(workflow_data, logic_node_values=None, getnod
                 elif isinstance(value, dict):
                     converted_inputs = value.copy()
                 
-                # 对于有 widgets_values 的节点，尝试推断输入参数（即使 inputs 不为空也要补充）
-                # 这主要针对 LoadWanVideoT5TextEncoder, WanVideoModelLoader 等节点
-                if widgets_values and not widgets_values_is_dict and isinstance(widgets_values, list) and len(widgets_values) > 0:
-                    node_type = node.get("type", "")
-                    # 常见节点的 widgets_values 到 inputs 映射
-                    if "LoadWanVideoT5TextEncoder" in node_type:
-                        if len(widgets_values) >= 1 and "model_name" not in converted_inputs:
-                            converted_inputs["model_name"] = widgets_values[0]
-                        if len(widgets_values) >= 2 and "precision" not in converted_inputs:
-                            converted_inputs["precision"] = widgets_values[1]
-                        if len(widgets_values) >= 3 and "offload_device" not in converted_inputs:
-                            converted_inputs["offload_device"] = widgets_values[2]
-                        if len(widgets_values) >= 4 and "offload_mode" not in converted_inputs:
-                            converted_inputs["offload_mode"] = widgets_values[3]
-                    elif "WanVideoModelLoader" in node_type:
-                        if len(widgets_values) >= 1 and "model" not in converted_inputs:
-                            # 模型路径需要处理，去掉完整路径前缀
-                            model_path = widgets_values[0]
-                            if model_path.startswith("/ComfyUI/models/diffusion_models/"):
-                                model_path = model_path.replace("/ComfyUI/models/diffusion_models/", "")
-                            elif model_path.startswith("/ComfyUI/models/checkpoints/"):
-                                model_path = model_path.replace("/ComfyUI/models/checkpoints/", "")
-                            # 处理 Windows 路径分隔符
-                            model_path = model_path.replace("\\", "/")
-                            converted_inputs["model"] = model_path
-                        if len(widgets_values) >= 2 and "base_precision" not in converted_inputs:
-                            converted_inputs["base_precision"] = widgets_values[1]
-                        if len(widgets_values) >= 3 and "load_device" not in converted_inputs:
-                            converted_inputs["load_device"] = widgets_values[2]
-                        if len(widgets_values) >= 4 and "offload_device" not in converted_inputs:
-                            converted_inputs["offload_device"] = widgets_values[3]
-                        if len(widgets_values) >= 5 and "quantization" not in converted_inputs:
-                            converted_inputs["quantization"] = widgets_values[4]
-                        if len(widgets_values) >= 6 and "attention_slicing" not in converted_inputs:
-                            converted_inputs["attention_slicing"] = widgets_values[5]
-                    elif "WanVideoVAELoader" in node_type:
-                        if len(widgets_values) >= 1 and "model_name" not in converted_inputs:
-                            converted_inputs["model_name"] = widgets_values[0]
-                    elif "WanVideoTextEncode" in node_type:
-                        if len(widgets_values) >= 1 and "positive_prompt" not in converted_inputs:
-                            converted_inputs["positive_prompt"] = widgets_values[0]
-                        if len(widgets_values) >= 2 and "negative_prompt" not in converted_inputs:
-                            converted_inputs["negative_prompt"] = widgets_values[1]
-                    elif "OnnxDetectionModelLoader" in node_type:
-                        if len(widgets_values) >= 1 and "vitpose_model" not in converted_inputs:
-                            converted_inputs["vitpose_model"] = widgets_values[0]
-                        if len(widgets_values) >= 2 and "yolo_model" not in converted_inputs:
-                            converted_inputs["yolo_model"] = widgets_values[1]
-                        if len(widgets_values) >= 3 and "onnx_device" not in converted_inputs:
-                            converted_inputs["onnx_device"] = widgets_values[2]
-                    elif "WanVideoScheduler" in node_type:
-                        # widgets: [scheduler, steps, start_step, end_step, shift]
-                        if len(widgets_values) >= 1 and "scheduler" not in converted_inputs:
-                            converted_inputs["scheduler"] = widgets_values[0]
-                        if len(widgets_values) >= 2 and "steps" not in converted_inputs:
-                            converted_inputs["steps"] = widgets_values[1]
-                        if len(widgets_values) >= 3 and "start_step" not in converted_inputs:
-                            converted_inputs["start_step"] = widgets_values[2]
-                        if len(widgets_values) >= 4 and "end_step" not in converted_inputs:
-                            converted_inputs["end_step"] = widgets_values[3]
-                        if len(widgets_values) >= 5 and "shift" not in converted_inputs:
-                            converted_inputs["shift"] = widgets_values[4]
-                    elif "WanVideoSampler" in node_type:
-                        if len(widgets_values) >= 1 and "steps" not in converted_inputs:
-                            converted_inputs["steps"] = widgets_values[0]
-                        if len(widgets_values) >= 2 and "seed" not in converted_inputs:
-                            converted_inputs["seed"] = widgets_values[1]
-                        if len(widgets_values) >= 3 and "cfg" not in converted_inputs:
-                            converted_inputs["cfg"] = widgets_values[2]
-                        if len(widgets_values) >= 7 and "sampler_name" not in converted_inputs:
-                            converted_inputs["sampler_name"] = widgets_values[6]
-                        if len(widgets_values) >= 8 and "shift" not in converted_inputs:
-                            converted_inputs["shift"] = widgets_values[7]
-                        if len(widgets_values) >= 9 and "riflex_freq_index" not in converted_inputs:
-                            converted_inputs["riflex_freq_index"] = widgets_values[8]
-                        if len(widgets_values) >= 10 and "force_offload" not in converted_inputs:
-                            converted_inputs["force_offload"] = widgets_values[9]
-                    elif "WanVideoDecode" in node_type:
-                        # widgets: [enable_vae_tiling, tile_x, tile_y, tile_stride_x, tile_stride_y, ...]
-                        if len(widgets_values) >= 1 and "enable_vae_tiling" not in converted_inputs:
-                            converted_inputs["enable_vae_tiling"] = widgets_values[0]
-                        if len(widgets_values) >= 2 and "tile_x" not in converted_inputs:
-                            converted_inputs["tile_x"] = widgets_values[1]
-                        if len(widgets_values) >= 3 and "tile_y" not in converted_inputs:
-                            converted_inputs["tile_y"] = widgets_values[2]
-                        if len(widgets_values) >= 4 and "tile_stride_x" not in converted_inputs:
-                            converted_inputs["tile_stride_x"] = widgets_values[3]
-                        if len(widgets_values) >= 5 and "tile_stride_y" not in converted_inputs:
-                            converted_inputs["tile_stride_y"] = widgets_values[4]
-                    elif "WanVideoEncode" in node_type:
-                        # widgets: [enable_vae_tiling, tile_x, tile_y, tile_stride_x, tile_stride_y, ...]
-                        if len(widgets_values) >= 1 and "enable_vae_tiling" not in converted_inputs:
-                            converted_inputs["enable_vae_tiling"] = widgets_values[0]
-                        if len(widgets_values) >= 2 and "tile_x" not in converted_inputs:
-                            converted_inputs["tile_x"] = widgets_values[1]
-                        if len(widgets_values) >= 3 and "tile_y" not in converted_inputs:
-                            converted_inputs["tile_y"] = widgets_values[2]
-                        if len(widgets_values) >= 4 and "tile_stride_x" not in converted_inputs:
-                            converted_inputs["tile_stride_x"] = widgets_values[3]
-                        if len(widgets_values) >= 5 and "tile_stride_y" not in converted_inputs:
-                            converted_inputs["tile_stride_y"] = widgets_values[4]
-                
                 # 处理字典格式的 widgets_values（如 VHS_VideoCombine）
                 # 将 widgets_values 中的值添加到 inputs（如果 inputs 中还没有）
                 if widgets_values_is_dict:
@@ -290,7 +198,7 @@ def convert_nodes_to_prompt_format(workflow_data, logic_node_values=None, getnod
             
             # 处理 UUID 类型的节点（通常是子图节点）
             # 尝试从 workflow 的 definitions/subgraphs 中查找实际的节点类型
-            if len(node_type) == 36 and node_type.count('-') == 4:  # UUID 格式
+            if len(str(node_type)) == 36 and str(node_type).count('-') == 4:  # UUID 格式
                 # 查找子图定义
                 subgraph_type = None
                 if "definitions" in workflow_data and "subgraphs" in workflow_data["definitions"]:
@@ -311,17 +219,17 @@ def convert_nodes_to_prompt_format(workflow_data, logic_node_values=None, getnod
                 
                 if subgraph_type:
                     final_class_type = subgraph_type
-                    print(f"节点 {node_id}: 将子图 UUID {node_type} 替换为 {subgraph_type}")
+                    logger.info(f"节点 {node_id}: 将子图 UUID {node_type} 替换为 {subgraph_type}")
                 else:
                     # 如果找不到，根据节点标题推断
                     node_title = converted_node.get("title", "").lower()
                     if "extend" in node_title:
                         final_class_type = "WanVideoAddOneToAllExtendEmbeds"
-                        print(f"节点 {node_id}: 根据标题 '{node_title}' 推断为 WanVideoAddOneToAllExtendEmbeds")
+                        logger.info(f"节点 {node_id}: 根据标题 '{node_title}' 推断为 WanVideoAddOneToAllExtendEmbeds")
                     else:
                         # 保持原样（可能会失败，但至少不会破坏结构）
                         final_class_type = node_type
-                        print(f"警告: 节点 {node_id}: 无法解析子图 UUID {node_type}，保持原样")
+                        logger.warning(f"节点 {node_id}: 无法解析子图 UUID {node_type}，保持原样")
             elif "GetNode" in str(node_type):
                 final_class_type = getnode_class_name if "|" not in str(node_type) else node_type
             elif "|" in node_type:
@@ -333,7 +241,7 @@ def convert_nodes_to_prompt_format(workflow_data, logic_node_values=None, getnod
             if final_class_type:
                 converted_node["class_type"] = final_class_type
                 # 如果是 UUID 被替换，也更新 type 字段
-                if len(node_type) == 36 and node_type.count('-') == 4 and final_class_type != node_type:
+                if len(str(node_type)) == 36 and str(node_type).count('-') == 4 and final_class_type != node_type:
                     converted_node["type"] = final_class_type
         
         if "inputs" not in converted_node:
@@ -346,15 +254,14 @@ def convert_nodes_to_prompt_format(workflow_data, logic_node_values=None, getnod
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python convert_workflow_to_api.py <input_workflow.json> [output_workflow.json]")
+        print("Usage: python -m handler_core.convert_workflow_to_api <input_workflow.json> [output_workflow.json]")
         sys.exit(1)
     
     input_file = sys.argv[1]
     output_file = sys.argv[2] if len(sys.argv) > 2 else input_file.replace(".json", "_api.json")
     
     print(f"Reading workflow from: {input_file}")
-    with open(input_file, 'r', encoding='utf-8') as f:
-        workflow_data = json.load(f)
+    workflow_data = fastjson.load_file(input_file)
     
     print("Converting workflow format...")
     # 转换格式
@@ -366,8 +273,7 @@ def main():
         
         print(f"Converted {len(prompt)} nodes")
         print(f"Writing API format workflow to: {output_file}")
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(api_workflow, f, indent=2, ensure_ascii=False)
+        fastjson.dump_file(output_file, api_workflow, indent=True)
         
         print(f"✓ Successfully converted workflow to API format")
         print(f"  Input nodes: {len(workflow_data.get('nodes', []))}")
@@ -375,8 +281,7 @@ def main():
     else:
         print("Workflow is already in API format (no 'nodes' array found)")
         # 如果已经是 API 格式，直接复制
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(workflow_data, f, indent=2, ensure_ascii=False)
+        fastjson.dump_file(output_file, workflow_data, indent=True)
 
 
 if __name__ == "__main__":
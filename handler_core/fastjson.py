@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+JSON 编解码：安装了 orjson 时使用 orjson，否则回退到标准库 json
+
+/prompt 请求体、/history、/object_info 和工作流文件都是几百 KB 到几 MB 的文档，
+orjson 的编解码比标准库快一个数量级。两种后端的输出一致：UTF-8、不转义非 ASCII、紧凑分隔符，
+int 键转为字符串；解码错误都是 ValueError（json.JSONDecodeError）的子类，调用方不需要区分后端。
+
+注意：缓存键、任务哈希等需要跨版本稳定的序列化（binding.job_hash、pose_cache）仍使用标准库，
+两种后端的浮点数格式可能不同。
+
+性能对比见 python -m handler_core.bench_json
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def dumps(obj, indent=False, sort_keys=False):
+    """序列化为 UTF-8 bytes；indent=True 时两空格缩进"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, ensure_ascii=False, sort_keys=sort_keys, indent=2 if indent else None,
+                      separators=(",", ": ") if indent else (",", ":")).encode('utf-8')
+
+
+def loads(data):
+    """解析 bytes / bytearray / str"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def load_file(path):
+    """读取并解析 JSON 文件"""
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+def dump_file(path, obj, indent=False):
+    """把 obj 序列化后写入文件"""
+    with open(path, 'wb') as f:
+        f.write(dumps(obj, indent=indent))
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+任务输入处理：path / url / base64 三种输入统一落地为本地文件
+"""
+
+import os
+import base64
+import shutil
+import logging
+import binascii
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+COMFYUI_INPUT_DIR = "/ComfyUI/input"
+DOWNLOAD_TIMEOUT = 300
+# 任务输入的后缀 -> 输入类型，按优先级排列
+INPUT_SUFFIXES = (("_path", "path"), ("_url", "url"), ("_base64", "base64"))
+
+
+def to_nearest_multiple_of_16(value):
+    """将值调整为最接近的16的倍数，最小16"""
+    try:
+        adjusted = int(round(float(value) / 16.0) * 16)
+    except Exception:
+        raise ValueError(f"width/height值不是数字: {value}")
+    return max(16, adjusted)
+
+
+def process_input(input_data, temp_dir, output_filename, input_type, copy_path=False):
+    """
+    处理输入数据并返回文件路径（绝对路径）
+
+    copy_path: path 输入不在 temp_dir 下时复制（优先硬链接）进去，
+               用于只接受 /ComfyUI/input 相对路径的节点
+    """
+    if input_type == "path":
+        logger.info(f"📁 路径输入: {input_data}")
+        source_path = input_data
+        if not os.path.exists(source_path):
+            source_path = os.path.join(COMFYUI_INPUT_DIR, input_data)
+            if not os.path.exists(source_path):
+                raise FileNotFoundError(f"文件不存在: {input_data}")
+        source_path = os.path.abspath(source_path)
+        if not copy_path or source_path.startswith(os.path.abspath(temp_dir) + os.sep):
+            return source_path
+
+        os.makedirs(temp_dir, exist_ok=True)
+        dest_path = os.path.abspath(os.path.join(temp_dir, output_filename))
+        try:
+            os.link(source_path, dest_path)
+        except OSError:
+            shutil.copy2(source_path, dest_path)
+        logger.info(f"✅ 已复制文件: {source_path} -> {dest_path}")
+        return dest_path
+    elif input_type == "url":
+        logger.info(f"🌐 URL输入: {input_data}")
+        os.makedirs(temp_dir, exist_ok=True)
+        file_path = os.path.abspath(os.path.join(temp_dir, output_filename))
+        return download_file_from_url(input_data, file_path)
+    elif input_type == "base64":
+        logger.info("🔢 Base64输入")
+        return save_base64_to_file(input_data, temp_dir, output_filename)
+    else:
+        raise ValueError(f"不支持的输入类型: {input_type}")
+
+
+def download_file_from_url(url, output_path):
+    """从URL下载文件"""
+    try:
+        result = subprocess.run(['wget', '-O', output_path, '--no-verbose', url],
+                                capture_output=True, text=True, timeout=DOWNLOAD_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        raise Exception(f"URL下载超时 ({DOWNLOAD_TIMEOUT}s): {url}")
+    if result.returncode != 0:
+        raise Exception(f"URL下载失败: {result.stderr}")
+    logger.info(f"✅ 下载成功: {url} -> {output_path}")
+    return output_path
+
+
+def save_base64_to_file(base64_data, temp_dir, output_filename):
+    """将Base64数据保存为文件，支持 data URI 前缀（data:image/jpeg;base64,...）"""
+    if base64_data.startswith("data:") and "," in base64_data:
+        base64_data = base64_data.split(",", 1)[1]
+    try:
+        decoded_data = base64.b64decode(base64_data)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Base64解码失败: {e}")
+    os.makedirs(temp_dir, exist_ok=True)
+    file_path = os.path.abspath(os.path.join(temp_dir, output_filename))
+    with open(file_path, 'wb') as f:
+        f.write(decoded_data)
+    logger.info(f"✅ Base64输入已保存: {file_path}")
+    return file_path
+
+
+def resolve_job_file(job_input, name, temp_dir, output_filename, copy_path=False):
+    """
+    按 <name>_path / <name>_url / <name>_base64 的顺序查找任务输入并落地为文件
+    没有提供时返回 None
+    """
+    for suffix, input_type in INPUT_SUFFIXES:
+        key = f"{name}{suffix}"
+        if key in job_input:
+            return process_input(job_input[key], temp_dir, output_filename, input_type, copy_path=copy_path)
+    return None
+
+
+def mask_job_input(job_input):
+    """用于日志的任务输入：base64 数据只记录长度"""
+    return {key: (f"<base64 data, length: {len(value)}>" if key.endswith("_base64") and isinstance(value, str)
+                  else value)
+            for key, value in job_input.items()}
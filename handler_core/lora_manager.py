@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+LoRA 管理：提交前验证 lora_pairs，下载用户提供的 LoRA，并在等待 ComfyUI 期间预热
+
+lora_pairs[i]["high"] / ["low"] 支持:
+    本地名称:   ComfyUI LoRA 列表中的名称，如 "WanVideo/Lightx2v/xxx.safetensors"
+    下载地址:   "https://.../xxx.safetensors"
+    HF 仓库:    "hf://org/repo/path/xxx.safetensors"，指定版本 "hf://org/repo@revision/path/xxx.safetensors"
+
+流程（run_job，profile.lora_param 指定参数名，默认 lora_pairs）:
+1. plan_lora_pairs: 验证参数后立即检查格式，格式错误的任务不等待 ComfyUI 直接返回
+2. prefetch_lora_pairs: 后台线程下载缺少的远程 LoRA 到 <LORA_CACHE_DIR>/remote/（按 LORA_CACHE_BUDGET_GB LRU 淘汰，
+   见 provision.ModelCache），并把所有 LoRA 读入页缓存，与 prepare / 等待 ComfyUI 并行；
+   下载受任务截止时间限制，超时后中止，不会占住后续任务的下载线程
+3. wait_for_lora_pairs: 等待下载完成；有新下载的 LoRA 时调用方重新获取 /object_info（缓存的列表中没有它）
+4. resolve_lora_pairs: 按 LoRA 列表（或磁盘上的文件）验证名称，远程地址替换为下载后的名称；
+   未知的 LoRA 在提交前返回错误，而不是等 ComfyUI 加载完基础模型后才失败
+"""
+
+import os
+import hashlib
+import logging
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from .comfy_client import get_loader_choices
+from .provision import ModelCache, HF_ENDPOINT
+from .stage import ModelStager, default_search_paths
+
+logger = logging.getLogger(__name__)
+
+LORA_CACHE_DIR = os.getenv("LORA_CACHE_DIR", "/workspace/loras")
+LORA_CACHE_BUDGET = float(os.getenv("LORA_CACHE_BUDGET_GB", "20")) * 1024 ** 3
+LORA_MAX_SIZE = float(os.getenv("LORA_MAX_SIZE_GB", "4")) * 1024 ** 3
+REMOTE_FOLDER = "remote"
+LORA_EXTENSIONS = (".safetensors",)
+EMPTY_LORA_VALUES = (None, "", "none")
+
+# (节点类型, 输入名)：ComfyUI 中列出 LoRA 文件的加载器
+LORA_LOADERS = (
+    ("WanVideoLoraSelectMulti", "lora_0"),
+    ("WanVideoLoraSelect", "lora"),
+    ("LoraLoaderModelOnly", "lora_name"),
+)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lora")
+
+
+def get_lora_choices(object_info):
+    """/object_info 中的 LoRA 文件列表"""
+    choices = []
+    for class_type, input_name in LORA_LOADERS:
+        choices += get_loader_choices(object_info, class_type, input_name)
+    return {choice.replace("\\", "/") for choice in choices if choice not in EMPTY_LORA_VALUES}
+
+
+def remote_lora_file(source, filename):
+    """远程 LoRA 在 remote/ 下的文件名；同一地址总是得到同一文件名，多个 worker 共用网络卷上的文件"""
+    digest = hashlib.sha256(source.encode('utf-8')).hexdigest()[:12]
+    return f"{digest}_{filename}"
+
+
+def parse_lora_source(value):
+    """
+    解析 LoRA 参数值
+    返回:
+        远程地址返回下载清单项（见 model_manifest），本地名称返回 None；格式错误时抛出 ValueError
+    """
+    if value.startswith(("http://", "https://")):
+        path = urllib.parse.urlsplit(value).path
+        filename = os.path.basename(urllib.parse.unquote(path))
+        spec = {"url": value}
+    elif value.startswith("hf://"):
+        parts = value[len("hf://"):].split("/", 2)
+        if len(parts) < 3 or not all(parts):
+            raise ValueError(f"HF 仓库格式应为 hf://org/repo/path/xxx.safetensors: {value}")
+        repo, _, revision = parts[1].partition("@")
+        filename = os.path.basename(parts[2])
+        spec = {"repo": f"{parts[0]}/{repo}", "path": parts[2], "revision": revision or "main"}
+    else:
+        if not value.lower().endswith(LORA_EXTENSIONS):
+            raise ValueError(f"LoRA 必须是 {', '.join(LORA_EXTENSIONS)} 文件: {value}")
+        return None
+    if not filename.lower().endswith(LORA_EXTENSIONS):
+        raise ValueError(f"LoRA 必须是 {', '.join(LORA_EXTENSIONS)} 文件: {value}")
+    spec.update(folder=REMOTE_FOLDER, file=remote_lora_file(value, filename))
+    return spec
+
+
+def plan_lora_pairs(lora_pairs):
+    """
+    检查 lora_pairs 的格式
+    返回:
+        ({参数值: 下载清单项或 None}, 错误列表)
+    """
+    sources, errors = {}, []
+    for i, pair in enumerate(lora_pairs):
+        if not isinstance(pair, dict):
+            errors.append(f"lora_pairs[{i}] 必须是对象")
+            continue
+        for key in ("high", "low"):
+            value = pair.get(key)
+            if value in EMPTY_LORA_VALUES:
+                continue
+            if not isinstance(value, str):
+                errors.append(f"lora_pairs[{i}].{key} 必须是字符串")
+                continue
+            try:
+                sources[value] = parse_lora_source(value)
+            except ValueError as e:
+                errors.append(f"lora_pairs[{i}].{key}: {e}")
+    return sources, errors
+
+
+class LoraManager:
+    """远程 LoRA 的下载缓存（<cache_dir>/remote/，LRU 淘汰）和本地 LoRA 的定位与预热"""
+
+    def __init__(self, cache_dir=LORA_CACHE_DIR, budget=LORA_CACHE_BUDGET, max_size=LORA_MAX_SIZE,
+                 endpoint=HF_ENDPOINT, search_paths=None):
+        self.cache = ModelCache(root=cache_dir, budget=budget, endpoint=endpoint, search_dirs=[],
+                                max_size=max_size)
+        self.search_paths = search_paths if search_paths is not None else [
+            path for path in default_search_paths() if path[0] == "loras"]
+        if ("loras", cache_dir) not in self.search_paths:
+            self.search_paths.append(("loras", cache_dir))
+
+    def fetch(self, sources, deadline=None):
+        """
+        下载缺少的远程 LoRA 并预热所有 LoRA，下载超过 deadline（time.monotonic()）时中止
+        返回:
+            ({参数值: LoRA 名称或 Exception}, 是否有新下载的 LoRA)
+        """
+        remote = [spec for spec in sources.values() if spec is not None]
+        pinned = {os.path.join(spec["folder"], spec["file"]) for spec in remote}
+        results, fetched = {}, False
+        for value, spec in sources.items():
+            if spec is None:
+                results[value] = value.replace("\\", "/")
+                continue
+            try:
+                _, downloaded = self.cache.ensure(spec, pinned, deadline)
+                fetched = fetched or downloaded
+                results[value] = f"{spec['folder']}/{spec['file']}"
+            except Exception as e:
+                logger.warning(f"⚠️ LoRA 下载失败 {value}: {e}")
+                results[value] = e
+
+        names = [name for name in results.values() if isinstance(name, str)]
+        try:
+            ModelStager(mode="readahead", search_paths=self.search_paths, workers=2).run(names)
+        except Exception as e:
+            logger.warning(f"⚠️ LoRA 预热失败: {e}")
+        return results, fetched
+
+    def exists(self, name):
+        return any(os.path.isfile(os.path.join(directory, name)) for _, directory in self.search_paths)
+
+    def resolve(self, lora_pairs, results, object_info):
+        """
+        验证 LoRA 名称并把远程地址替换为 LoRA 名称
+        返回:
+            (新的 lora_pairs, 错误列表)
+        """
+        choices = get_lora_choices(object_info)
+        errors, resolved = [], []
+        for i, pair in enumerate(lora_pairs):
+            pair = dict(pair)
+            for key in ("high", "low"):
+                value = pair.get(key)
+                if value in EMPTY_LORA_VALUES:
+                    continue
+                name = results[value]
+                if isinstance(name, Exception):
+                    errors.append(f"lora_pairs[{i}].{key}: 下载失败: {name}")
+                elif name not in choices and not self.exists(name):
+                    errors.append(f"lora_pairs[{i}].{key}: 未知的 LoRA: {value}")
+                else:
+                    pair[key] = name
+            resolved.append(pair)
+        if errors and choices:
+            errors.append(f"可用的 LoRA: {', '.join(sorted(choices)[:20])}")
+        return resolved, errors
+
+
+_default_manager = None
+
+
+def get_lora_manager():
+    global _default_manager
+    if _default_manager is None:
+        _default_manager = LoraManager()
+    return _default_manager
+
+
+def prefetch_lora_pairs(sources, deadline=None, manager=None):
+    """在后台线程中下载（不超过任务截止时间 deadline）和预热 LoRA，返回 Future"""
+    manager = manager or get_lora_manager()
+    return _executor.submit(manager.fetch, sources, deadline)
+
+
+def wait_for_lora_pairs(future, timeout=None):
+    """等待后台下载完成，返回 ({参数值: LoRA 名称或 Exception}, 是否有新下载的 LoRA)；超时时返回 (None, False)"""
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        return None, False
+
+
+def resolve_lora_pairs(lora_pairs, results, object_info, manager=None):
+    """验证 lora_pairs，返回 (新的 lora_pairs, 错误列表)；results 为 None（下载超时）时返回错误"""
+    if results is None:
+        return lora_pairs, ["LoRA 下载超时"]
+    manager = manager or get_lora_manager()
+    return manager.resolve(lora_pairs, results, object_info)
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+显存 / 内存规划：按 ComfyUI /system_stats 的总显存和空闲内存，为每个任务选择量化、block swap、VAE tiling 和加载设备
+
+工作流 JSON 中的 quantization / blocks_to_swap / load_device 是按某一张卡写死的，而 hub.json 同时允许 24 GB 和
+32 GB 的卡：大卡上多余的 block swap 拖慢每一步采样，小卡上不够的 swap 直接 OOM。提交前（任务输入
+memory_plan: true，默认开启，环境变量 MEMORY_PLAN=0 默认关闭）:
+
+1. 显存预算 = 总显存 - 预留 - 激活（按生成形状的 latent token 数估算）。不用当前的空闲显存：预热的 worker 上
+   ComfyUI 还持有上一个任务的模型（加载新模型时卸载），按空闲显存规划会让相同的任务得到不同的量化 / swap，
+   输出不一致，singleflight 的键（包含量化）也对不上
+2. 权重大小取模型文件大小；16 位权重不需要 swap 时保持原精度，否则换成 fp8 量化（Ada 及以上优先 *_fast），
+   只使用 object_info 中该节点支持的选项；已是 fp8 的权重不改 quantization
+3. 放不下的部分按 block 数换出（blocks_to_swap），放得下时设为 0 并直接加载到 main_device
+4. T5 放得下时加载到 main_device；VAE 解码估算超过显存时开启 tiling
+5. 换出的权重超过空闲内存时在结果中给出警告
+
+估算系数可用环境变量调整: MEMORY_VRAM_RESERVE_GB、MEMORY_RAM_RESERVE_GB、ACTIVATION_BYTES_PER_TOKEN、
+VAE_BYTES_PER_PIXEL。
+"""
+
+import os
+import math
+import logging
+import functools
+
+from .compile_cache import gpu_arch
+from .stage import default_search_paths, locate_model
+from .template import writable_node
+from .widgets import get_input_specs, get_combo_choices
+
+logger = logging.getLogger(__name__)
+
+GB = 1024 ** 3
+MEMORY_PLAN_DEFAULT = os.getenv("MEMORY_PLAN", "1").lower() in ("1", "true", "yes")
+# 按总显存规划，预留包括 CUDA 上下文和 ComfyUI 自身占用的约 0.5 GB
+VRAM_RESERVE = float(os.getenv("MEMORY_VRAM_RESERVE_GB", "2")) * GB
+RAM_RESERVE = float(os.getenv("MEMORY_RAM_RESERVE_GB", "4")) * GB
+# 采样时每个 latent token（16x16 像素 x 4 帧）的峰值激活，480x832x81 约 6 GB
+ACTIVATION_BYTES_PER_TOKEN = int(os.getenv("ACTIVATION_BYTES_PER_TOKEN", str(192 * 1024)))
+# 不分块的 VAE 解码每个输出像素的峰值显存
+VAE_BYTES_PER_PIXEL = int(os.getenv("VAE_BYTES_PER_PIXEL", "400"))
+# Wan 14B 的 transformer block 数
+NUM_BLOCKS = 40
+DEFAULT_LENGTH = 81
+
+FAST_FP8 = ("fp8_e4m3fn_scaled_fast", "fp8_e4m3fn_fast")
+FP8 = ("fp8_e4m3fn_scaled", "fp8_e4m3fn", "fp8_e5m2")
+MODEL_LOADERS = ("WanVideoModelLoader",)
+T5_LOADERS = ("LoadWanVideoT5TextEncoder",)
+BLOCK_SWAP_NODES = ("WanVideoBlockSwap", "WanVideoEnhancedBlockSwap")
+# 节点类型 -> VAE tiling 开关的输入名
+VAE_TILING_INPUTS = {"WanVideoDecode": "enable_vae_tiling", "WanVideoEncode": "enable_vae_tiling",
+                     "WanVideoImageToVideoEncode": "tiled_vae"}
+
+
+def parse_system_stats(system_stats, device_index=0):
+    """/system_stats -> {"gpu", "vram_total", "vram_free", "ram_total", "ram_free"}（字节），没有 GPU 信息时返回 None"""
+    devices = [device for device in system_stats.get("devices") or [] if device.get("vram_total")]
+    if len(devices) <= device_index:
+        return None
+    device, system = devices[device_index], system_stats.get("system") or {}
+    return {
+        "gpu": device.get("name", ""),
+        "vram_total": device["vram_total"],
+        "vram_free": device.get("vram_free", device["vram_total"]),
+        "ram_total": system.get("ram_total", 0),
+        "ram_free": system.get("ram_free", 0),
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def supports_fast_fp8():
+    """fp8 矩阵乘（*_fast 量化）需要 Ada（sm89）及以上"""
+    arch = gpu_arch()
+    return arch[2:].isdigit() and int(arch[2:]) >= 89
+
+
+def latent_tokens(width, height, length):
+    return (width // 16) * (height // 16) * ((length - 1) // 4 + 1)
+
+
+def quantization_candidates(choices, fast_fp8):
+    """可用的 fp8 量化选项，按速度优先排序"""
+    preferred = (FAST_FP8 if fast_fp8 else ()) + FP8
+    return [name for name in preferred if name in (choices or ())]
+
+
+def plan_memory(resources, model_bytes, shape, model_is_fp8=False, t5_bytes=0, quantization_choices=None,
+                fast_fp8=False, max_blocks_to_swap=NUM_BLOCKS, num_blocks=NUM_BLOCKS, vram_reserve=VRAM_RESERVE,
+                ram_reserve=RAM_RESERVE):
+    """
+    选择不超过显存 / 内存的最快配置，只取决于显卡（总显存）和任务，同一个 worker 上相同的任务得到相同的规划
+    resources: parse_system_stats 的结果; shape: {"width", "height", "length"}
+    返回 {"quantization": 选项或 None（不修改）, "blocks_to_swap", "load_device", "t5_load_device", "vae_tiling",
+          "vram_total_gb", "ram_free_gb", "warnings"}
+    """
+    width, height = shape["width"], shape["height"]
+    length = shape.get("length") or DEFAULT_LENGTH
+    vram = resources["vram_total"] - vram_reserve
+    budget = vram - latent_tokens(width, height, length) * ACTIVATION_BYTES_PER_TOKEN
+
+    # (quantization, 权重大小): 原精度在前，fp8 只对 16 位权重有用
+    candidates = [("disabled" if not model_is_fp8 else None, model_bytes)]
+    if not model_is_fp8:
+        candidates += [(name, model_bytes / 2) for name in quantization_candidates(quantization_choices, fast_fp8)]
+    options = []
+    for quantization, weights in candidates:
+        block_bytes = weights / num_blocks
+        swap = min(num_blocks, max(0, math.ceil((weights - budget) / block_bytes)))
+        options.append((swap, quantization, weights, block_bytes))
+    # 不需要 swap 时保持原精度；否则 swap 最少的（相同时按速度优先的顺序）
+    swap, quantization, weights, block_bytes = options[0] if options[0][0] == 0 else min(options, key=lambda o: o[0])
+
+    warnings = []
+    if swap > max_blocks_to_swap:
+        warnings.append(f"需要换出 {swap} 个 block，超过节点上限 {max_blocks_to_swap}，可能显存不足")
+        swap = max_blocks_to_swap
+    resident = weights - swap * block_bytes
+    t5_load_device = "main_device" if t5_bytes <= vram - resident else "offload_device"
+    offloaded = swap * block_bytes + (t5_bytes if t5_load_device == "offload_device" else 0)
+    if offloaded > resources["ram_free"] - ram_reserve:
+        warnings.append(f"换出 {offloaded / GB:.1f} GB 超过空闲内存 {resources['ram_free'] / GB:.1f} GB")
+
+    return {
+        "quantization": quantization,
+        "blocks_to_swap": swap,
+        "load_device": "main_device" if swap == 0 else "offload_device",
+        "t5_load_device": t5_load_device,
+        # 解码前采样器已把 transformer 卸载（force_offload），可用整块显存
+        "vae_tiling": width * height * length * VAE_BYTES_PER_PIXEL > vram,
+        "vram_total_gb": round(resources["vram_total"] / GB, 1),
+        "ram_free_gb": round(resources["ram_free"] / GB, 1),
+        "warnings": warnings,
+    }
+
+
+def apply_memory_plan(prompt, plan):
+    """
+    把规划写入 prompt，只修改节点已有的输入，返回修改的 [(节点ID, 输入名, 值), ...]
+    任务实例中的节点先通过 writable_node 复制，模板不受影响
+    """
+    changes = []
+
+    def set_input(node_id, node, name, value):
+        inputs = node.get("inputs", {})
+        if name in inputs and inputs[name] != value:
+            writable_node(prompt, node_id)["inputs"][name] = value
+            changes.append((node_id, name, value))
+
+    for node_id, node in prompt.items():
+        class_type = node.get("class_type", "")
+        if class_type in MODEL_LOADERS:
+            if plan["quantization"] is not None:
+                set_input(node_id, node, "quantization", plan["quantization"])
+            set_input(node_id, node, "load_device", plan["load_device"])
+        elif class_type in T5_LOADERS:
+            set_input(node_id, node, "load_device", plan["t5_load_device"])
+        elif class_type in BLOCK_SWAP_NODES:
+            set_input(node_id, node, "blocks_to_swap", plan["blocks_to_swap"])
+        elif class_type in VAE_TILING_INPUTS:
+            set_input(node_id, node, VAE_TILING_INPUTS[class_type], plan["vae_tiling"])
+    return changes
+
+
+def prompt_quantization(prompt):
+    """prompt 中 transformer 实际使用的量化（按节点ID），量化影响输出，参与任务合并的键"""
+    return {node_id: node.get("inputs", {}).get("quantization") for node_id, node in prompt.items()
+            if node.get("class_type") in MODEL_LOADERS}
+
+
+def node_model_size(node, input_name, search_paths):
+    """节点引用的模型文件大小，找不到时返回 None"""
+    name = node.get("inputs", {}).get(input_name)
+    if not isinstance(name, str):
+        return None
+    _, path = locate_model(name, search_paths)
+    return os.path.getsize(path) if path else None
+
+
+def plan_prompt_memory(prompt, object_info, system_stats, shape, search_paths=None, fast_fp8=None):
+    """
+    为 prompt 规划并写入显存配置，返回规划结果；没有 WanVideoModelLoader、模型文件、GPU 信息或宽高时返回 None
+    多个 transformer（如 Wan2.2 高噪 / 低噪）由采样器依次加载和卸载，按最大的一个规划
+    """
+    resources = parse_system_stats(system_stats)
+    if resources is None or not {"width", "height"} <= set(shape):
+        return None
+    search_paths = search_paths if search_paths is not None else default_search_paths()
+    models = []
+    t5_bytes = 0
+    for node in prompt.values():
+        class_type = node.get("class_type", "")
+        if class_type in MODEL_LOADERS:
+            size = node_model_size(node, "model", search_paths)
+            if size:
+                models.append((size, "fp8" in node["inputs"]["model"].lower()))
+        elif class_type in T5_LOADERS:
+            t5_bytes = max(t5_bytes, node_model_size(node, "model_name", search_paths) or 0)
+    if not models:
+        return None
+    model_bytes, model_is_fp8 = max(models)
+
+    loader_specs = get_input_specs(object_info, MODEL_LOADERS[0]) or {}
+    quantization_choices = get_combo_choices(*loader_specs["quantization"][:2]) if "quantization" in loader_specs \
+        else None
+    max_blocks_to_swap = NUM_BLOCKS
+    for class_type in BLOCK_SWAP_NODES:
+        spec = (get_input_specs(object_info, class_type) or {}).get("blocks_to_swap")
+        if spec and spec[1].get("max") is not None:
+            max_blocks_to_swap = min(NUM_BLOCKS, spec[1]["max"])
+    if fast_fp8 is None:
+        fast_fp8 = supports_fast_fp8()
+
+    plan = plan_memory(resources, model_bytes, shape, model_is_fp8, t5_bytes, quantization_choices, fast_fp8,
+                       max_blocks_to_swap)
+    if plan["blocks_to_swap"] and not any(node.get("class_type") in BLOCK_SWAP_NODES for node in prompt.values()):
+        plan["warnings"].append("工作流没有 BlockSwap 节点，无法换出权重")
+    changes = apply_memory_plan(prompt, plan)
+    logger.info(f"🧮 显存规划 ({resources['gpu']}, 显存 {plan['vram_total_gb']} GB, 内存 {plan['ram_free_gb']} GB, "
+                f"模型 {model_bytes / GB:.1f} GB): quantization={plan['quantization']}, "
+                f"blocks_to_swap={plan['blocks_to_swap']}, load_device={plan['load_device']}, "
+                f"t5={plan['t5_load_device']}, vae_tiling={plan['vae_tiling']}; 修改了 {len(changes)} 个输入")
+    for warning in plan["warnings"]:
+        logger.warning(f"⚠️ 显存规划: {warning}")
+    return plan
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+模型下载清单：工作流中引用的模型文件 -> HuggingFace 仓库中的来源（与各 Dockerfile 中 hfd.sh 下载的文件一致）
+
+每项:
+    folder:   ComfyUI 模型目录类型（diffusion_models / loras / vae ...）
+    file:     工作流中引用的路径（相对 folder，可包含子目录）
+    repo:     HF 仓库
+    path:     文件在仓库中的路径
+    revision: 可选，默认 main
+    url:      可选，直接下载地址（替代 repo / path，见 lora_manager 中用户提供的 LoRA）
+    sha256:   可选；未提供时使用镜像返回的 X-Linked-Etag（HF LFS 文件的 sha256）
+
+按需下载见 provision.py
+"""
+
+MODEL_MANIFEST = (
+    # 所有工作流共用
+    {"folder": "text_encoders", "file": "umt5-xxl-enc-bf16.safetensors",
+     "repo": "Kijai/WanVideo_comfy", "path": "umt5-xxl-enc-bf16.safetensors"},
+    {"folder": "vae", "file": "Wan2_1_VAE_bf16.safetensors",
+     "repo": "Kijai/WanVideo_comfy", "path": "Wan2_1_VAE_bf16.safetensors"},
+    {"folder": "clip_vision", "file": "clip_vision_h.safetensors",
+     "repo": "Comfy-Org/Wan_2.1_ComfyUI_repackaged", "path": "split_files/clip_vision/clip_vision_h.safetensors"},
+
+    # Wan2.2 MEGA/AIO 与 Lightning LoRA
+    {"folder": "diffusion_models", "file": "wan2.2-rapid-mega-aio-nsfw-v12.1.safetensors",
+     "repo": "Phr00t/WAN2.2-14B-Rapid-AllInOne", "path": "Mega-v12/wan2.2-rapid-mega-aio-nsfw-v12.1.safetensors"},
+    {"folder": "loras", "file": "high_noise_model.safetensors",
+     "repo": "lightx2v/Wan2.2-Lightning", "path": "Wan2.2-I2V-A14B-4steps-lora-rank64-Seko-V1/high_noise_model.safetensors"},
+    {"folder": "loras", "file": "low_noise_model.safetensors",
+     "repo": "lightx2v/Wan2.2-Lightning", "path": "Wan2.2-I2V-A14B-4steps-lora-rank64-Seko-V1/low_noise_model.safetensors"},
+
+    # Wan21 OneToAllAnimation
+    {"folder": "diffusion_models", "file": "WanVideo/OneToAll/Wan21-OneToAllAnimation_fp8_e4m3fn_scaled_KJ.safetensors",
+     "repo": "Kijai/WanVideo_comfy_fp8_scaled",
+     "path": "OneToAllAnimation/Wan21-OneToAllAnimation_fp8_e4m3fn_scaled_KJ.safetensors"},
+    {"folder": "loras", "file": "WanVideo/Lightx2v/lightx2v_T2V_14B_cfg_step_distill_v2_lora_rank64_bf16.safetensors",
+     "repo": "Kijai/WanVideo_comfy", "path": "Lightx2v/lightx2v_T2V_14B_cfg_step_distill_v2_lora_rank64_bf16.safetensors"},
+
+    # SteadyDancer
+    {"folder": "diffusion_models", "file": "WanVideo/SteadyDancer/Wan21_SteadyDancer_fp8_e4m3fn_scaled_KJ.safetensors",
+     "repo": "Kijai/WanVideo_comfy_fp8_scaled", "path": "SteadyDancer/Wan21_SteadyDancer_fp8_e4m3fn_scaled_KJ.safetensors"},
+    {"folder": "loras", "file": "WanVideo/Lightx2v/lightx2v_I2V_14B_480p_cfg_step_distill_rank64_bf16.safetensors",
+     "repo": "Kijai/WanVideo_comfy", "path": "Lightx2v/lightx2v_I2V_14B_480p_cfg_step_distill_rank64_bf16.safetensors"},
+
+    # 姿态检测（YOLO + ViTPose）
+    {"folder": "detection", "file": "yolov10m.onnx",
+     "repo": "Wan-AI/Wan2.2-Animate-14B", "path": "process_checkpoint/det/yolov10m.onnx"},
+    {"folder": "detection", "file": "vitpose-l-wholebody.onnx",
+     "repo": "JunkyByte/easy_ViTPose", "path": "onnx/wholebody/vitpose-l-wholebody.onnx"},
+    {"folder": "detection", "file": "vitpose_h_wholebody_model.onnx",
+     "repo": "JunkyByte/easy_ViTPose", "path": "onnx/wholebody/vitpose-h-wholebody.onnx"},
+)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+姿态提取缓存（handler 侧）
+
+参考视频通常来自一个不大的舞蹈视频库，每个任务重复运行 YOLO + ViTPose 检测很浪费。
+缓存键 = 检测节点上游子图的规范化 JSON 的 sha256，其中文件输入（参考视频、参考图像）替换为文件内容哈希，
+因此检测模型、分辨率、帧数上限、跳帧等设置变化都会得到不同的键。
+
+- 命中：检测节点替换为 PoseCacheLoad（同一节点 ID，输出顺序不变），上游检测子图随后被裁剪
+- 未命中：追加 PoseCacheSave 输出节点，本次运行结束后写入缓存
+
+能拿到关键点的工作流（SteadyDancer 的 PoseAndFaceDetection 输出 POSEDATA）只缓存关键点，DrawViTPose 照常渲染，
+缓存只有几十 KB；OneToAll 的 PoseDetectionOneToAllAnimation 只输出渲染好的姿态帧，缓存 uint8 帧。
+下游引用了未缓存的输出时不使用缓存。
+
+缓存的读写由 comfyui_pose_cache 自定义节点在 ComfyUI 进程内完成。
+"""
+
+import os
+import json
+import hashlib
+import logging
+
+from .validate_workflow import is_link
+from .prompt_optimizer import collect_required_nodes
+
+logger = logging.getLogger(__name__)
+
+POSE_CACHE_DIR = os.getenv("POSE_CACHE_DIR", "/workspace/pose_cache")
+COMFYUI_INPUT_DIR = "/ComfyUI/input"
+# 缓存格式或注入方式变化时递增
+POSE_CACHE_VERSION = 2
+
+# 被缓存的检测阶段终点节点类型 -> 缓存的输出数量（前 N 个输出）
+POSE_STAGE_CLASSES = {
+    "PoseDetectionOneToAllAnimation": 4,  # OneToAll: pose_images, ref_pose_image, ref_image, ref_mask
+    "PoseAndFaceDetection": 1,            # SteadyDancer: pose_data（关键点，DrawViTPose 的输入）
+}
+# 输入值是文件路径的节点输入
+FILE_INPUTS = {("LoadImage", "image"), ("VHS_LoadVideo", "video")}
+
+_file_hash_cache = {}
+
+
+def hash_file(file_path):
+    """文件内容 sha256，按 (路径, 大小, mtime) 在进程内缓存"""
+    stat = os.stat(file_path)
+    cache_key = (file_path, stat.st_size, stat.st_mtime_ns)
+    if cache_key not in _file_hash_cache:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(8 * 1024 * 1024), b''):
+                digest.update(chunk)
+        _file_hash_cache[cache_key] = digest.hexdigest()
+    return _file_hash_cache[cache_key]
+
+
+def resolve_input_file(value):
+    """文件输入可能是绝对路径，也可能是相对 /ComfyUI/input 的路径"""
+    if not isinstance(value, str) or not value:
+        return None
+    for candidate in (value, os.path.join(COMFYUI_INPUT_DIR, value)):
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def compute_pose_cache_key(prompt, stage_node_id):
+    """
+    计算检测阶段的缓存键；上游引用的文件不存在时返回 None（不缓存）
+    """
+    upstream = collect_required_nodes(prompt, [stage_node_id])
+    canonical = {}
+    for node_id in sorted(upstream, key=str):
+        node = prompt[node_id]
+        class_type = node.get("class_type", "")
+        inputs = {}
+        for input_name, value in node.get("inputs", {}).items():
+            if (class_type, input_name) in FILE_INPUTS:
+                file_path = resolve_input_file(value)
+                if file_path is None:
+                    return None
+                value = f"sha256:{hash_file(file_path)}"
+            elif is_link(value):
+                value = [str(value[0]), value[1]]
+            inputs[input_name] = value
+        canonical[node_id] = {"class_type": class_type, "inputs": inputs}
+
+    payload = json.dumps({"version": POSE_CACHE_VERSION, "stage": stage_node_id, "graph": canonical},
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def find_pose_stage_nodes(prompt):
+    """返回 prompt 中检测阶段终点节点 [(节点ID, 输出数量), ...]"""
+    return [(node_id, POSE_STAGE_CLASSES[node.get("class_type")]) for node_id, node in prompt.items()
+            if node.get("class_type") in POSE_STAGE_CLASSES]
+
+
+def consumed_outputs(prompt, node_id, consumer_ids=None):
+    """下游节点（consumer_ids 为 None 时为全部节点）引用的 node_id 输出索引集合"""
+    indices = set()
+    for consumer_id, node in prompt.items():
+        if consumer_ids is not None and consumer_id not in consumer_ids:
+            continue
+        for value in node.get("inputs", {}).values():
+            if is_link(value) and str(value[0]) == node_id:
+                indices.add(value[1])
+    return indices
+
+
+def is_cached(cache_key, cache_dir=POSE_CACHE_DIR):
+    return os.path.exists(os.path.join(cache_dir, cache_key, "meta.json"))
+
+
+def apply_pose_cache(prompt, output_node_ids=None, cache_dir=POSE_CACHE_DIR):
+    """
+    对 prompt 注入姿态缓存节点（原地修改）
+
+    参数:
+        output_node_ids: 本次需要执行的输出节点，None 表示全部；检测阶段不在其上游时不做处理
+
+    返回:
+        (命中的节点ID列表, 新增的 PoseCacheSave 节点ID列表)
+        新增的保存节点需要加入输出节点列表，否则会在裁剪时被删除
+    """
+    required = collect_required_nodes(prompt, output_node_ids) if output_node_ids is not None else None
+    hits, save_nodes = [], []
+    for stage_node_id, output_count in find_pose_stage_nodes(prompt):
+        if required is not None and stage_node_id not in required:
+            continue
+        if prompt[stage_node_id].get("mode", 0) != 0:
+            continue
+        uncached = [index for index in consumed_outputs(prompt, stage_node_id, required) if index >= output_count]
+        if uncached:
+            logger.info(f"姿态缓存: 节点 {stage_node_id} 的输出 {sorted(uncached)} 不在缓存中，跳过")
+            continue
+        try:
+            cache_key = compute_pose_cache_key(prompt, stage_node_id)
+        except OSError as e:
+            logger.warning(f"⚠️ 姿态缓存键计算失败，跳过缓存: {e}")
+            continue
+        if cache_key is None:
+            continue
+
+        class_type = prompt[stage_node_id]["class_type"]
+        if is_cached(cache_key, cache_dir):
+            prompt[stage_node_id] = {
+                "class_type": "PoseCacheLoad",
+                "inputs": {"cache_key": cache_key, "cache_dir": cache_dir},
+            }
+            hits.append(stage_node_id)
+            logger.info(f"♻️ 姿态缓存命中: 节点 {stage_node_id} ({class_type}) -> {cache_key[:12]}")
+        else:
+            save_node_id = f"{stage_node_id}_pose_cache_save"
+            inputs = {"cache_key": cache_key, "cache_dir": cache_dir}
+            for i in range(output_count):
+                inputs[f"output_{i}"] = [stage_node_id, i]
+            prompt[save_node_id] = {"class_type": "PoseCacheSave", "inputs": inputs}
+            save_nodes.append(save_node_id)
+            logger.info(f"💾 姿态缓存未命中: 节点 {stage_node_id} ({class_type})，运行后写入 {cache_key[:12]}")
+    return hits, save_nodes
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+生成过程中的实时预览：解码 ComfyUI 的二进制预览帧，限速、缩小、重新编码后推送给客户端
+
+ComfyUI 以 --preview-method 启动时，采样过程中会通过 WebSocket 发送二进制帧（该参数对所有任务生效，每个采样步都要
+解码预览，所以 entrypoint 默认 COMFYUI_PREVIEW_METHOD=none，需要预览的部署设置为 auto / latent2rgb / taesd）：
+前 4 字节为大端事件类型，
+- 1 (PREVIEW_IMAGE):               4 字节图片类型（1=JPEG, 2=PNG）+ 图片数据
+- 4 (PREVIEW_IMAGE_WITH_METADATA): 4 字节元数据长度 + JSON 元数据（node_id / prompt_id / image_type）+ 图片数据
+
+推送目标（任务输入 preview）：
+- progress: 以 base64 data URL 写入 RunPod 进度更新（/status 返回的 output）
+- r2:       覆盖写入 R2 上固定的对象键（滚动预览），进度更新中只返回 URL
+
+解码、编码和推送都在单独的后台线程中完成，WebSocket 读取循环只解析帧头；
+上一帧还没推送完时丢弃新帧，慢速的上传不会拖慢执行结果的读取。
+"""
+
+import io
+import os
+import time
+import base64
+import struct
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from . import fastjson
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_TARGETS = (None, "progress", "r2")
+# 与 entrypoint.sh 传给 ComfyUI 的 --preview-method 一致
+PREVIEW_METHOD = os.getenv("COMFYUI_PREVIEW_METHOD", "none")
+PREVIEW_FORMATS = ("jpeg", "webp")
+PREVIEW_MIME_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp"}
+PREVIEW_EXTENSIONS = {"jpeg": ".jpg", "webp": ".webp"}
+# 默认每秒最多 1 帧、长边 256 像素
+DEFAULT_PREVIEW_FPS = 1.0
+DEFAULT_PREVIEW_SIZE = 256
+DEFAULT_PREVIEW_QUALITY = 70
+MAX_PREVIEW_FPS = 10.0
+MAX_PREVIEW_SIZE = 1024
+
+EVENT_PREVIEW_IMAGE = 1
+EVENT_PREVIEW_IMAGE_WITH_METADATA = 4
+IMAGE_TYPES = {1: "JPEG", 2: "PNG"}
+
+
+def parse_preview_frame(frame):
+    """
+    解析 ComfyUI 的二进制预览帧，返回 (图片数据, 元数据)；不是预览帧或格式错误时返回 None
+    """
+    if len(frame) < 8:
+        return None
+    event, = struct.unpack(">I", frame[:4])
+    if event == EVENT_PREVIEW_IMAGE:
+        image_type, = struct.unpack(">I", frame[4:8])
+        return frame[8:], {"image_type": IMAGE_TYPES.get(image_type, "JPEG")}
+    if event == EVENT_PREVIEW_IMAGE_WITH_METADATA:
+        metadata_length, = struct.unpack(">I", frame[4:8])
+        try:
+            metadata = fastjson.loads(frame[8:8 + metadata_length])
+        except ValueError:
+            return None
+        if not isinstance(metadata, dict):
+            return None
+        return frame[8 + metadata_length:], metadata
+    return None
+
+
+def parse_preview_options(job_input, preview_method=PREVIEW_METHOD):
+    """
+    验证任务输入中的预览参数，返回 (options, 错误列表)；未开启预览时 options 为 None
+
+    preview: progress / r2；preview_fps: 每秒最多推送的帧数；preview_size: 长边像素；preview_format: jpeg / webp
+    """
+    target = job_input.get("preview")
+    if target not in PREVIEW_TARGETS:
+        return None, [f"不支持的 preview: {target}，可选: progress, r2"]
+    if target is None:
+        return None, []
+    if preview_method == "none":
+        return None, ["worker 未开启 ComfyUI 预览（COMFYUI_PREVIEW_METHOD=none），无法使用 preview"]
+
+    errors = []
+    options = {"target": target, "fps": DEFAULT_PREVIEW_FPS, "max_size": DEFAULT_PREVIEW_SIZE,
+               "image_format": job_input.get("preview_format", "jpeg")}
+    if options["image_format"] not in PREVIEW_FORMATS:
+        errors.append(f"不支持的 preview_format: {options['image_format']}，可选: {', '.join(PREVIEW_FORMATS)}")
+    for key, option, cast, maximum in (("preview_fps", "fps", float, MAX_PREVIEW_FPS),
+                                       ("preview_size", "max_size", int, MAX_PREVIEW_SIZE)):
+        if job_input.get(key) is None:
+            continue
+        try:
+            value = cast(job_input[key])
+        except (TypeError, ValueError):
+            errors.append(f"{key} 必须是数字，收到: {job_input[key]!r}")
+            continue
+        if not 0 < value <= maximum:
+            errors.append(f"{key} 必须在 (0, {maximum:g}] 范围内，收到: {value}")
+        options[option] = value
+    return options, errors
+
+
+def encode_preview(image_bytes, max_size=DEFAULT_PREVIEW_SIZE, image_format="jpeg", quality=DEFAULT_PREVIEW_QUALITY):
+    """把预览图缩小到长边不超过 max_size 并重新编码为 JPEG / WebP"""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        image = image.convert("RGB")
+        image.thumbnail((max_size, max_size))
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format.upper(), quality=quality)
+    return buffer.getvalue()
+
+
+class PreviewStreamer:
+    """
+    预览帧的限速与后台推送
+
+    publish(preview_bytes, info) 在后台线程中调用，info 包含 mime_type、frame（序号）、
+    node 和当前节点的采样进度 value / max
+    """
+
+    def __init__(self, publish, fps=DEFAULT_PREVIEW_FPS, max_size=DEFAULT_PREVIEW_SIZE, image_format="jpeg",
+                 quality=DEFAULT_PREVIEW_QUALITY, clock=time.monotonic):
+        self.publish = publish
+        self.interval = 1.0 / fps
+        self.max_size = max_size
+        self.image_format = image_format
+        self.quality = quality
+        self.clock = clock
+        self.progress = {}
+        self.sent = 0
+        self.dropped = 0
+        self._last_time = None
+        self._pending = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="preview")
+
+    def update_progress(self, data):
+        """记录 progress 消息中的节点和步数，随下一帧预览一起推送"""
+        self.progress = {"node": data.get("node"), "value": data.get("value"), "max": data.get("max")}
+
+    def handle_frame(self, frame, prompt_id=None):
+        """处理一个二进制 WebSocket 帧，提交到后台推送时返回 True"""
+        now = self.clock()
+        if self._last_time is not None and now - self._last_time < self.interval:
+            return False
+        if self._pending is not None and not self._pending.done():
+            self.dropped += 1
+            return False
+        parsed = parse_preview_frame(frame)
+        if parsed is None:
+            return False
+        image_bytes, metadata = parsed
+        if prompt_id and metadata.get("prompt_id") not in (None, prompt_id):
+            return False
+
+        self._last_time = now
+        info = dict(self.progress)
+        if metadata.get("node_id"):
+            info["node"] = metadata["node_id"]
+        self._pending = self._executor.submit(self._publish, image_bytes, info)
+        return True
+
+    def _publish(self, image_bytes, info):
+        try:
+            preview = encode_preview(image_bytes, self.max_size, self.image_format, self.quality)
+            self.publish(preview, {"mime_type": PREVIEW_MIME_TYPES[self.image_format], "frame": self.sent + 1,
+                                   **info})
+            self.sent += 1
+        except Exception as e:
+            logger.warning(f"⚠️ 预览推送失败: {e}")
+
+    def close(self, wait=False):
+        """停止后台线程；默认不等待正在进行的推送，执行结果不因预览而延迟返回"""
+        self._executor.shutdown(wait=wait)
+        logger.info(f"🖼️ 预览: 推送 {self.sent} 帧，丢弃 {self.dropped} 帧")
+
+
+def progress_publisher(job):
+    """以 base64 data URL 写入 RunPod 进度更新"""
+    import runpod
+
+    def publish(preview, info):
+        data_url = f"data:{info['mime_type']};base64,{base64.b64encode(preview).decode('ascii')}"
+        runpod.serverless.progress_update(job, {"preview": data_url, **info})
+    return publish
+
+
+def r2_publisher(job, object_key):
+    """覆盖写入 R2 上的固定对象键，进度更新中只返回 URL（frame 序号可用于绕过客户端缓存）"""
+    import runpod
+    from upload_to_r2 import upload_bytes_to_r2, create_r2_client
+
+    s3_client = create_r2_client()
+
+    def publish(preview, info):
+        url = upload_bytes_to_r2(preview, object_key, info["mime_type"], cache_control="no-store",
+                                 s3_client=s3_client)
+        runpod.serverless.progress_update(job, {"preview_url": url, **info})
+    return publish
+
+
+def create_preview_streamer(job, options, task_id):
+    """按 parse_preview_options 的结果创建 PreviewStreamer，未开启预览时返回 None"""
+    if not options:
+        return None
+    if options["target"] == "r2":
+        object_key = f"previews/{task_id}{PREVIEW_EXTENSIONS[options['image_format']]}"
+        publish = r2_publisher(job, object_key)
+    else:
+        publish = progress_publisher(job)
+    logger.info(f"🖼️ 实时预览: {options['target']}, {options['fps']:g} fps, "
+                f"{options['max_size']}px {options['image_format']}")
+    return PreviewStreamer(publish, options["fps"], options["max_size"], options["image_format"])
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""
+工作流 profile 与通用任务流程
+
+每个部署只定义一个 WorkflowProfile 子类：
+- prepare():      准备输入文件、启动 CPU 预处理（此时 ComfyUI 可能还在启动）
+- build_prompt(): 选择并加载工作流，绑定任务参数，返回 API prompt
+- pick_output():  从执行结果中选择返回的视频节点
+
+profile 的 params 声明任务参数（见 binding.py），run_job() 在准备输入前统一验证，
+验证后的值放在 ctx["params"]，并据此计算规范化任务哈希 ctx["job_hash"]。
+
+其余步骤（等待 ComfyUI、姿态缓存、裁剪、验证、提交、读取输出、重封装/上传）由 run_job() 统一完成。
+"""
+
+import os
+import uuid
+import base64
+import time
+import signal
+import logging
+
+from .inputs import COMFYUI_INPUT_DIR, mask_job_input
+from .lora_manager import plan_lora_pairs, prefetch_lora_pairs, wait_for_lora_pairs, resolve_lora_pairs
+from .binding import validate_params, job_hash, coerce_value
+from .bucketing import BUCKETING_DEFAULT, apply_buckets, get_bucket_stats
+from .compile_cache import get_compile_cache, uses_torch_compile, shape_key, job_shape
+from .convert_workflow_to_api import convert_nodes_to_prompt_format
+from .comfy_client import (wait_for_http_connection, get_object_info, invalidate_object_info, connect_websocket,
+                           get_videos, reap_orphaned_prompts, cancel_active_prompt, get_system_stats)
+from .memory_planner import MEMORY_PLAN_DEFAULT, plan_prompt_memory, prompt_quantization
+from .pose_cache import apply_pose_cache
+from .prompt_fixups import fix_prompt_inputs
+from .preview import parse_preview_options, create_preview_streamer
+from .provision import provision_prompt_models
+from .singleflight import flight_key, get_singleflight, SingleFlightTimeout
+from .stage import get_stage_progress
+from .prompt_optimizer import prune_prompt
+from .validate_workflow import check_workflow
+from .video_postprocess import postprocess_and_upload, fit_video
+from .workflow import load_workflow
+from .workflow_compiler import load_compiled_prompt
+
+logger = logging.getLogger(__name__)
+
+MP4_LAYOUTS = ("faststart", "fragmented", "none")
+STREAMING_FORMATS = (None, "hls", "dash")
+# 任务截止时间（秒，从收到任务开始计算），任务输入 job_timeout 可覆盖
+DEFAULT_JOB_TIMEOUT = float(os.getenv('JOB_TIMEOUT', '1800'))
+# 每个任务等待 ComfyUI HTTP 服务就绪的最长时间（秒），同时受任务截止时间限制
+COMFYUI_WAIT_TIMEOUT = 180
+# 上传到 R2 时写入对象元数据的任务参数
+RESULT_PARAM_KEYS = ("prompt", "seed", "width", "height", "length", "steps", "cfg")
+
+
+class WorkflowProfile:
+    """
+    部署的工作流定义，子类覆盖 build_prompt()，按需覆盖其他方法
+
+    ctx 是单个任务的上下文字典，run_job() 预先写入 task_id / task_dir / mp4_layout / params，
+    build_prompt() 需要写入 workflow_file，可选写入 workflow_data（用于按节点 order 选择输出），
+    prepare() 可选写入 input_files（{名称: 本地路径}，按内容参与任务哈希）
+    """
+
+    name = "default"
+    # 任务参数声明 {参数名: spec}，见 binding.validate_params
+    params = {}
+    # 可能使用的工作流文件，worker 启动时（boot.py）在等待 ComfyUI 的同时预编译
+    workflow_files = ()
+    # 命名输出: {工作流名（去掉 .json / _api 后缀）: {输出名: 节点ID}}
+    workflow_outputs = {}
+    default_output = "final"
+    # 提交前注入姿态缓存、裁剪禁用/无用节点并做图验证
+    optimize_prompt = True
+    # 提交前按 model_manifest 下载 prompt 引用但本地缺少的模型（见 provision.py）
+    provision_models = True
+    # LoRA 列表参数名（[{"high", "low", ...}]），提交前验证、下载并预热（见 lora_manager.py）；
+    # params 中没有该参数的 profile 不受影响
+    lora_param = "lora_pairs"
+    # 可分桶的参数名 (宽, 高[, 帧数])，任务开启 bucketing 时对齐到固定形状（见 bucketing.py）
+    bucket_params = ()
+    # 构建模板时对转换后的 prompt 执行的修正（名称见 prompt_fixups.PROMPT_FIXUPS）
+    prompt_fixups = ()
+
+    def prepare(self, job_input, ctx):
+        """准备输入文件，在等待 ComfyUI 启动之前调用"""
+
+    def build_prompt(self, job_input, ctx, object_info):
+        """返回绑定了任务参数的 API prompt"""
+        raise NotImplementedError
+
+    def load_prompt(self, workflow_file, logic_node_values=None):
+        """
+        加载工作流并转换为 API prompt，返回 (prompt, UI 工作流或 None)
+        UI 格式优先使用构建时预编译的 prompt（workflow_compiler），有 logic 节点值时在运行时转换
+        """
+        workflow_data = load_workflow(workflow_file)
+        if "nodes" not in workflow_data:
+            return workflow_data, None
+        prompt = load_compiled_prompt(workflow_file) if not logic_node_values else None
+        if prompt is not None:
+            logger.info(f"⚡ 使用预编译的工作流: {workflow_file}")
+        else:
+            prompt = convert_nodes_to_prompt_format(workflow_data, logic_node_values)
+        return prompt, workflow_data
+
+    def fix_prompt(self, prompt, workflow_data, object_info):
+        """对模板执行 prompt_fixups 中的修正，只依赖工作流本身，每个 worker 只执行一次"""
+        fix_prompt_inputs(prompt, workflow_data, object_info, self.prompt_fixups)
+
+    def get_bucket_params(self, params):
+        """
+        返回本任务可分桶的参数名，输出帧数与 length 不一致的任务只对齐宽高：
+        多提示词模式（prompt 有多行）的总帧数是各段拼接的结果，不按 length 截取
+        """
+        prompt = params.get("prompt")
+        if isinstance(prompt, str) and len([line for line in prompt.split("\n") if line.strip()]) > 1:
+            return self.bucket_params[:2]
+        return self.bucket_params
+
+    def get_outputs(self, workflow_file):
+        """返回工作流的命名输出映射，没有配置时返回 None"""
+        name = os.path.splitext(os.path.basename(workflow_file or ""))[0]
+        if name.endswith("_api"):
+            name = name[:-len("_api")]
+        return self.workflow_outputs.get(name)
+
+    def pick_output(self, output_videos, execution_order, prompt, ctx):
+        """返回要返回的视频节点ID；指定了命名输出时直接使用该节点"""
+        if ctx.get("output_node_ids"):
+            return ctx["output_node_ids"][0]
+        return select_output_node(output_videos, execution_order, prompt, ctx.get("workflow_data"))
+
+
+def node_id_sort_key(node_id):
+    try:
+        return int(str(node_id))
+    except (ValueError, TypeError):
+        return 0
+
+
+def select_output_node(output_videos, execution_order, prompt, workflow_data=None):
+    """
+    未指定输出时选择最终视频节点，依次：
+    1. save_output=True 的 VHS_VideoCombine（多个时取 order 最大）
+    2. order 最大（没有 order 时 ID 最大）的 VHS_VideoCombine
+    3. 最后执行的视频节点
+    4. ID 最大的视频节点
+    """
+    video_nodes = [str(node_id) for node_id, videos in output_videos.items() if videos]
+    if not video_nodes:
+        return None
+
+    node_orders = {}
+    if isinstance(workflow_data, dict):
+        node_orders = {str(node.get("id")): node.get("order", 0) for node in workflow_data.get("nodes", [])}
+
+    vhs_nodes = [node_id for node_id in video_nodes
+                 if "VHS_VideoCombine" in prompt.get(node_id, {}).get("class_type", "")]
+    save_output_nodes = [node_id for node_id in vhs_nodes
+                         if prompt[node_id].get("inputs", {}).get("save_output", False)]
+    for candidates in (save_output_nodes, vhs_nodes):
+        if candidates:
+            if node_orders:
+                return max(candidates, key=lambda node_id: node_orders.get(node_id, 0))
+            return max(candidates, key=node_id_sort_key)
+
+    for node_id in reversed([str(node_id) for node_id in execution_order]):
+        if node_id in video_nodes:
+            return node_id
+    return max(video_nodes, key=node_id_sort_key)
+
+
+def build_video_result(video_base64, video_file_paths, job_input, deadline=None):
+    """组装返回结果：base64 视频，以及（可选）R2 上传地址和 HLS/DASH 切片地址"""
+    result = {"video": video_base64}
+    upload = job_input.get("upload_to_r2", False)
+    streaming_format = job_input.get("streaming_format")
+    if not (upload or streaming_format) or not video_file_paths:
+        return result
+
+    params = {key: job_input[key] for key in RESULT_PARAM_KEYS if key in job_input}
+    try:
+        # get_videos 中已完成重封装，这里只做切片和上传
+        result.update(postprocess_and_upload(video_file_paths[0], mp4_layout="none",
+                                             streaming_format=streaming_format, upload=upload,
+                                             params=params, deadline=deadline))
+    except Exception as e:
+        logger.error(f"❌ 视频后处理/上传失败: {e}")
+        result["upload_error"] = str(e)
+    return result
+
+
+def optimize_prompt(prompt, job_input, object_info, output_node_ids):
+    """
+    姿态缓存 + 裁剪 + 验证，返回 (prompt, output_node_ids, 验证错误列表)
+    """
+    if job_input.get("pose_cache", True) and "PoseCacheLoad" in object_info:
+        _, pose_cache_saves = apply_pose_cache(prompt, output_node_ids)
+        if output_node_ids is not None:
+            output_node_ids = output_node_ids + pose_cache_saves
+
+    # 裁剪禁用节点（mode 2/4）和不通往所选输出节点的节点
+    prompt, pruned_nodes = prune_prompt(prompt, output_node_ids, object_info)
+    if pruned_nodes:
+        logger.info(f"✂️ 裁剪了 {len(pruned_nodes)} 个不需要执行的节点: {pruned_nodes}")
+
+    # 提交前的图验证：悬空引用、环路、不可执行的输出节点、连接类型不匹配
+    validation_start = time.perf_counter()
+    validation_errors, validation_info = check_workflow(prompt, object_info)
+    validation_us = (time.perf_counter() - validation_start) * 1e6
+    if validation_errors:
+        logger.error(f"❌ 工作流验证失败 ({len(validation_errors)} 个问题, {validation_us:.0f}µs):")
+        for error in validation_errors:
+            logger.error(f"   {error}")
+    else:
+        logger.info(f"✅ 工作流验证通过: {validation_info['node_count']} 个节点, "
+                    f"{len(validation_info['output_nodes'])} 个输出节点 ({validation_us:.0f}µs)")
+    return prompt, output_node_ids, validation_errors
+
+
+def run_job(job, profile):
+    """按 profile 执行一个 RunPod 任务，返回结果字典"""
+    job_input = job.get("input", {})
+    logger.info(f"收到任务输入: {mask_job_input(job_input)}")
+
+    task_id = f"task_{uuid.uuid4()}"
+    ctx = {"task_id": task_id, "task_dir": os.path.join(COMFYUI_INPUT_DIR, task_id)}
+
+    # 截止时间覆盖整个任务（准备输入、等待 ComfyUI、执行），超时后中断 ComfyUI 执行
+    try:
+        job_timeout = float(job_input.get("job_timeout", DEFAULT_JOB_TIMEOUT))
+    except (TypeError, ValueError):
+        job_timeout = 0
+    if job_timeout <= 0:
+        return {"error": f"job_timeout 必须是正数（秒），收到: {job_input.get('job_timeout')!r}"}
+    ctx["deadline"] = time.monotonic() + job_timeout
+
+    # 输出 MP4 布局：faststart（默认，moov 前置）/ fragmented（分片 MP4）/ none
+    ctx["mp4_layout"] = job_input.get("mp4_layout", "faststart")
+    if ctx["mp4_layout"] not in MP4_LAYOUTS:
+        return {"error": f"不支持的 mp4_layout: {ctx['mp4_layout']}，可选: {', '.join(MP4_LAYOUTS)}"}
+    if job_input.get("streaming_format") not in STREAMING_FORMATS:
+        return {"error": f"不支持的 streaming_format: {job_input.get('streaming_format')}，可选: hls, dash"}
+    # 生成过程中的实时预览（preview: progress / r2），见 preview.py
+    ctx["preview"], preview_errors = parse_preview_options(job_input)
+    if preview_errors:
+        return {"error": f"预览参数无效: {'; '.join(preview_errors)}"}
+
+    # 参数在等待 ComfyUI 之前验证，无效任务立即返回
+    ctx["params"], param_errors = validate_params(profile.params, job_input)
+    if param_errors:
+        return {"error": f"参数验证失败: {'; '.join(param_errors)}"}
+
+    # 分桶：宽高 / 帧数对齐到固定形状以复用编译图和缓存，输出再裁剪回请求的形状
+    ctx["bucket"] = None
+    try:
+        bucketing = coerce_value(job_input.get("bucketing", BUCKETING_DEFAULT), bool)
+    except ValueError:
+        return {"error": f"bucketing 必须是布尔值，收到: {job_input.get('bucketing')!r}"}
+    if bucketing and not profile.bucket_params and "bucketing" in job_input:
+        return {"error": f"工作流 {profile.name} 不支持 bucketing"}
+    bucket_params = profile.get_bucket_params(ctx["params"]) if profile.bucket_params else ()
+    if bucketing and bucket_params:
+        ctx["bucket"] = apply_buckets(ctx["params"], bucket_params)
+
+    try:
+        memory_plan = coerce_value(job_input.get("memory_plan", MEMORY_PLAN_DEFAULT), bool)
+    except ValueError:
+        return {"error": f"memory_plan 必须是布尔值，收到: {job_input.get('memory_plan')!r}"}
+
+    # LoRA 格式错误立即返回；下载和预热在后台与 prepare / 等待 ComfyUI 并行
+    lora_future = None
+    if profile.lora_param and ctx["params"].get(profile.lora_param):
+        lora_sources, lora_errors = plan_lora_pairs(ctx["params"][profile.lora_param])
+        if lora_errors:
+            return {"error": f"LoRA 参数无效: {'; '.join(lora_errors)}"}
+        lora_future = prefetch_lora_pairs(lora_sources, ctx["deadline"])
+
+    try:
+        profile.prepare(job_input, ctx)
+        # 不超过任务剩余的时间：prepare 之后 ComfyUI 仍未就绪时任务的截止时间先到
+        wait_for_http_connection(timeout=min(COMFYUI_WAIT_TIMEOUT, max(ctx["deadline"] - time.monotonic(), 0)))
+        try:
+            reap_orphaned_prompts()
+        except Exception as e:
+            logger.warning(f"⚠️ 清理遗留 prompt 失败: {e}")
+        try:
+            object_info = get_object_info()
+        except Exception as e:
+            logger.warning(f"无法获取 object_info: {e}")
+            object_info = {}
+        if lora_future is not None:
+            lora_results, lora_fetched = wait_for_lora_pairs(lora_future,
+                                                             timeout=max(ctx["deadline"] - time.monotonic(), 0))
+            # 新下载的 LoRA 不在缓存的 /object_info 的 LoRA 列表中，重新获取（名称验证和提交前的下拉值验证需要）
+            if lora_fetched:
+                invalidate_object_info()
+                object_info = get_object_info()
+            ctx["params"][profile.lora_param], lora_errors = resolve_lora_pairs(
+                ctx["params"][profile.lora_param], lora_results, object_info)
+            if lora_errors:
+                return {"error": f"LoRA 验证失败: {'; '.join(lora_errors)}"}
+        prompt = profile.build_prompt(job_input, ctx, object_info)
+        # 新下载的模型不在缓存的 /object_info 模型列表中，重新获取（提交前的下拉值验证需要）
+        if profile.provision_models and provision_prompt_models(prompt, deadline=ctx["deadline"]):
+            invalidate_object_info()
+            object_info = get_object_info()
+        # 按显卡的总显存和空闲内存选择量化、block swap、VAE tiling 和加载设备（见 memory_planner.py）
+        ctx["memory_plan"] = None
+        if memory_plan:
+            try:
+                ctx["memory_plan"] = plan_prompt_memory(prompt, object_info, get_system_stats(),
+                                                        job_shape(ctx["params"], ctx["bucket"]))
+            except Exception as e:
+                logger.warning(f"⚠️ 显存规划失败，使用工作流中的配置: {e}")
+    except Exception as e:
+        logger.error(f"准备工作流失败: {e}", exc_info=True)
+        return {"error": str(e)}
+
+    if profile.params:
+        # 分桶后按请求的形状计算哈希：同一个桶、不同请求尺寸的输出不同
+        hash_values = dict(ctx["params"], **ctx["bucket"]["requested"]) if ctx["bucket"] else ctx["params"]
+        ctx["job_hash"] = job_hash(hash_values, profile.params, ctx.get("input_files"),
+                                   os.path.basename(ctx.get("workflow_file") or ""))
+        logger.info(f"🔑 任务哈希: {ctx['job_hash']}")
+
+    # 命名输出（如 final / preview / pose-debug），未配置映射的工作流沿用自动选择
+    workflow_outputs = profile.get_outputs(ctx.get("workflow_file"))
+    output_node_ids = None
+    if workflow_outputs:
+        output_name = job_input.get("output", profile.default_output)
+        if output_name not in workflow_outputs:
+            return {"error": f"不支持的 output: {output_name}，可选: {', '.join(workflow_outputs)}"}
+        output_node_ids = [workflow_outputs[output_name]]
+        logger.info(f"🎯 输出: {output_name} -> 节点 {output_node_ids[0]}")
+    ctx["output_node_ids"] = output_node_ids
+
+    if profile.optimize_prompt:
+        prompt, output_node_ids, validation_errors = optimize_prompt(prompt, job_input, object_info, output_node_ids)
+        if validation_errors:
+            return {"error": f"工作流验证失败: {'; '.join(validation_errors[:5])}"}
+
+    # 相同任务（任务哈希、输出选项和显存规划选择的量化都相同）同时到达时只执行一次，见 singleflight.py
+    if not ctx.get("job_hash") or not job_input.get("singleflight", True):
+        return execute_prompt(job, profile, ctx, prompt)
+    key = flight_key(ctx["job_hash"], ctx["output_node_ids"], ctx["mp4_layout"], job_input.get("streaming_format"),
+                     bool(job_input.get("upload_to_r2", False)), prompt_quantization(prompt))
+    try:
+        result, shared = get_singleflight().do(key, lambda: execute_prompt(job, profile, ctx, prompt),
+                                               ctx["deadline"])
+    except SingleFlightTimeout as e:
+        return {"error": str(e)}
+    if shared:
+        logger.info(f"♻️ 共享相同任务的结果: {key[:12]}")
+        result = dict(result, coalesced=True)
+    return result
+
+
+def execute_prompt(job, profile, ctx, prompt):
+    """提交 prompt，等待执行完成并组装结果"""
+    job_input = job.get("input", {})
+    # 预览只是辅助信息，创建失败（缺少 runpod / R2 配置）时照常执行
+    try:
+        preview = create_preview_streamer(job, ctx["preview"], ctx["task_id"])
+    except Exception as e:
+        logger.warning(f"⚠️ 无法开启实时预览: {e}")
+        preview = None
+
+    # 使用 torch.compile 的工作流按形状恢复 / 保存编译缓存（见 compile_cache.py）
+    compile_cache = get_compile_cache() if uses_torch_compile(prompt) else None
+    compile_token = None
+    if compile_cache is not None:
+        try:
+            compile_token = compile_cache.begin(shape_key(ctx.get("workflow_file"),
+                                                          job_shape(ctx["params"], ctx["bucket"])))
+        except Exception as e:
+            logger.warning(f"⚠️ 无法恢复编译缓存: {e}")
+
+    # 启动时的模型预热还没完成时模型仍从网络卷加载，写入结果以便区分冷启动的耗时（见 stage.py）
+    stage = get_stage_progress()
+    model_stage = None
+    if stage and not stage["finished"]:
+        model_stage = {key: stage[key] for key in ("mode", "files", "files_done", "bytes_total", "bytes_done")}
+        logger.info(f"📀 模型预热未完成: {model_stage['files_done']}/{model_stage['files']} 个文件")
+
+    ws = connect_websocket()
+    try:
+        videos, execution_order, video_paths, _ = get_videos(ws, prompt, ctx["mp4_layout"], preview,
+                                                             ctx["deadline"])
+    except Exception as e:
+        logger.error(f"视频生成失败: {e}", exc_info=True)
+        return {"error": str(e)}
+    finally:
+        ws.close()
+    compile_status = compile_cache.finish(compile_token) if compile_token is not None else None
+
+    selected_node_id = profile.pick_output(videos, execution_order, prompt, ctx)
+    if selected_node_id is None or not videos.get(selected_node_id):
+        logger.error(f"未找到生成的视频，输出节点: {list(videos.keys())}")
+        return {"error": "未找到视频输出，请检查工作流配置和ComfyUI日志"}
+    logger.info(f"成功生成视频，输出节点: {selected_node_id}")
+    video_base64, video_file_paths = videos[selected_node_id][0], video_paths.get(selected_node_id)
+    if ctx["bucket"]:
+        video_base64 = restore_requested_shape(ctx["bucket"], video_base64, video_file_paths, ctx["mp4_layout"],
+                                               ctx["deadline"])
+    result = build_video_result(video_base64, video_file_paths, job_input, ctx["deadline"])
+    if ctx.get("job_hash"):
+        result["job_hash"] = ctx["job_hash"]
+    if ctx["bucket"]:
+        result["bucket"] = {key: ctx["bucket"][key] for key in ("requested", "generated", "hit", "warm")}
+        # 当前 worker 的命中率和形状复用率，用于调整 BUCKET_SIZES / BUCKET_LENGTHS
+        stats = get_bucket_stats()
+        result["bucket"]["worker"] = {key: stats[key] for key in ("jobs", "hits", "hit_rate", "warm_rate")}
+    if compile_status is not None:
+        result["compile_cache"] = compile_status
+    if ctx.get("memory_plan"):
+        result["memory_plan"] = ctx["memory_plan"]
+    if model_stage:
+        result["model_stage"] = model_stage
+    return result
+
+
+def restore_requested_shape(bucket, video_base64, video_file_paths, mp4_layout, deadline=None):
+    """把按桶的形状生成的视频裁剪回请求的宽高和帧数，返回新的 base64"""
+    requested, generated = bucket["requested"], bucket["generated"]
+    if requested == generated:
+        return video_base64
+    if not video_file_paths:
+        logger.warning(f"⚠️ 没有本地视频文件，无法裁剪回请求的形状，返回 {generated}")
+        return video_base64
+    width, height, *length = requested.values()
+    frames = length[0] if length and length != list(generated.values())[2:] else None
+    fit_video(video_file_paths[0], width, height, frames, mp4_layout, deadline)
+    with open(video_file_paths[0], 'rb') as f:
+        return base64.b64encode(f.read()).decode('utf-8')
+
+
+def install_signal_handlers():
+    """
+    收到 SIGTERM / SIGINT（任务被取消、worker 被回收）时先中断当前 prompt 并从队列移除，再按默认行为退出，
+    否则 ComfyUI 会在没有调用方的情况下继续占用 GPU
+    """
+    def on_signal(signum, frame):
+        logger.warning(f"⚠️ 收到信号 {signum}，中断当前 prompt 后退出")
+        cancel_active_prompt()
+        signal.signal(signum, signal.SIG_DFL)
+        os.kill(os.getpid(), signum)
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:
+            signal.signal(signum, on_signal)
+        except ValueError:
+            # 只能在主线程中注册
+            logger.debug(f"无法注册信号 {signum} 的处理函数")
+
+
+def make_handler(profile):
+    """返回 runpod.serverless.start 使用的 handler 函数"""
+    install_signal_handlers()
+
+    def handler(job):
+        return run_job(job, profile)
+    return handler
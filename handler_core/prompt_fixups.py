@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+转换后的 prompt 修正：补全输入、修正 UI 工作流中不能直接提交的值和连接
+
+只依赖工作流本身（和 worker 内基本不变的 object_info），在构建模板时执行一次（见 template.py）。
+各部署通过 WorkflowProfile.prompt_fixups 按名称选择需要的修正，按 PROMPT_FIXUPS 中的顺序执行：
+
+- normalize_inputs:     按 object_info 的控件顺序补全 inputs，下拉值 / 数值范围按节点定义校验（widgets.py）
+- model_load_device:    WanVideoModelLoader 的 offload_device 改为 main_device（避免 CUDA 错误）
+- vae_tiles:            WanVideoDecode / WanVideoEncode 的 tile 为 0 时设为默认值并关闭 tiling，否则满足最小值
+- missing_links:        指向不存在节点的连接：图像 / 姿态输入改连 LoadImage / 姿态检测节点，其余删除
+- video_combine_images: VHS_VideoCombine 的 images 连接到扩展嵌入节点的非 IMAGE 输出时改为 IMAGE 输出
+- image_size_inputs:    GetImageSizeAndCount 缺少 image 输入时连接到 LoadImage
+- scheduler_steps:      WanVideoScheduler 的 start_step / end_step 补全并保证 start_step < end_step
+- lora_merge:           WanVideoLoraSelect 未开启 low_mem_load 时不能 merge_loras
+"""
+
+import logging
+
+from .validate_workflow import is_link, get_output_types
+from .widgets import normalize_prompt_inputs
+from .workflow import find_node_by_class_type
+
+logger = logging.getLogger(__name__)
+
+# 缺失连接的替代节点: 输入名 -> class_type 模式
+MISSING_LINK_FALLBACKS = {"image": "LoadImage", "images": "LoadImage", "pose_images": "PoseDetection",
+                          "pose": "PoseDetection"}
+DEFAULT_TILE = 272
+DEFAULT_TILE_STRIDE = {"x": 144, "y": 128}
+MIN_TILE = 64
+MIN_TILE_STRIDE = 32
+DEFAULT_STEPS = 6
+
+
+def get_node_outputs(prompt, node_id, workflow_data=None, object_info=None):
+    """
+    节点的输出 [(名称小写, 类型), ...]：转换后的节点保留 UI 工作流的 outputs，
+    其次从原始工作流中查找，最后使用 object_info 的输出定义
+    """
+    outputs = prompt[node_id].get("outputs")
+    if not outputs and workflow_data:
+        original = next((node for node in workflow_data.get("nodes", []) if str(node.get("id")) == node_id), None)
+        outputs = original.get("outputs") if original else None
+    if outputs:
+        return [(str(output.get("name", "")).lower(), output.get("type", "")) for output in outputs
+                if isinstance(output, dict)]
+    class_type = prompt[node_id].get("class_type", "")
+    output_types = get_output_types(object_info or {}, class_type)
+    output_names = (object_info or {}).get(class_type, {}).get("output_name") or output_types
+    return [(str(name).lower(), output_type) for name, output_type in zip(output_names, output_types)]
+
+
+def fix_model_load_device(prompt):
+    for node_id, node in prompt.items():
+        inputs = node.get("inputs", {})
+        if "WanVideoModelLoader" in node.get("class_type", "") and inputs.get("load_device") == "offload_device":
+            inputs["load_device"] = "main_device"
+            logger.warning(f"节点 {node_id}: 将 load_device 从 'offload_device' 改为 'main_device' 以避免 CUDA 错误")
+
+
+def fix_vae_tiles(prompt):
+    for node_id, node in prompt.items():
+        class_type = node.get("class_type", "")
+        if "inputs" not in node or ("WanVideoDecode" not in class_type and "WanVideoEncode" not in class_type):
+            continue
+        inputs = node["inputs"]
+        for axis in ("x", "y"):
+            tile, stride = inputs.get(f"tile_{axis}", 0), inputs.get(f"tile_stride_{axis}", 0)
+            if not isinstance(tile, (int, float)) or not isinstance(stride, (int, float)):
+                continue
+            if tile == 0:
+                # 节点不接受 0，要禁用 tiling 应设置 enable_vae_tiling = False
+                inputs[f"tile_{axis}"], inputs[f"tile_stride_{axis}"] = DEFAULT_TILE, DEFAULT_TILE_STRIDE[axis]
+                inputs["enable_vae_tiling"] = False
+                logger.info(f"节点 {node_id}: tile_{axis} 为 0，设置为默认值 {DEFAULT_TILE}（tiling 已禁用）")
+            elif tile > 0:
+                tile, stride = max(tile, MIN_TILE), max(stride, MIN_TILE_STRIDE)
+                if stride >= tile:
+                    stride = max(MIN_TILE_STRIDE, tile - MIN_TILE_STRIDE)
+                    logger.warning(f"节点 {node_id}: 修正 tile_stride_{axis} 必须小于 tile_{axis}")
+                inputs[f"tile_{axis}"], inputs[f"tile_stride_{axis}"] = tile, stride
+
+
+def fix_missing_links(prompt):
+    """SetNode / GetNode 已在转换时解析，这里剩下的是工作流中被删除的节点"""
+    missing = 0
+    for node_id, node in prompt.items():
+        inputs = node.get("inputs", {})
+        for input_name, value in list(inputs.items()):
+            if not is_link(value) or str(value[0]) in prompt:
+                continue
+            missing += 1
+            if input_name not in MISSING_LINK_FALLBACKS:
+                logger.warning(f"节点 {node_id}: 移除指向不存在节点 {value[0]} 的连接 {input_name}")
+                del inputs[input_name]
+                continue
+            replacement = find_node_by_class_type(prompt, MISSING_LINK_FALLBACKS[input_name])
+            if replacement:
+                inputs[input_name] = [replacement, 0]
+                logger.warning(f"节点 {node_id}: 将输入 {input_name} 从不存在的节点 {value[0]} 改为 {replacement}")
+            else:
+                logger.warning(f"节点 {node_id}: 无法修复输入 {input_name}，引用的节点 {value[0]} 不存在且找不到替代节点")
+    if missing:
+        logger.warning(f"发现 {missing} 个缺失节点连接")
+
+
+def pick_image_output(outputs):
+    """优先 extended_images（名称包含 extend 的 IMAGE 输出），否则第一个 IMAGE 输出，没有时返回 None"""
+    image_indices = [index for index, (_, output_type) in enumerate(outputs) if output_type == "IMAGE"]
+    return next((index for index in image_indices if "extend" in outputs[index][0]),
+                image_indices[0] if image_indices else None)
+
+
+def fix_video_combine_images(prompt, workflow_data=None, object_info=None):
+    """
+    VHS_VideoCombine 的 images 连接到 WanVideoAddOneToAllExtendEmbeds 等扩展节点时使用其 IMAGE 输出
+    （extended_images），连接到 WANVIDIMAGE_EMBEDS 输出时改为源节点的 IMAGE 输出
+    """
+    fixed = 0
+    for node_id, node in prompt.items():
+        if "VHS_VideoCombine" not in node.get("class_type", ""):
+            continue
+        images = node.get("inputs", {}).get("images")
+        if not is_link(images) or str(images[0]) not in prompt:
+            continue
+        source_id, output_index = str(images[0]), images[1]
+        source_class = prompt[source_id].get("class_type", "")
+        outputs = get_node_outputs(prompt, source_id, workflow_data, object_info)
+        output_type = outputs[output_index][1] if output_index < len(outputs) else None
+        if "ExtendEmbeds" not in source_class and output_type != "WANVIDIMAGE_EMBEDS":
+            continue
+        image_index = pick_image_output(outputs)
+        if image_index is None:
+            logger.warning(f"⚠️ 节点 {node_id} (VHS_VideoCombine): 源节点 {source_id} ({source_class}) 没有 IMAGE 输出")
+        elif image_index != output_index:
+            node["inputs"]["images"] = [images[0], image_index]
+            fixed += 1
+            logger.info(f"节点 {node_id} (VHS_VideoCombine): 修正 images 输入从节点 {source_id} 的输出索引 "
+                        f"{output_index} ({output_type or 'unknown'}) -> {image_index} (IMAGE)")
+    if fixed:
+        logger.info(f"修复了 {fixed} 个 VHS_VideoCombine 节点的类型不匹配问题")
+
+
+def fix_image_size_inputs(prompt):
+    for node_id, node in prompt.items():
+        if "GetImageSizeAndCount" not in node.get("class_type", "") or "image" in node.get("inputs", {}):
+            continue
+        image_node_id = find_node_by_class_type(prompt, "LoadImage")
+        if image_node_id:
+            node.setdefault("inputs", {})["image"] = [image_node_id, 0]
+            logger.info(f"节点 {node_id} (GetImageSizeAndCount): 连接到图像节点 {image_node_id}")
+        else:
+            logger.warning(f"节点 {node_id} (GetImageSizeAndCount): 缺少 image 输入且找不到 LoadImage 节点")
+
+
+def fix_scheduler_steps(prompt):
+    for node_id, node in prompt.items():
+        if "WanVideoScheduler" not in node.get("class_type", ""):
+            continue
+        inputs = node.setdefault("inputs", {})
+        steps = inputs.get("steps", DEFAULT_STEPS)
+        start_step, end_step = inputs.get("start_step"), inputs.get("end_step")
+        if start_step is None or end_step is None:
+            if "start_step" not in inputs or "end_step" not in inputs:
+                inputs.setdefault("start_step", 0)
+                inputs.setdefault("end_step", steps)
+                logger.info(f"节点 {node_id} (WanVideoScheduler): 设置默认 start_step=0, end_step={inputs['end_step']}")
+            continue
+        # end_step 为 0 通常表示到最后一步
+        if end_step == 0:
+            inputs["end_step"] = end_step = steps
+        if isinstance(start_step, (int, float)) and isinstance(end_step, (int, float)) and start_step >= end_step:
+            inputs["end_step"] = steps
+            if start_step >= steps:
+                inputs["start_step"] = 0
+            logger.warning(f"节点 {node_id} (WanVideoScheduler): start_step ({start_step}) >= end_step ({end_step})，"
+                           f"改为 {inputs['start_step']}-{steps}")
+
+
+def fix_lora_merge(prompt):
+    """避免 "Set LoRA node does not use low_mem_load and can't merge LoRAs" 错误"""
+    for node_id, node in prompt.items():
+        if "WanVideoLoraSelect" not in node.get("class_type", ""):
+            continue
+        inputs = node.setdefault("inputs", {})
+        if not inputs.get("low_mem_load", False):
+            if inputs.get("merge_loras") is True:
+                logger.warning(f"节点 {node_id} (WanVideoLoraSelect): low_mem_load 为 false，禁用 merge_loras")
+            inputs["merge_loras"] = False
+        else:
+            inputs.setdefault("merge_loras", False)
+
+
+# 名称 -> 修正函数 (prompt, workflow_data, object_info)，按此顺序执行
+PROMPT_FIXUPS = {
+    "normalize_inputs": lambda prompt, workflow_data, object_info: normalize_prompt_inputs(prompt, object_info),
+    "model_load_device": lambda prompt, *_: fix_model_load_device(prompt),
+    "vae_tiles": lambda prompt, *_: fix_vae_tiles(prompt),
+    "missing_links": lambda prompt, *_: fix_missing_links(prompt),
+    "video_combine_images": fix_video_combine_images,
+    "image_size_inputs": lambda prompt, *_: fix_image_size_inputs(prompt),
+    "scheduler_steps": lambda prompt, *_: fix_scheduler_steps(prompt),
+    "lora_merge": lambda prompt, *_: fix_lora_merge(prompt),
+}
+
+
+def fix_prompt_inputs(prompt, workflow_data=None, object_info=None, fixups=tuple(PROMPT_FIXUPS)):
+    """按 PROMPT_FIXUPS 的顺序原地执行 fixups 中选择的修正（构建模板时调用，prompt 是普通 dict）"""
+    unknown = set(fixups) - set(PROMPT_FIXUPS)
+    if unknown:
+        raise ValueError(f"未知的 prompt 修正: {sorted(unknown)}，可选: {list(PROMPT_FIXUPS)}")
+    for name, fixup in PROMPT_FIXUPS.items():
+        if name in fixups:
+            fixup(prompt, workflow_data, object_info or {})
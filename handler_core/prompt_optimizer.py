@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+API prompt 优化：提交前裁剪无用节点
+
+- 去掉禁用节点：mode 2（Mute/Never）直接删除；mode 4（Bypass）删除并把下游连接改接到它的同类型输入
+- 只保留从输出节点反向可达的节点，预览节点和未被请求的 VHS_VideoCombine 不再执行
+"""
+
+from .validate_workflow import is_link, is_output_node, get_output_types
+
+MODE_MUTED = 2
+MODE_BYPASS = 4
+
+
+def get_linked_input_types(node, object_info):
+    """返回 bypass 节点的连接输入 [(输入名, 连接, 类型或 None), ...]，按 inputs 顺序"""
+    input_spec = object_info.get(node.get("class_type", ""), {}).get("input", {})
+    linked = []
+    for input_name, value in node.get("inputs", {}).items():
+        if not is_link(value):
+            continue
+        input_type = None
+        for section in ("required", "optional"):
+            spec = input_spec.get(section, {}).get(input_name)
+            if spec and isinstance(spec[0], str):
+                input_type = spec[0]
+                break
+        linked.append((input_name, value, input_type))
+    return linked
+
+
+def resolve_bypass(prompt, node_id, output_index, object_info, visited=None):
+    """
+    解析 bypass 节点某个输出对应的上游连接（与 ComfyUI 前端一致：优先同类型输入，其次同序号输入）
+    返回新的连接 [源节点, 输出索引]，无法解析时返回 None
+    """
+    visited = visited or set()
+    if node_id in visited:
+        return None
+    visited.add(node_id)
+
+    node = prompt[node_id]
+    linked = get_linked_input_types(node, object_info)
+    output_types = get_output_types(object_info, node.get("class_type", ""))
+    output_type = output_types[output_index] if output_index < len(output_types) else None
+
+    link = None
+    if isinstance(output_type, str):
+        link = next((value for _, value, input_type in linked if input_type == output_type), None)
+    if link is None and output_index < len(linked):
+        link = linked[output_index][1]
+    if link is None:
+        return None
+
+    source_id = str(link[0])
+    if source_id in prompt and prompt[source_id].get("mode") == MODE_BYPASS:
+        return resolve_bypass(prompt, source_id, link[1], object_info, visited)
+    return [source_id, link[1]]
+
+
+def remove_disabled_nodes(prompt, object_info=None):
+    """
+    删除 mode 2/4 的节点，返回 (新 prompt, 删除的节点 ID 列表)
+    指向被删除节点的输入：bypass 节点改接到上游，mute 节点直接移除该输入
+    """
+    object_info = object_info or {}
+    disabled = {node_id for node_id, node in prompt.items() if node.get("mode") in (MODE_MUTED, MODE_BYPASS)}
+    if not disabled:
+        return prompt, []
+
+    result = {}
+    for node_id, node in prompt.items():
+        if node_id in disabled:
+            continue
+        inputs = node.get("inputs", {})
+        new_inputs = {}
+        changed = False
+        for input_name, value in inputs.items():
+            if is_link(value) and str(value[0]) in disabled:
+                changed = True
+                source_id = str(value[0])
+                if prompt[source_id].get("mode") == MODE_BYPASS:
+                    rewired = resolve_bypass(prompt, source_id, value[1], object_info)
+                    if rewired and rewired[0] not in disabled:
+                        new_inputs[input_name] = rewired
+                continue
+            new_inputs[input_name] = value
+        result[node_id] = dict(node, inputs=new_inputs) if changed else node
+    return result, sorted(disabled, key=str)
+
+
+def collect_required_nodes(prompt, output_node_ids):
+    """从输出节点沿 inputs 反向遍历，返回所有需要执行的节点"""
+    required = set()
+    stack = [str(node_id) for node_id in output_node_ids if str(node_id) in prompt]
+    while stack:
+        node_id = stack.pop()
+        if node_id in required:
+            continue
+        required.add(node_id)
+        for value in prompt[node_id].get("inputs", {}).values():
+            if is_link(value) and str(value[0]) in prompt:
+                stack.append(str(value[0]))
+    return required
+
+
+def prune_prompt(prompt, output_node_ids=None, object_info=None):
+    """
+    裁剪 prompt：去掉禁用节点后只保留输出节点反向可达的节点
+
+    参数:
+        prompt: API 格式 prompt（不会被修改）
+        output_node_ids: 需要执行的输出节点，None 表示保留所有启用的输出节点
+        object_info: ComfyUI /object_info，用于识别输出节点和 bypass 改接时的类型匹配
+
+    返回:
+        (裁剪后的 prompt, 被删除的节点 ID 列表)
+    """
+    object_info = object_info or {}
+    active, removed = remove_disabled_nodes(prompt, object_info)
+
+    if output_node_ids is None:
+        output_node_ids = [node_id for node_id, node in active.items()
+                           if is_output_node(object_info, node.get("class_type", ""))]
+    required = collect_required_nodes(active, output_node_ids)
+
+    pruned = {node_id: node for node_id, node in active.items() if node_id in required}
+    removed = removed + sorted((node_id for node_id in active if node_id not in required), key=str)
+    return pruned, removed
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+按需下载模型到网络卷缓存：并行分段下载、断点续传、sha256 校验、原子放置、按磁盘预算 LRU 淘汰
+
+流程（provision_prompt_models，run_job 在提交前调用）:
+1. 从 prompt 中找出引用的模型文件，按 model_manifest.MODEL_MANIFEST 查找下载来源
+   （模板规范化不替换不在 /object_info 中的下拉值，所以这里看到的是工作流 / 参数中原本的模型名）
+2. 镜像中已有（/ComfyUI/models）或网络卷中已有的文件直接使用
+3. 缺少的文件从 HF 兼容镜像（HF_ENDPOINT）下载到 <MODEL_CACHE_DIR>/<folder>/<file>：
+   - 按 CHUNK_SIZE 分段，DOWNLOAD_CONNECTIONS 个连接并行 Range 请求，pwrite 写入预分配的 .part 文件
+   - 已完成的分段记录在 .part.json 中，进程重启后只下载剩余分段
+   - 校验 sha256（清单中的值或镜像返回的 X-Linked-Etag），通过后 os.replace 到最终路径
+4. 下载受任务截止时间限制，超时后保留 .part 和进度（下一个任务续传）并抛出 ProvisionTimeout
+5. 下载前按 MODEL_CACHE_BUDGET_GB（0 表示不限制）和磁盘剩余空间，淘汰最久未使用的已下载模型；
+   当前任务需要的模型不会被淘汰，只淘汰本模块下载的文件（索引 .provision_index.json）
+   索引由 touch / evict 整体重写，在 .provision_index.json.lock 上加锁，避免并发任务互相覆盖记录
+
+预先填充网络卷:
+    python -m handler_core.provision --all
+    python -m handler_core.provision Wan2_1_VAE_bf16.safetensors umt5-xxl-enc-bf16.safetensors
+"""
+
+import os
+import re
+import sys
+import time
+import fcntl
+import shutil
+import hashlib
+import logging
+import argparse
+import threading
+import contextlib
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from . import fastjson
+from .model_manifest import MODEL_MANIFEST
+from .workflow_compiler import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", "/workspace/models")
+COMFYUI_MODELS_DIR = "/ComfyUI/models"
+# extra_model_paths.yaml 中旧的目录布局（直接放在根目录下的模型）
+LEGACY_MODEL_DIRS = {"diffusion_models": ["/workspace/models"], "loras": ["/workspace/loras"]}
+HF_ENDPOINT = os.getenv("HF_ENDPOINT", "https://huggingface.co")
+MODEL_CACHE_BUDGET = float(os.getenv("MODEL_CACHE_BUDGET_GB", "0")) * 1024 ** 3
+DOWNLOAD_CONNECTIONS = int(os.getenv("DOWNLOAD_CONNECTIONS", "8"))
+CHUNK_SIZE = 64 * 1024 * 1024
+DOWNLOAD_RETRIES = 3
+INDEX_FILE = ".provision_index.json"
+MODEL_EXTENSIONS = (".safetensors", ".ckpt", ".pt", ".pth", ".bin", ".gguf", ".onnx", ".sft")
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class ProvisionTimeout(Exception):
+    """下载超过任务截止时间"""
+
+
+def check_deadline(deadline, name):
+    if deadline is not None and time.monotonic() > deadline:
+        raise ProvisionTimeout(f"下载 {name} 超过任务截止时间，已下载的部分保留用于续传")
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """不自动跳转，逐跳读取响应头（HF 的 X-Linked-Etag / X-Linked-Size 只在第一跳返回）"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def model_url(spec, endpoint=HF_ENDPOINT):
+    """清单项在 HF 兼容镜像上的下载地址（或清单项直接给出的 url）"""
+    if spec.get("url"):
+        return spec["url"]
+    path = urllib.parse.quote(spec["path"])
+    return f"{endpoint.rstrip('/')}/{spec['repo']}/resolve/{spec.get('revision', 'main')}/{path}"
+
+
+def auth_headers(url, endpoint=HF_ENDPOINT):
+    """只向镜像本身发送 HF_TOKEN，跳转后的 CDN 预签名地址不能带 Authorization"""
+    token = os.getenv("HF_TOKEN")
+    if token and urllib.parse.urlsplit(url).netloc == urllib.parse.urlsplit(endpoint).netloc:
+        return {"Authorization": f"Bearer {token}"}
+    return {}
+
+
+def probe_url(url, endpoint=HF_ENDPOINT, max_redirects=5):
+    """
+    HEAD 请求（逐跳跟随重定向），返回 {"url": 最终地址, "size", "sha256", "ranges": 是否支持 Range}
+    """
+    opener = urllib.request.build_opener(_NoRedirect)
+    info = {"url": url, "size": None, "sha256": None, "ranges": False}
+    for _ in range(max_redirects + 1):
+        request = urllib.request.Request(info["url"], method="HEAD", headers=auth_headers(info["url"], endpoint))
+        try:
+            response = opener.open(request, timeout=30)
+            headers = response.headers
+            response.close()
+            redirect = None
+        except urllib.error.HTTPError as e:
+            if e.code not in (301, 302, 303, 307, 308):
+                raise
+            headers = e.headers
+            redirect = urllib.parse.urljoin(info["url"], headers.get("Location", ""))
+
+        linked_etag = (headers.get("X-Linked-Etag") or "").strip('"')
+        if info["sha256"] is None and SHA256_PATTERN.match(linked_etag):
+            info["sha256"] = linked_etag
+        if info["size"] is None and headers.get("X-Linked-Size"):
+            info["size"] = int(headers["X-Linked-Size"])
+        if redirect is None:
+            if headers.get("Content-Length"):
+                info["size"] = int(headers["Content-Length"])
+            info["ranges"] = headers.get("Accept-Ranges", "").lower() == "bytes"
+            return info
+        info["url"] = redirect
+    raise Exception(f"重定向次数过多: {url}")
+
+
+def fetch_range(url, fd, start, end, endpoint=HF_ENDPOINT, retries=DOWNLOAD_RETRIES, deadline=None):
+    """下载 [start, end] 字节并写入文件的对应位置，失败时重试；超过 deadline 时抛出 ProvisionTimeout"""
+    for attempt in range(retries):
+        check_deadline(deadline, f"分段 {start}-{end}")
+        try:
+            headers = dict(auth_headers(url, endpoint), Range=f"bytes={start}-{end}")
+            with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=60) as response:
+                if response.status != 206:
+                    raise Exception(f"服务器不支持 Range 请求 (HTTP {response.status})")
+                offset = start
+                while True:
+                    check_deadline(deadline, f"分段 {start}-{end}")
+                    block = response.read(1024 * 1024)
+                    if not block:
+                        break
+                    os.pwrite(fd, block, offset)
+                    offset += len(block)
+            if offset != end + 1:
+                raise Exception(f"分段长度不完整: {offset - start}/{end - start + 1} 字节")
+            return start
+        except ProvisionTimeout:
+            raise
+        except Exception as e:
+            if attempt == retries - 1:
+                raise
+            logger.warning(f"⚠️ 分段 {start}-{end} 下载失败，重试 ({attempt + 1}/{retries}): {e}")
+            time.sleep(2 ** attempt)
+
+
+def fetch_stream(url, part_path, endpoint=HF_ENDPOINT, deadline=None):
+    """不支持 Range 时单连接下载整个文件（不能续传）"""
+    with urllib.request.urlopen(urllib.request.Request(url, headers=auth_headers(url, endpoint)),
+                                timeout=60) as response, open(part_path, 'wb') as f:
+        for block in iter(lambda: response.read(8 * 1024 * 1024), b""):
+            check_deadline(deadline, os.path.basename(part_path))
+            f.write(block)
+
+
+def file_sha256(path, chunk_size=8 * 1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def download_file(url, dest, info=None, sha256=None, connections=DOWNLOAD_CONNECTIONS, chunk_size=CHUNK_SIZE,
+                  endpoint=HF_ENDPOINT, deadline=None):
+    """
+    并行分段下载到 dest：先写 dest.part，校验通过后原子替换，失败时保留 .part 和进度以便续传
+    sha256 校验失败时删除 .part 并抛出异常；超过 deadline（time.monotonic()）时抛出 ProvisionTimeout；
+    返回文件的 sha256
+    """
+    info = info or probe_url(url, endpoint)
+    expected_sha256 = sha256 or info["sha256"]
+    size = info["size"]
+    part_path = f"{dest}.part"
+    state_path = f"{dest}.part.json"
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+
+    if not size or not info["ranges"]:
+        logger.info(f"⬇️ 单连接下载 {os.path.basename(dest)}（镜像不支持 Range）")
+        fetch_stream(info["url"], part_path, endpoint, deadline)
+    else:
+        # 续传：只有文件大小和 sha256 一致时才复用已完成的分段
+        state = {"size": size, "sha256": expected_sha256, "chunk_size": chunk_size, "done": []}
+        if os.path.exists(state_path) and os.path.exists(part_path):
+            try:
+                saved = fastjson.load_file(state_path)
+                if all(saved.get(key) == state[key] for key in ("size", "sha256", "chunk_size")):
+                    state = saved
+            except (OSError, ValueError):
+                pass
+        done = set(state["done"])
+        chunks = [(start, min(start + chunk_size, size) - 1) for start in range(0, size, chunk_size)
+                  if start not in done]
+        if done:
+            logger.info(f"⏯️ 续传 {os.path.basename(dest)}: 已完成 {len(done)} 段，剩余 {len(chunks)} 段")
+        logger.info(f"⬇️ 下载 {os.path.basename(dest)}: {size / 1024 ** 2:.0f} MB, {len(chunks)} 段, "
+                    f"{connections} 个连接")
+
+        fd = os.open(part_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            with ThreadPoolExecutor(max_workers=max(1, connections), thread_name_prefix="download") as executor:
+                futures = [executor.submit(fetch_range, info["url"], fd, start, end, endpoint, DOWNLOAD_RETRIES,
+                                           deadline)
+                           for start, end in chunks]
+                try:
+                    for future in as_completed(futures):
+                        state["done"].append(future.result())
+                        write_json_atomic(state_path, state)
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    actual_sha256 = file_sha256(part_path)
+    if expected_sha256 and actual_sha256 != expected_sha256:
+        for path in (part_path, state_path):
+            if os.path.exists(path):
+                os.remove(path)
+        raise Exception(f"sha256 校验失败: {os.path.basename(dest)} (期望 {expected_sha256}, 实际 {actual_sha256})")
+    os.replace(part_path, dest)
+    if os.path.exists(state_path):
+        os.remove(state_path)
+    return actual_sha256
+
+
+class ModelCache:
+    """
+    网络卷上的模型缓存：<root>/<folder>/<file>，索引记录本模块下载的文件大小和最近使用时间
+    """
+
+    def __init__(self, root=MODEL_CACHE_DIR, budget=MODEL_CACHE_BUDGET, endpoint=HF_ENDPOINT,
+                 connections=DOWNLOAD_CONNECTIONS, chunk_size=CHUNK_SIZE, search_dirs=None, max_size=0):
+        self.root = root
+        self.budget = budget
+        # 单个文件的大小上限（0 表示不限制），用于用户提供的下载地址
+        self.max_size = max_size
+        self.endpoint = endpoint
+        self.connections = connections
+        self.chunk_size = chunk_size
+        # 查找已有模型的目录（镜像中内置的模型优先）
+        self.search_dirs = search_dirs if search_dirs is not None else [COMFYUI_MODELS_DIR]
+        self.index_path = os.path.join(root, INDEX_FILE)
+        self._lock = threading.Lock()
+        # touch / evict 会重写整个索引，不能用下载期间一直持有的 _lock
+        self._index_lock = threading.Lock()
+
+    def model_path(self, spec):
+        return os.path.join(self.root, spec["folder"], spec["file"])
+
+    def find(self, spec):
+        """已存在的模型文件路径，没有时返回 None"""
+        candidates = [os.path.join(directory, spec["folder"], spec["file"]) for directory in self.search_dirs]
+        candidates.append(self.model_path(spec))
+        if self.root == MODEL_CACHE_DIR:
+            candidates += [os.path.join(directory, spec["file"])
+                           for directory in LEGACY_MODEL_DIRS.get(spec["folder"], [])]
+        return next((path for path in candidates if os.path.isfile(path)), None)
+
+    def load_index(self):
+        try:
+            return fastjson.load_file(self.index_path)
+        except (OSError, ValueError):
+            return {}
+
+    @contextlib.contextmanager
+    def index_lock(self):
+        """索引的读取-修改-写入在进程内的线程和同一网络卷上的其他 worker 之间互斥"""
+        with self._index_lock:
+            os.makedirs(self.root, exist_ok=True)
+            with open(f"{self.index_path}.lock", 'w') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                except OSError as e:
+                    # 部分网络文件系统不支持 flock，退化为只在进程内互斥
+                    logger.debug(f"无法锁定 {lock_file.name}: {e}")
+                yield
+
+    def touch(self, spec, size=None, sha256=None):
+        """更新模型的最近使用时间（只记录缓存目录中的文件）"""
+        relpath = os.path.join(spec["folder"], spec["file"])
+        # 镜像中内置的模型不在索引中，不需要加锁
+        if size is None and relpath not in self.load_index():
+            return
+        with self.index_lock():
+            index = self.load_index()
+            entry = index.get(relpath)
+            if entry is None and size is None:
+                return
+            entry = entry or {}
+            entry["last_used"] = time.time()
+            if size is not None:
+                entry.update(size=size, sha256=sha256)
+            index[relpath] = entry
+            write_json_atomic(self.index_path, index)
+
+    def evict(self, needed, pinned=()):
+        """
+        淘汰最久未使用的模型，直到缓存总大小 + needed 不超过预算且磁盘剩余空间足够
+        pinned（相对路径）不淘汰；空间不足时抛出异常
+        """
+        with self.index_lock():
+            index = self.load_index()
+            pinned = set(pinned)
+
+            def over_budget():
+                total = sum(entry.get("size", 0) for entry in index.values())
+                if self.budget and total + needed > self.budget:
+                    return True
+                return shutil.disk_usage(self.root).free < needed
+
+            candidates = sorted((entry.get("last_used", 0), relpath) for relpath, entry in index.items()
+                                if relpath not in pinned)
+            evicted = []
+            while over_budget():
+                if not candidates:
+                    raise Exception(f"模型缓存空间不足: 需要 {needed / 1024 ** 3:.1f} GB，"
+                                    f"预算 {self.budget / 1024 ** 3:.1f} GB")
+                _, relpath = candidates.pop(0)
+                path = os.path.join(self.root, relpath)
+                if os.path.exists(path):
+                    os.remove(path)
+                index.pop(relpath, None)
+                evicted.append(relpath)
+                logger.info(f"🗑️ 淘汰模型缓存: {relpath}")
+            if evicted:
+                write_json_atomic(self.index_path, index)
+            return evicted
+
+    def lock(self, lock_file, deadline=None, poll_interval=1.0):
+        """等待文件锁（同一网络卷上的其他 worker 正在下载同一文件），超过 deadline 时抛出 ProvisionTimeout"""
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                check_deadline(deadline, os.path.basename(lock_file.name)[:-len(".lock")])
+                time.sleep(poll_interval)
+            except OSError as e:
+                # 部分网络文件系统不支持 flock，退化为只在进程内互斥
+                logger.debug(f"无法锁定 {lock_file.name}: {e}")
+                return
+
+    def ensure(self, spec, pinned=(), deadline=None):
+        """
+        返回 (模型文件路径, 是否新下载)，不存在时下载
+        pinned 为当前任务需要的模型（相对路径），腾出空间时不淘汰；deadline 为任务截止时间（time.monotonic()）
+        """
+        path = self.find(spec)
+        if path is not None:
+            self.touch(spec)
+            return path, False
+
+        with self._lock:
+            dest = self.model_path(spec)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            # 同一网络卷上的其他 worker 正在下载同一文件时等待它完成
+            with open(f"{dest}.lock", 'w') as lock_file:
+                self.lock(lock_file, deadline)
+                if os.path.isfile(dest):
+                    self.touch(spec)
+                    return dest, False
+                url = model_url(spec, self.endpoint)
+                info = probe_url(url, self.endpoint)
+                if self.max_size and info["size"] and info["size"] > self.max_size:
+                    raise Exception(f"文件过大: {spec['file']} ({info['size'] / 1024 ** 3:.1f} GB，"
+                                    f"上限 {self.max_size / 1024 ** 3:.1f} GB)")
+                if info["size"]:
+                    part_path = f"{dest}.part"
+                    partial = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+                    self.evict(max(0, info["size"] - partial),
+                               pinned=set(pinned) | {os.path.join(spec["folder"], spec["file"])})
+                start = time.monotonic()
+                sha256 = download_file(url, dest, info, spec.get("sha256"), self.connections, self.chunk_size,
+                                       self.endpoint, deadline)
+                elapsed = time.monotonic() - start
+                size = os.path.getsize(dest)
+                logger.info(f"✅ 已下载 {spec['file']}: {size / 1024 ** 2:.0f} MB, {elapsed:.1f}s "
+                            f"({size / 1024 ** 2 / max(elapsed, 1e-6):.0f} MB/s)")
+                self.touch(spec, size, sha256)
+            return dest, True
+
+
+def find_manifest_spec(name, manifest=MODEL_MANIFEST):
+    """模型名对应的清单项（按完整相对路径匹配，其次按文件名），不是模型文件或清单中没有时返回 None"""
+    if not isinstance(name, str) or not name.lower().endswith(MODEL_EXTENSIONS):
+        return None
+    normalized = name.replace("\\", "/")
+    basename = normalized.rsplit("/", 1)[-1]
+    return (next((spec for spec in manifest if spec["file"] == normalized), None) or
+            next((spec for spec in manifest if os.path.basename(spec["file"]) == basename), None))
+
+
+def resolve_prompt_models(prompt, manifest=MODEL_MANIFEST):
+    """prompt 中引用的、清单中有下载来源的模型"""
+    specs = {}
+    for node in prompt.values():
+        for value in node.get("inputs", {}).values():
+            spec = find_manifest_spec(value, manifest)
+            if spec is not None:
+                specs[spec["file"]] = spec
+    return list(specs.values())
+
+
+_default_cache = None
+
+
+def get_model_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ModelCache()
+    return _default_cache
+
+
+def provision_prompt_models(prompt, manifest=MODEL_MANIFEST, cache=None, deadline=None):
+    """下载 prompt 需要但本地缺少的模型（不超过任务截止时间 deadline），返回新下载的文件路径列表"""
+    cache = cache or get_model_cache()
+    specs = resolve_prompt_models(prompt, manifest)
+    pinned = {os.path.join(spec["folder"], spec["file"]) for spec in specs}
+    downloaded = []
+    for spec in specs:
+        path, fetched = cache.ensure(spec, pinned, deadline)
+        if fetched:
+            downloaded.append(path)
+    return downloaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按清单下载模型到网络卷缓存")
+    parser.add_argument("files", nargs="*", help="清单中的模型文件（file 或文件名）")
+    parser.add_argument("--all", action="store_true", help="下载清单中的所有模型")
+    parser.add_argument("--root", default=MODEL_CACHE_DIR, help=f"缓存目录（默认: {MODEL_CACHE_DIR}）")
+    parser.add_argument("--connections", "-x", type=int, default=DOWNLOAD_CONNECTIONS, help="每个文件的并行连接数")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.all:
+        specs = list(MODEL_MANIFEST)
+    else:
+        wanted = set(args.files)
+        specs = [spec for spec in MODEL_MANIFEST if spec["file"] in wanted or os.path.basename(spec["file"]) in wanted]
+        missing = wanted - {spec["file"] for spec in specs} - {os.path.basename(spec["file"]) for spec in specs}
+        if missing or not specs:
+            parser.error(f"清单中没有这些模型: {', '.join(sorted(missing)) or '（未指定）'}")
+
+    cache = ModelCache(root=args.root, connections=args.connections)
+    failed = 0
+    for spec in specs:
+        try:
+            path, fetched = cache.ensure(spec)
+            print(f"{'⬇️ ' if fetched else '✅'} {spec['file']} -> {path}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {spec['file']}: {e}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
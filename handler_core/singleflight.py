@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+相同任务合并执行（singleflight）：同一时间到达的相同任务只执行一次，其余任务共享结果
+
+键为规范化任务哈希（binding.job_hash）加上影响结果的选项（输出节点、MP4 布局、上传/切片），见 flight_key()。
+
+- 同一进程:   第一个任务成为 leader，其余任务等待 leader 完成
+- 多个 worker: 通过共享网络卷上的锁文件协调（SINGLEFLIGHT_DIR）:
+    <key>.lock    leader 用 O_CREAT | O_EXCL 创建，执行期间定期更新 mtime（心跳）
+    <key>.wait-*  其他 worker 上等待的 follower 登记，等待结束时删除
+    <key>.json    leader 成功且有 follower 登记时原子写入结果，保留 SINGLEFLIGHT_TTL 秒，稍后到达的重试也直接使用；
+                  结果包含 base64 视频（几十 MB），没有 follower 时不写入网络卷
+  follower 轮询结果文件；锁文件消失（leader 失败）或心跳超时（leader 所在 worker 被回收）时重新竞争 leader
+- 只共享成功的结果：leader 失败、超时或被取消时，等待中的任务重新执行，不会把一次失败扩散给所有重试
+
+网络卷不可用时只在进程内合并。锁文件是尽力而为的协调，极端情况下（心跳超时的判断竞争）可能重复执行，但不会返回错误的结果。
+"""
+
+import os
+import json
+import time
+import socket
+import hashlib
+import logging
+import threading
+
+from . import fastjson
+from .workflow_compiler import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+SINGLEFLIGHT_DIR = os.getenv("SINGLEFLIGHT_DIR", "/workspace/.singleflight")
+SINGLEFLIGHT_TTL = float(os.getenv("SINGLEFLIGHT_TTL", "600"))
+POLL_INTERVAL = 0.5
+STALE_AFTER = 60
+PRUNE_INTERVAL = 60
+
+
+class SingleFlightTimeout(Exception):
+    """等待相同任务的结果时超过了截止时间"""
+
+
+def is_success(result):
+    return isinstance(result, dict) and "error" not in result
+
+
+def flight_key(job_hash, *options):
+    """任务哈希加上影响结果的选项（与 job_hash 一样使用标准库 json，保证跨版本稳定）"""
+    canonical = json.dumps([job_hash, *options], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.shared = False
+
+
+class SingleFlight:
+    """do(key, func) 在进程内和跨 worker 合并相同 key 的执行"""
+
+    def __init__(self, directory=SINGLEFLIGHT_DIR, ttl=SINGLEFLIGHT_TTL, poll_interval=POLL_INTERVAL,
+                 stale_after=STALE_AFTER, clock=time.time, sleep=time.sleep):
+        self.directory = directory
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.clock = clock
+        self.sleep = sleep
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._last_prune = 0
+
+    def do(self, key, func, deadline=None):
+        """
+        执行 func()，相同 key 的任务正在执行时等待它的结果
+        参数:
+            deadline: time.monotonic() 截止时间，等待超过时抛出 SingleFlightTimeout
+        返回:
+            (结果, 是否共享了其他任务的结果)
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+            if leader:
+                try:
+                    call.result, call.shared = self._do_shared(key, func, deadline)
+                    return call.result, call.shared
+                finally:
+                    with self._lock:
+                        del self._calls[key]
+                    call.done.set()
+
+            logger.info(f"⏳ 相同任务正在本 worker 上执行，等待结果: {key[:12]}")
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            if not call.done.wait(timeout):
+                raise SingleFlightTimeout("等待相同任务的结果超时")
+            if is_success(call.result):
+                return call.result, True
+            # leader 失败：重新竞争
+
+    def _do_shared(self, key, func, deadline):
+        if not self.directory:
+            return func(), False
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"⚠️ 无法使用 {self.directory} 跨 worker 合并任务: {e}")
+            return func(), False
+        self.prune()
+
+        lock_path = os.path.join(self.directory, f"{key}.lock")
+        result_path = os.path.join(self.directory, f"{key}.json")
+        waiter_path = os.path.join(self.directory,
+                                   f"{key}.wait-{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}")
+        waiting = False
+        try:
+            while True:
+                result = self.read_result(result_path)
+                if result is not None:
+                    return result, True
+                if self.acquire(lock_path):
+                    try:
+                        # 获得锁之前上一个 leader 可能刚写完结果
+                        result = self.read_result(result_path)
+                        if result is not None:
+                            return result, True
+                        result = self.run_leader(lock_path, func)
+                        if is_success(result) and self.has_waiters(key, exclude=waiter_path):
+                            write_json_atomic(result_path, {"time": self.clock(), "result": result})
+                        return result, False
+                    finally:
+                        self.release(lock_path)
+
+                if not waiting:
+                    logger.info(f"⏳ 相同任务正在其他 worker 上执行，等待结果: {key[:12]}")
+                    self.acquire(waiter_path)
+                    waiting = True
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise SingleFlightTimeout("等待相同任务的结果超时")
+                self.sleep(self.poll_interval)
+                self.break_stale(lock_path)
+        finally:
+            if waiting:
+                self.release(waiter_path)
+
+    def has_waiters(self, key, exclude=None):
+        """其他 worker 上是否有 follower 在等待 key 的结果"""
+        prefix = f"{key}.wait-"
+        try:
+            return any(name.startswith(prefix) and os.path.join(self.directory, name) != exclude
+                       for name in os.listdir(self.directory))
+        except OSError:
+            return False
+
+    def run_leader(self, lock_path, func):
+        """执行 func()，期间定期更新锁文件的 mtime"""
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(self.stale_after / 4):
+                try:
+                    os.utime(lock_path)
+                except OSError:
+                    pass
+
+        thread = threading.Thread(target=heartbeat, daemon=True)
+        thread.start()
+        try:
+            return func()
+        finally:
+            stop.set()
+
+    def acquire(self, lock_path):
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as f:
+            f.write(f"{socket.gethostname()} {os.getpid()}\n")
+        return True
+
+    def release(self, lock_path):
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+    def break_stale(self, lock_path):
+        """leader 心跳超时（所在 worker 已被回收）时删除它的锁"""
+        try:
+            if self.clock() - os.path.getmtime(lock_path) > self.stale_after:
+                logger.warning(f"⚠️ 删除心跳超时的任务锁: {os.path.basename(lock_path)}")
+                os.remove(lock_path)
+        except OSError:
+            pass
+
+    def read_result(self, result_path):
+        try:
+            entry = fastjson.load_file(result_path)
+        except (OSError, ValueError):
+            return None
+        if self.clock() - entry.get("time", 0) > self.ttl:
+            return None
+        return entry.get("result")
+
+    def prune(self):
+        """删除过期的结果文件和 follower 登记（所在 worker 被回收时遗留，每 PRUNE_INTERVAL 秒最多一次）"""
+        now = self.clock()
+        if now - self._last_prune < PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith(".json") and ".wait-" not in name:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+            except OSError:
+                continue
+
+
+_default = None
+
+
+def get_singleflight():
+    global _default
+    if _default is None:
+        _default = SingleFlight()
+    return _default
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+启动时预热网络卷上的模型文件：按工作流中首次使用的顺序并行读入页缓存，或复制到本地盘
+
+网络卷（/workspace）上的模型第一次加载比本地盘慢得多，而 ComfyUI 启动期间 GPU 和磁盘都是空闲的。
+boot 的 stage 阶段在后台执行（不阻塞 worker 启动），第一个任务加载模型时大部分数据已在本地。
+
+流程:
+1. 从 profile.workflow_files 中找出引用的模型文件（API 格式按执行顺序，UI 格式按节点 order），
+   默认工作流在前，同一文件只保留第一次出现的位置
+2. 按 ComfyUI 的查找顺序（extra_model_paths.yaml）定位文件，找不到的跳过（任务执行时按需下载）
+3. STAGE_WORKERS 个线程按顺序处理:
+   - readahead（默认）: posix_fadvise(WILLNEED) 后顺序读取一遍，填充页缓存；
+     总量限制在可用内存的 STAGE_MEMORY_FRACTION 以内，避免后面的文件把前面的挤出页缓存
+   - copy: 网络卷上的文件复制到 STAGE_DIR/<folder>/<file>（默认 /ComfyUI/models，即容器本地盘），
+     先写 .part 再 os.replace；comfyui 的目录在 extra_model_paths.yaml 中排在最前，ComfyUI 优先加载本地副本
+   - off: 不预热
+4. 进度见 get_stage_progress()，每 STAGE_LOG_INTERVAL 秒记录一次日志；任务开始执行时预热还没完成的，
+   结果中包含 model_stage（见 profile.py 的 execute_prompt）
+
+单独执行（例如在 entrypoint 之外手动预热）:
+    python -m handler_core.stage workflow.json [...] [--mode copy]
+"""
+
+import os
+import time
+import shutil
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import fastjson
+from .provision import MODEL_EXTENSIONS, COMFYUI_MODELS_DIR
+from .validate_workflow import build_graph, is_link
+from .workflow_compiler import load_compiled_prompt, DEFAULT_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+STAGE_MODE = os.getenv("MODEL_STAGE_MODE", "readahead")
+STAGE_DIR = os.getenv("MODEL_STAGE_DIR", COMFYUI_MODELS_DIR)
+STAGE_WORKERS = int(os.getenv("STAGE_WORKERS", "4"))
+STAGE_MEMORY_FRACTION = float(os.getenv("STAGE_MEMORY_FRACTION", "0.5"))
+STAGE_MAX_MBPS = float(os.getenv("STAGE_MAX_MBPS", "0"))
+STAGE_RESERVE_BYTES = 5 * 1024 ** 3
+STAGE_LOG_INTERVAL = 10
+BLOCK_SIZE = 16 * 1024 * 1024
+STAGE_MODES = ("readahead", "copy", "off")
+
+MODEL_FOLDERS = ("diffusion_models", "unet", "checkpoints", "loras", "text_encoders", "clip", "clip_vision",
+                 "vae", "detection", "upscale_models")
+NETWORK_MODEL_DIR = "/workspace/models"
+NETWORK_LORA_DIR = "/workspace/loras"
+
+
+def default_search_paths():
+    """[(folder, 目录), ...]，与 extra_model_paths.yaml 中 ComfyUI 的查找顺序一致"""
+    paths = []
+    for folder in MODEL_FOLDERS:
+        paths.append((folder, os.path.join(COMFYUI_MODELS_DIR, folder)))
+        if folder == "diffusion_models":
+            paths.append((folder, NETWORK_MODEL_DIR))
+        elif folder == "loras":
+            paths.append((folder, NETWORK_LORA_DIR))
+        paths.append((folder, os.path.join(NETWORK_MODEL_DIR, folder)))
+    return paths
+
+
+def is_model_name(value):
+    return isinstance(value, str) and value.lower().endswith(MODEL_EXTENSIONS)
+
+
+def execution_order(prompt):
+    """
+    API prompt 的近似执行顺序：从输出节点（没有下游的节点）出发，按输入顺序深度优先后序遍历，
+    与 ComfyUI 从输出节点递归执行依赖的顺序一致
+    """
+    _, downstream = build_graph(prompt)
+    sinks = sorted((node_id for node_id, targets in downstream.items() if not targets), key=_node_sort_key)
+    order, visited = [], set()
+    for sink in sinks:
+        stack = [(sink, False)]
+        while stack:
+            node_id, expanded = stack.pop()
+            if expanded:
+                order.append(node_id)
+                continue
+            if node_id in visited or node_id not in prompt:
+                continue
+            visited.add(node_id)
+            stack.append((node_id, True))
+            inputs = prompt[node_id].get("inputs", {})
+            sources = [str(value[0]) for value in inputs.values() if is_link(value)]
+            stack.extend((source, False) for source in reversed(sources))
+    return order
+
+
+def _node_sort_key(node_id):
+    return (0, int(node_id), "") if str(node_id).isdigit() else (1, 0, str(node_id))
+
+
+def workflow_model_names(workflow):
+    """工作流中引用的模型文件名（去重，按首次使用顺序）；支持 API 和 UI 格式"""
+    values = []
+    if "nodes" in workflow:
+        nodes = [node for node in workflow["nodes"] if node.get("mode", 0) not in (2, 4)]
+        for node in sorted(nodes, key=lambda node: node.get("order", 0)):
+            widgets = node.get("widgets_values")
+            values.extend(widgets.values() if isinstance(widgets, dict) else widgets or [])
+    else:
+        for node_id in execution_order(workflow):
+            values.extend(workflow[node_id].get("inputs", {}).values())
+    names = []
+    for value in values:
+        if is_model_name(value):
+            name = value.replace("\\", "/")
+            if name not in names:
+                names.append(name)
+    return names
+
+
+def load_workflow_models(workflow_files, cache_dir=DEFAULT_CACHE_DIR):
+    """多个工作流引用的模型文件名，前面的工作流优先；优先使用编译缓存中的 API prompt"""
+    names = []
+    for workflow_file in workflow_files:
+        workflow = load_compiled_prompt(workflow_file, cache_dir)
+        if workflow is None:
+            try:
+                workflow = fastjson.load_file(workflow_file)
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️ 无法读取工作流 {workflow_file}: {e}")
+                continue
+        names.extend(name for name in workflow_model_names(workflow) if name not in names)
+    return names
+
+
+def locate_model(name, search_paths):
+    """按查找顺序定位模型文件，返回 (folder, 路径)，找不到时返回 (None, None)"""
+    for folder, directory in search_paths:
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            return folder, path
+    return None, None
+
+
+def available_memory():
+    """/proc/meminfo 中的 MemAvailable（字节），无法读取时返回 None"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class RateLimiter:
+    """所有预热线程共享的读取带宽上限（字节/秒），0 表示不限制；避免预热占满网络卷带宽"""
+
+    def __init__(self, bytes_per_second=0, clock=time.monotonic, sleep=time.sleep):
+        self.bytes_per_second = bytes_per_second
+        self.clock = clock
+        self.sleep = sleep
+        self._next = clock()
+        self._lock = threading.Lock()
+
+    def consume(self, size):
+        if not self.bytes_per_second:
+            return
+        with self._lock:
+            now = self.clock()
+            self._next = max(self._next, now) + size / self.bytes_per_second
+            delay = self._next - now
+        if delay > 0:
+            self.sleep(delay)
+
+
+class StageProgress:
+    """预热进度，可在多个线程中更新，snapshot() 返回当前状态"""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.items = []
+        self.start = time.monotonic()
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def add(self, name, path, size, status="pending"):
+        item = {"name": name, "path": path, "size": size, "done": 0, "status": status}
+        with self._lock:
+            self.items.append(item)
+        return item
+
+    def advance(self, item, size):
+        with self._lock:
+            item["done"] += size
+
+    def set_status(self, item, status):
+        with self._lock:
+            item["status"] = status
+
+    def snapshot(self):
+        with self._lock:
+            items = [dict(item) for item in self.items]
+        active = [item for item in items if item["status"] not in ("missing", "skipped")]
+        return {
+            "mode": self.mode,
+            "finished": self.finished,
+            "elapsed": time.monotonic() - self.start,
+            "files": len(active),
+            "files_done": sum(1 for item in active if item["status"] in ("done", "local")),
+            "bytes_total": sum(item["size"] for item in active),
+            "bytes_done": sum(item["done"] for item in active),
+            "items": items,
+        }
+
+    def log(self):
+        state = self.snapshot()
+        percent = 100 * state["bytes_done"] / state["bytes_total"] if state["bytes_total"] else 100
+        logger.info(f"📀 模型预热({state['mode']}): {state['files_done']}/{state['files']} 个文件, "
+                    f"{state['bytes_done'] / 1024 ** 3:.1f}/{state['bytes_total'] / 1024 ** 3:.1f} GB "
+                    f"({percent:.0f}%), {state['elapsed']:.1f}s")
+
+
+def _read_blocks(fd, block_size, limiter, on_block):
+    """顺序读取整个文件，每块回调 on_block(数据)"""
+    buffer = bytearray(block_size)
+    view = memoryview(buffer)
+    while True:
+        count = os.readv(fd, [buffer])
+        if not count:
+            return
+        limiter.consume(count)
+        on_block(view[:count])
+
+
+def readahead_file(path, progress, item, limiter, block_size=BLOCK_SIZE):
+    """提示内核预读并顺序读取一遍（部分网络文件系统忽略 fadvise，实际读取才能保证进入页缓存）"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        _read_blocks(fd, block_size, limiter, lambda block: progress.advance(item, len(block)))
+    finally:
+        os.close(fd)
+
+
+def copy_file(path, dest, progress, item, limiter, block_size=BLOCK_SIZE):
+    """复制到本地盘：写入 .part，完成后原子替换，已存在且大小一致时跳过"""
+    size = os.path.getsize(path)
+    if os.path.isfile(dest) and os.path.getsize(dest) == size:
+        progress.advance(item, size)
+        return
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    part = f"{dest}.part"
+    source = os.open(path, os.O_RDONLY)
+    try:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(source, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        with open(part, "wb") as out:
+            def write(block):
+                out.write(block)
+                progress.advance(item, len(block))
+            _read_blocks(source, block_size, limiter, write)
+        os.replace(part, dest)
+    except BaseException:
+        try:
+            os.remove(part)
+        except OSError:
+            pass
+        raise
+    finally:
+        os.close(source)
+
+
+class ModelStager:
+    """按首次使用顺序并行预热模型文件"""
+
+    def __init__(self, mode=STAGE_MODE, stage_dir=STAGE_DIR, workers=STAGE_WORKERS, search_paths=None,
+                 memory_budget=None, reserve=STAGE_RESERVE_BYTES, max_mbps=STAGE_MAX_MBPS, block_size=BLOCK_SIZE):
+        if mode not in STAGE_MODES:
+            raise ValueError(f"MODEL_STAGE_MODE 必须是 {', '.join(STAGE_MODES)} 之一: {mode}")
+        self.mode = mode
+        self.stage_dir = stage_dir
+        self.workers = workers
+        self.search_paths = search_paths if search_paths is not None else default_search_paths()
+        if memory_budget is None:
+            memory = available_memory()
+            memory_budget = memory * STAGE_MEMORY_FRACTION if memory else float("inf")
+        self.memory_budget = memory_budget
+        self.reserve = reserve
+        self.limiter = RateLimiter(max_mbps * 1024 * 1024)
+        self.block_size = block_size
+        self.progress = StageProgress(mode)
+
+    def is_local(self, path):
+        """已经在本地盘上（镜像中的 ComfyUI 模型目录或已复制的副本）"""
+        local_dirs = {os.path.abspath(COMFYUI_MODELS_DIR), os.path.abspath(self.stage_dir)}
+        return any(os.path.abspath(path).startswith(directory + os.sep) for directory in local_dirs)
+
+    def disk_free(self):
+        """本地盘上可用于副本的空间（保留 reserve 字节给 ComfyUI 输出和临时文件）"""
+        directory = self.stage_dir
+        while not os.path.isdir(directory) and os.path.dirname(directory) != directory:
+            directory = os.path.dirname(directory)
+        return max(shutil.disk_usage(directory).free - self.reserve, 0)
+
+    def plan(self, names):
+        """定位文件并确定每个文件的处理方式，按输入顺序登记到进度中"""
+        planned, memory_used = [], 0
+        disk_free = self.disk_free() if self.mode == "copy" else 0
+        for name in names:
+            folder, path = locate_model(name, self.search_paths)
+            if path is None:
+                self.progress.add(name, None, 0, "missing")
+                continue
+            size = os.path.getsize(path)
+            if self.mode == "copy":
+                if self.is_local(path):
+                    item = self.progress.add(name, path, size, "local")
+                    self.progress.advance(item, size)
+                    continue
+                if size > disk_free:
+                    self.progress.add(name, path, size, "skipped")
+                    continue
+                disk_free -= size
+            elif memory_used + size > self.memory_budget:
+                self.progress.add(name, path, size, "skipped")
+                continue
+            else:
+                memory_used += size
+            item = self.progress.add(name, path, size)
+            planned.append((item, folder, path))
+        return planned
+
+    def stage_one(self, item, folder, path):
+        self.progress.set_status(item, "running")
+        try:
+            if self.mode == "copy":
+                copy_file(path, os.path.join(self.stage_dir, folder, item["name"]), self.progress, item,
+                          self.limiter, self.block_size)
+            else:
+                readahead_file(path, self.progress, item, self.limiter, self.block_size)
+        except Exception as e:
+            logger.warning(f"⚠️ 模型预热失败 {path}: {e}")
+            self.progress.set_status(item, "failed")
+            return
+        self.progress.set_status(item, "done")
+
+    def run(self, names, log_interval=STAGE_LOG_INTERVAL):
+        """预热 names 中的模型（阻塞到全部完成），返回最终进度"""
+        if self.mode == "off":
+            self.progress.finished = True
+            return self.progress.snapshot()
+        planned = self.plan(names)
+        stop = threading.Event()
+        reporter = threading.Thread(target=self._report, args=(stop, log_interval), daemon=True)
+        reporter.start()
+        try:
+            # 线程池按提交顺序取任务，先使用的文件先开始
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="stage") as executor:
+                for item, folder, path in planned:
+                    executor.submit(self.stage_one, item, folder, path)
+        finally:
+            stop.set()
+            self.progress.finished = True
+        self.progress.log()
+        return self.progress.snapshot()
+
+    def _report(self, stop, interval):
+        while not stop.wait(interval):
+            self.progress.log()
+
+
+_current = None
+
+
+def get_stage_progress():
+    """当前（或最近一次）预热的进度，没有执行过预热时返回 None"""
+    return _current.progress.snapshot() if _current is not None else None
+
+
+def stage_profile_models(profile, cache_dir=DEFAULT_CACHE_DIR, stager=None):
+    """预热 profile 工作流引用的模型，返回最终进度"""
+    global _current
+    workflow_files = [path for path in getattr(profile, "workflow_files", ()) if os.path.exists(path)]
+    _current = stager or ModelStager()
+    names = load_workflow_models(workflow_files, cache_dir)
+    logger.info(f"📀 模型预热({_current.mode}): 工作流引用 {len(names)} 个模型文件")
+    return _current.run(names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预热工作流引用的模型文件（读入页缓存或复制到本地盘）")
+    parser.add_argument("workflows", nargs="+", help="工作流文件（前面的优先）")
+    parser.add_argument("--mode", choices=STAGE_MODES, default=STAGE_MODE)
+    parser.add_argument("--stage-dir", default=STAGE_DIR, help="copy 模式的目标目录")
+    parser.add_argument("--workers", type=int, default=STAGE_WORKERS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    stager = ModelStager(mode=args.mode, stage_dir=args.stage_dir, workers=args.workers)
+    state = stager.run(load_workflow_models(args.workflows))
+    for item in state["items"]:
+        logger.info(f"   {item['status']:<8} {item['size'] / 1024 ** 3:6.2f} GB  {item['name']}")
+
+
+if __name__ == "__main__":
+    main()
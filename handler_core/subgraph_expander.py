@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+展开 workflow 中的子图（type 为 UUID 的节点）
+
+ComfyUI 前端把子图定义保存在 definitions.subgraphs 中，画布上的实例节点只是一个代理：
+- 子图内部连接为字典格式 {"id", "origin_id", "origin_slot", "target_id", "target_slot", "type"}
+- origin_id == -10 表示来自子图输入（实例节点的第 origin_slot 个输入）
+- target_id == -20 表示连到子图输出（实例节点的第 target_slot 个输出）
+
+展开后内部节点成为普通节点，ID 重新编号为 "<实例ID>:<内部ID>"（与 ComfyUI 前端导出 API 格式一致），
+所有连接改写为外层的列表格式，之后即可按普通 nodes 格式转换为 API prompt。
+"""
+
+import copy
+import logging
+
+logger = logging.getLogger(__name__)
+
+SUBGRAPH_INPUT_NODE_ID = -10
+SUBGRAPH_OUTPUT_NODE_ID = -20
+MAX_SUBGRAPH_DEPTH = 10
+
+
+def get_subgraph_definitions(workflow_data):
+    """返回 {子图UUID: 子图定义}"""
+    subgraphs = workflow_data.get("definitions", {}).get("subgraphs", [])
+    return {subgraph["id"]: subgraph for subgraph in subgraphs if "id" in subgraph}
+
+
+def find_instance_input_index(instance, subgraph_input, index):
+    """实例节点的输入与子图输入按顺序对应，名称不一致时按名称查找"""
+    inputs = instance.get("inputs", [])
+    if index < len(inputs) and inputs[index].get("name") == subgraph_input.get("name"):
+        return index
+    for i, input_item in enumerate(inputs):
+        if input_item.get("name") == subgraph_input.get("name"):
+            return i
+    return None
+
+
+def get_widget_index(node, input_name):
+    """输入对应的 widgets_values 下标（按 inputs 中带 widget 的顺序，与转换逻辑一致）"""
+    widget_index = 0
+    for input_item in node.get("inputs", []):
+        if "widget" not in input_item:
+            continue
+        if input_item.get("name") == input_name:
+            return widget_index
+        widget_index += 1
+    return None
+
+
+def expand_subgraphs_once(workflow_data, subgraphs):
+    """展开一层子图实例，返回 (新 workflow, 展开的实例数量)"""
+    instances = {node["id"]: node for node in workflow_data.get("nodes", []) if node.get("type") in subgraphs}
+    if not instances:
+        return workflow_data, 0
+
+    result = dict(workflow_data)
+    links = [list(link) for link in workflow_data.get("links", [])]
+    next_link_id = max([link[0] for link in links if link] + [0]) + 1
+
+    def new_link_id():
+        nonlocal next_link_id
+        link_id = next_link_id
+        next_link_id += 1
+        return link_id
+
+    def inner_id(instance_id, node_id):
+        return f"{instance_id}:{node_id}"
+
+    # 1. 子图输出映射: (实例ID, 输出槽) -> (内部节点, 输出槽) 或子图输入直通 ("input", 输入槽)
+    output_map = {}
+    for instance_id, instance in instances.items():
+        for link in subgraphs[instance["type"]].get("links", []):
+            if link.get("target_id") != SUBGRAPH_OUTPUT_NODE_ID:
+                continue
+            if link.get("origin_id") == SUBGRAPH_INPUT_NODE_ID:
+                output_map[(instance_id, link["target_slot"])] = ("input", link["origin_slot"])
+            else:
+                output_map[(instance_id, link["target_slot"])] = (inner_id(instance_id, link["origin_id"]), link["origin_slot"])
+
+    # 2. 外层连接: 指向实例的连接记录为实例输入，来自实例输出的连接改写源节点
+    links_by_id = {link[0]: link for link in links}
+    input_sources = {}
+    for instance_id, instance in instances.items():
+        for slot, input_item in enumerate(instance.get("inputs", [])):
+            link = links_by_id.get(input_item.get("link"))
+            if link:
+                input_sources[(instance_id, slot)] = (link[1], link[2])
+
+    def resolve_source(node_id, slot, depth=0):
+        """把来自实例输出（可能是输入直通、链式实例）的源解析为真实节点"""
+        while node_id in instances and depth < MAX_SUBGRAPH_DEPTH:
+            mapped = output_map.get((node_id, slot))
+            if mapped is None:
+                return None
+            if mapped[0] == "input":
+                source = input_sources.get((node_id, mapped[1]))
+                if source is None:
+                    return None
+                node_id, slot = source
+            else:
+                node_id, slot = mapped
+            depth += 1
+        return node_id, slot
+
+    new_links = []
+    for link in links:
+        if len(link) < 6:
+            continue
+        if link[3] in instances:
+            # 实例输入连接在展开时按内部目标重新生成
+            continue
+        if link[1] in instances:
+            source = resolve_source(link[1], link[2])
+            if source is None:
+                logger.warning(f"子图实例 {link[1]} 的输出 {link[2]} 无法解析，移除连接 {link[0]}")
+                continue
+            link = [link[0], source[0], source[1]] + link[3:]
+        new_links.append(link)
+
+    # 3. 复制内部节点和内部连接
+    new_nodes = [node for node in workflow_data.get("nodes", []) if node["id"] not in instances]
+    for instance_id, instance in instances.items():
+        subgraph = subgraphs[instance["type"]]
+        inner_nodes = {}
+        for node in subgraph.get("nodes", []):
+            inner_node = copy.deepcopy(node)
+            inner_node["id"] = inner_id(instance_id, node["id"])
+            # 实例被禁用时内部节点随之禁用
+            if instance.get("mode", 0) != 0 and inner_node.get("mode", 0) == 0:
+                inner_node["mode"] = instance["mode"]
+            for input_item in inner_node.get("inputs", []):
+                input_item["link"] = None
+            for output_item in inner_node.get("outputs", []):
+                output_item["links"] = []
+            inner_nodes[node["id"]] = inner_node
+
+        instance_widgets = instance.get("widgets_values", [])
+        for link in subgraph.get("links", []):
+            origin_id, target_id = link.get("origin_id"), link.get("target_id")
+            if target_id == SUBGRAPH_OUTPUT_NODE_ID or target_id not in inner_nodes:
+                continue
+            target = inner_nodes[target_id]
+            target_input = target["inputs"][link["target_slot"]]
+
+            if origin_id == SUBGRAPH_INPUT_NODE_ID:
+                subgraph_inputs = subgraph.get("inputs", [])
+                if link["origin_slot"] >= len(subgraph_inputs):
+                    continue
+                instance_slot = find_instance_input_index(instance, subgraph_inputs[link["origin_slot"]], link["origin_slot"])
+                source = input_sources.get((instance_id, instance_slot)) if instance_slot is not None else None
+                if source is not None:
+                    source = resolve_source(*source)
+                if source is None:
+                    # 实例输入未连接：把实例上的 widget 值写入内部节点
+                    instance_input = instance["inputs"][instance_slot] if instance_slot is not None else {}
+                    instance_widget_index = get_widget_index(instance, instance_input.get("name"))
+                    target_widget_index = get_widget_index(target, target_input.get("name"))
+                    if (instance_widget_index is not None and target_widget_index is not None and
+                            isinstance(instance_widgets, list) and instance_widget_index < len(instance_widgets) and
+                            isinstance(target.get("widgets_values"), list) and
+                            target_widget_index < len(target["widgets_values"])):
+                        target["widgets_values"][target_widget_index] = instance_widgets[instance_widget_index]
+                    continue
+                source_id, source_slot = source
+            elif origin_id in inner_nodes:
+                source_id, source_slot = inner_id(instance_id, origin_id), link["origin_slot"]
+                origin_outputs = inner_nodes[origin_id].get("outputs", [])
+            else:
+                continue
+
+            link_id = new_link_id()
+            target_input["link"] = link_id
+            if origin_id in inner_nodes and link["origin_slot"] < len(origin_outputs):
+                origin_outputs[link["origin_slot"]]["links"].append(link_id)
+            new_links.append([link_id, source_id, source_slot, target["id"], link["target_slot"], link.get("type", "*")])
+
+        new_nodes.extend(inner_nodes.values())
+        logger.info(f"展开子图实例 {instance_id} ({subgraph.get('name', instance['type'])}): {len(inner_nodes)} 个内部节点")
+
+    result["nodes"] = new_nodes
+    result["links"] = new_links
+    return result, len(instances)
+
+
+def expand_subgraphs(workflow_data):
+    """
+    展开 workflow 中所有子图实例（支持嵌套子图），返回新的 workflow（不修改输入）
+    没有子图定义时原样返回
+    """
+    subgraphs = get_subgraph_definitions(workflow_data)
+    if not subgraphs or "nodes" not in workflow_data:
+        return workflow_data
+
+    for _ in range(MAX_SUBGRAPH_DEPTH):
+        workflow_data, expanded = expand_subgraphs_once(workflow_data, subgraphs)
+        if not expanded:
+            break
+    return workflow_data
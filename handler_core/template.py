@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+工作流模板：缓存转换、补全后的 API prompt，每个任务按写时复制实例化
+
+加载 JSON、nodes -> prompt 转换、从 widgets_values 补全 inputs、修正值类型这些步骤只依赖工作流文件
+（以及 worker 内基本不变的 object_info / 可用模型），每个 worker 每个工作流只做一次：
+
+    template = get_template(key, lambda: (build_prompt_from_file(), workflow_data))
+    prompt = template.instantiate(BINDINGS, values, writable=("563", "584"))
+    prompt.writable("279")["inputs"]["lora_0"] = ...
+
+instantiate() 只浅复制被绑定的节点和 writable 中声明的节点，其余节点与模板按引用共享，
+所以单个任务的分配和 CPU 时间与绑定参数的数量相关，而不是与图的大小相关。
+实例本身是 dict，可以直接作为 /prompt 请求体序列化。
+
+约定：任务中修改节点前必须通过 writable() 取得副本，模板中的节点不能原地修改。
+"""
+
+import logging
+
+from .binding import compile_bindings, apply_bindings
+
+logger = logging.getLogger(__name__)
+
+# 缓存键 -> PromptTemplate
+_templates = {}
+
+
+def copy_node(node):
+    """浅复制节点：节点字典、inputs、widgets_values 各复制一层，其余值（连接、嵌套对象）共享"""
+    node = dict(node)
+    if "inputs" in node:
+        node["inputs"] = dict(node["inputs"])
+    widgets = node.get("widgets_values")
+    if isinstance(widgets, list):
+        node["widgets_values"] = list(widgets)
+    elif isinstance(widgets, dict):
+        node["widgets_values"] = dict(widgets)
+    return node
+
+
+class PromptInstance(dict):
+    """单个任务的 prompt，未修改的节点与模板共享"""
+
+    def __init__(self, template_prompt):
+        super().__init__(template_prompt)
+        self.template_prompt = template_prompt
+
+    def writable(self, node_id):
+        """返回可以原地修改的节点；仍与模板共享时先复制"""
+        node = self[node_id]
+        if node is self.template_prompt.get(node_id):
+            node = self[node_id] = copy_node(node)
+        return node
+
+    def remove_links_to(self, removed_node_id):
+        """删除节点及所有指向它的连接（只复制受影响的节点）"""
+        for node_id, node in list(self.items()):
+            if any(isinstance(value, list) and value and str(value[0]) == removed_node_id
+                   for value in node.get("inputs", {}).values()):
+                inputs = self.writable(node_id)["inputs"]
+                for input_name, value in list(inputs.items()):
+                    if isinstance(value, list) and value and str(value[0]) == removed_node_id:
+                        del inputs[input_name]
+        self.pop(removed_node_id, None)
+
+
+class PromptTemplate:
+    """只读的工作流模板：API prompt + 原始 UI 工作流（用于按节点 order 选择输出）"""
+
+    def __init__(self, prompt, workflow_data=None):
+        self.prompt = prompt
+        self.workflow_data = workflow_data
+        self._plans = {}
+        self._class_index = {}
+
+    def plan(self, bindings):
+        """按模板编译 BINDINGS（见 binding.compile_bindings），每个模板只编译一次"""
+        if bindings not in self._plans:
+            self._plans[bindings] = compile_bindings(bindings, self.prompt)
+        return self._plans[bindings]
+
+    def find_nodes(self, class_type_pattern):
+        """class_type 包含 class_type_pattern 的节点ID列表（按模板顺序，结果缓存）"""
+        if class_type_pattern not in self._class_index:
+            self._class_index[class_type_pattern] = [
+                node_id for node_id, node in self.prompt.items()
+                if class_type_pattern in node.get("class_type", "")
+            ]
+        return self._class_index[class_type_pattern]
+
+    def find_node(self, class_type_pattern):
+        """第一个 class_type 包含 class_type_pattern 的节点ID，没有时返回 None"""
+        nodes = self.find_nodes(class_type_pattern)
+        return nodes[0] if nodes else None
+
+    def instantiate(self, bindings=(), values=None, writable=()):
+        """生成任务 prompt：复制被绑定的节点和 writable 中的节点后写入参数值"""
+        instance = PromptInstance(self.prompt)
+        plan = self.plan(bindings)
+        for node_id in dict.fromkeys([entry[1] for entry in plan] + list(writable)):
+            if node_id in instance:
+                instance.writable(node_id)
+        apply_bindings(instance, plan, values or {})
+        return instance
+
+
+def writable_node(prompt, node_id):
+    """返回可以原地修改的节点：任务实例中先复制共享节点，普通 dict（如构建模板时）直接返回"""
+    if isinstance(prompt, PromptInstance):
+        return prompt.writable(node_id)
+    return prompt[node_id]
+
+
+def get_template(key, build):
+    """返回 key 对应的模板；首次调用时执行 build()，其返回 (API prompt, UI 工作流或 None)"""
+    template = _templates.get(key)
+    if template is None:
+        prompt, workflow_data = build()
+        template = _templates[key] = PromptTemplate(prompt, workflow_data)
+        logger.info(f"📦 已缓存工作流模板: {key[0] if isinstance(key, tuple) else key} ({len(prompt)} 个节点)")
+    return template
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+测试声明式参数绑定：参数验证、绑定编译（丢弃不存在的节点和越界的 widgets 索引）、规范化任务哈希
+"""
+
+from handler_core.binding import validate_params, compile_bindings, apply_bindings, job_hash
+from handler_core.inputs import to_nearest_multiple_of_16
+
+PARAMS = {
+    "steps": {"type": int, "default": 4, "min": 1},
+    "width": {"type": float, "default": 480, "transform": to_nearest_multiple_of_16},
+    "sampler": {"type": str, "default": "euler", "choices": ["euler", "dpm++_sde"]},
+    "preprocess": {"type": bool, "default": True},
+    "model": {"default": "a.safetensors", "fixed": True},
+}
+
+
+def test_validate_params_defaults_coercion_and_errors():
+    values, errors = validate_params(PARAMS, {"width": 500, "preprocess": "false", "model": "other"})
+    assert errors == []
+    assert values == {"steps": 4, "width": 496, "sampler": "euler", "preprocess": False, "model": "a.safetensors"}
+
+    _, errors = validate_params(PARAMS, {"steps": 0, "width": "wide", "sampler": "ddim", "preprocess": 1})
+    assert len(errors) == 4
+    _, errors = validate_params(PARAMS, {"steps": 2.5})
+    assert errors and "steps" in errors[0]
+    _, errors = validate_params({"image": {"required": True}}, {})
+    assert errors == ["缺少必需参数: image"]
+
+
+def test_compile_and_apply_bindings():
+    prompt = {
+        "1": {"inputs": {}, "widgets_values": [0, "euler"]},
+        "2": {"inputs": {}, "widgets_values": {"frame_rate": 16}},
+        "3": {"inputs": {}},
+    }
+    bindings = (
+        ("steps", "1", "steps", 0),
+        ("sampler", "1", None, 5),
+        ("width", "2", "width", "width"),
+        ("model", "3", "model", 0),
+        ("steps", "404", "steps", 0),
+    )
+    plan = compile_bindings(bindings, prompt)
+    # 越界索引且没有输入名的绑定、不存在的节点被丢弃；widgets_values 缺失时只写 inputs
+    assert plan == [("steps", "1", "steps", 0), ("width", "2", "width", "width"), ("model", "3", "model", None)]
+
+    apply_bindings(prompt, plan, {"steps": 6, "sampler": "euler", "width": 512, "model": None})
+    assert prompt["1"] == {"inputs": {"steps": 6}, "widgets_values": [6, "euler"]}
+    assert prompt["2"] == {"inputs": {"width": 512}, "widgets_values": {"frame_rate": 16, "width": 512}}
+    assert prompt["3"] == {"inputs": {}}
+
+
+def test_job_hash_is_canonical(tmp_path):
+    values, _ = validate_params(PARAMS, {"width": 500})
+    same_values, _ = validate_params(PARAMS, {"width": 496.0, "steps": 4, "model": "ignored"})
+    image = tmp_path / "a.png"
+    image.write_bytes(b"pixels")
+    copy = tmp_path / "b.png"
+    copy.write_bytes(b"pixels")
+
+    key = job_hash(values, PARAMS, {"image": str(image)}, "wf.json")
+    assert key == job_hash(same_values, PARAMS, {"image": str(copy)}, "wf.json")
+    assert key != job_hash(values, PARAMS, {"image": str(image)}, "other.json")
+    copy.write_bytes(b"other pixels")
+    assert key != job_hash(values, PARAMS, {"image": str(copy)}, "wf.json")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+测试启动编排：等待 ComfyUI 与导入 handler 并行执行，ComfyUI 进程退出时立即失败
+"""
+
+import threading
+
+import pytest
+
+from handler_core import boot, comfy_client
+
+HANDLER_SOURCE = '''
+class Profile:
+    workflow_files = ("/missing/workflow.json",)
+
+PROFILE = Profile()
+handler = lambda job: {"ok": True}
+'''
+
+
+class FakeProcess:
+    returncode = None
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        self.returncode = -15
+
+
+def test_boot_overlaps_comfyui_and_handler(tmp_path, monkeypatch):
+    handler_path = tmp_path / "handler.py"
+    handler_path.write_text(HANDLER_SOURCE)
+    handler_imported = threading.Event()
+    original_import = boot.import_handler
+
+    def import_handler(path):
+        module = original_import(path)
+        handler_imported.set()
+        return module
+
+    def wait_for_comfyui(timeout, process):
+        # ComfyUI 就绪前 handler 已在主线程导入完成
+        assert handler_imported.wait(5)
+        return {"system": {"comfyui_version": "0.3.60"}, "devices": [{"name": "cuda:0 NVIDIA L40S"}]}
+
+    monkeypatch.setattr(boot, "start_comfyui", lambda args: FakeProcess())
+    monkeypatch.setattr(boot, "import_handler", import_handler)
+    monkeypatch.setattr(boot, "wait_for_http_connection", wait_for_comfyui)
+    monkeypatch.setattr(boot, "scan_models", lambda: {})
+    monkeypatch.setattr(boot, "stage_profile_models", lambda profile: None)
+    monkeypatch.setattr(boot, "restore_compile_cache", lambda: 0)
+    monkeypatch.setattr(boot, "prefetch_comfyui_state", lambda: None)
+
+    module = boot.boot(str(handler_path), ["--listen"])
+    assert module.handler({}) == {"ok": True}
+
+
+def test_wait_for_comfyui_fails_fast_when_process_exits(monkeypatch):
+    def refuse(timeout=5):
+        raise ConnectionRefusedError("refused")
+
+    process = FakeProcess()
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == 6:
+            process.returncode = 1
+
+    monkeypatch.setattr(comfy_client, "get_system_stats", refuse)
+    monkeypatch.setattr(comfy_client.time, "sleep", sleep)
+    with pytest.raises(Exception, match="退出码 1"):
+        comfy_client.wait_for_http_connection(timeout=60, process=process)
+    # 指数退避，上限 2 秒
+    assert sleeps == [0.1, 0.2, 0.4, 0.8, 1.6, 2.0]
+
+
+def test_boot_timeline_report():
+    now = [0.0]
+    timeline = boot.BootTimeline(clock=lambda: now[0])
+
+    def phase(seconds):
+        now[0] += seconds
+    timeline.run("handler", phase, 3.0)
+    with pytest.raises(ValueError):
+        timeline.run("workflows", lambda: (phase(1.0), int("x")))
+    total, phase_sum = timeline.report()
+    assert (total, phase_sum) == (4.0, 4.0)
+    assert [(p["name"], p["start"], p["end"], p["status"]) for p in timeline.phases] == [
+        ("handler", 0.0, 3.0, "ok"), ("workflows", 3.0, 4.0, "failed")]
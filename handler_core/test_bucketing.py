@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+测试分辨率 / 帧数分桶：选择最接近宽高比的桶、帧数桶、开销上限、命中率与形状复用率统计
+"""
+
+from handler_core.bucketing import BucketStats, apply_buckets, choose_length, choose_size
+
+SIZES = [(480, 832), (832, 480), (640, 640), (720, 1280)]
+LENGTHS = [33, 49, 81, 121]
+
+
+def test_choose_size_prefers_nearest_aspect_without_upscaling():
+    assert choose_size(480, 832, SIZES) == (480, 832)
+    # 464x800 可由 480x832 缩小裁剪得到
+    assert choose_size(464, 800, SIZES) == (480, 832)
+    assert choose_size(624, 608, SIZES) == (640, 640)
+    # 560x880 需要放大 480x832，720x1280 面积超过 1.5 倍
+    assert choose_size(560, 880, SIZES) is None
+    assert choose_size(560, 880, SIZES, max_overhead=2) == (720, 1280)
+
+
+def test_choose_length():
+    assert choose_length(81, LENGTHS) == 81
+    assert choose_length(60, LENGTHS) == 81
+    assert choose_length(20, LENGTHS) is None
+    assert choose_length(200, LENGTHS) is None
+
+
+def test_apply_buckets_and_stats():
+    stats = BucketStats()
+    params = {"width": 464, "height": 800, "length": 77, "steps": 4}
+    bucket = apply_buckets(params, sizes=SIZES, lengths=LENGTHS, stats=stats)
+    assert params == {"width": 480, "height": 832, "length": 81, "steps": 4}
+    assert bucket == {"requested": {"width": 464, "height": 800, "length": 77},
+                      "generated": {"width": 480, "height": 832, "length": 81}, "hit": True, "warm": False}
+
+    # 多提示词模式只对齐宽高；相同的生成形状复用
+    params = {"width": 480, "height": 816, "length": 81}
+    assert apply_buckets(params, ("width", "height"), sizes=SIZES, lengths=LENGTHS, stats=stats)["hit"]
+    params = {"width": 480, "height": 832, "length": 81}
+    assert apply_buckets(params, sizes=SIZES, lengths=LENGTHS, stats=stats)["warm"]
+    params = {"width": 560, "height": 880, "length": 81}
+    assert not apply_buckets(params, sizes=SIZES, lengths=LENGTHS, stats=stats)["hit"]
+    assert params == {"width": 560, "height": 880, "length": 81}
+
+    summary = stats.snapshot()
+    assert (summary["jobs"], summary["hits"], summary["hit_rate"], summary["warm_rate"]) == (4, 3, 0.75, 0.25)
+    assert summary["shapes"] == {"480x832x81": 2, "480x832": 1, "560x880x81": 1}
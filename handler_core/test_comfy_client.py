@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+测试 get_videos：输出从 WebSocket 的 executed 消息读取，断开或输出节点命中缓存时才回退到 /history；
+超时后中断 prompt，启动时清理遗留 prompt
+"""
+
+import json
+
+import pytest
+import websocket
+
+from handler_core import comfy_client
+
+PROMPT = {
+    "1": {"class_type": "WanVideoSampler", "inputs": {}},
+    "2": {"class_type": "VHS_VideoCombine", "inputs": {"images": ["1", 0]}},
+}
+
+
+class FakeWebSocket:
+    def __init__(self, messages, disconnect=False, idle=False):
+        self.frames = [json.dumps({"type": kind, "data": data}) for kind, data in messages]
+        self.disconnect = disconnect
+        self.idle = idle
+        self.timeouts = []
+
+    def settimeout(self, timeout):
+        self.timeouts.append(timeout)
+
+    def recv(self):
+        if not self.frames:
+            if self.disconnect:
+                raise websocket.WebSocketConnectionClosedException("closed")
+            if self.idle:
+                raise websocket.WebSocketTimeoutException("timed out")
+            raise AssertionError("没有更多消息")
+        return self.frames.pop(0)
+
+
+@pytest.fixture
+def video(tmp_path, monkeypatch):
+    path = tmp_path / "out.webm"
+    path.write_bytes(b"video")
+    histories = []
+    monkeypatch.setattr(comfy_client, "queue_prompt", lambda prompt: {"prompt_id": "p1"})
+    monkeypatch.setattr(comfy_client, "get_history", lambda prompt_id: histories.pop(0))
+    return {"gifs": [{"filename": "out.webm", "fullpath": str(path)}]}, histories
+
+
+def test_outputs_from_executed_messages(video):
+    output, histories = video
+    ws = FakeWebSocket([
+        ("status", {"status": {}}),
+        ("executing", {"node": "1", "prompt_id": "p1"}),
+        ("executed", {"node": "9", "output": {"gifs": []}, "prompt_id": "other"}),
+        ("executing", {"node": "2", "prompt_id": "p1"}),
+        ("executed", {"node": "2", "output": output, "prompt_id": "p1"}),
+        ("executing", {"node": None, "prompt_id": "p1"}),
+    ])
+    videos, order, paths, history = comfy_client.get_videos(ws, PROMPT)
+    assert videos == {"2": ["dmlkZW8="]} and order == ["1", "2"]
+    assert paths == {"2": [output["gifs"][0]["fullpath"]]} and list(history["outputs"]) == ["2"]
+
+
+def test_history_fallback_on_disconnect_and_cached_output(video, monkeypatch):
+    output, histories = video
+    monkeypatch.setattr(comfy_client.time, "sleep", lambda seconds: None)
+    # 断开后轮询 /history 直到 prompt 出现
+    histories.extend([{}, {"p1": {"outputs": {"2": output}}}])
+    videos, _, _, _ = comfy_client.get_videos(
+        FakeWebSocket([("executing", {"node": "1", "prompt_id": "p1"})], disconnect=True), PROMPT)
+    assert videos == {"2": ["dmlkZW8="]} and not histories
+
+    # 输出节点命中缓存且没有 executed 消息（旧版 ComfyUI）
+    histories.append({"p1": {"outputs": {"2": output}}})
+    videos, _, _, _ = comfy_client.get_videos(FakeWebSocket([
+        ("execution_cached", {"nodes": ["1", "2"], "prompt_id": "p1"}),
+        ("executing", {"node": None, "prompt_id": "p1"}),
+    ]), PROMPT)
+    assert videos == {"2": ["dmlkZW8="]} and not histories
+
+
+def test_execution_error_raises(video):
+    ws = FakeWebSocket([
+        ("execution_error", {"node_id": "1", "node_type": "WanVideoSampler", "prompt_id": "p1",
+                             "exception_type": "torch.OutOfMemoryError", "exception_message": "CUDA out of memory"}),
+        ("executing", {"node": None, "prompt_id": "p1"}),
+    ])
+    with pytest.raises(Exception, match="GPU内存不足"):
+        comfy_client.get_videos(ws, PROMPT)
+
+
+@pytest.fixture
+def comfy_queue(monkeypatch):
+    """模拟 /queue、/queue 删除和 /interrupt，记录 POST 请求"""
+    queue = {"queue_running": [], "queue_pending": []}
+    posts = []
+    monkeypatch.setattr(comfy_client, "get_queue", lambda: queue)
+    monkeypatch.setattr(comfy_client, "post_json", lambda path, payload: posts.append((path, payload)))
+    return queue, posts
+
+
+def test_deadline_interrupts_running_prompt(video, comfy_queue, monkeypatch):
+    queue, posts = comfy_queue
+    queue["queue_running"].append([0, "p1", {}, {"client_id": comfy_client.CLIENT_ID}, ["2"]])
+    queue["queue_pending"].append([1, "p2", {}, {"client_id": comfy_client.CLIENT_ID}, ["2"]])
+    now = [100.0]
+    monkeypatch.setattr(comfy_client.time, "monotonic", lambda: now[0])
+    ws = FakeWebSocket([("executing", {"node": "1", "prompt_id": "p1"})], idle=True)
+    original_recv = ws.recv
+
+    def recv():
+        now[0] += 4
+        return original_recv()
+    ws.recv = recv
+
+    with pytest.raises(Exception, match="任务超时"):
+        comfy_client.get_videos(ws, PROMPT, deadline=110.0)
+    # recv 超时不超过剩余时间，只中断本任务的 prompt
+    assert ws.timeouts == [5, 5, 2.0]
+    assert posts == [("/interrupt", {"prompt_id": "p1"})]
+    assert comfy_client._active_prompt_id is None
+
+
+def test_reap_orphaned_prompts(comfy_queue, monkeypatch):
+    queue, posts = comfy_queue
+    monkeypatch.setattr(comfy_client, "_orphans_reaped", False)
+    queue["queue_running"].append([0, "old1", {}, {"client_id": "crashed-process"}, ["2"]])
+    queue["queue_pending"].extend([[1, "old2", {}, {"client_id": "crashed-process"}, ["2"]],
+                                   [2, "mine", {}, {"client_id": comfy_client.CLIENT_ID}, ["2"]]])
+
+    assert comfy_client.reap_orphaned_prompts() == ["old1", "old2"]
+    assert posts == [("/queue", {"delete": ["old2"]}), ("/interrupt", {"prompt_id": "old1"})]
+    # 每个进程只清理一次
+    assert comfy_client.reap_orphaned_prompts() == []
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+测试编译缓存：按形状保存 / 恢复条目、命中判断、原子写入、LRU 淘汰
+"""
+
+import os
+import tarfile
+
+from handler_core.compile_cache import CompileCache, job_shape, shape_key, uses_torch_compile
+
+SHAPE = shape_key("/Wan21_OneToAllAnimation_example_01.json", {"width": 480, "height": 832, "length": 81})
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def test_keys():
+    assert SHAPE == "Wan21_OneToAllAnimation_example_01-480x832x81"
+    assert job_shape({"width": 480, "height": 832, "length": 77, "steps": 4}) == {"width": 480, "height": 832,
+                                                                                 "length": 77}
+    assert job_shape({}, {"generated": {"width": 480, "height": 832}}) == {"width": 480, "height": 832}
+    assert uses_torch_compile({"1": {"class_type": "WanVideoTorchCompileSettings", "inputs": {}}})
+    assert not uses_torch_compile({"1": {"class_type": "WanVideoSampler", "inputs": {}}})
+
+
+def test_cold_worker_restores_entry_and_hits(tmp_path):
+    volume = tmp_path / "volume"
+    first = CompileCache(str(volume), str(tmp_path / "worker1"), budget=0, env_key="torch2.8.0-sm89")
+
+    token = first.begin(SHAPE)
+    # ComfyUI 编译时写入本地缓存
+    write(tmp_path / "worker1/inductor/fxgraph/ab/graph", b"graph")
+    write(tmp_path / "worker1/triton/kernel/k.cubin", b"cubin")
+    status = first.finish(token)
+    assert status == {"key": f"torch2.8.0-sm89/{SHAPE}", "hit": False, "restored": False, "new_files": 2}
+    assert not [name for name in os.listdir(volume / "torch2.8.0-sm89") if name.endswith(".tmp")]
+
+    # 同一 worker 上的第二个任务没有新编译
+    assert first.finish(first.begin(SHAPE))["hit"] is True
+
+    # 新的冷 worker 从网络卷恢复后命中
+    second = CompileCache(str(volume), str(tmp_path / "worker2"), budget=0, env_key="torch2.8.0-sm89")
+    status = second.finish(second.begin(SHAPE))
+    assert status["hit"] is True and status["restored"] is True
+    assert (tmp_path / "worker2/triton/kernel/k.cubin").read_bytes() == b"cubin"
+
+    # 其他 torch 版本 / GPU 架构不共用
+    other = CompileCache(str(volume), str(tmp_path / "worker3"), budget=0, env_key="torch2.8.0-sm90")
+    assert other.begin(SHAPE)["restored"] is False
+
+
+def test_restore_skips_unsafe_members_and_prune_is_lru(tmp_path):
+    volume = tmp_path / "volume"
+    cache = CompileCache(str(volume), str(tmp_path / "local"), budget=0, env_key="env")
+    write(tmp_path / "evil", b"x")
+    os.makedirs(volume / "env")
+    with tarfile.open(volume / "env/evil.tar", "w") as tar:
+        tar.add(tmp_path / "evil", arcname="../evil2")
+    assert cache.restore("evil") is True
+    assert not (tmp_path / "evil2").exists()
+
+    for i, key in enumerate(("old", "recent", "new")):
+        write(tmp_path / f"src/{key}", os.urandom(10000))
+        with tarfile.open(volume / f"env/{key}.tar", "w") as tar:
+            tar.add(tmp_path / f"src/{key}", arcname=key)
+        os.utime(volume / f"env/{key}.tar", (1000 + i, 1000 + i))
+    os.utime(volume / "env/evil.tar", (999, 999))
+    # 恢复时更新最近使用时间
+    cache.restore("old")
+    cache.budget = os.path.getsize(volume / "env/old.tar") + os.path.getsize(volume / "env/new.tar")
+    evicted = cache.prune(keep={cache.entry_path("new")})
+    assert sorted(os.path.basename(path) for path in evicted) == ["evil.tar", "recent.tar"]
+    assert sorted(os.listdir(volume / "env")) == ["new.tar", "old.tar"]
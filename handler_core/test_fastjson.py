@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+测试 fastjson：orjson 与标准库后端输出一致，解码错误都是 ValueError
+"""
+
+import json
+
+import pytest
+
+from handler_core import fastjson
+
+DOCUMENT = {"1": {"class_type": "WanVideoTextEncode", "inputs": {"positive_prompt": "跳舞的女孩", "steps": 6,
+                                                                 "cfg": 1.5, "model": ["3", 0], "force_offload": True}},
+            2: None}
+
+
+@pytest.fixture(params=["orjson", "json"])
+def backend(request, monkeypatch):
+    if request.param == "json":
+        monkeypatch.setattr(fastjson, "orjson", None)
+    elif fastjson.orjson is None:
+        pytest.skip("orjson 未安装")
+    return request.param
+
+
+def test_dumps_matches_stdlib(backend):
+    expected = json.dumps(DOCUMENT, ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+    assert fastjson.dumps(DOCUMENT) == expected
+    assert fastjson.loads(fastjson.dumps(DOCUMENT, indent=True)) == json.loads(expected)
+    assert fastjson.dumps({"b": 1, "a": 2}, sort_keys=True) == b'{"a":2,"b":1}'
+
+
+def test_loads_bytes_and_str(backend):
+    assert fastjson.loads(b'{"prompt_id": "abc"}') == fastjson.loads('{"prompt_id": "abc"}') == {"prompt_id": "abc"}
+    with pytest.raises(ValueError):
+        fastjson.loads(b'{"a": 1,}')
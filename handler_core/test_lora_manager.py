@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+测试 LoRA 管理：参数格式检查、远程 LoRA 下载（本地镜像，受截止时间限制）、按 /object_info 与磁盘验证名称
+"""
+
+import time
+
+from handler_core.lora_manager import LoraManager, plan_lora_pairs
+from handler_core.provision import ProvisionTimeout
+
+OBJECT_INFO = {"WanVideoLoraSelectMulti": {"input": {"required": {
+    "lora_0": [["none", "WanVideo/listed.safetensors"]]}}}}
+
+
+def test_plan_lora_pairs():
+    sources, errors = plan_lora_pairs([
+        {"high": "WanVideo\\listed.safetensors", "low": "none", "high_weight": 0.8},
+        {"high": "hf://org/repo@v2/loras/style.safetensors", "low": "https://example.com/a/b%20c.safetensors?x=1"},
+    ])
+    assert errors == []
+    assert sources["WanVideo\\listed.safetensors"] is None
+    hub = sources["hf://org/repo@v2/loras/style.safetensors"]
+    assert (hub["repo"], hub["path"], hub["revision"], hub["folder"]) == ("org/repo", "loras/style.safetensors",
+                                                                          "v2", "remote")
+    assert hub["file"].endswith("_style.safetensors")
+    assert sources["https://example.com/a/b%20c.safetensors?x=1"]["file"].endswith("_b c.safetensors")
+
+    _, errors = plan_lora_pairs(["style.safetensors", {"high": 3}, {"low": "hf://org/repo"},
+                                 {"high": "https://example.com/model.ckpt"}])
+    assert len(errors) == 4
+
+
+def test_fetch_and_resolve(tmp_path, mirror):
+    server, endpoint = mirror
+    loras = tmp_path / "loras"
+    loras.mkdir()
+    (loras / "mine.safetensors").write_bytes(b"local")
+    manager = LoraManager(cache_dir=str(loras), budget=0, max_size=0, endpoint=endpoint,
+                          search_paths=[("loras", str(loras))])
+    url = f"{endpoint}/cdn/org/repo/main/lora.safetensors"
+    pairs = [{"high": url, "low": "mine.safetensors", "low_weight": 0.5},
+             {"high": "WanVideo/listed.safetensors", "low": "missing.safetensors"}]
+
+    sources, errors = plan_lora_pairs(pairs)
+    results, fetched = manager.fetch(sources)
+    assert fetched
+    resolved, errors = manager.resolve(pairs, results, OBJECT_INFO)
+
+    remote_name = resolved[0]["high"]
+    assert remote_name.startswith("remote/") and remote_name.endswith("_lora.safetensors")
+    assert (loras / remote_name).read_bytes() == server.files["org/repo/main/lora.safetensors"]
+    assert resolved[0]["low"] == "mine.safetensors" and resolved[0]["low_weight"] == 0.5
+    assert resolved[1]["high"] == "WanVideo/listed.safetensors"
+    assert errors == ["lora_pairs[1].low: 未知的 LoRA: missing.safetensors",
+                      "可用的 LoRA: WanVideo/listed.safetensors"]
+
+    # 超过大小上限的远程 LoRA 不下载
+    small = LoraManager(cache_dir=str(tmp_path / "small"), budget=0, max_size=100, endpoint=endpoint,
+                        search_paths=[])
+    sources, _ = plan_lora_pairs([{"high": url}])
+    results, fetched = small.fetch(sources)
+    _, errors = small.resolve([{"high": url}], results, OBJECT_INFO)
+    assert "文件过大" in errors[0] and not fetched
+
+    # 超过任务截止时间时中止下载，不占住后续任务的下载线程
+    late = LoraManager(cache_dir=str(tmp_path / "late"), budget=0, max_size=0, endpoint=endpoint, search_paths=[])
+    results, fetched = late.fetch(sources, deadline=time.monotonic() - 1)
+    assert isinstance(results[url], ProvisionTimeout) and not fetched
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+测试显存规划：按 /system_stats（24 GB / 32 GB 卡）选择量化、block swap、VAE tiling 和加载设备并写入 prompt，
+预热的 worker 上空闲显存变少时规划不变
+"""
+
+from handler_core.memory_planner import GB, parse_system_stats, plan_memory, plan_prompt_memory, prompt_quantization
+from handler_core.template import PromptTemplate
+
+
+def system_stats(gpu, vram_total_gb, vram_free_gb, ram_free_gb=60):
+    """ComfyUI /system_stats 的响应格式"""
+    return {
+        "system": {"os": "posix", "ram_total": 64 * GB, "ram_free": ram_free_gb * GB, "comfyui_version": "0.3.66",
+                   "python_version": "3.12.3", "pytorch_version": "2.8.0+cu128", "embedded_python": False},
+        "devices": [{"name": f"cuda:0 {gpu} : cudaMallocAsync", "type": "cuda", "index": 0,
+                     "vram_total": vram_total_gb * GB, "vram_free": vram_free_gb * GB,
+                     "torch_vram_total": 0, "torch_vram_free": 0}],
+    }
+
+
+RTX_4090 = system_stats("NVIDIA GeForce RTX 4090", 24, 23.5)
+RTX_5000_ADA = system_stats("NVIDIA RTX 5000 Ada Generation", 32, 31.5)
+SHAPE = {"width": 480, "height": 832, "length": 81}
+QUANTIZATION = ["disabled", "fp8_e4m3fn", "fp8_e4m3fn_fast", "fp8_e5m2"]
+FP8_MODEL = 16.4 * GB
+BF16_MODEL = 28.6 * GB
+
+
+def test_parse_system_stats():
+    resources = parse_system_stats(RTX_4090)
+    assert resources["gpu"].startswith("cuda:0 NVIDIA GeForce RTX 4090")
+    assert (resources["vram_free"], resources["ram_free"]) == (23.5 * GB, 60 * GB)
+    assert parse_system_stats({"system": {}, "devices": [{"name": "cpu", "type": "cpu", "vram_total": 0}]}) is None
+
+
+def test_plan_depends_on_card_and_shape():
+    small, large = parse_system_stats(RTX_4090), parse_system_stats(RTX_5000_ADA)
+
+    # fp8 权重: 24 GB 卡换出少量 block，32 GB 卡不换出并直接加载到 GPU
+    plan = plan_memory(small, FP8_MODEL, SHAPE, model_is_fp8=True, t5_bytes=11 * GB)
+    assert (plan["quantization"], plan["load_device"], plan["vae_tiling"]) == (None, "offload_device", False)
+    assert plan["t5_load_device"] == "offload_device"
+    assert 0 < plan["blocks_to_swap"] <= 5
+    plan = plan_memory(large, FP8_MODEL, SHAPE, model_is_fp8=True, t5_bytes=11 * GB)
+    assert (plan["blocks_to_swap"], plan["load_device"], plan["t5_load_device"]) == (0, "main_device", "main_device")
+
+    # bf16 权重放不下时换成 fp8（Ada 上优先 _fast），而不是换出一半的 block
+    plan = plan_memory(large, BF16_MODEL, SHAPE, quantization_choices=QUANTIZATION, fast_fp8=True)
+    assert (plan["quantization"], plan["blocks_to_swap"]) == ("fp8_e4m3fn_fast", 0)
+    plan = plan_memory(small, BF16_MODEL, SHAPE, quantization_choices=QUANTIZATION)
+    assert plan["quantization"] == "fp8_e4m3fn"
+    # object_info 中没有 fp8 选项时只能换出
+    plan = plan_memory(small, BF16_MODEL, SHAPE, quantization_choices=["disabled"])
+    assert plan["quantization"] == "disabled" and plan["blocks_to_swap"] > 10
+
+    # 720p 长视频：大量换出并开启 VAE tiling，换出超过空闲内存时给出警告
+    plan = plan_memory(small, FP8_MODEL, {"width": 720, "height": 1280, "length": 121}, model_is_fp8=True)
+    assert plan["blocks_to_swap"] > 30 and plan["vae_tiling"] and not plan["warnings"]
+    tight = parse_system_stats(system_stats("NVIDIA GeForce RTX 4090", 24, 23.5, ram_free_gb=8))
+    assert plan_memory(tight, FP8_MODEL, {"width": 720, "height": 1280, "length": 121}, model_is_fp8=True)["warnings"]
+
+
+def test_plan_ignores_vram_held_by_previous_job():
+    # 预热的 worker 上 ComfyUI 还持有上一个任务的模型，相同的任务仍得到相同的规划
+    fresh = parse_system_stats(RTX_4090)
+    warm = parse_system_stats(system_stats("NVIDIA GeForce RTX 4090", 24, 3.5))
+    for model_bytes, kwargs in ((FP8_MODEL, {"model_is_fp8": True}), (BF16_MODEL, {"quantization_choices": QUANTIZATION})):
+        assert plan_memory(warm, model_bytes, SHAPE, **kwargs) == plan_memory(fresh, model_bytes, SHAPE, **kwargs)
+
+
+def test_plan_prompt_memory_rewrites_workflow_settings(tmp_path):
+    model = tmp_path / "wan2.2-bf16.safetensors"
+    with open(model, "wb") as f:
+        f.truncate(int(BF16_MODEL))
+    prompt = {
+        "122": {"class_type": "WanVideoModelLoader",
+                "inputs": {"model": model.name, "quantization": "disabled", "load_device": "offload_device"}},
+        "525": {"class_type": "WanVideoEnhancedBlockSwap", "inputs": {"blocks_to_swap": 25}},
+        "612": {"class_type": "WanVideoDecode", "inputs": {"enable_vae_tiling": True, "tile_x": 272}},
+        "541": {"class_type": "WanVideoImageToVideoEncode", "inputs": {"tiled_vae": True}},
+    }
+    object_info = {"WanVideoModelLoader": {"input": {"required": {"quantization": [QUANTIZATION]}}},
+                   "WanVideoEnhancedBlockSwap": {"input": {"required": {"blocks_to_swap": ["INT", {"max": 40}]}}}}
+
+    plan = plan_prompt_memory(prompt, object_info, RTX_5000_ADA, SHAPE, [("diffusion_models", str(tmp_path))],
+                              fast_fp8=True)
+    assert plan["quantization"] == "fp8_e4m3fn_fast"
+    assert prompt["122"]["inputs"] == {"model": model.name, "quantization": "fp8_e4m3fn_fast",
+                                       "load_device": "main_device"}
+    assert prompt["525"]["inputs"]["blocks_to_swap"] == 0
+    assert prompt["612"]["inputs"]["enable_vae_tiling"] is False and prompt["541"]["inputs"]["tiled_vae"] is False
+
+    # 模型文件不在本地时不修改工作流
+    assert plan_prompt_memory(prompt, object_info, RTX_5000_ADA, SHAPE, []) is None
+
+
+def test_plan_does_not_modify_shared_template(tmp_path):
+    model = tmp_path / "wan2.2-bf16.safetensors"
+    with open(model, "wb") as f:
+        f.truncate(int(BF16_MODEL))
+    template = PromptTemplate({
+        "122": {"class_type": "WanVideoModelLoader",
+                "inputs": {"model": model.name, "quantization": "disabled", "load_device": "offload_device"}},
+        "525": {"class_type": "WanVideoBlockSwap", "inputs": {"blocks_to_swap": 25}},
+    })
+    object_info = {"WanVideoModelLoader": {"input": {"required": {"quantization": [QUANTIZATION]}}}}
+
+    planned = template.instantiate()
+    plan_prompt_memory(planned, object_info, RTX_4090, SHAPE, [("diffusion_models", str(tmp_path))])
+    assert planned["122"]["inputs"]["quantization"] == "fp8_e4m3fn"
+    assert prompt_quantization(planned) == {"122": "fp8_e4m3fn"}
+
+    # 模板不变，下一个 memory_plan: false 的任务看到工作流中的原始配置
+    assert template.prompt["122"]["inputs"] == {"model": model.name, "quantization": "disabled",
+                                                "load_device": "offload_device"}
+    unplanned = template.instantiate()
+    assert unplanned["525"]["inputs"]["blocks_to_swap"] == 25
+    assert prompt_quantization(unplanned) == {"122": "disabled"}
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+测试姿态缓存注入：缓存键随参考视频内容和检测参数变化，命中时替换检测节点，未命中时追加保存节点
+"""
+
+import os
+import json
+
+from handler_core.pose_cache import compute_pose_cache_key, apply_pose_cache
+
+
+def make_prompt(video_path, max_frames=81):
+    """VHS_LoadVideo -> PoseDetectionOneToAllAnimation -> VHS_VideoCombine"""
+    return {
+        "1": {"class_type": "VHS_LoadVideo", "inputs": {"video": video_path, "frame_load_cap": max_frames}},
+        "2": {"class_type": "PoseDetectionOneToAllAnimation", "inputs": {"images": ["1", 0], "width": 512}},
+        "3": {"class_type": "VHS_VideoCombine", "inputs": {"images": ["2", 0]}},
+    }
+
+
+def test_cache_key_tracks_video_content_and_settings(tmp_path):
+    video = tmp_path / "ref.mp4"
+    video.write_bytes(b"frame-a")
+    key = compute_pose_cache_key(make_prompt(str(video)), "2")
+    assert key == compute_pose_cache_key(make_prompt(str(video)), "2")
+    assert key != compute_pose_cache_key(make_prompt(str(video), max_frames=49), "2")
+
+    video.write_bytes(b"frame-b-changed")
+    assert key != compute_pose_cache_key(make_prompt(str(video)), "2")
+    assert compute_pose_cache_key(make_prompt(str(tmp_path / "missing.mp4")), "2") is None
+
+
+def test_miss_adds_save_node_then_hit_replaces_stage(tmp_path):
+    video = tmp_path / "ref.mp4"
+    video.write_bytes(b"frame-a")
+    cache_dir = str(tmp_path / "cache")
+
+    prompt = make_prompt(str(video))
+    hits, save_nodes = apply_pose_cache(prompt, ["3"], cache_dir=cache_dir)
+    assert hits == [] and save_nodes == ["2_pose_cache_save"]
+    save_inputs = prompt["2_pose_cache_save"]["inputs"]
+    assert [save_inputs[f"output_{i}"] for i in range(4)] == [["2", i] for i in range(4)]
+
+    # 模拟 PoseCacheSave 写入完成
+    entry_dir = os.path.join(cache_dir, save_inputs["cache_key"])
+    os.makedirs(entry_dir)
+    with open(os.path.join(entry_dir, "meta.json"), "w") as f:
+        json.dump({"outputs": []}, f)
+
+    prompt = make_prompt(str(video))
+    hits, save_nodes = apply_pose_cache(prompt, ["3"], cache_dir=cache_dir)
+    assert hits == ["2"] and save_nodes == []
+    assert prompt["2"]["class_type"] == "PoseCacheLoad"
+    assert prompt["3"]["inputs"]["images"] == ["2", 0]
+
+
+def test_keypoint_stage_and_uncached_outputs(tmp_path):
+    video = tmp_path / "ref.mp4"
+    video.write_bytes(b"frame-a")
+    # SteadyDancer: 缓存 PoseAndFaceDetection 的关键点，DrawViTPose 每次渲染
+    prompt = {
+        "1": {"class_type": "VHS_LoadVideo", "inputs": {"video": str(video)}},
+        "89": {"class_type": "PoseAndFaceDetection", "inputs": {"images": ["1", 0], "width": 480}},
+        "88": {"class_type": "DrawViTPose", "inputs": {"pose_data": ["89", 0], "width": 480}},
+        "3": {"class_type": "VHS_VideoCombine", "inputs": {"images": ["88", 0]}},
+    }
+    _, save_nodes = apply_pose_cache(prompt, ["3"], cache_dir=str(tmp_path / "cache"))
+    assert save_nodes == ["89_pose_cache_save"]
+    assert prompt["89_pose_cache_save"]["inputs"]["output_0"] == ["89", 0]
+
+    # 下游使用了未缓存的 face_images 输出时不缓存
+    prompt = make_prompt(str(video))
+    prompt["2"]["class_type"] = "PoseAndFaceDetection"
+    prompt["4"] = {"class_type": "VHS_VideoCombine", "inputs": {"images": ["2", 1]}}
+    assert apply_pose_cache(prompt, ["3", "4"], cache_dir=str(tmp_path / "cache")) == ([], [])
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+测试实时预览：二进制预览帧解析、参数验证、限速与后台推送、缩小重编码
+"""
+
+import io
+import json
+import struct
+
+import pytest
+
+from handler_core import preview
+from handler_core.preview import PreviewStreamer, parse_preview_frame, parse_preview_options
+
+
+def make_frame(image_bytes, metadata=None):
+    if metadata is None:
+        return struct.pack(">II", 1, 2) + image_bytes
+    encoded = json.dumps(metadata).encode('utf-8')
+    return struct.pack(">II", 4, len(encoded)) + encoded + image_bytes
+
+
+def test_parse_preview_frame():
+    assert parse_preview_frame(make_frame(b"png")) == (b"png", {"image_type": "PNG"})
+    metadata = {"node_id": "27", "prompt_id": "p1", "image_type": "image/jpeg"}
+    assert parse_preview_frame(make_frame(b"jpg", metadata)) == (b"jpg", metadata)
+    # 未知事件类型、截断的帧
+    assert parse_preview_frame(struct.pack(">II", 3, 0) + b"x") is None
+    assert parse_preview_frame(b"\x00\x00") is None
+
+
+def test_parse_preview_options():
+    assert parse_preview_options({}) == (None, [])
+    options, errors = parse_preview_options({"preview": "r2", "preview_fps": "2", "preview_format": "webp"}, "auto")
+    assert errors == []
+    assert options == {"target": "r2", "fps": 2.0, "max_size": 256, "image_format": "webp"}
+    assert parse_preview_options({"preview": "email"}, "auto")[1]
+    _, errors = parse_preview_options({"preview": "progress", "preview_fps": 0, "preview_size": "big"}, "auto")
+    assert len(errors) == 2
+    # ComfyUI 未开启预览时请求预览直接返回错误
+    assert parse_preview_options({"preview": "progress"}, "none")[1]
+
+
+def test_streamer_throttles_and_filters_prompt(monkeypatch):
+    monkeypatch.setattr(preview, "encode_preview", lambda image_bytes, *args: image_bytes)
+    published = []
+    now = [0.0]
+    streamer = PreviewStreamer(lambda data, info: published.append((data, info)), fps=2, clock=lambda: now[0])
+
+    streamer.update_progress({"node": "27", "value": 3, "max": 6, "prompt_id": "p1"})
+    assert streamer.handle_frame(make_frame(b"a"), "p1")
+    streamer._pending.result()
+    now[0] = 0.3
+    assert not streamer.handle_frame(make_frame(b"b"), "p1")
+    now[0] = 0.6
+    assert not streamer.handle_frame(make_frame(b"c", {"node_id": "9", "prompt_id": "other"}), "p1")
+    assert streamer.handle_frame(make_frame(b"d", {"node_id": "30", "prompt_id": "p1"}), "p1")
+    streamer.close(wait=True)
+
+    assert published == [
+        (b"a", {"mime_type": "image/jpeg", "frame": 1, "node": "27", "value": 3, "max": 6}),
+        (b"d", {"mime_type": "image/jpeg", "frame": 2, "node": "30", "value": 3, "max": 6}),
+    ]
+
+
+def test_encode_preview_downscales():
+    Image = pytest.importorskip("PIL.Image")
+    buffer = io.BytesIO()
+    Image.new("RGB", (832, 480), (200, 30, 30)).save(buffer, format="PNG")
+
+    encoded = preview.encode_preview(buffer.getvalue(), max_size=256, image_format="webp")
+    with Image.open(io.BytesIO(encoded)) as image:
+        assert image.format == "WEBP"
+        assert image.size == (256, 148)
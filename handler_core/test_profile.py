@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+测试 profile 的输出选择（命名输出映射按工作流文件名查找，未指定时自动选择最终视频节点）、分桶参数，
+以及替换 ComfyUI 通信后的 run_job 流程（新下载的 LoRA、命名输出的选择和裁剪、未完成的模型预热、分桶统计、
+等待 ComfyUI 的截止时间）
+"""
+
+import json
+from concurrent.futures import Future
+
+import pytest
+
+from handler_core import comfy_client, profile as profile_module
+from handler_core.profile import WorkflowProfile, run_job, select_output_node
+
+REMOTE_LORA = "https://example.com/loras/style.safetensors"
+REMOTE_LORA_NAME = "remote/0123456789ab_style.safetensors"
+
+
+def object_info(loras=()):
+    return {
+        "WanVideoSampler": {"input": {"required": {}}, "output": ["LATENT"]},
+        "WanVideoLoraSelectMulti": {"input": {"required": {"lora_0": [["none", *loras]]}}, "output": ["WANVIDLORA"]},
+        "VHS_VideoCombine": {"input": {"required": {"images": ["LATENT"]}}, "output": [], "output_node": True},
+    }
+
+
+class FakeWebSocket:
+    """对最近提交的 prompt 中每个 VHS_VideoCombine 节点发送 executed 消息，然后结束执行"""
+
+    def __init__(self, queued, video_path):
+        self.queued = queued
+        self.video_path = video_path
+        self.frames = None
+
+    def settimeout(self, timeout):
+        pass
+
+    def recv(self):
+        if self.frames is None:
+            outputs = [node_id for node_id, node in self.queued[-1].items()
+                       if node["class_type"] == "VHS_VideoCombine"]
+            self.frames = [("executed", {"node": node_id, "prompt_id": "p1", "output": {
+                "gifs": [{"filename": "out.webm", "fullpath": self.video_path}]}}) for node_id in outputs]
+            self.frames.append(("executing", {"node": None, "prompt_id": "p1"}))
+        kind, data = self.frames.pop(0)
+        return json.dumps({"type": kind, "data": data})
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def comfy(tmp_path, monkeypatch):
+    """
+    替换 ComfyUI 通信：queued 记录提交的 prompt；object_info 模拟进程内缓存（invalidate 后才读到 ComfyUI 的新列表），
+    预热的 worker 已缓存不含远程 LoRA 的列表
+    """
+    video = tmp_path / "out.webm"
+    video.write_bytes(b"video")
+    state = {"queued": [], "comfyui": object_info(), "cached": object_info()}
+
+    def get_object_info():
+        if state["cached"] is None:
+            state["cached"] = state["comfyui"]
+        return state["cached"]
+
+    def queue_prompt(prompt):
+        state["queued"].append(prompt)
+        return {"prompt_id": "p1"}
+
+    monkeypatch.setattr(profile_module, "wait_for_http_connection", lambda *args, **kwargs: None)
+    monkeypatch.setattr(profile_module, "reap_orphaned_prompts", lambda: None)
+    monkeypatch.setattr(profile_module, "get_object_info", get_object_info)
+    monkeypatch.setattr(profile_module, "invalidate_object_info", lambda: state.update(cached=None))
+    monkeypatch.setattr(profile_module, "connect_websocket", lambda: FakeWebSocket(state["queued"], str(video)))
+    monkeypatch.setattr(comfy_client, "queue_prompt", queue_prompt)
+    return state
+
+
+class LoraProfile(WorkflowProfile):
+    params = {"lora_pairs": {"type": list, "default": []}}
+    provision_models = False
+
+    def build_prompt(self, job_input, ctx, object_info):
+        ctx["workflow_file"] = "/lora.json"
+        lora = ctx["params"]["lora_pairs"][0]["high"] if ctx["params"]["lora_pairs"] else "none"
+        return {
+            "1": {"class_type": "WanVideoLoraSelectMulti", "inputs": {"lora_0": lora}},
+            "2": {"class_type": "WanVideoSampler", "inputs": {"lora": ["1", 0]}},
+            "3": {"class_type": "VHS_VideoCombine", "inputs": {"images": ["2", 0]}},
+        }
+
+
+class OutputsProfile(WorkflowProfile):
+    """final 和 preview 是两条独立的分支"""
+    params = {"prompt": {"type": str, "default": ""}}
+    provision_models = False
+    workflow_outputs = {"outputs": {"final": "2", "preview": "4"}}
+
+    def build_prompt(self, job_input, ctx, object_info):
+        ctx["workflow_file"] = "/outputs.json"
+        return {
+            "1": {"class_type": "WanVideoSampler", "inputs": {}},
+            "2": {"class_type": "VHS_VideoCombine", "inputs": {"images": ["1", 0]}},
+            "3": {"class_type": "WanVideoSampler", "inputs": {}},
+            "4": {"class_type": "VHS_VideoCombine", "inputs": {"images": ["3", 0]}},
+        }
+
+
+def test_get_outputs_strips_extension_and_api_suffix():
+    class Profile(WorkflowProfile):
+        workflow_outputs = {"wf": {"final": "9"}}
+
+    profile = Profile()
+    assert profile.get_outputs("/wf.json") == {"final": "9"}
+    assert profile.get_outputs("/wf_api.json") == {"final": "9"}
+    assert profile.get_outputs("/other.json") is None
+    assert profile.get_outputs(None) is None
+
+
+def test_select_output_node_prefers_save_output_then_order():
+    prompt = {
+        "1": {"class_type": "VHS_VideoCombine", "inputs": {"save_output": False}},
+        "2": {"class_type": "VHS_VideoCombine", "inputs": {"save_output": True}},
+        "3": {"class_type": "SaveVideo", "inputs": {}},
+    }
+    videos = {"1": ["a"], "2": ["b"], "3": ["c"]}
+    assert select_output_node(videos, ["3", "2", "1"], prompt) == "2"
+
+    prompt["2"]["inputs"]["save_output"] = False
+    workflow_data = {"nodes": [{"id": 1, "order": 10}, {"id": 2, "order": 5}]}
+    assert select_output_node(videos, [], prompt, workflow_data) == "1"
+
+    # 没有 VHS 节点时取最后执行的视频节点
+    assert select_output_node({"3": ["c"], "4": ["d"]}, ["4", "3"], prompt) == "3"
+    assert select_output_node({"1": []}, [], prompt) is None
+
+
+def test_bucket_params():
+    class Profile(WorkflowProfile):
+        params = {"prompt": {"type": str, "default": ""}}
+        bucket_params = ("width", "height", "length")
+
+    assert Profile().get_bucket_params({"prompt": "a cat"}) == ("width", "height", "length")
+    # 多提示词模式只对齐宽高
+    assert Profile().get_bucket_params({"prompt": "a cat\na dog"}) == ("width", "height")
+    # 显式请求分桶但 profile 不支持时返回错误，而不是忽略
+    assert "不支持 bucketing" in run_job({"input": {"bucketing": True}}, WorkflowProfile())["error"]
+
+
+def test_run_job_with_new_remote_lora(comfy, monkeypatch):
+    def prefetch_lora_pairs(sources, deadline=None):
+        # 后台下载完成后 ComfyUI 的 LoRA 列表中才有新文件
+        comfy["comfyui"] = object_info([REMOTE_LORA_NAME])
+        future = Future()
+        future.set_result(({REMOTE_LORA: REMOTE_LORA_NAME}, True))
+        return future
+
+    monkeypatch.setattr(profile_module, "prefetch_lora_pairs", prefetch_lora_pairs)
+    result = run_job({"id": "j1", "input": {"lora_pairs": [{"high": REMOTE_LORA}], "mp4_layout": "none",
+                                            "memory_plan": False, "singleflight": False}}, LoraProfile())
+    assert "error" not in result, result
+    assert result["video"] == "dmlkZW8="
+    assert comfy["queued"][0]["1"]["inputs"]["lora_0"] == REMOTE_LORA_NAME
+
+
+def outputs_job(**job_input):
+    return {"id": "j1", "input": dict(job_input, mp4_layout="none", memory_plan=False, singleflight=False)}
+
+
+def test_run_job_named_output_prunes_other_branches(comfy):
+    result = run_job(outputs_job(output="preview"), OutputsProfile())
+    assert "error" not in result, result
+    assert result["video"] == "dmlkZW8="
+    # 只提交所选输出需要的节点
+    assert sorted(comfy["queued"][-1]) == ["3", "4"]
+
+    # 未指定 output 时使用 default_output
+    assert "error" not in run_job(outputs_job(), OutputsProfile())
+    assert sorted(comfy["queued"][-1]) == ["1", "2"]
+
+
+def test_run_job_unknown_output(comfy):
+    result = run_job(outputs_job(output="pose-debug"), OutputsProfile())
+    assert result["error"] == "不支持的 output: pose-debug，可选: final, preview"
+    assert comfy["queued"] == []
+
+
+def test_run_job_reports_unfinished_model_stage(comfy, monkeypatch):
+    stage = {"mode": "copy", "finished": False, "elapsed": 3.0, "files": 2, "files_done": 1, "bytes_total": 30,
+             "bytes_done": 10, "items": []}
+    monkeypatch.setattr(profile_module, "get_stage_progress", lambda: stage)
+    result = run_job(outputs_job(), OutputsProfile())
+    assert result["model_stage"] == {"mode": "copy", "files": 2, "files_done": 1, "bytes_total": 30, "bytes_done": 10}
+
+    # 预热完成后不再写入结果
+    stage["finished"] = True
+    assert "model_stage" not in run_job(outputs_job(), OutputsProfile())
+
+
+def test_run_job_reports_bucket_stats(comfy):
+    class Profile(OutputsProfile):
+        params = {"width": {"type": int, "default": 480}, "height": {"type": int, "default": 832},
+                  "length": {"type": int, "default": 81}}
+        bucket_params = ("width", "height", "length")
+
+    # 请求的形状就是一个桶，输出不需要裁剪
+    first = run_job(outputs_job(bucketing=True), Profile())["bucket"]
+    second = run_job(outputs_job(bucketing=True), Profile())["bucket"]
+    assert first["requested"] == first["generated"] == {"width": 480, "height": 832, "length": 81}
+    assert first["hit"] and second["warm"]
+    assert second["worker"]["jobs"] == first["worker"]["jobs"] + 1
+    assert second["worker"]["hits"] == first["worker"]["hits"] + 1
+
+
+def test_run_job_waits_for_comfyui_within_deadline(comfy, monkeypatch):
+    timeouts = []
+    monkeypatch.setattr(profile_module, "wait_for_http_connection", lambda timeout: timeouts.append(timeout))
+    assert "error" not in run_job(outputs_job(job_timeout=30), OutputsProfile())
+    assert 0 < timeouts[0] <= 30
+
+    # 截止时间较远时仍使用固定的上限
+    run_job(outputs_job(job_timeout=3600), OutputsProfile())
+    assert timeouts[1] == profile_module.COMFYUI_WAIT_TIMEOUT
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+测试 prompt 修正：按 profile 选择的修正名称执行，VHS_VideoCombine 的 images 改连 IMAGE 输出，tile / 调度步数修正
+"""
+
+import pytest
+
+from handler_core.prompt_fixups import fix_prompt_inputs
+
+
+def extend_prompt():
+    return {
+        "263": {"class_type": "WanVideoAddOneToAllExtendEmbeds", "inputs": {},
+                "outputs": [{"name": "image_embeds", "type": "WANVIDIMAGE_EMBEDS"},
+                            {"name": "samples", "type": "LATENT"},
+                            {"name": "extended_images", "type": "IMAGE"}]},
+        "250": {"class_type": "VHS_VideoCombine", "inputs": {"images": ["263", 0], "frame_rate": 16}},
+        "28": {"class_type": "WanVideoDecode", "inputs": {"tile_x": 0, "tile_stride_x": 0, "tile_y": 128,
+                                                          "tile_stride_y": 128, "enable_vae_tiling": True}},
+        "231": {"class_type": "WanVideoScheduler", "inputs": {"steps": 6, "start_step": 6, "end_step": 0}},
+    }
+
+
+def test_video_combine_uses_extended_images():
+    prompt = extend_prompt()
+    fix_prompt_inputs(prompt, fixups=("video_combine_images",))
+    assert prompt["250"]["inputs"]["images"] == ["263", 2]
+    # 未选择的修正不执行
+    assert prompt["28"]["inputs"]["tile_x"] == 0 and prompt["231"]["inputs"]["end_step"] == 0
+
+    # 转换后的节点没有 outputs 时从 object_info 读取
+    prompt = extend_prompt()
+    del prompt["263"]["outputs"]
+    object_info = {"WanVideoAddOneToAllExtendEmbeds": {
+        "output": ["WANVIDIMAGE_EMBEDS", "LATENT", "IMAGE"],
+        "output_name": ["image_embeds", "samples", "extended_images"]}}
+    fix_prompt_inputs(prompt, None, object_info, ("video_combine_images",))
+    assert prompt["250"]["inputs"]["images"] == ["263", 2]
+
+
+def test_tiles_and_scheduler_steps():
+    prompt = extend_prompt()
+    fix_prompt_inputs(prompt, fixups=("vae_tiles", "scheduler_steps"))
+    assert prompt["28"]["inputs"] == {"tile_x": 272, "tile_stride_x": 144, "tile_y": 128, "tile_stride_y": 96,
+                                      "enable_vae_tiling": False}
+    assert (prompt["231"]["inputs"]["start_step"], prompt["231"]["inputs"]["end_step"]) == (0, 6)
+
+    with pytest.raises(ValueError, match="未知的 prompt 修正"):
+        fix_prompt_inputs(prompt, fixups=("vae_tile",))
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+测试 prompt 裁剪：禁用节点删除、bypass 改接、反向可达性
+"""
+
+from handler_core.prompt_optimizer import prune_prompt
+
+OBJECT_INFO = {
+    "LoadImage": {"output": ["IMAGE", "MASK"]},
+    "ImageScale": {"input": {"required": {"image": ["IMAGE"]}}, "output": ["IMAGE"]},
+    "PreviewImage": {"input": {"required": {"images": ["IMAGE"]}}, "output": [], "output_node": True},
+    "VHS_VideoCombine": {"input": {"required": {"images": ["IMAGE"]}}, "output": ["VHS_FILENAMES"], "output_node": True},
+}
+
+
+def make_prompt():
+    return {
+        "1": {"class_type": "LoadImage", "inputs": {"image": "a.png"}, "mode": 0},
+        "2": {"class_type": "ImageScale", "inputs": {"image": ["1", 0]}, "mode": 0},
+        "3": {"class_type": "VHS_VideoCombine", "inputs": {"images": ["2", 0]}, "mode": 0},
+        "4": {"class_type": "PreviewImage", "inputs": {"images": ["1", 0]}, "mode": 0},
+        "5": {"class_type": "ImageScale", "inputs": {"image": ["1", 0]}, "mode": 0},
+        "6": {"class_type": "VHS_VideoCombine", "inputs": {"images": ["5", 0]}, "mode": 2},
+    }
+
+
+def test_muted_nodes_and_dead_branches_removed():
+    pruned, removed = prune_prompt(make_prompt(), object_info=OBJECT_INFO)
+    assert set(pruned) == {"1", "2", "3", "4"}
+    assert set(removed) == {"5", "6"}
+
+
+def test_requested_outputs_only():
+    pruned, _ = prune_prompt(make_prompt(), output_node_ids=["3"], object_info=OBJECT_INFO)
+    assert set(pruned) == {"1", "2", "3"}
+
+
+def test_bypass_rewires_downstream():
+    prompt = make_prompt()
+    prompt["2"]["mode"] = 4
+    pruned, removed = prune_prompt(prompt, output_node_ids=["3"], object_info=OBJECT_INFO)
+    assert "2" in removed
+    assert pruned["3"]["inputs"]["images"] == ["1", 0]
+    # 原 prompt 不被修改
+    assert prompt["3"]["inputs"]["images"] == ["2", 0]
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+测试按需下载模型：本地 HF 兼容镜像（302 跳转 + Range），并行分段下载、续传、sha256 校验、LRU 淘汰、截止时间、
+并发更新索引
+"""
+
+import os
+import time
+import hashlib
+import threading
+
+import pytest
+
+from handler_core import fastjson, provision
+from handler_core.provision import ModelCache, ProvisionTimeout, download_file, model_url, provision_prompt_models
+from handler_core.template import PromptTemplate
+from handler_core.validate_workflow import check_workflow
+from handler_core.widgets import normalize_prompt_inputs
+
+MANIFEST = (
+    {"folder": "vae", "file": "vae.safetensors", "repo": "org/repo", "path": "vae.safetensors"},
+    {"folder": "loras", "file": "WanVideo/lora.safetensors", "repo": "org/repo", "path": "lora.safetensors"},
+)
+
+
+def make_cache(root, endpoint, budget=0):
+    return ModelCache(root=str(root), budget=budget, endpoint=endpoint, connections=4, chunk_size=1024,
+                      search_dirs=[])
+
+
+def test_provision_prompt_models(tmp_path, mirror):
+    server, endpoint = mirror
+    cache = make_cache(tmp_path, endpoint)
+    prompt = {"1": {"class_type": "WanVideoVAELoader", "inputs": {"model_name": "vae.safetensors"}},
+              "2": {"class_type": "WanVideoLoraSelect", "inputs": {"lora": "WanVideo\\lora.safetensors"}},
+              "3": {"class_type": "LoadImage", "inputs": {"image": "input.png"}}}
+
+    downloaded = provision_prompt_models(prompt, MANIFEST, cache)
+    assert sorted(downloaded) == [str(tmp_path / "loras/WanVideo/lora.safetensors"),
+                                  str(tmp_path / "vae/vae.safetensors")]
+    assert (tmp_path / "vae/vae.safetensors").read_bytes() == server.files["org/repo/main/vae.safetensors"]
+    # 10000 字节按 1024 分成 10 段，6000 字节分成 6 段
+    assert len(server.ranges) == 16
+    assert not [name for name in os.listdir(tmp_path / "vae") if name.endswith((".part", ".part.json"))]
+    assert set(fastjson.load_file(tmp_path / ".provision_index.json")) == {"vae/vae.safetensors",
+                                                                          "loras/WanVideo/lora.safetensors"}
+
+    # 已存在时不再请求镜像
+    assert provision_prompt_models(prompt, MANIFEST, cache) == []
+    assert len(server.ranges) == 16
+
+
+def test_resume_and_sha256_mismatch(tmp_path, mirror):
+    server, endpoint = mirror
+    data = server.files["org/repo/main/vae.safetensors"]
+    dest = tmp_path / "vae.safetensors"
+    # 上次下载完成了前 4 段
+    part = bytearray(len(data))
+    part[:4096] = data[:4096]
+    (tmp_path / "vae.safetensors.part").write_bytes(bytes(part))
+    state = {"size": len(data), "sha256": hashlib.sha256(data).hexdigest(), "chunk_size": 1024,
+             "done": [0, 1024, 2048, 3072]}
+    (tmp_path / "vae.safetensors.part.json").write_bytes(fastjson.dumps(state))
+
+    url = model_url(MANIFEST[0], endpoint)
+    download_file(url, str(dest), connections=3, chunk_size=1024, endpoint=endpoint)
+    assert dest.read_bytes() == data
+    assert sorted(start for start, _ in server.ranges) == [4096, 5120, 6144, 7168, 8192, 9216]
+
+    # 清单中的 sha256 与下载内容不一致：不放置文件，也不保留 .part
+    with pytest.raises(Exception, match="sha256"):
+        download_file(url, str(tmp_path / "bad.safetensors"), sha256="0" * 64, chunk_size=4096, endpoint=endpoint)
+    assert not list(tmp_path.glob("bad.safetensors*"))
+
+
+def test_lru_eviction_keeps_pinned_models(tmp_path, mirror):
+    server, endpoint = mirror
+    server.files["org/repo/main/big.safetensors"] = os.urandom(9000)
+    cache = make_cache(tmp_path, endpoint, budget=20000)
+    vae, lora = MANIFEST
+    big = {"folder": "diffusion_models", "file": "big.safetensors", "repo": "org/repo", "path": "big.safetensors"}
+
+    cache.ensure(vae)
+    cache.ensure(lora)
+    # 16000 + 9000 超出 20000 的预算：最久未使用的 vae 被当前任务固定，改为淘汰 lora
+    cache.ensure(big, pinned={"vae/vae.safetensors"})
+    assert (tmp_path / "vae/vae.safetensors").exists()
+    assert not (tmp_path / "loras/WanVideo/lora.safetensors").exists()
+    assert set(cache.load_index()) == {"vae/vae.safetensors", "diffusion_models/big.safetensors"}
+
+    with pytest.raises(Exception, match="空间不足"):
+        make_cache(tmp_path, endpoint, budget=20000).ensure(
+            lora, pinned={"vae/vae.safetensors", "diffusion_models/big.safetensors"})
+
+
+def test_missing_model_is_provisioned_not_replaced(tmp_path, mirror):
+    """模板规范化保留缺少的模型名，提交前下载后通过下拉值验证；已有的模型不下载"""
+    server, endpoint = mirror
+    local = tmp_path / "comfyui"
+    (local / "vae").mkdir(parents=True)
+    (local / "vae/vae.safetensors").write_bytes(b"local")
+    cache = ModelCache(root=str(tmp_path / "cache"), endpoint=endpoint, connections=4, chunk_size=1024,
+                       search_dirs=[str(local)])
+
+    def object_info():
+        # ComfyUI 每次请求 /object_info 时重新扫描模型目录
+        loras = sorted(str(path.relative_to(tmp_path / "cache/loras"))
+                       for path in (tmp_path / "cache").glob("loras/**/*.safetensors"))
+        return {"WanVideoVAELoader": {"input": {"required": {"model_name": [["vae.safetensors"]]}},
+                                      "output": ["WANVAE"]},
+                "WanVideoLoraSelect": {"input": {"required": {"lora": [loras or ["none"]]}},
+                                       "output": ["WANVIDLORA"], "output_node": True}}
+
+    workflow = {"1": {"class_type": "WanVideoVAELoader", "inputs": {"model_name": "vae.safetensors"}},
+                "2": {"class_type": "WanVideoLoraSelect", "inputs": {"lora": "WanVideo/lora.safetensors"}}}
+    normalize_prompt_inputs(workflow, object_info())
+    assert workflow["2"]["inputs"]["lora"] == "WanVideo/lora.safetensors"
+    assert any("WanVideo/lora.safetensors" in error for error in check_workflow(workflow, object_info())[0])
+
+    prompt = PromptTemplate(workflow).instantiate()
+    downloaded = provision_prompt_models(prompt, MANIFEST, cache, deadline=time.monotonic() + 30)
+    assert downloaded == [str(tmp_path / "cache/loras/WanVideo/lora.safetensors")]
+    assert not (tmp_path / "cache/vae").exists()
+    assert check_workflow(prompt, object_info())[0] == []
+
+
+def test_download_stops_at_deadline(tmp_path, mirror):
+    _, endpoint = mirror
+    cache = make_cache(tmp_path, endpoint)
+    with pytest.raises(ProvisionTimeout):
+        cache.ensure(MANIFEST[0], deadline=time.monotonic() - 1)
+    assert not (tmp_path / "vae/vae.safetensors").exists()
+
+
+def test_concurrent_touch_keeps_all_entries(tmp_path, monkeypatch):
+    write_json_atomic = provision.write_json_atomic
+
+    def slow_write(path, data):
+        # 放大读取和写入之间的窗口：没有索引锁时后写入的线程会覆盖其他线程的记录
+        time.sleep(0.01)
+        write_json_atomic(path, data)
+
+    monkeypatch.setattr(provision, "write_json_atomic", slow_write)
+    cache = make_cache(tmp_path, "http://unused")
+    specs = [{"folder": "loras", "file": f"lora_{index}.safetensors"} for index in range(8)]
+    threads = [threading.Thread(target=cache.touch, args=(spec, 100, None)) for spec in specs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert set(cache.load_index()) == {os.path.join("loras", spec["file"]) for spec in specs}
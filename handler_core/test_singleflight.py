@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+测试相同任务合并执行：进程内 follower、跨 worker 锁文件与结果文件（只在有 follower 时写入）、失败不共享、心跳超时的锁
+"""
+
+import os
+import json
+import time
+import threading
+
+from handler_core.singleflight import SingleFlight, flight_key
+
+KEY = flight_key("hash", ["27"], "faststart", None, False)
+
+
+def test_flight_key_depends_on_options():
+    assert KEY == flight_key("hash", ["27"], "faststart", None, False)
+    assert KEY != flight_key("hash", ["27"], "fragmented", None, False)
+
+
+def test_followers_in_same_process_share_leader_result(tmp_path):
+    flight = SingleFlight(str(tmp_path), poll_interval=0.01)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def execute():
+        calls.append(1)
+        started.set()
+        assert release.wait(5)
+        return {"video": "abc"}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do(KEY, execute)))
+    leader.start()
+    assert started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(flight.do(KEY, execute)))
+    follower.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert len(calls) == 1
+    assert sorted(results, key=lambda result: result[1]) == [({"video": "abc"}, False), ({"video": "abc"}, True)]
+
+
+def test_followers_on_other_workers_wait_for_lock(tmp_path):
+    # 两个实例模拟共享同一网络卷的两个 worker
+    leader_flight, follower_flight = SingleFlight(str(tmp_path)), SingleFlight(str(tmp_path), poll_interval=0.01)
+    started, release = threading.Event(), threading.Event()
+
+    def execute():
+        started.set()
+        assert release.wait(5)
+        return {"video": "abc", "job_hash": "hash"}
+
+    leader = threading.Thread(target=leader_flight.do, args=(KEY, execute))
+    leader.start()
+    assert started.wait(5)
+    assert os.path.exists(tmp_path / f"{KEY}.lock")
+
+    def release_after_follower_waits():
+        while not [name for name in os.listdir(tmp_path) if ".wait-" in name]:
+            time.sleep(0.01)
+        release.set()
+
+    threading.Thread(target=release_after_follower_waits, daemon=True).start()
+    assert follower_flight.do(KEY, lambda: {"error": "不应执行"}) == ({"video": "abc", "job_hash": "hash"}, True)
+    leader.join(5)
+    # follower 等待结束后删除登记，网络卷上只留下结果
+    assert sorted(os.listdir(tmp_path)) == [f"{KEY}.json"]
+    entry = json.loads((tmp_path / f"{KEY}.json").read_text())
+    assert entry["result"] == {"video": "abc", "job_hash": "hash"}
+    # 结果保留 ttl 秒，稍后到达的重试直接使用
+    assert SingleFlight(str(tmp_path)).do(KEY, lambda: {"error": "不应执行"})[1] is True
+    assert SingleFlight(str(tmp_path), ttl=0).do(KEY, lambda: {"video": "new"}) == ({"video": "new"}, False)
+
+
+def test_failures_are_not_shared_and_stale_locks_are_broken(tmp_path):
+    flight = SingleFlight(str(tmp_path), poll_interval=0.01, stale_after=60)
+    assert flight.do(KEY, lambda: {"error": "OOM"}) == ({"error": "OOM"}, False)
+    assert not os.path.exists(tmp_path / f"{KEY}.json")
+
+    # 上一个 leader 所在的 worker 被回收，锁文件的心跳停止
+    lock_path = tmp_path / f"{KEY}.lock"
+    lock_path.write_text("dead-host 1\n")
+    os.utime(lock_path, (time.time() - 120, time.time() - 120))
+    assert flight.do(KEY, lambda: {"video": "abc"}) == ({"video": "abc"}, False)
+    assert not lock_path.exists()
+
+
+def test_result_is_not_written_without_followers(tmp_path):
+    # 结果包含 base64 视频，没有 follower 等待时不写入网络卷
+    flight = SingleFlight(str(tmp_path))
+    assert flight.do(KEY, lambda: {"video": "x" * 1000}) == ({"video": "x" * 1000}, False)
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+测试模型预热：按首次使用排序、按 ComfyUI 查找顺序定位、copy / readahead 与进度、带宽限制
+"""
+
+from handler_core.stage import ModelStager, RateLimiter, workflow_model_names
+
+PROMPT = {
+    "1": {"class_type": "LoadImage", "inputs": {"image": "input.png"}},
+    "2": {"class_type": "WanVideoModelLoader", "inputs": {"model": "WanVideo\\model.safetensors",
+                                                          "lora": ["5", 0]}},
+    "3": {"class_type": "WanVideoSampler", "inputs": {"model": ["2", 0], "text_embeds": ["4", 0]}},
+    "4": {"class_type": "WanVideoTextEncodeCached", "inputs": {"model_name": "umt5.safetensors"}},
+    "5": {"class_type": "WanVideoLoraSelect", "inputs": {"lora": "lora.safetensors"}},
+    "6": {"class_type": "WanVideoDecode", "inputs": {"vae": ["7", 0], "samples": ["3", 0]}},
+    "7": {"class_type": "WanVideoVAELoader", "inputs": {"model_name": "vae.safetensors"}},
+}
+
+
+def test_workflow_model_names_in_execution_order():
+    # 从输出节点 6 出发：vae -> sampler(model <- lora, text_embeds)
+    assert workflow_model_names(PROMPT) == ["vae.safetensors", "lora.safetensors", "WanVideo/model.safetensors",
+                                            "umt5.safetensors"]
+
+    ui_workflow = {"nodes": [
+        {"id": 9, "order": 2, "widgets_values": ["vae.safetensors", "bf16"]},
+        {"id": 3, "order": 0, "widgets_values": {"model": "model.safetensors"}},
+        {"id": 5, "order": 1, "mode": 4, "widgets_values": ["bypassed.safetensors"]},
+    ]}
+    assert workflow_model_names(ui_workflow) == ["model.safetensors", "vae.safetensors"]
+
+
+def test_copy_mode_stages_network_models(tmp_path):
+    local, network, stage_dir = tmp_path / "local", tmp_path / "network", tmp_path / "stage"
+    (local / "vae").mkdir(parents=True)
+    (local / "vae/vae.safetensors").write_bytes(b"v" * 10)
+    (network / "models/WanVideo").mkdir(parents=True)
+    (network / "models/WanVideo/model.safetensors").write_bytes(b"m" * 3000)
+    (network / "loras").mkdir()
+    (network / "loras/lora.safetensors").write_bytes(b"l" * 500)
+    search_paths = [("vae", str(local / "vae")), ("diffusion_models", str(network / "models")),
+                    ("loras", str(network / "loras"))]
+
+    stager = ModelStager(mode="copy", stage_dir=str(stage_dir), search_paths=search_paths, reserve=0,
+                         block_size=1024)
+    stager.is_local = lambda path: path.startswith(str(local))
+    state = stager.run(workflow_model_names(PROMPT), log_interval=3600)
+
+    assert [(item["name"], item["status"]) for item in state["items"]] == [
+        ("vae.safetensors", "local"), ("lora.safetensors", "done"),
+        ("WanVideo/model.safetensors", "done"), ("umt5.safetensors", "missing")]
+    assert (state["files"], state["files_done"], state["bytes_total"], state["bytes_done"]) == (3, 3, 3510, 3510)
+    assert (stage_dir / "diffusion_models/WanVideo/model.safetensors").read_bytes() == b"m" * 3000
+    assert (stage_dir / "loras/lora.safetensors").read_bytes() == b"l" * 500
+    assert not list(stage_dir.rglob("*.part"))
+
+
+def test_readahead_respects_memory_budget(tmp_path):
+    for name, size in (("a.safetensors", 600), ("b.safetensors", 600), ("c.safetensors", 300)):
+        (tmp_path / name).write_bytes(b"x" * size)
+    stager = ModelStager(mode="readahead", search_paths=[("loras", str(tmp_path))], memory_budget=1000)
+    state = stager.run(["a.safetensors", "b.safetensors", "c.safetensors"], log_interval=3600)
+    # 超出内存预算的文件跳过，避免把先使用的文件挤出页缓存
+    assert [item["status"] for item in state["items"]] == ["done", "skipped", "done"]
+    assert state["bytes_done"] == 900
+
+
+def test_rate_limiter_shares_bandwidth():
+    now, sleeps = [0.0], []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    limiter = RateLimiter(1000, clock=lambda: now[0], sleep=sleep)
+    limiter.consume(500)
+    limiter.consume(1500)
+    assert sleeps == [0.5, 1.5]
+    assert RateLimiter(0).consume(10 ** 9) is None
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+测试子图展开：内部节点重新编号、子图输入/输出连接改写、链式实例
+"""
+
+import json
+import os
+
+from handler_core.subgraph_expander import expand_subgraphs
+from handler_core.convert_workflow_to_api import convert_nodes_to_prompt_format
+from handler_core.validate_workflow import check_workflow
+
+SUBGRAPH_ID = "11111111-2222-3333-4444-555555555555"
+
+
+def make_workflow():
+    """LoadImage -> 子图实例 5 -> 子图实例 6 -> PreviewImage，子图内部为单个 ImageScale"""
+    return {
+        "nodes": [
+            {"id": 1, "type": "LoadImage", "inputs": [], "outputs": [{"name": "IMAGE", "type": "IMAGE", "links": [1]}],
+             "widgets_values": ["a.png"], "mode": 0},
+            {"id": 5, "type": SUBGRAPH_ID, "inputs": [{"name": "image", "type": "IMAGE", "link": 1}],
+             "outputs": [{"name": "scaled", "type": "IMAGE", "links": [2]}], "mode": 0},
+            {"id": 6, "type": SUBGRAPH_ID, "inputs": [{"name": "image", "type": "IMAGE", "link": 2}],
+             "outputs": [{"name": "scaled", "type": "IMAGE", "links": [3]}], "mode": 0},
+            {"id": 9, "type": "PreviewImage", "inputs": [{"name": "images", "type": "IMAGE", "link": 3}], "mode": 0},
+        ],
+        "links": [[1, 1, 0, 5, 0, "IMAGE"], [2, 5, 0, 6, 0, "IMAGE"], [3, 6, 0, 9, 0, "IMAGE"]],
+        "definitions": {"subgraphs": [{
+            "id": SUBGRAPH_ID,
+            "name": "Scale",
+            "inputs": [{"name": "image", "type": "IMAGE", "linkIds": [1]}],
+            "outputs": [{"name": "scaled", "type": "IMAGE", "linkIds": [2]}],
+            "nodes": [{"id": 3, "type": "ImageScale",
+                       "inputs": [{"name": "image", "type": "IMAGE", "link": 1},
+                                  {"name": "width", "type": "INT", "widget": {"name": "width"}, "link": None}],
+                       "outputs": [{"name": "IMAGE", "type": "IMAGE", "links": [2]}],
+                       "widgets_values": [512], "mode": 0}],
+            "links": [{"id": 1, "origin_id": -10, "origin_slot": 0, "target_id": 3, "target_slot": 0, "type": "IMAGE"},
+                      {"id": 2, "origin_id": 3, "origin_slot": 0, "target_id": -20, "target_slot": 0, "type": "IMAGE"}],
+        }]},
+    }
+
+
+def test_chained_instances_are_inlined():
+    prompt = convert_nodes_to_prompt_format(make_workflow())
+    assert set(prompt) == {"1", "5:3", "6:3", "9"}
+    assert prompt["5:3"]["inputs"]["image"] == ["1", 0]
+    assert prompt["5:3"]["inputs"]["width"] == 512
+    assert prompt["6:3"]["inputs"]["image"] == ["5:3", 0]
+    assert prompt["9"]["inputs"]["images"] == ["6:3", 0]
+
+
+def test_input_not_modified():
+    workflow = make_workflow()
+    expand_subgraphs(workflow)
+    assert [node["id"] for node in workflow["nodes"]] == [1, 5, 6, 9]
+
+
+def test_bundled_onetoall_workflow_has_no_subgraph_nodes():
+    path = os.path.join(os.path.dirname(__file__), "..", "onetoall_all", "Wan21_OneToAllAnimation_example_01.json")
+    with open(path, 'r', encoding='utf-8') as f:
+        workflow = json.load(f)
+    prompt = convert_nodes_to_prompt_format(workflow)
+    errors, _ = check_workflow(prompt)
+    assert errors == []
+    assert "263:248" in prompt and prompt["263:248"]["class_type"] == "WanVideoSampler"
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+测试工作流模板：实例化只复制被绑定 / 声明可写的节点，任务中的修改不会影响模板和后续任务
+"""
+
+import json
+
+from handler_core.template import PromptTemplate, get_template, writable_node
+
+BINDINGS = (
+    ("seed", "1", "seed", 0),
+    ("prompt", "2", "text", None),
+)
+
+
+def make_prompt():
+    return {
+        "1": {"class_type": "KSampler", "inputs": {"seed": 0, "model": ["3", 0]}, "widgets_values": [0, "euler"]},
+        "2": {"class_type": "CLIPTextEncode", "inputs": {"text": "", "clip": ["3", 1]}},
+        "3": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "a.safetensors"}},
+        "4": {"class_type": "VHS_VideoCombine", "inputs": {"images": ["1", 0]}, "widgets_values": {"frame_rate": 16}},
+    }
+
+
+def test_instantiate_copies_only_bound_nodes():
+    template = PromptTemplate(make_prompt())
+    prompt = template.instantiate(BINDINGS, {"seed": 7, "prompt": "dance"}, writable=("4",))
+
+    assert prompt["3"] is template.prompt["3"]
+    assert prompt["1"] is not template.prompt["1"] and prompt["4"] is not template.prompt["4"]
+    assert prompt["1"]["inputs"]["model"] is template.prompt["1"]["inputs"]["model"]
+    assert prompt["1"]["widgets_values"] == [7, "euler"]
+    assert template.prompt == make_prompt()
+    assert json.loads(json.dumps(prompt)) == dict(make_prompt(), **{
+        "1": dict(make_prompt()["1"], inputs={"seed": 7, "model": ["3", 0]}, widgets_values=[7, "euler"]),
+        "2": dict(make_prompt()["2"], inputs={"text": "dance", "clip": ["3", 1]}),
+    })
+
+
+def test_job_mutations_do_not_leak_into_template():
+    template = PromptTemplate(make_prompt())
+    prompt = template.instantiate()
+    prompt.writable("4")["widgets_values"]["frame_rate"] = 24
+    writable_node(prompt, "3")["inputs"]["ckpt_name"] = "b.safetensors"
+    prompt.remove_links_to("1")
+
+    assert "1" not in prompt and "images" not in prompt["4"]["inputs"]
+    assert prompt["2"] is template.prompt["2"]
+    assert template.prompt == make_prompt()
+    assert template.instantiate() == make_prompt()
+
+    # 构建模板时 writable_node 直接返回原节点
+    raw = make_prompt()
+    assert writable_node(raw, "3") is raw["3"]
+
+
+def test_template_cache_and_node_index():
+    builds = []
+
+    def build():
+        builds.append(1)
+        return make_prompt(), None
+
+    key = ("/test_template.json", (), ())
+    template = get_template(key, build)
+    assert get_template(key, build) is template and len(builds) == 1
+    assert template.find_nodes("Encode") == ["2"]
+    assert template.find_node("VHS_") == "4" and template.find_node("LoadVideo") is None
+    assert template.plan(BINDINGS) is template.plan(BINDINGS)
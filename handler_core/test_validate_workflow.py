@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+测试基于图的 workflow 验证（悬空引用、环路、输出节点、类型匹配）
+"""
+
+import json
+import os
+
+from handler_core.validate_workflow import check_workflow
+
+OBJECT_INFO = {
+    "LoadImage": {"input": {"required": {"image": [["a.png"], {}]}}, "output": ["IMAGE", "MASK"]},
+    "ImageScale": {"input": {"required": {"image": ["IMAGE"], "width": ["INT", {}]}}, "output": ["IMAGE"]},
+    "VHS_VideoCombine": {"input": {"required": {"images": ["IMAGE"]}}, "output": ["VHS_FILENAMES"], "output_node": True},
+}
+
+
+def make_prompt():
+    return {
+        "1": {"class_type": "LoadImage", "inputs": {"image": "a.png"}},
+        "2": {"class_type": "ImageScale", "inputs": {"image": ["1", 0], "width": 512}},
+        "3": {"class_type": "VHS_VideoCombine", "inputs": {"images": ["2", 0]}},
+    }
+
+
+def test_valid_prompt_passes():
+    errors, info = check_workflow(make_prompt(), OBJECT_INFO)
+    assert errors == []
+    assert info["output_nodes"] == ["3"]
+    assert info["order"].index("1") < info["order"].index("2") < info["order"].index("3")
+
+
+def test_dangling_reference_with_non_numeric_id():
+    """子图内联后的节点 ID（如 "263:247"）同样能检查"""
+    prompt = make_prompt()
+    prompt["2"]["inputs"]["image"] = ["263:247", 0]
+    errors, _ = check_workflow(prompt, OBJECT_INFO)
+    assert any("263:247" in error for error in errors)
+    assert any("输出节点 3" in error for error in errors)
+
+
+def test_cycle_detected():
+    prompt = make_prompt()
+    prompt["1"] = {"class_type": "ImageScale", "inputs": {"image": ["2", 0], "width": 512}}
+    errors, _ = check_workflow(prompt, OBJECT_INFO)
+    assert any("环路" in error for error in errors)
+
+
+def test_type_mismatch_and_output_index():
+    prompt = make_prompt()
+    prompt["2"]["inputs"]["image"] = ["1", 1]
+    errors, _ = check_workflow(prompt, OBJECT_INFO)
+    assert any("类型不匹配" in error and "MASK" in error for error in errors)
+
+    prompt["2"]["inputs"]["image"] = ["1", 5]
+    errors, _ = check_workflow(prompt, OBJECT_INFO)
+    assert any("没有输出索引 5" in error for error in errors)
+
+
+def test_bundled_api_workflow_without_object_info():
+    path = os.path.join(os.path.dirname(__file__), "..", "onetoall_all", "Wan21_OneToAllAnimation_example_01_api.json")
+    with open(path, 'r', encoding='utf-8') as f:
+        workflow = json.load(f)
+    errors, info = check_workflow(workflow)
+    assert errors == []
+    assert info["output_nodes"]
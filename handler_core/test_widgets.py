@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+测试按 /object_info 补全 inputs：控件顺序（生成后控制值、上传控件占位）、下拉值匹配与报告、数值范围和默认值
+"""
+
+from handler_core.validate_workflow import check_workflow
+from handler_core.widgets import get_input_specs, get_widget_layout, normalize_prompt_inputs
+
+OBJECT_INFO = {
+    "KSampler": {
+        "input": {"required": {
+            "model": ["MODEL"],
+            "seed": ["INT", {"default": 0, "min": 0}],
+            "steps": ["INT", {"default": 20, "min": 1}],
+            "cfg": ["FLOAT", {"default": 8.0}],
+            "sampler_name": [["euler", "dpmpp_2m"]],
+            "scheduler": [["normal", "karras"]],
+            "positive": ["CONDITIONING"],
+            "denoise": ["FLOAT", {"default": 1.0, "min": 0.0, "max": 1.0}],
+        }},
+        "input_order": {"required": ["model", "seed", "steps", "cfg", "sampler_name", "scheduler", "positive",
+                                     "denoise"]},
+    },
+    "LoadImage": {"input": {"required": {"image": [["a.png", "b.png"], {"image_upload": True}]}}},
+    "WanVideoVAELoader": {
+        "input": {
+            "required": {"model_name": ["COMBO", {"options": ["wanvideo/Wan2_1_VAE_bf16.safetensors"]}]},
+            "optional": {"precision": [["fp16", "fp32", "bf16"], {"default": "bf16"}],
+                         "compile_args": ["WANCOMPILEARGS"]},
+        },
+    },
+    "WanVideoDecode": {"input": {"required": {
+        "vae": ["WANVAE"],
+        "enable_vae_tiling": ["BOOLEAN", {"default": False}],
+        "tile_x": ["INT", {"default": 272, "min": 40}],
+        "tile_stride_x": ["INT", {"default": 144, "min": 32, "forceInput": True}],
+    }}},
+}
+
+
+def test_widget_layout_follows_object_info_order():
+    assert get_widget_layout(get_input_specs(OBJECT_INFO, "KSampler")) == [
+        "seed", None, "steps", "cfg", "sampler_name", "scheduler", "denoise"]
+    assert get_widget_layout(get_input_specs(OBJECT_INFO, "LoadImage")) == ["image", None]
+    assert get_widget_layout(get_input_specs(OBJECT_INFO, "WanVideoVAELoader")) == ["model_name", "precision"]
+    assert get_input_specs(OBJECT_INFO, "Missing") is None
+
+
+def test_normalize_prompt_inputs():
+    prompt = {
+        "1": {"class_type": "KSampler", "inputs": {"model": ["4", 0], "steps": 4},
+              "widgets_values": [7, "randomize", 30, 1.5, "ddim", "Karras", 2.0]},
+        "2": {"class_type": "LoadImage", "inputs": {}, "widgets_values": ["b.png", "image"]},
+        "3": {"class_type": "WanVideoVAELoader", "inputs": {},
+              "widgets_values": ["wanvideo\\Wan2_1_VAE_bf16.safetensors", "bf16"]},
+        "4": {"class_type": "WanVideoDecode", "inputs": {"vae": ["3", 0], "tile_x": 0}},
+        "5": {"class_type": "VHS_VideoCombine", "inputs": {"images": ["1", 0]},
+              "widgets_values": {"frame_rate": 16, "crf": 19, "videopreview": {"hidden": False}}},
+    }
+    normalize_prompt_inputs(prompt, OBJECT_INFO)
+
+    # 已有的 inputs 不被覆盖，下拉值只修正大小写 / 路径分隔符，超出范围的数值被限制
+    assert prompt["1"]["inputs"] == {"model": ["4", 0], "seed": 7, "steps": 4, "cfg": 1.5, "sampler_name": "ddim",
+                                     "scheduler": "karras", "denoise": 1.0}
+    assert prompt["2"]["inputs"] == {"image": "b.png"}
+    assert prompt["3"]["inputs"] == {"model_name": "wanvideo/Wan2_1_VAE_bf16.safetensors", "precision": "bf16"}
+    # 没有 widgets_values 时按默认值补全必需控件，forceInput 的输入不补
+    assert prompt["4"]["inputs"] == {"vae": ["3", 0], "tile_x": 40, "enable_vae_tiling": False}
+    # 未知节点只补全字典格式的 widgets_values
+    assert prompt["5"]["inputs"] == {"images": ["1", 0], "frame_rate": 16, "crf": 19}
+
+    # 不在可选列表中的值不会被替换成其他值，而是作为验证错误报告
+    errors, _ = check_workflow(prompt, OBJECT_INFO)
+    assert [error for error in errors if "可选列表" in error] == [
+        "节点 1.sampler_name: 值 'ddim' 不在可选列表中（euler, dpmpp_2m）"]
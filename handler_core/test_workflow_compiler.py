@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+测试 workflow 批量编译：转换 + 验证 + 按哈希写入编译缓存、缓存命中、API 格式输入、验证失败不缓存、
+编译器版本变化后缓存失效、handler 按文件哈希加载编译结果
+"""
+
+import os
+import json
+
+from handler_core import workflow_compiler
+from handler_core.workflow_compiler import compile_all, load_compiled_prompt, write_json_atomic
+
+WORKFLOW = {
+    "nodes": [
+        {"id": 1, "type": "WanVideoSampler", "inputs": [], "widgets_values": {"steps": 4},
+         "outputs": [{"name": "samples", "type": "LATENT", "links": [1]}]},
+        {"id": 2, "type": "VHS_VideoCombine", "inputs": [{"name": "images", "type": "IMAGE", "link": 1}],
+         "outputs": [], "widgets_values": {"frame_rate": 16}},
+        {"id": 3, "type": "Note", "widgets_values": ["只在 UI 中显示"]},
+    ],
+    "links": [[1, 1, 0, 2, 0, "LATENT"]],
+}
+
+
+def write(path, data):
+    path.write_text(json.dumps(data))
+    return str(path)
+
+
+def test_compile_cache_and_load(tmp_path):
+    workflows = tmp_path / "workflows"
+    workflows.mkdir()
+    ui = write(workflows / "wf.json", WORKFLOW)
+    api = write(workflows / "api.json", {"1": {"class_type": "WanVideoSampler", "inputs": {}},
+                                         "2": {"class_type": "VHS_VideoCombine", "inputs": {"images": ["1", 0]}}})
+    write(workflows / "list.json", [1, 2])
+    (workflows / "notes.txt").write_text("不是 json")
+    out_dir, cache_dir = tmp_path / "compiled", str(tmp_path / "compiled" / ".cache")
+
+    results = compile_all([str(workflows)], str(out_dir), workers=2)
+    assert [(os.path.basename(r["input"]), r["status"]) for r in results] == [
+        ("api.json", "api"), ("list.json", "skipped"), ("wf.json", "compiled")]
+    compiled = json.loads((out_dir / "wf_api.json").read_text())
+    assert compiled["2"]["inputs"] == {"images": ["1", 0], "frame_rate": 16} and "3" not in compiled
+    # API 格式只验证，不重复输出
+    assert results[0]["output"] == api and not (out_dir / "api_api.json").exists()
+    assert load_compiled_prompt(ui, cache_dir) == compiled
+
+    # 第二次编译命中缓存；修改 workflow 后缓存键变化
+    assert compile_all([ui], str(out_dir), workers=1)[0]["status"] == "cached"
+    write(workflows / "wf.json", dict(WORKFLOW, extra={"changed": True}))
+    assert load_compiled_prompt(ui, cache_dir) is None
+    assert compile_all([ui], str(out_dir), workers=1)[0]["status"] == "compiled"
+    assert not [name for name in os.listdir(cache_dir) if name.endswith(".tmp")]
+
+
+def test_compiler_version_invalidates_cache(tmp_path, monkeypatch):
+    ui = write(tmp_path / "wf.json", WORKFLOW)
+    out_dir = str(tmp_path / "compiled")
+    cache_dir = os.path.join(out_dir, ".cache")
+    compile_all([ui], out_dir, workers=1)
+    assert load_compiled_prompt(ui, cache_dir) is not None
+
+    monkeypatch.setattr(workflow_compiler, "COMPILER_VERSION", workflow_compiler.COMPILER_VERSION + 1)
+    assert load_compiled_prompt(ui, cache_dir) is None
+    assert compile_all([ui], out_dir, workers=1)[0]["status"] == "compiled"
+    assert load_compiled_prompt(ui, cache_dir) is not None
+
+
+def test_failed_validation_is_not_cached(tmp_path):
+    broken = dict(WORKFLOW, links=[[1, 9, 0, 2, 0, "LATENT"]])
+    ui = write(tmp_path / "broken.json", broken)
+    result = compile_all([ui], str(tmp_path / "compiled"), workers=1)[0]
+    assert result["status"] == "failed" and "不存在的节点 9" in result["errors"][0]
+    assert load_compiled_prompt(ui, str(tmp_path / "compiled" / ".cache")) is None
+
+    # 读取失败也记录为 failed
+    missing = compile_all([str(tmp_path / "missing.json")], str(tmp_path / "compiled"), workers=1)[0]
+    assert missing["status"] == "failed" and missing["errors"][0].startswith("读取失败")
+
+
+def test_write_json_atomic(tmp_path):
+    path = tmp_path / "nested" / "result.json"
+    write_json_atomic(str(path), {"a": 1})
+    write_json_atomic(str(path), {"a": 2}, indent=True)
+    assert json.loads(path.read_text()) == {"a": 2}
+    assert os.listdir(path.parent) == ["result.json"]
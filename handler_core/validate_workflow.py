@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+验证 API 格式的 workflow 文件
+
+从每个节点的 inputs 一次性构建邻接表，检查：
+- 悬空引用（引用了不存在的节点 / 输出索引越界）
+- 环路
+- 输出节点不可执行（上游存在悬空引用或环路），以及没有任何输出节点
+- 连接两端的类型不匹配、下拉输入的值不在可选列表中（需要 ComfyUI 的 /object_info）
+"""
+import sys
+
+from . import fastjson
+from .widgets import get_input_specs, get_combo_choices
+
+# 关键节点类型及说明
+KEY_NODES = {
+    "LoadImage": "图像加载节点",
+    "WanVideoModelLoader": "模型加载节点",
+    "WanVideoTextEncode": "文本编码节点",
+    "WanVideoSampler": "采样器节点",
+    "VHS_VideoCombine": "视频输出节点"
+}
+
+# 没有 /object_info 时按类名识别输出节点
+FALLBACK_OUTPUT_CLASSES = {"VHS_VideoCombine", "SaveImage", "PreviewImage", "SaveVideo", "SaveAnimatedWEBP"}
+
+def is_link(value):
+    """API 格式中的连接: [源节点ID, 输出索引]，节点 ID 可以是任意字符串（如子图内联后的 "263:247"）"""
+    return (isinstance(value, list) and len(value) == 2 and
+            isinstance(value[0], (str, int)) and not isinstance(value[0], bool) and
+            isinstance(value[1], int) and not isinstance(value[1], bool))
+
+def build_graph(workflow):
+    """
+    从 inputs 构建邻接表
+    返回 (links, downstream)
+    links: [(目标节点, 输入名, 源节点, 输出索引), ...]
+    downstream: {源节点: {目标节点, ...}}
+    """
+    links = []
+    downstream = {node_id: set() for node_id in workflow}
+    for node_id, node in workflow.items():
+        inputs = node.get("inputs", {}) if isinstance(node, dict) else {}
+        for input_name, value in inputs.items():
+            if is_link(value):
+                source_id = str(value[0])
+                links.append((node_id, input_name, source_id, value[1]))
+                if source_id in downstream:
+                    downstream[source_id].add(node_id)
+    return links, downstream
+
+def find_cycle_nodes(workflow, links):
+    """Kahn 拓扑排序，返回 (拓扑序, 处于环路上或依赖环路的节点集合)"""
+    indegree = {node_id: 0 for node_id in workflow}
+    edges = {node_id: [] for node_id in workflow}
+    for target_id, _, source_id, _ in links:
+        if source_id in workflow:
+            indegree[target_id] += 1
+            edges[source_id].append(target_id)
+    queue = [node_id for node_id, degree in indegree.items() if degree == 0]
+    order = []
+    while queue:
+        node_id = queue.pop()
+        order.append(node_id)
+        for target_id in edges[node_id]:
+            indegree[target_id] -= 1
+            if indegree[target_id] == 0:
+                queue.append(target_id)
+    return order, {node_id for node_id, degree in indegree.items() if degree > 0}
+
+def get_output_types(object_info, class_type):
+    """从 object_info 获取节点的输出类型列表"""
+    return object_info.get(class_type, {}).get("output", [])
+
+def get_input_type(object_info, class_type, input_name):
+    """从 object_info 获取节点输入的期望类型（下拉框类型返回 None）"""
+    input_spec = object_info.get(class_type, {}).get("input", {})
+    for section in ("required", "optional"):
+        spec = input_spec.get(section, {}).get(input_name)
+        if spec:
+            return spec[0] if isinstance(spec[0], str) else None
+    return None
+
+def types_compatible(output_type, input_type):
+    """与 ComfyUI 一致：* 匹配任意类型，逗号分隔的多类型有交集即兼容"""
+    if output_type == input_type or output_type == "*" or input_type == "*":
+        return True
+    output_types = {t.strip() for t in output_type.split(",")}
+    input_types = {t.strip() for t in input_type.split(",")}
+    return bool(output_types & input_types)
+
+def is_output_node(object_info, class_type):
+    """是否为输出节点（object_info 中 output_node 为 true）"""
+    if class_type in object_info:
+        return bool(object_info[class_type].get("output_node"))
+    return class_type in FALLBACK_OUTPUT_CLASSES
+
+def check_combo_values(workflow, object_info):
+    """下拉输入的字面值必须在节点定义的可选列表中（与 ComfyUI 的 "Value not in list" 校验一致）"""
+    errors = []
+    for node_id, node in workflow.items():
+        if not isinstance(node, dict):
+            continue
+        specs = get_input_specs(object_info, node.get("class_type", "")) or {}
+        for input_name, value in node.get("inputs", {}).items():
+            if input_name not in specs or is_link(value):
+                continue
+            choices = get_combo_choices(*specs[input_name][:2])
+            if choices and value not in choices:
+                sample = ", ".join(str(choice) for choice in choices[:5]) + (" ..." if len(choices) > 5 else "")
+                errors.append(f"节点 {node_id}.{input_name}: 值 {value!r} 不在可选列表中（{sample}）")
+    return errors
+
+def check_workflow(workflow, object_info=None):
+    """
+    检查 API 格式 workflow，返回 (errors, info)
+    errors: 错误信息列表（为空表示通过）
+    info: 统计信息（节点数、被引用节点数、关键节点、输出节点、拓扑序）
+    object_info: ComfyUI /object_info 的结果，提供时额外检查未知节点类型、输出索引、连接类型和下拉值
+    """
+    errors = []
+    object_info = object_info or {}
+    
+    # 检查是否有 class_type
+    missing_class_type = [node_id for node_id, node in workflow.items()
+                          if not isinstance(node, dict) or "class_type" not in node]
+    if missing_class_type:
+        errors.append(f"缺少 class_type 的节点: {sorted(missing_class_type, key=str)}")
+    class_types = {node_id: node.get("class_type", "") if isinstance(node, dict) else ""
+                   for node_id, node in workflow.items()}
+    
+    # 检查 UUID 类型的节点（应该已经被转换）
+    for node_id, class_type in class_types.items():
+        if len(class_type) == 36 and class_type.count('-') == 4:
+            errors.append(f"节点 {node_id} 仍为 UUID 类型（可能未转换）: {class_type}")
+        elif object_info and class_type and class_type not in object_info:
+            errors.append(f"节点 {node_id}: ComfyUI 中不存在节点类型 {class_type}")
+    
+    links, downstream = build_graph(workflow)
+    
+    # 悬空引用和连接类型
+    broken_nodes = set()
+    referenced_nodes = set()
+    for target_id, input_name, source_id, output_index in links:
+        referenced_nodes.add(source_id)
+        if source_id not in workflow:
+            errors.append(f"节点 {target_id}.{input_name}: 引用了不存在的节点 {source_id}")
+            broken_nodes.add(target_id)
+            continue
+        output_types = get_output_types(object_info, class_types[source_id])
+        if not output_types:
+            continue
+        if output_index < 0 or output_index >= len(output_types):
+            errors.append(f"节点 {target_id}.{input_name}: 节点 {source_id} ({class_types[source_id]}) "
+                          f"没有输出索引 {output_index}（共 {len(output_types)} 个输出）")
+            broken_nodes.add(target_id)
+            continue
+        output_type = output_types[output_index]
+        input_type = get_input_type(object_info, class_types[target_id], input_name)
+        if isinstance(output_type, str) and input_type and not types_compatible(output_type, input_type):
+            errors.append(f"节点 {target_id}.{input_name}: 类型不匹配，期望 {input_type}，"
+                          f"节点 {source_id} ({class_types[source_id]}) 输出 {output_index} 为 {output_type}")
+    if object_info:
+        errors.extend(check_combo_values(workflow, object_info))
+    
+    # 环路
+    order, cycle_nodes = find_cycle_nodes(workflow, links)
+    if cycle_nodes:
+        errors.append(f"存在环路，涉及节点: {sorted(cycle_nodes, key=str)}")
+        broken_nodes |= cycle_nodes
+    
+    # 输出节点可达性：上游有问题的输出节点无法执行
+    unreachable = set()
+    stack = list(broken_nodes)
+    while stack:
+        node_id = stack.pop()
+        if node_id in unreachable:
+            continue
+        unreachable.add(node_id)
+        stack.extend(downstream.get(node_id, ()))
+    output_nodes = [node_id for node_id, class_type in class_types.items() if is_output_node(object_info, class_type)]
+    for node_id in output_nodes:
+        if node_id in unreachable:
+            errors.append(f"输出节点 {node_id} ({class_types[node_id]}) 无法执行：上游存在悬空引用或环路")
+    if workflow and not output_nodes:
+        errors.append("没有任何输出节点")
+    
+    # 检查关键节点
+    found_key_nodes = {}
+    for node_id, class_type in class_types.items():
+        for key_type in KEY_NODES:
+            if key_type in class_type:
+                found_key_nodes.setdefault(key_type, []).append(node_id)
+    
+    info = {
+        "node_count": len(workflow),
+        "referenced_count": len(referenced_nodes),
+        "key_nodes": found_key_nodes,
+        "output_nodes": output_nodes,
+        "order": order
+    }
+    return errors, info
+
+def validate_workflow(workflow_file, object_info=None):
+    """验证 workflow 文件"""
+    print(f"验证 workflow 文件: {workflow_file}")
+    
+    workflow = fastjson.load_file(workflow_file)
+    
+    errors, info = check_workflow(workflow, object_info)
+    print(f"✓ 总节点数: {info['node_count']}")
+    print(f"✓ 被引用的节点数: {info['referenced_count']}")
+    
+    if errors:
+        for error in errors:
+            print(f"❌ {error}")
+        return False
+    print("✓ 所有节点引用都存在")
+    print("✓ 所有节点都有 class_type")
+    print("✓ 没有未转换的 UUID 节点")
+    print("✓ 没有环路")
+    print(f"✓ 输出节点: {', '.join(info['output_nodes'])}")
+    if object_info:
+        print("✓ 连接类型匹配")
+    
+    print("\n关键节点检查:")
+    for key_type, desc in KEY_NODES.items():
+        if key_type in info["key_nodes"]:
+            print(f"  ✓ {desc} ({key_type}): 节点 {', '.join(info['key_nodes'][key_type])}")
+        else:
+            print(f"  ⚠️  {desc} ({key_type}): 未找到")
+    
+    print("\n✅ Workflow 验证通过!")
+    return True
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python -m handler_core.validate_workflow <workflow_file.json> [object_info.json]")
+        sys.exit(1)
+    
+    workflow_file = sys.argv[1]
+    object_info = None
+    if len(sys.argv) > 2:
+        object_info = fastjson.load_file(sys.argv[2])
+    if not validate_workflow(workflow_file, object_info):
+        sys.exit(1)
+
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+视频后处理：MP4 快速启动 / 分片 MP4 / HLS、DASH 切片
+
+VHS_VideoCombine 输出的 MP4 的 moov atom 位于文件末尾，播放器必须下载完整个文件才能开始播放。
+这里在上传前对输出做无损重封装（-c copy，不重新编码）：
+- faststart: 把 moov atom 移到文件开头
+- fragmented: 生成分片 MP4（moov 在前，数据按关键帧分成 moof/mdat 片段）
+- 可选生成 HLS (fMP4 切片 + m3u8) 或 DASH (m4s 切片 + mpd) 切片集
+- 分桶生成的视频（见 bucketing.py）缩放裁剪回请求的尺寸和帧数（需要重新编码）
+
+ffmpeg 的超时取任务截止时间（deadline，time.monotonic() 时间）的剩余时间，损坏的输入不会让 worker 卡到 RunPod 强制终止。
+"""
+
+import os
+import shutil
+import mimetypes
+import struct
+import logging
+import subprocess
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+MP4_LAYOUTS = ("faststart", "fragmented", "none")
+STREAMING_FORMATS = ("hls", "dash")
+DEFAULT_SEGMENT_SECONDS = 4
+# 切片清单和片段的 Content-Type，播放器按此识别；其他文件（init.mp4）按扩展名猜测
+STREAMING_CONTENT_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".m4s": "video/iso.segment",
+    ".mpd": "application/dash+xml",
+}
+
+
+def find_ffmpeg():
+    """查找 ffmpeg 可执行文件：优先 PATH，其次 VHS 依赖的 imageio-ffmpeg 自带二进制"""
+    ffmpeg_path = shutil.which("ffmpeg")
+    if ffmpeg_path:
+        return ffmpeg_path
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return None
+
+
+def read_top_level_atoms(file_path):
+    """读取 MP4 顶层 atom 类型列表（只读 atom 头，不读取数据）"""
+    atoms = []
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        offset = 0
+        while offset + 8 <= file_size:
+            f.seek(offset)
+            header = f.read(8)
+            size, atom_type = struct.unpack(">I4s", header)
+            if size == 1:
+                size = struct.unpack(">Q", f.read(8))[0]
+            elif size == 0:
+                size = file_size - offset
+            if size < 8:
+                break
+            atoms.append(atom_type.decode('latin-1'))
+            offset += size
+    return atoms
+
+
+def is_faststart(file_path):
+    """moov atom 是否位于 mdat 之前（分片 MP4 同样满足）"""
+    atoms = read_top_level_atoms(file_path)
+    if "moov" not in atoms:
+        return False
+    if "mdat" not in atoms:
+        return True
+    return atoms.index("moov") < atoms.index("mdat")
+
+
+def run_ffmpeg(args, deadline=None):
+    """执行 ffmpeg 命令，失败或超过 deadline 时抛出异常"""
+    ffmpeg_path = find_ffmpeg()
+    if not ffmpeg_path:
+        raise Exception("未找到 ffmpeg，无法进行视频后处理")
+    timeout = None
+    if deadline is not None:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            raise Exception("任务超时: 已超过截止时间，跳过视频后处理")
+    cmd = [ffmpeg_path, "-hide_banner", "-loglevel", "error", "-y"] + args
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise Exception(f"任务超时: ffmpeg 在截止时间内未完成（{timeout:.0f} 秒）")
+    if result.returncode != 0:
+        raise Exception(f"ffmpeg 执行失败: {result.stderr.strip()[:500]}")
+
+
+def remux_mp4(file_path, layout="faststart", deadline=None):
+    """
+    原地重封装 MP4（不重新编码）
+
+    参数:
+        file_path: MP4 文件路径
+        layout: "faststart" 移动 moov 到文件开头，"fragmented" 生成分片 MP4，"none" 不处理
+        deadline: 任务截止时间（time.monotonic()），None 表示不限时
+
+    返回:
+        是否进行了重封装
+    """
+    if layout not in MP4_LAYOUTS:
+        raise ValueError(f"不支持的 MP4 布局: {layout}，可选: {MP4_LAYOUTS}")
+    if layout == "none":
+        return False
+    if layout == "faststart" and is_faststart(file_path):
+        logger.info(f"⚡ 视频已是 faststart 布局，跳过: {file_path}")
+        return False
+
+    if layout == "faststart":
+        movflags = "+faststart"
+    else:
+        movflags = "+frag_keyframe+empty_moov+default_base_moof"
+
+    # 写入同目录的临时文件后原子替换，避免中途失败留下损坏的输出
+    fd, tmp_path = tempfile.mkstemp(suffix=".mp4", dir=os.path.dirname(os.path.abspath(file_path)))
+    os.close(fd)
+    try:
+        run_ffmpeg(["-i", file_path, "-map", "0", "-c", "copy", "-movflags", movflags, tmp_path], deadline)
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    logger.info(f"⚡ 视频重封装完成 ({layout}): {file_path}")
+    return True
+
+
+def fit_video(file_path, width, height, frames=None, layout="faststart", deadline=None):
+    """
+    原地把视频等比缩放到覆盖 width x height 后居中裁剪，并只保留前 frames 帧（重新编码）
+
+    分桶生成的视频比请求的尺寸大或帧数多，这里在 CPU 上还原为请求的形状，再按 layout 重封装
+    """
+    if layout not in MP4_LAYOUTS:
+        raise ValueError(f"不支持的 MP4 布局: {layout}，可选: {MP4_LAYOUTS}")
+    args = ["-i", file_path,
+            "-vf", f"scale={width}:{height}:force_original_aspect_ratio=increase,crop={width}:{height}",
+            "-c:v", "libx264", "-crf", "17", "-preset", "veryfast", "-pix_fmt", "yuv420p", "-c:a", "copy"]
+    if frames:
+        args += ["-frames:v", str(frames), "-shortest"]
+    if layout == "faststart":
+        args += ["-movflags", "+faststart"]
+    elif layout == "fragmented":
+        args += ["-movflags", "+frag_keyframe+empty_moov+default_base_moof"]
+
+    fd, tmp_path = tempfile.mkstemp(suffix=".mp4", dir=os.path.dirname(os.path.abspath(file_path)))
+    os.close(fd)
+    try:
+        run_ffmpeg(args + [tmp_path], deadline)
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    logger.info(f"📐 视频已裁剪为 {width}x{height}{f', {frames} 帧' if frames else ''}: {file_path}")
+
+
+def package_streaming(file_path, output_dir, streaming_format="hls", segment_seconds=DEFAULT_SEGMENT_SECONDS,
+                      deadline=None):
+    """
+    生成 HLS 或 DASH 切片集（fMP4 切片，不重新编码）
+
+    返回:
+        清单文件（.m3u8 / .mpd）路径；切片文件与清单位于同一目录
+    """
+    if streaming_format not in STREAMING_FORMATS:
+        raise ValueError(f"不支持的切片格式: {streaming_format}，可选: {STREAMING_FORMATS}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    if streaming_format == "hls":
+        manifest_path = os.path.join(output_dir, "index.m3u8")
+        run_ffmpeg([
+            "-i", file_path, "-map", "0", "-c", "copy",
+            "-f", "hls",
+            "-hls_time", str(segment_seconds),
+            "-hls_playlist_type", "vod",
+            "-hls_segment_type", "fmp4",
+            "-hls_fmp4_init_filename", "init.mp4",
+            "-hls_segment_filename", os.path.join(output_dir, "segment_%05d.m4s"),
+            manifest_path
+        ], deadline)
+    else:
+        manifest_path = os.path.join(output_dir, "manifest.mpd")
+        run_ffmpeg([
+            "-i", file_path, "-map", "0", "-c", "copy",
+            "-f", "dash",
+            "-seg_duration", str(segment_seconds),
+            "-use_template", "1",
+            "-use_timeline", "1",
+            "-init_seg_name", "init-$RepresentationID$.m4s",
+            "-media_seg_name", "chunk-$RepresentationID$-$Number%05d$.m4s",
+            manifest_path
+        ], deadline)
+    logger.info(f"📺 {streaming_format.upper()} 切片完成: {manifest_path}")
+    return manifest_path
+
+
+def upload_streaming_to_r2(manifest_path, prefix, s3_client=None):
+    """
+    上传切片目录（清单 + 切片）到 R2，对象键为 <prefix>/<文件名>，按扩展名设置 Content-Type
+
+    返回:
+        清单文件的公开访问 URL，失败时返回 None
+    """
+    from upload_to_r2 import upload_bytes_to_r2
+
+    output_dir = os.path.dirname(manifest_path)
+    manifest_name = os.path.basename(manifest_path)
+    # 先上传切片，最后上传清单，保证清单可见时切片已就绪
+    file_names = sorted(name for name in os.listdir(output_dir) if name != manifest_name) + [manifest_name]
+    manifest_url = None
+    for name in file_names:
+        ext = os.path.splitext(name)[1].lower()
+        content_type = STREAMING_CONTENT_TYPES.get(ext) or mimetypes.guess_type(name)[0] or "application/octet-stream"
+        with open(os.path.join(output_dir, name), "rb") as f:
+            data = f.read()
+        try:
+            url = upload_bytes_to_r2(data, f"{prefix}/{name}", content_type, s3_client=s3_client)
+        except Exception as e:
+            logger.error(f"❌ 切片上传失败: {name}: {e}")
+            return None
+        if name == manifest_name:
+            manifest_url = url
+    return manifest_url
+
+
+def postprocess_and_upload(file_path, mp4_layout="faststart", streaming_format=None,
+                           upload=False, params=None, segment_seconds=DEFAULT_SEGMENT_SECONDS, deadline=None):
+    """
+    对输出视频执行完整后处理流程：重封装 -> （可选）切片 -> （可选）上传 R2
+
+    返回:
+        附加到 handler 返回值中的字段字典，例如 {"video_url": ..., "streaming_url": ...}
+    """
+    result = {}
+    remux_mp4(file_path, mp4_layout, deadline)
+
+    if streaming_format and not upload:
+        logger.warning(f"⚠️ 切片格式 {streaming_format} 需要同时开启 upload_to_r2，已跳过切片")
+        streaming_format = None
+    if not upload:
+        return result
+
+    from upload_to_r2 import upload_mp4_to_r2, create_r2_client
+
+    s3_client = create_r2_client()
+    uploaded = upload_mp4_to_r2(file_path, params=params, s3_client=s3_client)
+    if not uploaded:
+        raise Exception("视频上传 R2 失败")
+    result["video_url"] = uploaded["url"]
+    result["video_sha256"] = uploaded["sha256"]
+
+    if streaming_format:
+        # 切片目录以视频内容哈希命名，同一视频的切片集可复用
+        prefix = os.path.splitext(uploaded["object_key"])[0] + f"_{streaming_format}"
+        with tempfile.TemporaryDirectory() as output_dir:
+            manifest_path = package_streaming(file_path, output_dir, streaming_format, segment_seconds,
+                                              deadline)
+            streaming_url = upload_streaming_to_r2(manifest_path, prefix, s3_client)
+        if streaming_url:
+            result["streaming_format"] = streaming_format
+            result["streaming_url"] = streaming_url
+    return result
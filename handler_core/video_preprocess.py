@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+参考视频预处理（handler 侧，CPU）
+
+原来 VHS_LoadVideo 在 ComfyUI 内解码全分辨率参考视频（如 2160x4096），再由 VHS / ImageResizeKJv2 缩放，
+解码和缩放都占用 GPU worker 的时间。这里在提交前用 ffmpeg 一次完成：
+- 输入端 seek 到起始时间（-ss 放在 -i 之前，只解码需要的区间）
+- 重采样到工作流帧率
+- 缩放并居中裁剪到目标分辨率
+- 截断到需要的帧数
+
+输出为小尺寸的 intra-only MP4（ComfyUI 侧解码很快），按 (源文件内容哈希, 参数) 缓存，
+相同参考视频的任务直接复用，姿态缓存键也因此保持稳定。
+
+预处理在进程池中执行，handler 同时等待 ComfyUI 启动。
+"""
+
+import os
+import json
+import hashlib
+import logging
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+from .pose_cache import hash_file
+from .video_postprocess import find_ffmpeg
+
+logger = logging.getLogger(__name__)
+
+PREPROCESS_DIR = os.getenv("REFERENCE_PREPROCESS_DIR", "/ComfyUI/input/preprocessed")
+PREPROCESS_WORKERS = int(os.getenv("REFERENCE_PREPROCESS_WORKERS", "1"))
+# 输出编码参数变化时递增
+PREPROCESS_VERSION = 1
+FFMPEG_TIMEOUT = 600
+
+_executor = None
+
+
+def get_executor():
+    """进程池在第一次使用时创建，之后各任务复用"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=PREPROCESS_WORKERS)
+    return _executor
+
+
+def preprocess_cache_key(source_path, width, height, fps, max_frames, start_time):
+    params = {
+        "version": PREPROCESS_VERSION,
+        "source": hash_file(source_path),
+        "width": width,
+        "height": height,
+        "fps": fps,
+        "max_frames": max_frames,
+        "start_time": start_time,
+    }
+    payload = json.dumps(params, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def build_ffmpeg_command(ffmpeg_path, source_path, output_path, width, height, fps, max_frames, start_time=0.0):
+    """缩放到覆盖目标尺寸后居中裁剪，与 ImageResizeKJv2 的 crop 模式一致"""
+    video_filter = (
+        f"fps={fps},"
+        f"scale={width}:{height}:force_original_aspect_ratio=increase:flags=lanczos,"
+        f"crop={width}:{height},setsar=1"
+    )
+    command = [ffmpeg_path, "-hide_banner", "-loglevel", "error", "-y"]
+    if start_time:
+        command += ["-ss", f"{start_time:.3f}"]
+    command += [
+        "-i", source_path,
+        "-vf", video_filter,
+        "-frames:v", str(max_frames),
+        "-an",
+        # 全关键帧 + 高质量：体积仍远小于原视频，解码无需参考帧
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "12", "-g", "1",
+        "-pix_fmt", "yuv420p",
+        "-movflags", "+faststart",
+        output_path,
+    ]
+    return command
+
+
+def preprocess_reference_video(source_path, width, height, fps=16, max_frames=81, start_time=0.0,
+                               cache_dir=PREPROCESS_DIR):
+    """
+    预处理参考视频，返回输出文件路径；ffmpeg 不可用或处理失败时返回 None（沿用 ComfyUI 内处理）
+    可在子进程中执行
+    """
+    ffmpeg_path = find_ffmpeg()
+    if not ffmpeg_path:
+        logger.warning("⚠️ 未找到 ffmpeg，跳过参考视频预处理")
+        return None
+
+    cache_key = preprocess_cache_key(source_path, width, height, fps, max_frames, start_time)
+    output_path = os.path.join(cache_dir, f"{cache_key}.mp4")
+    if os.path.exists(output_path):
+        logger.info(f"♻️ 复用已预处理的参考视频: {output_path}")
+        return output_path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = os.path.join(cache_dir, f".{cache_key}.{os.getpid()}.mp4")
+    command = build_ffmpeg_command(ffmpeg_path, source_path, tmp_path, width, height, fps, max_frames, start_time)
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=FFMPEG_TIMEOUT)
+        if result.returncode != 0 or not os.path.exists(tmp_path) or os.path.getsize(tmp_path) == 0:
+            logger.warning(f"⚠️ 参考视频预处理失败: {result.stderr.strip()[-500:]}")
+            return None
+        os.replace(tmp_path, output_path)
+    except subprocess.TimeoutExpired:
+        logger.warning(f"⚠️ 参考视频预处理超时 ({FFMPEG_TIMEOUT}s)")
+        return None
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    logger.info(f"✅ 参考视频预处理完成: {os.path.getsize(source_path)} -> {os.path.getsize(output_path)} 字节, "
+                f"{width}x{height}@{fps}fps, 最多 {max_frames} 帧")
+    return output_path
+
+
+def submit_preprocess(source_path, width, height, fps=16, max_frames=81, start_time=0.0):
+    """提交到进程池，返回 Future（结果同 preprocess_reference_video）"""
+    return get_executor().submit(preprocess_reference_video, source_path, width, height, fps, max_frames, start_time)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Wan2.2 工作流的参数绑定声明（见 binding.py）
+
+new_Wan22_api.json / new_Wan22_flf2v_api.json / RapidAIO Mega (V2.5).json 由根目录、long_v1.0、
+onetoall、onetoall_all 四个部署共用，节点 ID 相同，所以绑定只在这里声明一次。
+需要按条件处理的节点（模型选择、KSampler 采样器回退、VHS 输出参数）仍由各 profile 处理。
+"""
+
+from .binding import join_prompt_lines
+from .inputs import to_nearest_multiple_of_16
+
+WAN22_PARAMS = {
+    "prompt": {"default": "running man, grab the gun", "transform": join_prompt_lines},
+    "negative_prompt": {"type": str, "default": ""},
+    "width": {"type": float, "default": 480, "transform": to_nearest_multiple_of_16},
+    "height": {"type": float, "default": 832, "transform": to_nearest_multiple_of_16},
+    "length": {"type": int, "default": 81, "min": 1},
+    "steps": {"type": int, "default": 4, "min": 1},
+    "seed": {"type": int, "default": 42},
+    "cfg": {"type": float, "default": 1.0, "min": 0},
+    # MEGA v12 推荐 euler_a / beta
+    "sampler": {"type": str, "default": "euler_a"},
+    "scheduler": {"type": str, "default": "beta"},
+    "context_overlap": {"type": int, "min": 0},
+    "lora_pairs": {"type": list, "default": []},
+    "shift": {"type": float, "default": 7.02},
+    "megapixel": {"type": float, "default": 0.5},
+    "overlapping_frames": {"type": int, "default": 1, "min": 0},
+    "filename_prefix": {"type": str, "default": "rapid-mega-out/vid"},
+    # 有输入图像时必须开启 fun_or_fl2v_model 才是 I2V 模式
+    "fun_or_fl2v_model": {"default": True, "fixed": True},
+    "vace_strength": {"default": 1, "fixed": True},
+}
+
+# 标准 workflow；image_path / end_image_path / context_overlap / start_step 由 profile 计算后传入
+WAN22_BINDINGS = (
+    ("image_path", "244", "image", None),
+    ("end_image_path", "617", "image", None),
+    ("length", "541", "num_frames", None),
+    ("fun_or_fl2v_model", "541", "fun_or_fl2v_model", None),
+    ("prompt", "135", "positive_prompt", None),
+    ("seed", "220", "seed", None),
+    ("seed", "540", "seed", None),
+    ("cfg", "540", "cfg", None),
+    ("width", "235", "value", None),
+    ("height", "236", "value", None),
+    ("context_overlap", "498", "context_overlap", None),
+    ("steps", "569", "value", None),
+    ("start_step", "575", "value", None),
+)
+
+# RapidAIO Mega (V2.5).json：nodes 数组格式，inputs 和 widgets_values 同时写入
+MEGA_BINDINGS = (
+    ("image_path", "597", "image", 0),
+    ("prompt", "591", "Multi_prompts", 0),
+    ("negative_prompt", "567", "text", 0),
+    ("filename_prefix", "595", "value", 0),
+    ("length", "576", "num_frames", 0),
+    ("width", "572", "width", 0),
+    ("height", "572", "height", 1),
+    ("length", "572", "length", 2),
+    ("vace_strength", "572", "strength", 3),
+    ("shift", "562", "shift", 0),
+    ("seed", "563", "seed", 0),
+    ("steps", "563", "steps", 2),
+    ("cfg", "563", "cfg", 3),
+)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+按 /object_info 的节点定义把 widgets_values 映射到 inputs，并规范化输入值
+
+ComfyUI 前端按节点定义中 required + optional 输入的顺序（input_order）保存 widgets_values，
+只有控件类型（INT / FLOAT / STRING / BOOLEAN / 下拉列表）的输入占位，另外：
+- seed / noise_seed 或声明了 control_after_generate 的输入后面跟一个 "fixed" / "randomize" 值
+- 声明了 image_upload / video_upload 的下拉输入后面跟一个上传控件的值
+所以不需要为每种节点手写下标表。normalize_prompt_inputs() 在构建工作流模板时调用一次，
+之后每个任务只写入绑定的参数。
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+WIDGET_TYPES = ("INT", "FLOAT", "STRING", "BOOLEAN", "COMBO")
+CONTROL_AFTER_GENERATE_INPUTS = ("seed", "noise_seed")
+UPLOAD_OPTIONS = ("image_upload", "video_upload", "audio_upload")
+# 字典格式 widgets_values（如 VHS）中不是输入的键
+NON_INPUT_WIDGETS = ("videopreview",)
+
+
+def get_input_specs(object_info, class_type):
+    """节点定义中的输入 {名称: (类型或选项列表, 选项字典, 是否必需)}，按前端顺序；未知节点返回 None"""
+    info = object_info.get(class_type)
+    if not isinstance(info, dict):
+        return None
+    inputs = info.get("input", {})
+    input_order = info.get("input_order", {})
+    specs = {}
+    for section in ("required", "optional"):
+        section_inputs = inputs.get(section) or {}
+        for name in input_order.get(section) or list(section_inputs):
+            spec = section_inputs.get(name)
+            if not isinstance(spec, (list, tuple)) or not spec:
+                continue
+            options = spec[1] if len(spec) > 1 and isinstance(spec[1], dict) else {}
+            specs[name] = (spec[0], options, section == "required")
+    return specs
+
+
+def get_combo_choices(input_type, options):
+    """下拉输入的可选值（旧格式为列表类型，新格式为 COMBO + options），其他输入返回 None"""
+    if isinstance(input_type, list):
+        return input_type
+    if input_type == "COMBO":
+        return options.get("options", [])
+    return None
+
+
+def is_widget_input(input_type, options):
+    """输入在前端是否显示为控件（占用 widgets_values 的位置）"""
+    if options.get("forceInput"):
+        return False
+    return isinstance(input_type, list) or input_type in WIDGET_TYPES
+
+
+def get_widget_layout(specs):
+    """widgets_values 各位置对应的输入名，控件附带的额外值（生成后控制、上传）为 None"""
+    layout = []
+    for name, (input_type, options, _) in specs.items():
+        if not is_widget_input(input_type, options):
+            continue
+        layout.append(name)
+        if options.get("control_after_generate") or (input_type == "INT" and name in CONTROL_AFTER_GENERATE_INPUTS):
+            layout.append(None)
+        elif any(options.get(option) for option in UPLOAD_OPTIONS):
+            layout.append(None)
+    return layout
+
+
+def match_choice(value, choices):
+    """
+    在可选值中查找 value：先精确匹配，再忽略路径分隔符（反斜杠 / 斜杠）差异，最后忽略大小写；
+    找不到或匹配不唯一时返回 None
+    """
+    if value in choices:
+        return value
+    if not isinstance(value, str):
+        return None
+    normalized = value.replace("\\", "/")
+    for key in (lambda text: text, str.lower):
+        matches = [choice for choice in choices
+                   if isinstance(choice, str) and key(choice.replace("\\", "/")) == key(normalized)]
+        if matches:
+            return matches[0] if len(matches) == 1 else None
+    return None
+
+
+def normalize_input_value(value, input_type, options):
+    """
+    把字面值修正为节点定义允许的值：下拉值只修正分隔符 / 大小写差异，数值限制在 min / max 内
+    不在可选列表中的下拉值（拼写错误的采样器名、缺少的模型 / LoRA）保持不变，由 check_workflow 报告
+    """
+    choices = get_combo_choices(input_type, options)
+    if choices:
+        matched = match_choice(value, choices)
+        return matched if matched is not None else value
+    if input_type in ("INT", "FLOAT") and isinstance(value, (int, float)) and not isinstance(value, bool):
+        if options.get("min") is not None and value < options["min"]:
+            return options["min"]
+        if options.get("max") is not None and value > options["max"]:
+            return options["max"]
+    if input_type == "BOOLEAN" and value in ("True", "False"):
+        return value == "True"
+    return value
+
+
+def get_widget_values(node, specs):
+    """节点 widgets_values 中的值 {输入名: 值}；列表格式按节点定义的控件顺序对应"""
+    widgets = node.get("widgets_values")
+    if isinstance(widgets, dict):
+        return {key: value for key, value in widgets.items() if key not in NON_INPUT_WIDGETS}
+    if isinstance(widgets, list) and specs:
+        return {name: value for name, value in zip(get_widget_layout(specs), widgets) if name}
+    return {}
+
+
+def normalize_node_inputs(node_id, node, specs):
+    """补全单个节点缺失的 inputs（widgets_values 或默认值）并修正字面值，返回 (补全数, 修正数)"""
+    inputs = node.setdefault("inputs", {})
+    filled = fixed = 0
+    for name, value in get_widget_values(node, specs).items():
+        if name not in inputs and value is not None:
+            inputs[name] = value
+            filled += 1
+
+    for name, (input_type, options, required) in (specs or {}).items():
+        if name not in inputs:
+            if not required or not is_widget_input(input_type, options):
+                continue
+            choices = get_combo_choices(input_type, options)
+            if "default" in options:
+                inputs[name] = options["default"]
+            elif choices:
+                inputs[name] = choices[0]
+            else:
+                continue
+            filled += 1
+        value = inputs[name]
+        if isinstance(value, list):
+            # 连接 [节点ID, 输出下标]
+            continue
+        normalized = normalize_input_value(value, input_type, options)
+        if normalized != value or type(normalized) is not type(value):
+            inputs[name] = normalized
+            fixed += 1
+            logger.info(f"节点 {node_id} ({node.get('class_type')}): {name} {value!r} -> {normalized!r}")
+    return filled, fixed
+
+
+def normalize_prompt_inputs(prompt, object_info):
+    """按 /object_info 补全所有节点的 inputs 并规范化输入值（构建模板时调用一次）"""
+    filled = fixed = 0
+    unknown_types = set()
+    for node_id, node in prompt.items():
+        class_type = node.get("class_type", "")
+        specs = get_input_specs(object_info, class_type)
+        if specs is None:
+            unknown_types.add(class_type)
+        node_filled, node_fixed = normalize_node_inputs(node_id, node, specs)
+        filled += node_filled
+        fixed += node_fixed
+    if unknown_types and object_info:
+        logger.warning(f"object_info 中没有以下节点类型，只补全字典格式的 widgets_values: {sorted(unknown_types)}")
+    logger.info(f"🧩 按 object_info 补全 {filled} 个输入，修正 {fixed} 个输入值")
+    return filled, fixed
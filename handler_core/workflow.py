@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+工作流文件与模型文件的通用处理，以及按 class_type 查找 / 修改 prompt 节点的辅助函数
+"""
+
+import os
+import json
+import shutil
+import logging
+
+from . import fastjson
+from .provision import find_manifest_spec
+from .template import writable_node
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINTS_DIR = "/ComfyUI/models/checkpoints"
+# ensure_model_in_checkpoints 查找模型文件的目录
+MODEL_SEARCH_DIRS = [
+    "/ComfyUI/models/diffusion_models",
+    "/workspace/models",
+    "/ComfyUI/models/diffusion_models/WanVideo/OneToAll",
+    "/workspace/models/WanVideo/OneToAll",
+]
+
+
+def load_workflow(workflow_path):
+    """加载并验证工作流JSON文件"""
+    if not os.path.exists(workflow_path):
+        raise FileNotFoundError(f"工作流文件不存在: {workflow_path}")
+
+    file_size = os.path.getsize(workflow_path)
+    logger.info(f"加载工作流文件: {workflow_path} (大小: {file_size} 字节)")
+    if file_size == 0:
+        raise ValueError(f"工作流文件为空: {workflow_path}")
+
+    with open(workflow_path, 'rb') as file:
+        content = file.read().strip()
+    if not content.startswith((b'{', b'[')):
+        logger.error(f"文件内容不是有效的JSON格式。前500字符: {content[:500].decode('utf-8', 'replace')}")
+        raise ValueError(f"工作流文件不是有效的JSON格式: {workflow_path}")
+    try:
+        return fastjson.loads(content)
+    except json.JSONDecodeError as e:
+        lines = content.decode('utf-8', 'replace').splitlines()
+        context = "\n".join(lines[max(0, e.lineno - 3):e.lineno + 2])
+        logger.error(f"JSON解析错误 (行 {e.lineno}, 列 {e.colno}):\n{context}")
+        raise ValueError(f"工作流文件JSON格式错误: {workflow_path} - {e}")
+
+
+def find_node_by_class_type(prompt, class_type_pattern, attribute=None, attribute_value=None):
+    """第一个 class_type 包含 class_type_pattern 的节点ID，可按 inputs / widgets_values 中的属性过滤；没有时返回 None"""
+    for node_id, node in prompt.items():
+        if class_type_pattern not in node.get("class_type", ""):
+            continue
+        if attribute is None:
+            return node_id
+        for values in (node.get("inputs", {}), node.get("widgets_values", {})):
+            if isinstance(values, dict) and attribute in values:
+                if attribute_value is None or values[attribute] == attribute_value:
+                    return node_id
+                break
+    return None
+
+
+def find_node_by_type_and_input(prompt, node_type_pattern, input_name=None):
+    """第一个 class_type 包含 node_type_pattern 且有 input_name 输入的节点ID"""
+    for node_id, node in prompt.items():
+        if node_type_pattern in node.get("class_type", ""):
+            if input_name is None or input_name in node.get("inputs", {}):
+                return node_id
+    return None
+
+
+def set_node_value(prompt, node_id, key, value, use_widgets=False):
+    """写入节点输入（任务实例中先复制节点），use_widgets 时同时写 widgets_values[0]；节点不存在时返回 False"""
+    if node_id not in prompt:
+        logger.warning(f"节点 {node_id} 不存在于prompt中")
+        return False
+    node = writable_node(prompt, node_id)
+    node.setdefault("inputs", {})[key] = value
+    if use_widgets and isinstance(node.get("widgets_values"), list) and node["widgets_values"]:
+        node["widgets_values"][0] = value
+    return True
+
+
+def update_model_in_prompt(prompt, node_id, available_models):
+    """
+    配置文件中的模型不在可用列表中时，替换为 I2V 模型或第一个可用模型
+    清单中有下载来源的模型不替换，由 provision_prompt_models 在提交前下载
+    """
+    if node_id not in prompt:
+        return False
+    node = prompt[node_id]
+    if "inputs" not in node or "model" not in node["inputs"]:
+        return False
+
+    current_model = node["inputs"]["model"]
+    if current_model in available_models or find_manifest_spec(current_model) is not None:
+        return False
+
+    i2v_models = [m for m in available_models if "i2v" in m.lower()]
+    new_model = i2v_models[0] if i2v_models else (available_models[0] if available_models else None)
+    if new_model:
+        logger.info(f"节点 {node_id} 模型更新: {current_model} -> {new_model}")
+        node["inputs"]["model"] = new_model
+        return True
+    return False
+
+
+def ensure_model_in_checkpoints(model_name):
+    """确保模型文件在 checkpoints 目录中（CheckpointLoaderSimple 只扫描该目录），优先创建符号链接"""
+    model_name = os.path.basename(model_name)
+    target_path = os.path.join(CHECKPOINTS_DIR, model_name)
+
+    if os.path.exists(target_path):
+        return True
+    if os.path.lexists(target_path):
+        # 失效的符号链接
+        os.remove(target_path)
+
+    source_path = next((os.path.join(directory, model_name) for directory in MODEL_SEARCH_DIRS
+                        if os.path.exists(os.path.join(directory, model_name))), None)
+    if source_path is None:
+        logger.warning(f"未找到模型文件: {model_name}，查找目录: {MODEL_SEARCH_DIRS}")
+        return False
+
+    os.makedirs(CHECKPOINTS_DIR, exist_ok=True)
+    try:
+        os.symlink(source_path, target_path)
+        logger.info(f"已创建模型链接: {target_path} -> {source_path}")
+    except OSError as e:
+        logger.warning(f"创建符号链接失败: {e}，改为复制文件")
+        shutil.copy2(source_path, target_path)
+        logger.info(f"已复制模型文件: {source_path} -> {target_path}")
+    return True
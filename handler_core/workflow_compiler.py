@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+批量编译 workflow：转换为 API 格式 + 验证 + 写入按哈希索引的编译缓存
+
+用法:
+    python -m handler_core.workflow_compiler <workflow.json|目录> [...] [--out-dir compiled] [--workers N]
+
+输出:
+    <out-dir>/<名称>_api.json       编译后的 API 格式 prompt
+    <out-dir>/.cache/<哈希>.json    编译缓存（键为 workflow 文件内容 + 编译器版本的 sha256）
+
+handler 启动时通过 load_compiled_prompt() 按 workflow 文件哈希直接加载编译结果，
+命中时无需在运行时再做 nodes -> API 格式的转换。
+"""
+
+import os
+import sys
+import hashlib
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from . import fastjson
+from .convert_workflow_to_api import convert_nodes_to_prompt_format, get_getnode_class_name
+from .validate_workflow import check_workflow
+
+# 转换逻辑变化时递增，使旧缓存失效
+COMPILER_VERSION = 3
+DEFAULT_CACHE_DIR = os.getenv("COMPILED_WORKFLOW_CACHE_DIR", "/compiled/.cache")
+
+
+def workflow_cache_key(raw_bytes):
+    """
+    计算编译缓存键
+    GetNode 在转换时会被跳过，getnode_class_name 不影响输出，因此不参与哈希
+    """
+    digest = hashlib.sha256()
+    digest.update(f"workflow-compiler-v{COMPILER_VERSION}\n".encode('utf-8'))
+    digest.update(raw_bytes)
+    return digest.hexdigest()
+
+
+def write_json_atomic(path, data, indent=False):
+    """先写临时文件再 os.replace，并发编译或中途失败时不会留下半截文件"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(fastjson.dumps(data, indent=indent))
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_compiled_prompt(workflow_path, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    从编译缓存加载 workflow 对应的 API 格式 prompt
+
+    返回:
+        命中时返回 prompt 字典，未命中返回 None
+    """
+    try:
+        with open(workflow_path, 'rb') as f:
+            cache_path = os.path.join(cache_dir, f"{workflow_cache_key(f.read())}.json")
+        if not os.path.exists(cache_path):
+            return None
+        return fastjson.load_file(cache_path)
+    except (OSError, ValueError):
+        return None
+
+
+def compile_workflow(workflow_path, out_dir, cache_dir, getnode_class_name=None):
+    """
+    编译单个 workflow（进程池中执行，参数和返回值都必须可 pickle）
+
+    返回:
+        结果字典 {"input", "output", "key", "status", "nodes", "errors"}
+        status: compiled / cached / api（输入已是 API 格式）/ skipped（不是 workflow）/ failed
+    """
+    result = {"input": workflow_path, "output": None, "key": None, "status": "failed", "nodes": 0, "errors": []}
+    try:
+        with open(workflow_path, 'rb') as f:
+            raw_bytes = f.read()
+        workflow_data = fastjson.loads(raw_bytes)
+    except (OSError, ValueError) as e:
+        result["errors"].append(f"读取失败: {e}")
+        return result
+
+    if not isinstance(workflow_data, dict):
+        result["status"] = "skipped"
+        return result
+
+    key = workflow_cache_key(raw_bytes)
+    cache_path = os.path.join(cache_dir, f"{key}.json")
+    result["key"] = key
+
+    if "nodes" in workflow_data:
+        prompt = None
+        if os.path.exists(cache_path):
+            try:
+                prompt = fastjson.load_file(cache_path)
+                result["status"] = "cached"
+            except (OSError, ValueError):
+                prompt = None
+        if prompt is None:
+            prompt = convert_nodes_to_prompt_format(workflow_data, {}, getnode_class_name or get_getnode_class_name())
+            result["status"] = "compiled"
+    elif workflow_data and all(isinstance(node, dict) and "class_type" in node for node in workflow_data.values()):
+        prompt = workflow_data
+        result["status"] = "api"
+    else:
+        result["status"] = "skipped"
+        return result
+
+    errors, _ = check_workflow(prompt)
+    result["nodes"] = len(prompt)
+    if errors:
+        result["errors"] = errors
+        result["status"] = "failed"
+        return result
+
+    # 只缓存验证通过的编译结果
+    if result["status"] == "compiled":
+        write_json_atomic(cache_path, prompt)
+
+    if result["status"] == "api":
+        # 已经是 API 格式，只做验证，不重复输出（避免与 <名称>_api.json 编译结果同名覆盖）
+        result["output"] = workflow_path
+        return result
+
+    name = os.path.splitext(os.path.basename(workflow_path))[0]
+    output_path = os.path.join(out_dir, f"{name}_api.json")
+    write_json_atomic(output_path, prompt, indent=True)
+    result["output"] = output_path
+    return result
+
+
+def collect_workflow_files(paths):
+    """展开输入路径：文件直接使用，目录取其中的 .json 文件（不递归）"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(".json"):
+                    files.append(os.path.join(path, name))
+        else:
+            files.append(path)
+    return files
+
+
+def compile_all(paths, out_dir, cache_dir=None, workers=None, getnode_class_name=None):
+    """在进程池中并行编译所有 workflow，返回结果列表（顺序与输入一致）"""
+    cache_dir = cache_dir or os.path.join(out_dir, ".cache")
+    files = collect_workflow_files(paths)
+    if not files:
+        return []
+    workers = max(1, min(workers or os.cpu_count() or 1, len(files)))
+    if workers == 1:
+        return [compile_workflow(path, out_dir, cache_dir, getnode_class_name) for path in files]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(compile_workflow, path, out_dir, cache_dir, getnode_class_name) for path in files]
+        return [future.result() for future in futures]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='批量将 workflow 转换为 API 格式、验证并写入编译缓存',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  # 编译当前目录下所有 workflow
+  python -m handler_core.workflow_compiler . --out-dir compiled
+
+  # 构建镜像时预编译，handler 启动后直接加载
+  python -m handler_core.workflow_compiler /Wan21_OneToAllAnimation_example_01.json --out-dir /compiled
+        """
+    )
+    parser.add_argument('paths', nargs='+', help='workflow 文件或目录')
+    parser.add_argument('--out-dir', '-o', default='compiled', help='输出目录（默认: compiled）')
+    parser.add_argument('--cache-dir', help='编译缓存目录（默认: <out-dir>/.cache）')
+    parser.add_argument('--workers', '-j', type=int, help='进程数（默认: CPU 核数）')
+    parser.add_argument('--getnode-class', help='GetNode 节点的 class_type（默认: GetNode|comfyui-logic）')
+
+    args = parser.parse_args()
+
+    results = compile_all(args.paths, args.out_dir, args.cache_dir, args.workers, args.getnode_class)
+    failed = 0
+    for result in results:
+        status = result["status"]
+        if status == "failed":
+            failed += 1
+            print(f"❌ {result['input']}")
+            for error in result["errors"]:
+                print(f"   {error}")
+        elif status == "skipped":
+            print(f"⏭️  {result['input']}: 不是 workflow，跳过")
+        else:
+            label = {"compiled": "编译", "cached": "缓存命中", "api": "已是 API 格式"}[status]
+            print(f"✓ {result['input']} -> {result['output']} ({label}, {result['nodes']} 个节点)")
+
+    print(f"\n共 {len(results)} 个文件，失败 {failed} 个")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
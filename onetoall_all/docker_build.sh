@@ -1,2 +1,2 @@
-docker build -t  aishawn/onetoall:v1.3 .
+docker build -t  aishawn/onetoall:v1.3 -f Dockerfile ..
 docker push aishawn/onetoall:v1.3
\ No newline at end of file
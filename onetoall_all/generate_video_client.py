@@ -12,10 +12,30 @@ import base64
 from typing import Optional, Dict, Any, List, Union
 import logging
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Logging configuration
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+def json_dumps(obj: Any) -> bytes:
+    """Serialize the request body (orjson when installed, same output as handler_core/fastjson)"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+
+
+def json_loads(data: bytes) -> Any:
+    """Parse a response body; results carry the video as a multi-MB base64 string"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
 class GenerateVideoClient:
     def __init__(
         self,
@@ -85,10 +105,10 @@ class GenerateVideoClient:
             logger.info(f"Submitting job to RunPod: {self.runpod_api_endpoint}")
             logger.info(f"Input data: {json.dumps(input_data, indent=2, ensure_ascii=False)}")
             
-            response = self.session.post(self.runpod_api_endpoint, json=payload, timeout=30)
+            response = self.session.post(self.runpod_api_endpoint, data=json_dumps(payload), timeout=30)
             response.raise_for_status()
             
-            response_data = response.json()
+            response_data = json_loads(response.content)
             job_id = response_data.get('id')
             
             if job_id:
@@ -98,7 +118,7 @@ class GenerateVideoClient:
                 logger.error(f"❌ Failed to receive Job ID: {response_data}")
                 return None
                 
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, ValueError) as e:
             logger.error(f"❌ Job submission failed: {e}")
             return None
     
@@ -123,7 +143,7 @@ class GenerateVideoClient:
                 response = self.session.get(f"{self.status_url}/{job_id}", timeout=30)
                 response.raise_for_status()
                 
-                status_data = response.json()
+                status_data = json_loads(response.content)
                 status = status_data.get('status')
                 
                 if status == 'COMPLETED':
@@ -151,7 +171,7 @@ class GenerateVideoClient:
                         'job_id': job_id
                     }
                     
-            except requests.exceptions.RequestException as e:
+            except (requests.exceptions.RequestException, ValueError) as e:
                 logger.error(f"❌ Status check error: {e}")
                 time.sleep(check_interval)
         
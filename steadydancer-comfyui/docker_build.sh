@@ -1,2 +1,2 @@
-docker build -t  aishawn/steadydancer-comfyui:v1.1 .
+docker build -t  aishawn/steadydancer-comfyui:v1.1 -f Dockerfile ..
 docker push aishawn/steadydancer-comfyui:v1.1
\ No newline at end of file
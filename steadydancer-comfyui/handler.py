@@ -1,36 +1,87 @@
 import runpod
-from runpod.serverless.utils import rp_upload
 import os
-import websocket
-import base64
-import json
-import uuid
-import logging
-import urllib.request
-import urllib.parse
-import binascii
-import subprocess
+import copy
 import time
-import shutil
+import logging
+import concurrent.futures
+
+from handler_core import (WorkflowProfile, make_handler, to_nearest_multiple_of_16, process_input,
+                          resolve_job_file, load_workflow, get_template, normalize_prompt_inputs)
+from handler_core.binding import join_prompt_lines
+from handler_core.video_preprocess import submit_preprocess
 
 # 日志配置
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-server_address = os.getenv('SERVER_ADDRESS', '127.0.0.1')
-client_id = str(uuid.uuid4())
+WORKFLOW_FILE = "/wanvideo_SteadyDancer_example_01.json"
+DEFAULT_IMAGE = "/example_image.png"
+
+# ==================== 参数绑定 ====================
+
+# 任务参数声明（见 handler_core/binding.py），fixed 为工作流中固定使用的模型和输出设置
+STEADYDANCER_PARAMS = {
+    "prompt": {"default": "running man, grab the gun", "transform": join_prompt_lines},
+    "negative_prompt": {"type": str, "default": ""},
+    "width": {"type": float, "default": 480, "transform": to_nearest_multiple_of_16},
+    "height": {"type": float, "default": 832, "transform": to_nearest_multiple_of_16},
+    "length": {"type": int, "default": 81, "min": 1},
+    "steps": {"type": int, "default": 4, "min": 1},
+    "seed": {"type": int, "default": 42},
+    "cfg": {"type": float, "default": 1.0, "min": 0},
+    "scheduler": {"type": str, "default": "dpm++_sde"},
+    "sampler": {"type": str, "default": "fixed"},
+    "frame_rate": {"type": float, "default": 24, "min": 1},
+    "filename_prefix": {"type": str, "default": "WanVideoWrapper_SteadyDancer"},
+    "reference_video_start": {"type": float, "default": 0, "min": 0},
+    "preprocess_reference_video": {"type": bool, "default": True},
+    "steadydancer_model": {"default": "WanVideo/SteadyDancer/Wan21_SteadyDancer_fp8_e4m3fn_scaled_KJ.safetensors",
+                           "fixed": True},
+    "text_encoder": {"default": "umt5-xxl-enc-bf16.safetensors", "fixed": True},
+    "lora": {"default": "WanVideo/Lightx2v/lightx2v_I2V_14B_480p_cfg_step_distill_rank64_bf16.safetensors",
+             "fixed": True},
+    "vae": {"default": "Wan2_1_VAE_bf16.safetensors", "fixed": True},
+    "video_format": {"default": "video/h264-mp4", "fixed": True},
+    "save_output": {"default": True, "fixed": True},
+    "loop_count": {"default": 0, "fixed": True},
+    "pingpong": {"default": False, "fixed": True},
+    # 节点117 为中间预览输出，不保存
+    "preview_save_output": {"default": False, "fixed": True},
+    "preview_frame_rate": {"default": 24, "fixed": True},
+}
+
+# 节点76（参考图像）、75（参考视频）按任务处理，见 configure_steadydancer_nodes；
+# 90（姿态检测模型）、69 的 strength、59 与任务无关，在模板中处理，见 prepare_steadydancer_template
+STEADYDANCER_BINDINGS = (
+    ("steadydancer_model", "22", "model", 0),
+    ("text_encoder", "92", None, 0),
+    ("prompt", "92", "text", 2),
+    ("negative_prompt", "92", "negative_text", 3),
+    ("lora", "69", "lora", 0),
+    ("height", "63", "height", 0),
+    ("width", "63", "width", 1),
+    ("length", "63", "num_frames", 2),
+    ("steps", "119", "steps", 0),
+    ("seed", "119", "seed", 3),
+    ("sampler", "119", "sampler_name", 4),
+    ("scheduler", "119", "scheduler", 6),
+    ("cfg", "119", "cfg", None),
+    ("frame_rate", "83", "frame_rate", "frame_rate"),
+    ("filename_prefix", "83", "filename_prefix", "filename_prefix"),
+    ("video_format", "83", "format", "format"),
+    ("save_output", "83", "save_output", "save_output"),
+    ("loop_count", "83", "loop_count", "loop_count"),
+    ("pingpong", "83", "pingpong", "pingpong"),
+    ("preview_frame_rate", "117", "frame_rate", "frame_rate"),
+    ("video_format", "117", "format", "format"),
+    ("preview_save_output", "117", "save_output", "save_output"),
+    ("loop_count", "117", "loop_count", "loop_count"),
+    ("pingpong", "117", "pingpong", "pingpong"),
+    ("vae", "38", "model_name", None),
+)
 
 # ==================== 工具函数 ====================
 
-def to_nearest_multiple_of_16(value):
-    """将值调整为最接近的16的倍数，最小16"""
-    try:
-        numeric_value = float(value)
-    except Exception:
-        raise Exception(f"width/height值不是数字: {value}")
-    adjusted = int(round(numeric_value / 16.0) * 16)
-    return max(adjusted, 16)
-
 def should_skip_node(node_type):
     """检查节点类型是否应该被跳过"""
     if not node_type:
@@ -39,352 +90,8 @@ def should_skip_node(node_type):
     skip_types = ["Note", "GetNode", "SetNode", "PrimitiveNode"]
     return any(node_type_str == t or node_type_str.startswith(t) for t in skip_types)
 
-# ==================== Widgets 映射配置 ====================
-
-# 节点类型到 widgets_values 索引映射的配置
-WIDGETS_MAPPING = {
-    "WanVideoTextEncodeCached": {
-        "model_name": 0, "precision": 1, "positive_prompt": 2, 
-        "negative_prompt": 3, "quantization": 4, "use_disk_cache": 5, "device": 6
-    },
-    "WanVideoSamplerSettings": {
-        "shift": 7, "force_offload": 8, "riflex_freq_index": 9
-    },
-    "WanVideoModelLoader": {
-        "base_precision": 1, "quantization": 2, "load_device": 3
-    },
-    "WanVideoLoraSelect": {
-        "lora": 0, "strength": 1
-    },
-    "WanVideoImageToVideoEncode": {
-        "start_latent_strength": 3, "end_latent_strength": 4,
-        "noise_aug_strength": 5, "force_offload": 6
-    },
-    "WanVideoAddSteadyDancerEmbeds": {
-        "pose_strength_spatial": 0, "pose_strength_temporal": 1,
-        "start_percent": 2, "end_percent": 3
-    },
-    "WanVideoBlockSwap": {
-        "blocks_to_swap": 0, "offload_txt_emb": 1, "offload_img_emb": 2
-    },
-    "WanVideoTorchCompileSettings": {
-        "backend": 0, "compile_transformer_blocks_only": 1, "mode": 2,
-        "fullgraph": 3, "dynamo_cache_size_limit": 4, "dynamic": 5
-    },
-    "ImageConcatMulti": {
-        "inputcount": 0, "direction": 1, "match_image_size": 2
-    },
-    "WanVideoDecode": {
-        "enable_vae_tiling": 0, "tile_x": 1, "tile_y": 2,
-        "tile_stride_x": 3, "tile_stride_y": 4
-    },
-    "WanVideoEncode": {
-        "enable_vae_tiling": 0, "tile_x": 1, "tile_y": 2,
-        "tile_stride_x": 3, "tile_stride_y": 4
-    },
-    "WanVideoContextOptions": {
-        "context_schedule": 0, "context_frames": 1, "context_overlap": 2,
-        "context_stride": 3, "freenoise": 4, "verbose": 5
-    },
-    "GetImageRangeFromBatch": {
-        "start_index": 0, "num_frames": 1
-    },
-    "OnnxDetectionModelLoader": {
-        "vitpose_model": (0, lambda v: v.replace("\\", "/")),
-        "yolo_model": (1, lambda v: v.replace("\\", "/")),
-        "onnx_device": 2
-    },
-    "WanVideoVAELoader": {
-        "model_name": (0, lambda v: v.replace("\\", "/")),
-        "load_precision": 1
-    },
-    "CLIPVisionLoader": {
-        "clip_name": 0
-    },
-    "DrawViTPose": {
-        "retarget_padding": 2, "hand_stick_width": 3,
-        "body_stick_width": 4, "draw_head": 5
-    },
-    "ImageResizeKJv2": {
-        "upscale_method": 2, "keep_proportion": 3, "pad_color": 4,
-        "crop_position": 5, "divisible_by": 6
-    },
-    "WanVideoClipVisionEncode": {
-        "strength_1": 0, "strength_2": 1, "crop": 2,
-        "combine_embeds": 3, "force_offload": 4
-    }
-}
-
-def supplement_node_inputs_from_widgets(node_id, node_data, widgets_values):
-    """根据 widgets_values 补充节点的 inputs（简化版）"""
-    if not isinstance(widgets_values, list) or len(widgets_values) == 0:
-        return
-    
-    class_type = node_data.get("class_type") or node_data.get("type", "")
-    inputs = node_data.get("inputs", {})
-    mapping = WIDGETS_MAPPING.get(class_type)
-    
-    if not mapping:
-        return
-    
-    for input_name, index_or_tuple in mapping.items():
-        if input_name in inputs:
-            continue
-        
-        if isinstance(index_or_tuple, tuple):
-            index, transform = index_or_tuple
-        else:
-            index, transform = index_or_tuple, None
-        
-        if index < len(widgets_values) and widgets_values[index] is not None:
-            value = widgets_values[index]
-            if transform:
-                value = transform(value)
-            inputs[input_name] = value
-
-# ==================== 输入处理 ====================
-
-def process_input(input_data, temp_dir, output_filename, input_type):
-    """处理输入数据并返回文件路径（绝对路径）"""
-    if input_type == "path":
-        logger.info(f"📁 路径输入: {input_data}")
-        # 如果文件已经在 /ComfyUI/input/ 目录下，直接返回
-        if input_data.startswith("/ComfyUI/input/"):
-            return input_data
-        
-        # 如果文件不在 /ComfyUI/input/ 目录下，需要复制到目标目录
-        if os.path.exists(input_data):
-            os.makedirs(temp_dir, exist_ok=True)
-            dest_path = os.path.abspath(os.path.join(temp_dir, output_filename))
-            shutil.copy2(input_data, dest_path)
-            logger.info(f"✅ 已复制文件: {input_data} -> {dest_path}")
-            # 验证文件是否成功复制
-            if os.path.exists(dest_path):
-                logger.info(f"✅ 文件复制验证成功: {dest_path} (大小: {os.path.getsize(dest_path)} 字节)")
-            else:
-                logger.error(f"❌ 文件复制失败: {dest_path} 不存在")
-            return dest_path
-        else:
-            # 文件不存在，尝试作为相对路径处理
-            abs_path = os.path.abspath(os.path.join("/ComfyUI/input", input_data))
-            if os.path.exists(abs_path):
-                return abs_path
-            raise FileNotFoundError(f"文件不存在: {input_data}")
-    elif input_type == "url":
-        logger.info(f"🌐 URL输入: {input_data}")
-        os.makedirs(temp_dir, exist_ok=True)
-        file_path = os.path.abspath(os.path.join(temp_dir, output_filename))
-        return download_file_from_url(input_data, file_path)
-    elif input_type == "base64":
-        logger.info(f"🔢 Base64输入")
-        return save_base64_to_file(input_data, temp_dir, output_filename)
-    else:
-        raise Exception(f"不支持的输入类型: {input_type}")
-
-def download_file_from_url(url, output_path):
-    """从URL下载文件"""
-    try:
-        result = subprocess.run(
-            ['wget', '-O', output_path, '--no-verbose', url],
-            capture_output=True, text=True, timeout=300
-        )
-        if result.returncode == 0:
-            logger.info(f"✅ 下载成功: {url} -> {output_path}")
-            return output_path
-        else:
-            raise Exception(f"URL下载失败: {result.stderr}")
-    except Exception as e:
-        logger.error(f"❌ 下载错误: {e}")
-        raise
-
-def save_base64_to_file(base64_data, temp_dir, output_filename):
-    """将Base64数据保存为文件"""
-    try:
-        decoded_data = base64.b64decode(base64_data)
-        os.makedirs(temp_dir, exist_ok=True)
-        file_path = os.path.abspath(os.path.join(temp_dir, output_filename))
-        with open(file_path, 'wb') as f:
-            f.write(decoded_data)
-        logger.info(f"✅ Base64已保存: {file_path}")
-        return file_path
-    except (binascii.Error, ValueError) as e:
-        logger.error(f"❌ Base64解码失败: {e}")
-        raise Exception(f"Base64解码失败: {e}")
-
-# ==================== ComfyUI API 通信 ====================
-
-def queue_prompt(prompt):
-    """提交prompt到ComfyUI"""
-    url = f"http://{server_address}:8188/prompt"
-    data = json.dumps({"prompt": prompt, "client_id": client_id}).encode('utf-8')
-    req = urllib.request.Request(url, data=data)
-    req.add_header('Content-Type', 'application/json')
-    try:
-        response = urllib.request.urlopen(req)
-        return json.loads(response.read())
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode('utf-8')
-        logger.error(f"HTTP错误 {e.code}: {error_body}")
-        raise Exception(f"ComfyUI API错误 ({e.code}): {error_body}")
-
-def get_image(filename, subfolder, folder_type):
-    """从ComfyUI获取图像"""
-    url = f"http://{server_address}:8188/view"
-    data = {"filename": filename, "subfolder": subfolder, "type": folder_type}
-    url_values = urllib.parse.urlencode(data)
-    with urllib.request.urlopen(f"{url}?{url_values}") as response:
-        return response.read()
-
-def get_history(prompt_id):
-    """获取执行历史"""
-    url = f"http://{server_address}:8188/history/{prompt_id}"
-    with urllib.request.urlopen(url) as response:
-        return json.loads(response.read())
-
-def get_videos(ws, prompt):
-    """获取生成的视频，增强错误处理"""
-    prompt_id = queue_prompt(prompt)['prompt_id']
-    output_videos = {}
-    error_info = None
-    node_errors = {}
-    executed_nodes = set()
-    
-    logger.info(f"开始执行工作流，prompt_id: {prompt_id}")
-    
-    while True:
-        out = ws.recv()
-        if isinstance(out, str):
-            message = json.loads(out)
-            if message['type'] == 'executing':
-                data = message['data']
-                node_id = data.get('node')
-                if node_id:
-                    executed_nodes.add(node_id)
-                    logger.debug(f"节点 {node_id} 正在执行...")
-                elif data['node'] is None and data['prompt_id'] == prompt_id:
-                    logger.info("所有节点执行完成")
-                    break
-            elif message['type'] == 'execution_error':
-                error_data = message.get('data', {})
-                node_id = error_data.get('node_id', 'unknown')
-                error_info = error_data.get('error', 'Unknown execution error')
-                exception_message = error_data.get('exception_message', '')
-                
-                node_errors[node_id] = {
-                    'error': error_info,
-                    'type': error_data.get('type', ''),
-                    'exception_message': exception_message,
-                    'full_data': error_data
-                }
-                
-                error_str = str(error_info)
-                logger.error("=" * 60)
-                logger.error(f"❌ 执行错误 - 节点: {node_id}")
-                if 'OutOfMemoryError' in error_str or 'OOM' in error_str:
-                    logger.error(f"GPU内存不足(OOM): {error_info}")
-                    logger.error("建议: 减小分辨率、帧数或提示词长度")
-                else:
-                    logger.error(f"错误类型: {error_data.get('type', 'unknown')}")
-                    logger.error(f"错误信息: {error_info}")
-                    if exception_message:
-                        logger.error(f"异常详情: {exception_message[:500]}...")  # 限制长度
-                    # 记录节点配置信息以便调试
-                    if node_id in prompt:
-                        node_class = prompt[node_id].get("class_type", "unknown")
-                        logger.error(f"节点类型: {node_class}")
-                        logger.error(f"节点输入: {prompt[node_id].get('inputs', {})}")
-
-    history = get_history(prompt_id)[prompt_id]
-    
-    # 检查是否有执行错误
-    if node_errors:
-        logger.error(f"发现 {len(node_errors)} 个节点执行错误")
-        error_details = []
-        for node_id, error_data in node_errors.items():
-            error_msg = error_data.get('error', 'Unknown error')
-            exception_msg = error_data.get('exception_message', '')
-            full_error = f"节点 {node_id}: {error_msg}"
-            if exception_msg:
-                full_error += f"\n异常详情: {exception_msg[:300]}"
-            logger.error(full_error)
-            error_details.append(full_error)
-        
-        # 如果有执行错误，即使 history 中没有 error 字段，也应该抛出异常
-        raise Exception(f"工作流执行失败，{len(node_errors)} 个节点出现错误:\n" + "\n".join(error_details))
-    
-    if 'error' in history:
-        error_info = history['error']
-        if isinstance(error_info, dict):
-            error_info = error_info.get('message', str(error_info))
-        
-        error_str = str(error_info)
-        if 'OutOfMemoryError' in error_str or 'OOM' in error_str or 'allocation' in error_str.lower():
-            logger.error(f"❌ GPU内存不足 (OOM): {error_info}")
-            raise Exception(f"GPU内存不足: {error_info}. 请尝试减小分辨率、帧数或提示词长度。")
-        else:
-            # 如果有节点错误，包含节点错误信息
-            if node_errors:
-                error_details = []
-                for node_id, err_data in node_errors.items():
-                    error_details.append(f"节点 {node_id}: {err_data.get('error', 'Unknown error')}")
-                raise Exception(f"ComfyUI执行错误: {error_info}\n节点错误详情:\n" + "\n".join(error_details))
-            raise Exception(f"ComfyUI执行错误: {error_info}")
-    
-    if 'outputs' not in history:
-        raise Exception("执行历史中未找到输出")
-    
-    for node_id in history['outputs']:
-        node_output = history['outputs'][node_id]
-        videos_output = []
-        video_list = node_output.get('gifs') or node_output.get('videos')
-        
-        if video_list:
-            for video in video_list:
-                if 'fullpath' in video:
-                    with open(video['fullpath'], 'rb') as f:
-                        video_data = base64.b64encode(f.read()).decode('utf-8')
-                    videos_output.append(video_data)
-                elif 'filename' in video:
-                    try:
-                        video_bytes = get_image(
-                            video['filename'],
-                            video.get('subfolder', ''),
-                            video.get('type', 'output')
-                        )
-                        video_data = base64.b64encode(video_bytes).decode('utf-8')
-                        videos_output.append(video_data)
-                    except Exception as e:
-                        logger.warning(f"无法读取视频文件 {video['filename']}: {e}")
-        output_videos[node_id] = videos_output
-
-    return output_videos
-
 # ==================== Workflow 处理 ====================
 
-def load_workflow(workflow_path):
-    """加载并验证工作流JSON文件"""
-    if not os.path.exists(workflow_path):
-        raise FileNotFoundError(f"工作流文件不存在: {workflow_path}")
-    
-    file_size = os.path.getsize(workflow_path)
-    logger.info(f"加载工作流: {workflow_path} (大小: {file_size} 字节)")
-    
-    if file_size == 0:
-        raise ValueError(f"工作流文件为空: {workflow_path}")
-    
-    try:
-        with open(workflow_path, 'r', encoding='utf-8') as file:
-            content = file.read().strip()
-            if not content.startswith(('{', '[')):
-                raise ValueError(f"工作流文件不是有效的JSON格式: {workflow_path}")
-            return json.loads(content)
-    except json.JSONDecodeError as e:
-        logger.error(f"JSON解析错误 (行 {e.lineno}): {str(e)}")
-        raise ValueError(f"工作流文件JSON格式错误: {workflow_path} - {str(e)}")
-    except Exception as e:
-        logger.error(f"加载工作流文件时发生错误: {workflow_path} - {str(e)}")
-        raise
-
 def convert_workflow_nodes_to_prompt(workflow_data):
     """将 nodes 数组格式转换为节点 ID key 格式（支持 SetNode/GetNode 解析）"""
     if "nodes" not in workflow_data:
@@ -569,10 +276,6 @@ def convert_workflow_nodes_to_prompt(workflow_data):
         elif "class_type" not in converted_node:
             logger.warning(f"节点 {node_id} 缺少 type 和 class_type 字段")
         
-        # 补充缺失的 inputs
-        if not widgets_values_is_dict and isinstance(widgets_values, list) and len(widgets_values) > 0:
-            supplement_node_inputs_from_widgets(node_id, converted_node, widgets_values)
-        
         prompt[node_id] = converted_node
     
     # 验证并清理无效引用
@@ -599,147 +302,6 @@ def convert_workflow_nodes_to_prompt(workflow_data):
     logger.info(f"已转换工作流，共 {len(prompt)} 个有效节点")
     return prompt
 
-# ==================== 自动填充缺失输入 ====================
-
-def fill_missing_inputs_from_widgets(node_id, node):
-    """从 widgets_values 填充缺失的 inputs"""
-    class_type = node.get("class_type", "")
-    if "inputs" not in node:
-        node["inputs"] = {}
-    
-    # 处理字典格式的 widgets_values（如 VHS_VideoCombine）
-    if "widgets_values" in node and isinstance(node["widgets_values"], dict):
-        widgets = node["widgets_values"]
-        for key, value in widgets.items():
-            if key not in ["videopreview"] and key not in node["inputs"]:
-                node["inputs"][key] = value
-        return
-    
-    # 处理列表格式的 widgets_values
-    if "widgets_values" not in node:
-        return
-    
-    widgets = node["widgets_values"]
-    if not isinstance(widgets, list) or len(widgets) == 0:
-        return
-    
-    # 根据节点类型填充缺失的输入（只处理 SteadyDancer 需要的节点类型）
-    if "WanVideoSamplerSettings" in class_type:
-        # widgets: [steps, shift, riflex_freq_index, seed, sampler_name, cfg, scheduler, ...]
-        if len(widgets) >= 1 and "steps" not in node["inputs"]:
-            node["inputs"]["steps"] = widgets[0]
-        if len(widgets) >= 2 and "shift" not in node["inputs"]:
-            shift_value = widgets[1] if isinstance(widgets[1], (int, float)) else 0.0
-            if shift_value < 0:
-                shift_value = 0.0
-            node["inputs"]["shift"] = shift_value
-        if len(widgets) >= 3 and "riflex_freq_index" not in node["inputs"]:
-            node["inputs"]["riflex_freq_index"] = widgets[2] if isinstance(widgets[2], (int, float)) else 0
-        if len(widgets) >= 4 and "seed" not in node["inputs"]:
-            node["inputs"]["seed"] = widgets[3]
-        if len(widgets) >= 5 and "sampler_name" not in node["inputs"]:
-            node["inputs"]["sampler_name"] = widgets[4]
-        if len(widgets) >= 6 and "cfg" not in node["inputs"]:
-            node["inputs"]["cfg"] = widgets[5]
-        if len(widgets) >= 7 and "scheduler" not in node["inputs"]:
-            node["inputs"]["scheduler"] = widgets[6]
-        if len(widgets) >= 8 and "force_offload" not in node["inputs"]:
-            node["inputs"]["force_offload"] = widgets[7] if isinstance(widgets[7], bool) else False
-    
-    elif "WanVideoAddSteadyDancerEmbeds" in class_type:
-        # widgets: [pose_strength_spatial, pose_strength_temporal, start_percent, end_percent]
-        if len(widgets) >= 1 and "pose_strength_spatial" not in node["inputs"]:
-            node["inputs"]["pose_strength_spatial"] = widgets[0]
-        if len(widgets) >= 2 and "pose_strength_temporal" not in node["inputs"]:
-            node["inputs"]["pose_strength_temporal"] = widgets[1]
-        if len(widgets) >= 3 and "start_percent" not in node["inputs"]:
-            node["inputs"]["start_percent"] = widgets[2]
-        if len(widgets) >= 4 and "end_percent" not in node["inputs"]:
-            node["inputs"]["end_percent"] = widgets[3]
-    
-    elif "WanVideoImageToVideoEncode" in class_type:
-        # widgets: [height, width, num_frames, start_latent_strength, end_latent_strength, noise_aug_strength, force_offload]
-        if len(widgets) >= 1 and "height" not in node["inputs"]:
-            node["inputs"]["height"] = widgets[0]
-        if len(widgets) >= 2 and "width" not in node["inputs"]:
-            node["inputs"]["width"] = widgets[1]
-        if len(widgets) >= 3 and "num_frames" not in node["inputs"]:
-            node["inputs"]["num_frames"] = widgets[2]
-        if len(widgets) >= 4 and "start_latent_strength" not in node["inputs"]:
-            node["inputs"]["start_latent_strength"] = widgets[3]
-        if len(widgets) >= 5 and "end_latent_strength" not in node["inputs"]:
-            node["inputs"]["end_latent_strength"] = widgets[4]
-        if len(widgets) >= 6 and "noise_aug_strength" not in node["inputs"]:
-            node["inputs"]["noise_aug_strength"] = widgets[5]
-        if len(widgets) >= 7 and "force_offload" not in node["inputs"]:
-            node["inputs"]["force_offload"] = widgets[6] if isinstance(widgets[6], bool) else False
-    
-    elif "WanVideoDecode" in class_type or "WanVideoEncode" in class_type:
-        # widgets: [enable_vae_tiling, tile_x, tile_y, tile_stride_x, tile_stride_y, ...]
-        if len(widgets) >= 1 and "enable_vae_tiling" not in node["inputs"]:
-            node["inputs"]["enable_vae_tiling"] = widgets[0] if isinstance(widgets[0], bool) else False
-        if len(widgets) >= 2 and "tile_x" not in node["inputs"]:
-            node["inputs"]["tile_x"] = widgets[1]
-        if len(widgets) >= 3 and "tile_y" not in node["inputs"]:
-            node["inputs"]["tile_y"] = widgets[2]
-        if len(widgets) >= 4 and "tile_stride_x" not in node["inputs"]:
-            node["inputs"]["tile_stride_x"] = widgets[3]
-        if len(widgets) >= 5 and "tile_stride_y" not in node["inputs"]:
-            node["inputs"]["tile_stride_y"] = widgets[4]
-    
-    elif "WanVideoLoraSelect" in class_type:
-        # widgets: [lora, strength, ...]
-        if len(widgets) >= 1 and "lora" not in node["inputs"]:
-            lora_path = widgets[0]
-            if isinstance(lora_path, str) and lora_path:
-                lora_path = lora_path.replace("\\", "/")
-                if lora_path.startswith("ComfyUI/models/loras/"):
-                    lora_path = lora_path.replace("ComfyUI/models/loras/", "")
-                elif lora_path.startswith("/ComfyUI/models/loras/"):
-                    lora_path = lora_path.replace("/ComfyUI/models/loras/", "")
-                if "/" in lora_path and not lora_path.startswith("WanVideo/"):
-                    lora_path = "WanVideo/" + lora_path
-            node["inputs"]["lora"] = lora_path
-        if len(widgets) >= 2 and "strength" not in node["inputs"]:
-            node["inputs"]["strength"] = widgets[1]
-    
-    elif "WanVideoBlockSwap" in class_type:
-        # widgets: [blocks_to_swap, offload_txt_emb, offload_img_emb, ...]
-        if len(widgets) >= 1 and "blocks_to_swap" not in node["inputs"]:
-            node["inputs"]["blocks_to_swap"] = widgets[0]
-        if len(widgets) >= 2 and "offload_txt_emb" not in node["inputs"]:
-            node["inputs"]["offload_txt_emb"] = widgets[1]
-        if len(widgets) >= 3 and "offload_img_emb" not in node["inputs"]:
-            node["inputs"]["offload_img_emb"] = widgets[2]
-    
-    elif "WanVideoContextOptions" in class_type:
-        # widgets: [context_schedule, context_frames, context_overlap, context_stride, freenoise, verbose]
-        if len(widgets) >= 1 and "context_schedule" not in node["inputs"]:
-            node["inputs"]["context_schedule"] = widgets[0]
-        if len(widgets) >= 2 and "context_frames" not in node["inputs"]:
-            node["inputs"]["context_frames"] = widgets[1]
-        if len(widgets) >= 3 and "context_overlap" not in node["inputs"]:
-            node["inputs"]["context_overlap"] = widgets[2]
-        if len(widgets) >= 4 and "context_stride" not in node["inputs"]:
-            node["inputs"]["context_stride"] = widgets[3]
-        if len(widgets) >= 5 and "freenoise" not in node["inputs"]:
-            node["inputs"]["freenoise"] = widgets[4] if isinstance(widgets[4], bool) else True
-        if len(widgets) >= 6 and "verbose" not in node["inputs"]:
-            node["inputs"]["verbose"] = widgets[5] if isinstance(widgets[5], bool) else False
-    
-    elif "WanVideoClipVisionEncode" in class_type:
-        # widgets: [strength_1, strength_2, crop, combine_embeds, force_offload, ...]
-        if len(widgets) >= 1 and "strength_1" not in node["inputs"]:
-            node["inputs"]["strength_1"] = widgets[0]
-        if len(widgets) >= 2 and "strength_2" not in node["inputs"]:
-            node["inputs"]["strength_2"] = widgets[1]
-        if len(widgets) >= 3 and "crop" not in node["inputs"]:
-            node["inputs"]["crop"] = widgets[2]
-        if len(widgets) >= 4 and "combine_embeds" not in node["inputs"]:
-            node["inputs"]["combine_embeds"] = widgets[3]
-        if len(widgets) >= 5 and "force_offload" not in node["inputs"]:
-            node["inputs"]["force_offload"] = widgets[4] if isinstance(widgets[4], bool) else True
-
 # ==================== 节点配置 ====================
 
 def configure_node(prompt, node_id, updates):
@@ -770,83 +332,33 @@ def configure_node(prompt, node_id, updates):
     for key, value in updates.get("inputs", {}).items():
         prompt[node_id]["inputs"][key] = value
 
-def configure_steadydancer_nodes(prompt, job_input, task_id, image_path, adjusted_width, adjusted_height, length, 
-                                 positive_prompt, negative_prompt, steps, seed, cfg, scheduler, sampler_name):
-    """配置 SteadyDancer 工作流的所有节点"""
-    logger.info("配置 SteadyDancer 工作流节点")
-    
-    # 节点76: LoadImage
-    if "76" in prompt:
-        # 使用绝对路径（ComfyUI 期望相对于 /ComfyUI/input/ 的路径或绝对路径）
-        # image_path 已经是绝对路径，但需要转换为相对于 /ComfyUI/input/ 的路径
-        if image_path and image_path.startswith("/ComfyUI/input/"):
-            image_relative_path = image_path.replace("/ComfyUI/input/", "")
-            logger.info(f"节点76: 图像路径转换: {image_path} -> {image_relative_path}")
-        else:
-            image_relative_path = f"{task_id}/input_image.jpg"
-            logger.warning(f"节点76: 图像路径不在 /ComfyUI/input/ 下，使用默认路径: {image_relative_path}")
-        # 验证文件是否存在
-        full_path = os.path.join("/ComfyUI/input", image_relative_path)
-        if os.path.exists(full_path):
-            logger.info(f"节点76: 验证文件存在: {full_path}")
-        else:
-            logger.error(f"节点76: 文件不存在: {full_path}")
-        configure_node(prompt, "76", {
-            "widgets_list": {"image": (0, image_relative_path)},
-            "inputs": {"image": image_relative_path}
-        })
-        logger.info(f"节点76 (参考图像): {image_relative_path}")
-    
-    # 节点75: VHS_LoadVideo (可选)
-    reference_video_path = None
-    for key in ["reference_video_path", "reference_video_url", "reference_video_base64", "video_base64"]:
-        if key in job_input:
-            task_input_dir = os.path.join("/ComfyUI/input", task_id)
-            reference_video_path = process_input(
-                job_input[key], task_input_dir, "reference_video.mp4",
-                "path" if "path" in key else ("url" if "url" in key else "base64")
-            )
-            break
-    
-    if reference_video_path and "75" in prompt:
-        # 使用绝对路径（ComfyUI 期望相对于 /ComfyUI/input/ 的路径或绝对路径）
-        if reference_video_path.startswith("/ComfyUI/input/"):
-            video_relative_path = reference_video_path.replace("/ComfyUI/input/", "")
-            logger.info(f"节点75: 视频路径转换: {reference_video_path} -> {video_relative_path}")
-        else:
-            video_relative_path = f"{task_id}/reference_video.mp4"
-            logger.warning(f"节点75: 视频路径不在 /ComfyUI/input/ 下，使用默认路径: {video_relative_path}")
-        # 验证文件是否存在
-        full_path = os.path.join("/ComfyUI/input", video_relative_path)
-        if os.path.exists(full_path):
-            logger.info(f"节点75: 验证文件存在: {full_path}")
-        else:
-            logger.error(f"节点75: 文件不存在: {full_path}")
-        configure_node(prompt, "75", {
-            "widgets_dict": {"video": video_relative_path},
-            "inputs": {"video": video_relative_path}
-        })
-        logger.info(f"节点75 (参考视频): {video_relative_path}")
-    elif "75" in prompt:
-        # 移除节点75的依赖
-        for nid, ndata in list(prompt.items()):
-            if "inputs" in ndata:
-                for input_name, input_value in list(ndata["inputs"].items()):
-                    if isinstance(input_value, list) and len(input_value) >= 1 and str(input_value[0]) == "75":
-                        del ndata["inputs"][input_name]
-        if "75" in prompt:
-            del prompt["75"]
-        logger.info("已移除节点75 (未提供参考视频)")
-    
-    # 节点22: WanVideoModelLoader
-    if "22" in prompt:
-        steadydancer_model = "WanVideo/SteadyDancer/Wan21_SteadyDancer_fp8_e4m3fn_scaled_KJ.safetensors"
-        configure_node(prompt, "22", {
-            "widgets_list": {"model": (0, steadydancer_model)},
-            "inputs": {"model": steadydancer_model}
-        })
-        logger.info(f"节点22 (SteadyDancer模型): {steadydancer_model}")
-    
+def resolve_reference_video(job_input, task_dir):
+    """获取参考视频的本地路径（task_dir 下），未提供时返回 None；video_base64 为旧参数名"""
+    reference_video_path = resolve_job_file(job_input, "reference_video", task_dir, "reference_video.mp4",
+                                            copy_path=True)
+    if reference_video_path is None and "video_base64" in job_input:
+        reference_video_path = process_input(job_input["video_base64"], task_dir, "reference_video.mp4", "base64")
+    return reference_video_path
+
+def get_reference_fps(prompt, default=16):
+    """工作流中 VHS_LoadVideo (节点75) 的 force_rate"""
+    node = prompt.get("75", {})
+    fps = node.get("inputs", {}).get("force_rate")
+    if not fps and isinstance(node.get("widgets_values"), dict):
+        fps = node["widgets_values"].get("force_rate")
+    return fps or default
+
+def prepare_steadydancer_template(prompt, object_info):
+    """
+    模板中与任务参数无关的配置：姿态检测模型、LoRA strength、CLIP Vision 模型，
+    以及按 object_info 补全 inputs 和值修正（每个 worker 只执行一次）
+    """
+    # 节点119 的 widgets_values 补齐到 7 项（sampler 在 [4]，scheduler 在 [6]），绑定按补齐后的模板编译
+    if isinstance(prompt.get("119", {}).get("widgets_values"), list):
+        widgets = prompt["119"]["widgets_values"]
+        while len(widgets) < 7:
+            widgets.append(None)
+
     # 节点90: OnnxDetectionModelLoader
     if "90" in prompt:
         vitpose_model = "vitpose_h_wholebody_model.onnx"
@@ -886,116 +398,12 @@ def configure_steadydancer_nodes(prompt, job_input, task_id, image_path, adjuste
         })
         logger.info(f"节点90 (姿态检测模型): vitpose={vitpose_model}, yolo={yolo_model}, device={onnx_device}")
     
-    # 节点92: WanVideoTextEncodeCached
-    if "92" in prompt:
-        configure_node(prompt, "92", {
-            "widgets_list": {
-                "model_name": (0, "umt5-xxl-enc-bf16.safetensors"),
-                "positive_prompt": (2, positive_prompt),
-                "negative_prompt": (3, negative_prompt)
-            },
-            "inputs": {
-                "text": positive_prompt,
-                "negative_text": negative_prompt
-            }
-        })
-        logger.info(f"节点92 (文本编码): {positive_prompt[:50]}...")
-    
-    # 节点69: WanVideoLoraSelect
+    # 节点69: WanVideoLoraSelect - strength 沿用工作流中的值
     if "69" in prompt:
-        lora_path = "WanVideo/Lightx2v/lightx2v_I2V_14B_480p_cfg_step_distill_rank64_bf16.safetensors"
-        strength = 1.0
-        if "widgets_values" in prompt["69"] and len(prompt["69"]["widgets_values"]) > 1:
-            strength = prompt["69"]["widgets_values"][1]
-        configure_node(prompt, "69", {
-            "widgets_list": {"lora": (0, lora_path)},
-            "inputs": {"lora": lora_path, "strength": strength}
-        })
-        logger.info(f"节点69 (LoRA): {lora_path}")
-    
-    # 节点63: WanVideoImageToVideoEncode
-    if "63" in prompt:
-        configure_node(prompt, "63", {
-            "widgets_list": {
-                "height": (0, adjusted_height),
-                "width": (1, adjusted_width),
-                "num_frames": (2, length)
-            },
-            "inputs": {
-                "width": adjusted_width,
-                "height": adjusted_height,
-                "num_frames": length
-            }
-        })
-        logger.info(f"节点63 (图像到视频编码): {adjusted_width}x{adjusted_height}, {length}帧")
-    
-    # 节点119: WanVideoSamplerSettings
-    if "119" in prompt:
-        widgets = prompt["119"].get("widgets_values", [])
-        while len(widgets) < 7:
-            widgets.append(None)
-        widgets[0] = steps
-        widgets[3] = seed
-        widgets[4] = sampler_name
-        widgets[6] = scheduler
-        configure_node(prompt, "119", {
-            "inputs": {
-                "steps": steps,
-                "seed": seed,
-                "cfg": cfg,
-                "scheduler": scheduler
-            }
-        })
-        logger.info(f"节点119 (采样器设置): steps={steps}, seed={seed}, cfg={cfg}, scheduler={scheduler}")
-    
-    # 节点83: VHS_VideoCombine (输出)
-    if "83" in prompt:
-        configure_node(prompt, "83", {
-            "widgets_dict": {
-                "frame_rate": job_input.get("frame_rate", 24),
-                "filename_prefix": job_input.get("filename_prefix", "WanVideoWrapper_SteadyDancer"),
-                "format": "video/h264-mp4",
-                "save_output": True,
-                "loop_count": 0,
-                "pingpong": False
-            },
-            "inputs": {
-                "frame_rate": job_input.get("frame_rate", 24),
-                "filename_prefix": job_input.get("filename_prefix", "WanVideoWrapper_SteadyDancer"),
-                "format": "video/h264-mp4",
-                "save_output": True,
-                "loop_count": 0,
-                "pingpong": False
-            }
-        })
-        logger.info(f"节点83 (视频输出): 已配置")
-    
-    # 节点117: VHS_VideoCombine (中间输出)
-    if "117" in prompt:
-        configure_node(prompt, "117", {
-            "widgets_dict": {
-                "save_output": False,
-                "loop_count": 0,
-                "pingpong": False,
-                "format": "video/h264-mp4",
-                "frame_rate": 24
-            },
-            "inputs": {
-                "save_output": False,
-                "loop_count": 0,
-                "pingpong": False,
-                "format": "video/h264-mp4",
-                "frame_rate": 24
-            }
-        })
-        logger.info(f"节点117 (视频输出): 已配置")
-    
-    # 补充其他节点
-    if "38" in prompt:
-        configure_node(prompt, "38", {
-            "inputs": {"model_name": "Wan2_1_VAE_bf16.safetensors"}
-        })
-    
+        widgets = prompt["69"].get("widgets_values")
+        strength = widgets[1] if isinstance(widgets, list) and len(widgets) > 1 else 1.0
+        configure_node(prompt, "69", {"inputs": {"strength": strength}})
+
     if "59" in prompt and "widgets_values" in prompt["59"]:
         widgets = prompt["59"]["widgets_values"]
         if isinstance(widgets, list) and len(widgets) > 0:
@@ -1003,178 +411,85 @@ def configure_steadydancer_nodes(prompt, job_input, task_id, image_path, adjuste
                 "inputs": {"clip_name": widgets[0]}
             })
     
-    logger.info("SteadyDancer 工作流节点配置完成")
+    # 按 object_info 的控件顺序补全 inputs 并校验取值
+    normalize_prompt_inputs(prompt, object_info)
+    fix_value_types(prompt)
 
-# ==================== 连接管理 ====================
-
-def wait_for_http_connection(max_attempts=180):
-    """等待HTTP连接"""
-    http_url = f"http://{server_address}:8188/"
-    logger.info(f"检查HTTP连接: {http_url}")
-    
-    for attempt in range(max_attempts):
-        try:
-            urllib.request.urlopen(http_url, timeout=5)
-            logger.info(f"HTTP连接成功 (尝试 {attempt+1})")
-            return
-        except Exception as e:
-            if attempt == max_attempts - 1:
-                raise Exception("无法连接到ComfyUI服务器")
-            time.sleep(1)
+def configure_steadydancer_nodes(prompt, values, task_id, image_path,
+                                 reference_video_path=None, reference_preprocessed=False):
+    """配置 SteadyDancer 任务的节点：参数已按 BINDINGS 写入，这里只处理参考图像 (76) 和参考视频 (75)"""
+    logger.info("配置 SteadyDancer 工作流节点")
+    logger.info(f"节点92 (文本编码): {values['prompt'][:50]}...")
+    logger.info(f"节点63 (图像到视频编码): {values['width']}x{values['height']}, {values['length']}帧")
+    logger.info(f"节点119 (采样器设置): steps={values['steps']}, seed={values['seed']}, cfg={values['cfg']}, "
+                f"scheduler={values['scheduler']}")
 
-def connect_websocket(max_attempts=36):
-    """连接WebSocket"""
-    ws_url = f"ws://{server_address}:8188/ws?clientId={client_id}"
-    logger.info(f"连接WebSocket: {ws_url}")
+    # 节点76: LoadImage
+    if "76" in prompt:
+        # 使用绝对路径（ComfyUI 期望相对于 /ComfyUI/input/ 的路径或绝对路径）
+        # image_path 已经是绝对路径，但需要转换为相对于 /ComfyUI/input/ 的路径
+        if image_path and image_path.startswith("/ComfyUI/input/"):
+            image_relative_path = image_path.replace("/ComfyUI/input/", "")
+            logger.info(f"节点76: 图像路径转换: {image_path} -> {image_relative_path}")
+        else:
+            image_relative_path = f"{task_id}/input_image.jpg"
+            logger.warning(f"节点76: 图像路径不在 /ComfyUI/input/ 下，使用默认路径: {image_relative_path}")
+        # 验证文件是否存在
+        full_path = os.path.join("/ComfyUI/input", image_relative_path)
+        if os.path.exists(full_path):
+            logger.info(f"节点76: 验证文件存在: {full_path}")
+        else:
+            logger.error(f"节点76: 文件不存在: {full_path}")
+        configure_node(prompt, "76", {
+            "widgets_list": {"image": (0, image_relative_path)},
+            "inputs": {"image": image_relative_path}
+        })
+        logger.info(f"节点76 (参考图像): {image_relative_path}")
     
-    ws = websocket.WebSocket()
-    for attempt in range(max_attempts):
-        try:
-            ws.connect(ws_url)
-            logger.info(f"WebSocket连接成功 (尝试 {attempt+1})")
-            return ws
-        except Exception as e:
-            if attempt == max_attempts - 1:
-                raise Exception("WebSocket连接超时 (3分钟)")
-            time.sleep(5)
+    # 节点75: VHS_LoadVideo (可选)
+    if reference_video_path and "75" in prompt:
+        # 使用绝对路径（ComfyUI 期望相对于 /ComfyUI/input/ 的路径或绝对路径）
+        if reference_video_path.startswith("/ComfyUI/input/"):
+            video_relative_path = reference_video_path.replace("/ComfyUI/input/", "")
+            logger.info(f"节点75: 视频路径转换: {reference_video_path} -> {video_relative_path}")
+        else:
+            video_relative_path = f"{task_id}/reference_video.mp4"
+            logger.warning(f"节点75: 视频路径不在 /ComfyUI/input/ 下，使用默认路径: {video_relative_path}")
+        # 验证文件是否存在
+        full_path = os.path.join("/ComfyUI/input", video_relative_path)
+        if os.path.exists(full_path):
+            logger.info(f"节点75: 验证文件存在: {full_path}")
+        else:
+            logger.error(f"节点75: 文件不存在: {full_path}")
+        configure_node(prompt, "75", {
+            "widgets_dict": {"video": video_relative_path},
+            "inputs": {"video": video_relative_path}
+        })
+        if reference_preprocessed:
+            # 已在 handler 侧完成重采样、缩放和截断，VHS 只需原样读取
+            passthrough = {"force_rate": 0, "custom_width": 0, "custom_height": 0,
+                           "frame_load_cap": 0, "skip_first_frames": 0, "select_every_nth": 1}
+            configure_node(prompt, "75", {"widgets_dict": passthrough, "inputs": passthrough})
+        logger.info(f"节点75 (参考视频): {video_relative_path}")
+    elif "75" in prompt:
+        # 移除节点75及其依赖（只复制引用了节点75的节点）
+        prompt.remove_links_to("75")
+        logger.info("已移除节点75 (未提供参考视频)")
 
-# ==================== 主处理函数 ====================
+    logger.info("SteadyDancer 工作流节点配置完成")
 
-def handler(job):
-    """处理 SteadyDancer 视频生成任务"""
-    job_input = job.get("input", {})
-    
-    # 记录输入（排除base64数据）
-    log_input = {k: v for k, v in job_input.items() 
-                 if k not in ["image_base64", "end_image_base64", "video_base64", "reference_video_base64"]}
-    for key in ["image_base64", "end_image_base64", "video_base64", "reference_video_base64"]:
-        if key in job_input:
-            log_input[key] = f"<base64 data, length: {len(job_input[key])}>"
-    logger.info(f"收到任务输入: {log_input}")
-    
-    task_id = f"task_{uuid.uuid4()}"
-    comfyui_input_dir = "/ComfyUI/input"
-    task_input_dir = os.path.join(comfyui_input_dir, task_id)
-    os.makedirs(task_input_dir, exist_ok=True)
-    
-    # 处理图像输入
-    image_path = None
-    for key in ["image_path", "image_url", "image_base64"]:
-        if key in job_input:
-            image_path = process_input(
-                job_input[key], task_input_dir, "input_image.jpg",
-                "path" if "path" in key else ("url" if "url" in key else "base64")
-            )
-            break
-    
-    if not image_path:
-        image_path = "/example_image.png"
-        logger.info("使用默认图像: /example_image.png")
-    
-    # 加载工作流
-    workflow_file = "/wanvideo_SteadyDancer_example_01.json"
-    workflow_data = load_workflow(workflow_file)
-    
-    # 转换工作流格式
-    prompt = convert_workflow_nodes_to_prompt(workflow_data)
-    
-    # 获取参数
-    length = job_input.get("length", 81)
-    steps = job_input.get("steps", 4)
-    seed = job_input.get("seed", 42)
-    cfg = job_input.get("cfg", 1.0)
-    scheduler = job_input.get("scheduler", "dpm++_sde")
-    sampler_name = job_input.get("sampler", "fixed")
-    
-    # 处理提示词
-    prompt_input = job_input.get("prompt", "running man, grab the gun")
-    if isinstance(prompt_input, list):
-        positive_prompt = "\n".join(str(p) for p in prompt_input if p)
-    else:
-        positive_prompt = str(prompt_input)
-    
-    prompt_lines = [line.strip() for line in positive_prompt.split("\n") if line.strip()]
-    prompt_count = len(prompt_lines)
-    if prompt_count > 1:
-        total_frames = length * prompt_count
-        total_seconds = total_frames / 16.0
-        logger.info(f"📹 多提示词模式: {prompt_count}个提示词，总长度约{total_seconds:.1f}秒")
-    
-    negative_prompt = job_input.get("negative_prompt", "")
-    
-    # 调整分辨率
-    original_width = job_input.get("width", 480)
-    original_height = job_input.get("height", 832)
-    adjusted_width = to_nearest_multiple_of_16(original_width)
-    adjusted_height = to_nearest_multiple_of_16(original_height)
-    if adjusted_width != original_width or adjusted_height != original_height:
-        logger.info(f"分辨率调整: {original_width}x{original_height} -> {adjusted_width}x{adjusted_height}")
-    
-    # 配置节点
-    configure_steadydancer_nodes(
-        prompt, job_input, task_id, image_path,
-        adjusted_width, adjusted_height, length,
-        positive_prompt, negative_prompt,
-        steps, seed, cfg, scheduler, sampler_name
-    )
-    
-    # 自动填充缺失的必需输入（在所有配置之后）
-    logger.info("自动填充缺失的必需输入...")
-    for node_id, node in prompt.items():
-        fill_missing_inputs_from_widgets(node_id, node)
-    
-    # 修正所有节点的值类型错误
+def fix_value_types(prompt):
+    """节点定义之外的值修正：加载设备、tile 参数"""
     logger.info("修正值类型错误...")
     for node_id, node in prompt.items():
         class_type = node.get("class_type", "")
         if "inputs" not in node:
             continue
         
-        # WanVideoModelLoader: 修正 quantization、base_precision 和 load_device
-        if "WanVideoModelLoader" in class_type:
-            # 从 widgets_values 填充缺失的必需输入
-            if "widgets_values" in node and isinstance(node["widgets_values"], list):
-                widgets = node["widgets_values"]
-                if len(widgets) >= 2 and "base_precision" not in node["inputs"]:
-                    node["inputs"]["base_precision"] = widgets[1]
-                if len(widgets) >= 3:
-                    quant = widgets[2]
-                    if quant not in ["disabled", "fp8_e4m3fn", "fp8_e4m3fn_fast", "fp8_e4m3fn_scaled", "fp8_e4m3fn_scaled_fast", "fp8_e5m2", "fp8_e5m2_fast", "fp8_e5m2_scaled", "fp8_e5m2_scaled_fast"]:
-                        quant = "disabled"
-                    node["inputs"]["quantization"] = quant
-                if len(widgets) >= 4:
-                    load_dev = widgets[3]
-                    if load_dev == "offload_device":
-                        load_dev = "main_device"
-                        logger.warning(f"节点 {node_id}: 将 load_device 从 'offload_device' 改为 'main_device' 以避免 CUDA 错误")
-                    if load_dev not in ["main_device", "offload_device"]:
-                        load_dev = "main_device"
-                    node["inputs"]["load_device"] = load_dev
-            
-            # 验证并修正 quantization
-            if "quantization" in node["inputs"]:
-                quant = node["inputs"]["quantization"]
-                if quant not in ["disabled", "fp8_e4m3fn", "fp8_e4m3fn_fast", "fp8_e4m3fn_scaled", "fp8_e4m3fn_scaled_fast", "fp8_e5m2", "fp8_e5m2_fast", "fp8_e5m2_scaled", "fp8_e5m2_scaled_fast"]:
-                    node["inputs"]["quantization"] = "disabled"
-            else:
-                node["inputs"]["quantization"] = "disabled"
-            
-            # 确保 base_precision 存在
-            if "base_precision" not in node["inputs"]:
-                node["inputs"]["base_precision"] = "float16"
-        
-        # WanVideoTextEncodeCached: 修正 offload_device
-        if "WanVideoTextEncodeCached" in class_type:
-            if "widgets_values" in node and isinstance(node["widgets_values"], list):
-                widgets = node["widgets_values"]
-                if len(widgets) >= 6:
-                    offload_dev = widgets[6]
-                    if offload_dev == "offload_device":
-                        offload_dev = "main_device"
-                        logger.warning(f"节点 {node_id}: 将 offload_device 从 'offload_device' 改为 'main_device'")
-                    if offload_dev not in ["main_device", "offload_device", "cpu"]:
-                        offload_dev = "main_device"
-                    node["inputs"]["offload_device"] = offload_dev
+        # WanVideoModelLoader: load_device 为 "offload_device" 可能导致 CUDA 错误，改为 "main_device"
+        if "WanVideoModelLoader" in class_type and node["inputs"].get("load_device") == "offload_device":
+            node["inputs"]["load_device"] = "main_device"
+            logger.warning(f"节点 {node_id}: 将 load_device 从 'offload_device' 改为 'main_device' 以避免 CUDA 错误")
         
         # WanVideoDecode/WanVideoEncode: 修正 tile 参数
         if "WanVideoDecode" in class_type or "WanVideoEncode" in class_type:
@@ -1189,26 +504,99 @@ def handler(job):
             if tile_y > 0 and tile_stride_y >= tile_y:
                 node["inputs"]["tile_stride_y"] = max(32, tile_y - 32)
                 logger.warning(f"节点 {node_id}: 修正 tile_stride_y 必须小于 tile_y")
-    
-    # 连接并执行
-    wait_for_http_connection()
-    ws = connect_websocket()
-    
-    try:
-        videos = get_videos(ws, prompt)
-        ws.close()
-        
-        for node_id in videos:
-            if videos[node_id]:
-                return {"video": videos[node_id][0]}
-        
-        return {"error": "未找到视频"}
-    except Exception as e:
-        ws.close()
-        error_message = str(e)
-        logger.error(f"视频生成失败: {error_message}")
-        return {"error": error_message}
+
+# ==================== 工作流 Profile ====================
+
+def build_steadydancer_workflow():
+    """加载并转换工作流，返回 (未补全的 API prompt, UI 工作流)；不依赖 ComfyUI，可以在等待启动时执行"""
+    workflow_data = load_workflow(WORKFLOW_FILE)
+    return convert_workflow_nodes_to_prompt(workflow_data), workflow_data
+
+def build_steadydancer_template(workflow, object_info):
+    """在转换后的工作流副本上处理与任务无关的节点并按 object_info 补全输入，返回 (API prompt, UI 工作流)"""
+    prompt = copy.deepcopy(workflow.prompt)
+    prepare_steadydancer_template(prompt, object_info)
+    return prompt, workflow.workflow_data
+
+
+class SteadyDancerProfile(WorkflowProfile):
+    """SteadyDancer 图像 + 参考视频生成视频"""
+
+    name = "steadydancer"
+    workflow_files = (WORKFLOW_FILE,)
+    params = STEADYDANCER_PARAMS
+
+    def prepare(self, job_input, ctx):
+        params = ctx["params"]
+        task_dir = ctx["task_dir"]
+        os.makedirs(task_dir, exist_ok=True)
+
+        # LoadImage 只接受 /ComfyUI/input 下的相对路径，path 输入和默认图像都复制到任务目录
+        image_path = resolve_job_file(job_input, "image", task_dir, "input_image.jpg", copy_path=True)
+        if not image_path:
+            logger.info(f"使用默认图像: {DEFAULT_IMAGE}")
+            image_path = process_input(DEFAULT_IMAGE, task_dir, "input_image.jpg", "path", copy_path=True)
+        ctx["image_path"] = image_path
+
+        # 工作流加载和转换每个 worker 只做一次，与等待 ComfyUI 启动重叠；补全输入需要 object_info，在 build_prompt 中完成
+        ctx["workflow_file"] = WORKFLOW_FILE
+        ctx["workflow"] = get_template(WORKFLOW_FILE, build_steadydancer_workflow)
+        ctx["workflow_data"] = ctx["workflow"].workflow_data
+
+        original_size = (job_input.get("width", 480), job_input.get("height", 832))
+        if (params["width"], params["height"]) != original_size:
+            logger.info(f"分辨率调整: {original_size[0]}x{original_size[1]} -> {params['width']}x{params['height']}")
+
+        # 参考视频：在进程池中预处理（解码、重采样、缩放、截断），同时等待 ComfyUI 启动
+        ctx["reference_video_path"] = resolve_reference_video(job_input, task_dir)
+        ctx["input_files"] = {"image": image_path, "reference_video": ctx["reference_video_path"]}
+        ctx["preprocess_future"] = None
+        if ctx["reference_video_path"] and "75" in ctx["workflow"].prompt and params["preprocess_reference_video"]:
+            ctx["preprocess_future"] = submit_preprocess(
+                ctx["reference_video_path"], params["width"], params["height"],
+                fps=get_reference_fps(ctx["workflow"].prompt), max_frames=params["length"],
+                start_time=params["reference_video_start"]
+            )
+
+    def build_prompt(self, job_input, ctx, object_info):
+        params = ctx["params"]
+
+        prompt_count = len([line for line in params["prompt"].split("\n") if line.strip()])
+        if prompt_count > 1:
+            logger.info(f"📹 多提示词模式: {prompt_count}个提示词，总长度约{params['length'] * prompt_count / 16.0:.1f}秒")
+
+        reference_video_path = ctx["reference_video_path"]
+        reference_preprocessed = False
+        if ctx["preprocess_future"] is not None:
+            # 预处理不能超过任务截止时间，超时时直接返回错误（ComfyUI 内处理原视频同样来不及）
+            try:
+                preprocessed_path = ctx["preprocess_future"].result(
+                    timeout=max(ctx["deadline"] - time.monotonic(), 0))
+            except concurrent.futures.TimeoutError:
+                ctx["preprocess_future"].cancel()
+                raise Exception("任务超时: 参考视频预处理未在截止时间内完成")
+            except Exception as e:
+                logger.warning(f"⚠️ 参考视频预处理出错，使用原视频: {e}")
+                preprocessed_path = None
+            if preprocessed_path:
+                reference_video_path = preprocessed_path
+                reference_preprocessed = True
+
+        # object_info 获取失败时构建的模板没有经过校验，不与正常模板共用缓存
+        template = get_template((WORKFLOW_FILE, bool(object_info)),
+                                lambda: build_steadydancer_template(ctx["workflow"], object_info))
+        # 只复制被绑定的节点和参考图像/视频节点，其余节点与模板共享
+        prompt = template.instantiate(STEADYDANCER_BINDINGS, params, writable=("76", "75"))
+        configure_steadydancer_nodes(
+            prompt, params, ctx["task_id"], ctx["image_path"],
+            reference_video_path=reference_video_path,
+            reference_preprocessed=reference_preprocessed
+        )
+        return prompt
+
+
+PROFILE = SteadyDancerProfile()
+handler = make_handler(PROFILE)
 
 if __name__ == "__main__":
     runpod.serverless.start({"handler": handler})
-
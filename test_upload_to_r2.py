@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+测试 upload_to_r2 的内容寻址上传
+使用本地 S3 替身服务器（仅实现 HEAD/PUT），不访问真实的 R2
+"""
+
+import os
+import threading
+import tempfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import boto3
+from botocore.config import Config
+
+import upload_to_r2
+
+
+class LocalS3Handler(BaseHTTPRequestHandler):
+    """最小化的 path-style S3 替身：/<bucket>/<key>"""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(length) if length else b''
+
+    def do_PUT(self):
+        body = self._read_body()
+        metadata = {k[len('x-amz-meta-'):]: v for k, v in self.headers.items()
+                    if k.lower().startswith('x-amz-meta-')}
+        self.server.objects[self.path] = (body, metadata, self.headers.get('Content-Type'))
+        self.server.put_count += 1
+        self.send_response(200)
+        self.send_header('ETag', '"stand-in"')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_HEAD(self):
+        self.server.head_count += 1
+        if self.path not in self.server.objects:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body, metadata, content_type = self.server.objects[self.path]
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Content-Type', content_type or 'application/octet-stream')
+        for key, value in metadata.items():
+            self.send_header(f'x-amz-meta-{key}', value)
+        self.end_headers()
+
+
+def start_local_s3():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), LocalS3Handler)
+    server.objects = {}
+    server.put_count = 0
+    server.head_count = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def make_client(server):
+    return boto3.client(
+        's3',
+        endpoint_url=f"http://127.0.0.1:{server.server_address[1]}",
+        aws_access_key_id='test',
+        aws_secret_access_key='test',
+        region_name='auto',
+        config=Config(s3={'addressing_style': 'path'},
+                      request_checksum_calculation='when_required',
+                      response_checksum_validation='when_required')
+    )
+
+
+def write_temp_video(data):
+    fd, path = tempfile.mkstemp(suffix='.mp4')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def test_content_hash_key_and_head_skip():
+    """相同内容第二次上传只发 HEAD，不再 PUT"""
+    server = start_local_s3()
+    client = make_client(server)
+    first = write_temp_video(b'fake mp4 bytes' * 100)
+    second = write_temp_video(b'fake mp4 bytes' * 100)
+    try:
+        params = {"prompt": "跳舞的人", "seed": 42, "width": 480, "height": 832}
+        result = upload_to_r2.upload_mp4_to_r2(first, bucket_name='bucket', params=params, s3_client=client)
+        sha256_hex = upload_to_r2.compute_sha256(first)
+        assert result["object_key"] == f"sha256/{sha256_hex[:2]}/{sha256_hex}.mp4"
+        assert result["skipped"] is False
+        assert server.put_count == 1
+
+        body, metadata, content_type = server.objects[f"/bucket/{result['object_key']}"]
+        assert content_type == 'video/mp4'
+        assert metadata["sha256"] == sha256_hex
+        assert '"seed":42' in metadata["params"]
+
+        # 不同文件名、相同内容：命中同一个对象键，跳过上传
+        again = upload_to_r2.upload_mp4_to_r2(second, bucket_name='bucket', s3_client=client)
+        assert again["object_key"] == result["object_key"]
+        assert again["skipped"] is True
+        assert server.put_count == 1
+    finally:
+        os.remove(first)
+        os.remove(second)
+        server.shutdown()
+
+
+def test_explicit_key_reuploads_changed_content():
+    """自定义对象键在内容变化时重新上传"""
+    server = start_local_s3()
+    client = make_client(server)
+    path = write_temp_video(b'version 1')
+    try:
+        upload_to_r2.upload_mp4_to_r2(path, bucket_name='bucket', object_key='out/video.mp4', s3_client=client)
+        upload_to_r2.upload_mp4_to_r2(path, bucket_name='bucket', object_key='out/video.mp4', s3_client=client)
+        assert server.put_count == 1
+
+        with open(path, 'wb') as f:
+            f.write(b'version 2')
+        result = upload_to_r2.upload_mp4_to_r2(path, bucket_name='bucket', object_key='out/video.mp4', s3_client=client)
+        assert result["skipped"] is False
+        assert server.put_count == 2
+    finally:
+        os.remove(path)
+        server.shutdown()
+
+
+def test_large_params_stored_as_hash_only():
+    """超过元数据上限的生成参数只保存哈希"""
+    path = write_temp_video(b'x')
+    try:
+        metadata = upload_to_r2.build_object_metadata(path, 'ab' * 32, {"prompt": "a" * 4096})
+        assert "params" not in metadata
+        assert len(metadata["params-sha256"]) == 64
+    finally:
+        os.remove(path)
+
+
+def test_streaming_segments_keep_content_types(tmp_path):
+    """HLS / DASH 切片按扩展名设置 Content-Type，清单最后上传"""
+    from handler_core.video_postprocess import upload_streaming_to_r2
+
+    server = start_local_s3()
+    client = make_client(server)
+    for name in ("index.m3u8", "init.mp4", "segment_00000.m4s", "manifest.mpd"):
+        (tmp_path / name).write_bytes(name.encode())
+    try:
+        url = upload_streaming_to_r2(str(tmp_path / "index.m3u8"), "sha256/ab/abcd_hls", s3_client=client)
+        assert url.endswith("/sha256/ab/abcd_hls/index.m3u8")
+        content_types = {path.rsplit("/", 1)[1]: content_type
+                         for path, (_, _, content_type) in server.objects.items()}
+        assert content_types == {"index.m3u8": "application/vnd.apple.mpegurl", "init.mp4": "video/mp4",
+                                 "segment_00000.m4s": "video/iso.segment", "manifest.mpd": "application/dash+xml"}
+    finally:
+        server.shutdown()
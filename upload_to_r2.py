@@ -5,9 +5,12 @@
 
 import os
 import sys
+import json
+import hashlib
+import mimetypes
+import subprocess
 import boto3
 from botocore.exceptions import ClientError
-from pathlib import Path
 
 # R2 配置（硬编码）
 DEFAULT_R2_BUCKET = "generate-image"
@@ -16,6 +19,81 @@ DEFAULT_R2_ACCESS_KEY_ID = "33ce9b42035c24059e421092eb7d3437"
 DEFAULT_R2_SECRET_ACCESS_KEY = "7e898d9484a4d55f59189be2a99cbb34aaed2828b34acfb56b42bec600ac666d"
 DEFAULT_STORAGE_DOMAIN = "pub-adba99cbc4cd4237a5ed7de21ad26f3c.r2.dev"
 
+# 内容寻址对象键前缀：sha256/<前2位>/<完整哈希><扩展名>
+CONTENT_HASH_PREFIX = "sha256"
+# S3/R2 用户元数据总大小上限为 2KB，生成参数超过此长度时只保存其哈希
+MAX_PARAMS_METADATA_BYTES = 1024
+
+def compute_sha256(file_path, chunk_size=8 * 1024 * 1024):
+    """分块计算文件的 sha256（避免大视频一次性读入内存）"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def content_hash_object_key(sha256_hex, ext=".mp4", prefix=CONTENT_HASH_PREFIX):
+    """根据内容哈希生成对象键，例如 sha256/ab/abcdef....mp4"""
+    return f"{prefix}/{sha256_hex[:2]}/{sha256_hex}{ext}"
+
+def probe_video_metadata(file_path):
+    """使用 ffprobe 读取视频时长和分辨率，ffprobe 不可用时返回空字典"""
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+             '-show_entries', 'stream=width,height:format=duration',
+             '-of', 'json', file_path],
+            capture_output=True, text=True, timeout=30
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return {}
+    if result.returncode != 0:
+        return {}
+    try:
+        info = json.loads(result.stdout)
+    except ValueError:
+        return {}
+    metadata = {}
+    streams = info.get("streams") or []
+    if streams:
+        if streams[0].get("width") and streams[0].get("height"):
+            metadata["resolution"] = f"{streams[0]['width']}x{streams[0]['height']}"
+    duration = info.get("format", {}).get("duration")
+    if duration:
+        metadata["duration"] = duration
+    return metadata
+
+def build_object_metadata(file_path, sha256_hex, params=None):
+    """构建对象的用户元数据（sha256、时长、分辨率、生成参数），值必须为 ASCII 字符串"""
+    metadata = {"sha256": sha256_hex}
+    metadata.update(probe_video_metadata(file_path))
+    if params:
+        params_json = json.dumps(params, sort_keys=True, separators=(',', ':'), ensure_ascii=True)
+        metadata["params-sha256"] = hashlib.sha256(params_json.encode('utf-8')).hexdigest()
+        if len(params_json) <= MAX_PARAMS_METADATA_BYTES:
+            metadata["params"] = params_json
+    return {k: str(v) for k, v in metadata.items()}
+
+def head_object(s3_client, bucket_name, object_key):
+    """HEAD 对象，存在时返回响应，不存在时返回 None"""
+    try:
+        return s3_client.head_object(Bucket=bucket_name, Key=object_key)
+    except ClientError as e:
+        error_code = str(e.response.get("Error", {}).get("Code", ""))
+        if error_code in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+
+def create_r2_client(endpoint_url=None, access_key_id=None, secret_access_key=None, region="auto"):
+    """创建 S3 客户端（R2 兼容 S3 API）"""
+    return boto3.client(
+        's3',
+        endpoint_url=endpoint_url or os.getenv('R2_ENDPOINT_URL') or DEFAULT_R2_ENDPOINT,
+        aws_access_key_id=access_key_id or os.getenv('R2_ACCESS_KEY_ID') or DEFAULT_R2_ACCESS_KEY_ID,
+        aws_secret_access_key=secret_access_key or os.getenv('R2_SECRET_ACCESS_KEY') or DEFAULT_R2_SECRET_ACCESS_KEY,
+        region_name=region
+    )
+
 def upload_mp4_to_r2(
     file_path: str,
     bucket_name: str = None,
@@ -23,19 +101,29 @@ def upload_mp4_to_r2(
     endpoint_url: str = None,
     access_key_id: str = None,
     secret_access_key: str = None,
-    region: str = "auto"
+    region: str = "auto",
+    params: dict = None,
+    s3_client=None
 ):
     """
     上传 MP4 文件到 Cloudflare R2
     
+    未指定 object_key 时使用内容哈希作为对象键（sha256/<前缀>/<哈希>.mp4），
+    上传前先 HEAD 检查，相同内容的文件只会存储一次，重复上传直接返回。
+    
     参数:
         file_path: 本地 MP4 文件路径
         bucket_name: R2 bucket 名称
-        object_key: R2 中的对象键（路径），如果为 None 则使用文件名
+        object_key: R2 中的对象键（路径），如果为 None 则使用内容哈希
         endpoint_url: R2 endpoint URL（例如: https://xxx.r2.cloudflarestorage.com）
         access_key_id: R2 Access Key ID
         secret_access_key: R2 Secret Access Key
         region: 区域，默认为 "auto"
+        params: 生成参数（写入对象元数据，便于之后的缓存查找）
+        s3_client: 可选，已创建的 S3 客户端（测试时可指向本地 S3 替身）
+    
+    返回:
+        成功时返回 {"object_key", "url", "sha256", "skipped"} 字典，失败时返回 False
     """
     # 检查文件是否存在
     if not os.path.exists(file_path):
@@ -46,10 +134,6 @@ def upload_mp4_to_r2(
     if not file_path.lower().endswith('.mp4'):
         print(f"⚠️  警告: 文件不是 .mp4 格式: {file_path}")
     
-    # 如果没有指定 object_key，使用文件名
-    if object_key is None:
-        object_key = os.path.basename(file_path)
-    
     # 使用硬编码的默认值，如果未提供参数则从环境变量获取，最后使用默认值
     endpoint_url = endpoint_url or os.getenv('R2_ENDPOINT_URL') or DEFAULT_R2_ENDPOINT
     access_key_id = access_key_id or os.getenv('R2_ACCESS_KEY_ID') or DEFAULT_R2_ACCESS_KEY_ID
@@ -78,14 +162,15 @@ def upload_mp4_to_r2(
         return False
     
     try:
-        # 创建 S3 客户端（R2 兼容 S3 API）
-        s3_client = boto3.client(
-            's3',
-            endpoint_url=endpoint_url,
-            aws_access_key_id=access_key_id,
-            aws_secret_access_key=secret_access_key,
-            region_name=region
-        )
+        if s3_client is None:
+            s3_client = create_r2_client(endpoint_url, access_key_id, secret_access_key, region)
+        
+        # 计算内容哈希，未指定 object_key 时使用内容寻址键
+        sha256_hex = compute_sha256(file_path)
+        ext = os.path.splitext(file_path)[1].lower() or ".mp4"
+        if object_key is None:
+            object_key = content_hash_object_key(sha256_hex, ext)
+        public_url = f"https://{DEFAULT_STORAGE_DOMAIN}/{object_key}"
         
         # 获取文件大小
         file_size = os.path.getsize(file_path)
@@ -93,23 +178,36 @@ def upload_mp4_to_r2(
         print(f"📦 大小: {file_size / (1024*1024):.2f} MB")
         print(f"🪣 Bucket: {bucket_name}")
         print(f"🔑 对象键: {object_key}")
-        print(f"⏳ 开始上传...")
+        
+        # HEAD-before-PUT：对象已存在且内容哈希一致时跳过上传
+        existing = head_object(s3_client, bucket_name, object_key)
+        if existing is not None:
+            # 内容寻址键存在即代表内容相同；自定义键需比对元数据中的 sha256
+            if (object_key.startswith(f"{CONTENT_HASH_PREFIX}/") or
+                    existing.get("Metadata", {}).get("sha256") == sha256_hex):
+                print("♻️  对象已存在，跳过上传")
+                print(f"🔗 公开访问 URL: {public_url}")
+                return {"object_key": object_key, "url": public_url, "sha256": sha256_hex, "skipped": True}
+        
+        print("⏳ 开始上传...")
         
         # 上传文件
         s3_client.upload_file(
             file_path,
             bucket_name,
             object_key,
-            ExtraArgs={'ContentType': 'video/mp4'}
+            ExtraArgs={
+                'ContentType': mimetypes.guess_type(file_path)[0] or 'application/octet-stream',
+                'Metadata': build_object_metadata(file_path, sha256_hex, params)
+            }
         )
         
         # 生成访问 URL
-        public_url = f"https://{DEFAULT_STORAGE_DOMAIN}/{object_key}"
-        print(f"✅ 上传成功!")
+        print("✅ 上传成功!")
         print(f"📹 对象键: {object_key}")
         print(f"🔗 公开访问 URL: {public_url}")
         
-        return True
+        return {"object_key": object_key, "url": public_url, "sha256": sha256_hex, "skipped": False}
         
     except ClientError as e:
         print(f"❌ 上传失败: {e}")
@@ -120,6 +218,20 @@ def upload_mp4_to_r2(
         traceback.print_exc()
         return False
 
+def upload_bytes_to_r2(data, object_key, content_type="application/octet-stream", bucket_name=None,
+                       cache_control=None, s3_client=None):
+    """
+    把内存中的数据直接写入固定对象键（覆盖已有对象），返回公开访问 URL
+
+    用于频繁更新的小对象（如生成过程中的滚动预览图），不做 HEAD 检查和内容哈希，失败时抛出异常
+    """
+    bucket_name = bucket_name or os.getenv('R2_BUCKET_NAME') or os.getenv('R2_BUCKET') or DEFAULT_R2_BUCKET
+    if s3_client is None:
+        s3_client = create_r2_client()
+    extra_args = {'CacheControl': cache_control} if cache_control else {}
+    s3_client.put_object(Bucket=bucket_name, Key=object_key, Body=data, ContentType=content_type, **extra_args)
+    return f"https://{DEFAULT_STORAGE_DOMAIN}/{object_key}"
+
 def main():
     """主函数"""
     import argparse
@@ -127,11 +239,12 @@ def main():
     parser = argparse.ArgumentParser(description='上传 MP4 文件到 Cloudflare R2')
     parser.add_argument('file_path', help='要上传的 MP4 文件路径')
     parser.add_argument('--bucket', '-b', default=None, help='R2 bucket 名称（默认使用硬编码配置）')
-    parser.add_argument('--key', '-k', default=None, help='R2 中的对象键/路径（默认为文件名）')
+    parser.add_argument('--key', '-k', default=None, help='R2 中的对象键/路径（默认为内容哈希 sha256/<前缀>/<哈希>.mp4）')
     parser.add_argument('--endpoint', '-e', default=None, help='R2 endpoint URL（默认使用硬编码配置）')
     parser.add_argument('--access-key', '-a', default=None, help='R2 Access Key ID（默认使用硬编码配置）')
     parser.add_argument('--secret-key', '-s', default=None, help='R2 Secret Access Key（默认使用硬编码配置）')
     parser.add_argument('--region', '-r', default='auto', help='区域（默认: auto）')
+    parser.add_argument('--params', '-p', default=None, help='生成参数 JSON 字符串（写入对象元数据）')
     
     args = parser.parse_args()
     
@@ -142,7 +255,8 @@ def main():
         endpoint_url=args.endpoint,
         access_key_id=args.access_key,
         secret_access_key=args.secret_key,
-        region=args.region
+        region=args.region,
+        params=json.loads(args.params) if args.params else None
     )
     
     sys.exit(0 if success else 1)